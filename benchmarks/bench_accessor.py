@@ -0,0 +1,55 @@
+"""
+Microbenchmark for reading and writing a nested field of structs.
+
+Compares the attribute chain 'p.hdr.len' with an accessor returned by
+ffi.accessor("struct pkt", "hdr.len"), for one struct and for an array
+of structs with get_many() and set_many().
+
+    python benchmarks/bench_accessor.py [repeat]
+"""
+import sys
+import timeit
+import cffi
+
+ffi = cffi.FFI()
+ffi.cdef("""
+    struct hdr { unsigned short len; int flags: 3; };
+    struct pkt { int id; struct hdr hdr; char payload[50]; };
+""")
+
+N = 100000
+pkts = ffi.new("struct pkt[]", N)
+p = pkts + 0
+length = ffi.accessor("struct pkt", "hdr.len")
+values = [i & 0xffff for i in range(N)]
+
+
+def read_chain():
+    return [pkts[i].hdr.len for i in range(N)]
+
+def write_chain():
+    for i in range(N):
+        pkts[i].hdr.len = values[i]
+
+CASES = [
+    ("read  p.hdr.len", lambda: p.hdr.len, 1),
+    ("read  accessor.get(p)", lambda: length.get(p), 1),
+    ("write p.hdr.len = 5", lambda: setattr(p.hdr, "len", 5), 1),
+    ("write accessor.set(p, 5)", lambda: length.set(p, 5), 1),
+    ("read  loop over array", read_chain, N),
+    ("read  accessor.get_many()", lambda: length.get_many(pkts, N), N),
+    ("write loop over array", write_chain, N),
+    ("write accessor.set_many()", lambda: length.set_many(pkts, values), N),
+]
+
+
+def bench(repeat=5):
+    print("%-28s %12s" % ("", "ns per struct"))
+    for name, func, n in CASES:
+        number = max(1, 1000000 // n)
+        t = min(timeit.repeat(func, repeat=repeat, number=number))
+        print("%-28s %12.1f" % (name, t * 1e9 / (number * n)))
+
+
+if __name__ == '__main__':
+    bench(*[int(x) for x in sys.argv[1:2]])
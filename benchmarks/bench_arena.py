@@ -0,0 +1,56 @@
+"""
+Microbenchmark for ffi.new_arena().
+
+Simulates a request handler that allocates a few dozen temporary
+structs and arrays and drops them all at the end: once with ffi.new()
+and once with arena.new() inside a 'with ffi.new_arena()' block.  Both
+are given ctype objects, not strings, to leave out the cost of looking
+up the types.
+
+    python benchmarks/bench_arena.py [repeat]
+"""
+import sys
+import timeit
+import cffi
+
+ffi = cffi.FFI()
+ffi.cdef("""
+    struct header { int kind; unsigned int length; double stamp; };
+    struct field { const char *name; int offset, size; };
+""")
+
+HEADER = ffi.typeof("struct header *")
+FIELDS = ffi.typeof("struct field[8]")
+BUFFER = ffi.typeof("char[]")
+N = 10000
+
+
+def handler_new():
+    for i in range(N):
+        tmp = []
+        for j in range(10):
+            tmp.append(ffi.new(HEADER))
+            tmp.append(ffi.new(FIELDS))
+            tmp.append(ffi.new(BUFFER, 256))
+
+def handler_arena():
+    for i in range(N):
+        with ffi.new_arena() as arena:
+            new = arena.new
+            tmp = []
+            for j in range(10):
+                tmp.append(new(HEADER))
+                tmp.append(new(FIELDS))
+                tmp.append(new(BUFFER, 256))
+
+
+def bench(repeat=5, number=1):
+    print("%-16s %12s" % ("", "us/request"))
+    for name, func in [("ffi.new()", handler_new),
+                       ("arena.new()", handler_arena)]:
+        t = min(timeit.repeat(func, repeat=repeat, number=number))
+        print("%-16s %12.2f" % (name, t * 1e6 / (number * N)))
+
+
+if __name__ == '__main__':
+    bench(*[int(x) for x in sys.argv[1:2]])
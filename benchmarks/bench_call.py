@@ -0,0 +1,50 @@
+"""
+Microbenchmark for calling ABI-mode functions from ffi.dlopen().
+
+Measures the per-call overhead of 0-, 1- and 4-argument calls.  Each
+call is done twice: once the normal way, which uses the vectorcall
+protocol on Python >= 3.9, and once through 'type(f).__call__', which
+always builds a tuple of arguments and goes through tp_call.  A call
+to a variadic function is measured too.  Run it against two builds of
+_cffi_backend to compare them.
+
+    python benchmarks/bench_call.py [repeat]
+"""
+import sys
+import timeit
+import cffi
+
+ffi = cffi.FFI()
+ffi.cdef("""
+    int getpid(void);
+    int abs(int);
+    void *memccpy(void *, const void *, int, size_t);
+    int snprintf(char *, size_t, const char *, ...);
+""")
+lib = ffi.dlopen(None)
+
+dst = ffi.new("char[]", 16)
+src = ffi.new("char[]", b"hello")
+
+CASES = [
+    ("0 args", lib.getpid, ()),
+    ("1 arg ", lib.abs, (-42,)),
+    ("4 args", lib.memccpy, (dst, src, 0, 4)),
+    ("varargs", lib.snprintf, (dst, 16, b"%d", ffi.cast("int", 42))),
+]
+
+
+def bench(repeat=5, number=1000000):
+    print("%-8s %16s %16s" % ("", "vectorcall", "tp_call"))
+    for name, func, args in CASES:
+        tp_call = type(func).__call__
+        fast = min(timeit.repeat(lambda: func(*args),
+                                 repeat=repeat, number=number))
+        slow = min(timeit.repeat(lambda: tp_call(func, *args),
+                                 repeat=repeat, number=number))
+        print("%-8s %13.1f ns %13.1f ns" % (name, fast * 1e9 / number,
+                                           slow * 1e9 / number))
+
+
+if __name__ == '__main__':
+    bench(*[int(x) for x in sys.argv[1:2]])
@@ -0,0 +1,45 @@
+"""
+Microbenchmark for ffi.call_many().
+
+Calls the C function 'double ldexp(double, int)' over two columns of
+N items, first with a Python loop over the cdata function and then
+with a single ffi.call_many().
+
+    python benchmarks/bench_call_many.py [repeat]
+"""
+import array
+import sys
+import timeit
+import cffi
+
+ffi = cffi.FFI()
+ffi.cdef("""
+    double ldexp(double, int);
+""")
+lib = ffi.dlopen(None)
+
+N = 100000
+xs = array.array('d', [i * 0.5 for i in range(N)])
+ns = array.array('i', [i % 16 for i in range(N)])
+out = array.array('d', [0.0]) * N
+
+
+def python_loop():
+    f = lib.ldexp
+    for i in range(N):
+        out[i] = f(xs[i], ns[i])
+
+
+def call_many():
+    ffi.call_many(lib.ldexp, xs, ns, out=out)
+
+
+def bench(repeat=5, number=10):
+    for name, func in [("python loop", python_loop),
+                       ("call_many", call_many)]:
+        t = min(timeit.repeat(func, repeat=repeat, number=number))
+        print("%-12s %10.1f ns per row" % (name, t * 1e9 / (number * N)))
+
+
+if __name__ == '__main__':
+    bench(*[int(x) for x in sys.argv[1:2]])
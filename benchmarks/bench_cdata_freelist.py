@@ -0,0 +1,61 @@
+"""
+Microbenchmark for the per-thread freelist of plain cdata objects.
+
+Reads every item of an array of pointers with 'p[i]' and by iterating
+over it, and calls a function returning a pointer.  Each of these
+makes a short-lived cdata object.  Every case is run with the freelist
+disabled and enabled, and the freelist counters of the thread are
+printed at the end.
+
+    python benchmarks/bench_cdata_freelist.py [repeat]
+"""
+import sys
+import timeit
+import cffi
+import _cffi_ft_backend as backend
+
+ffi = cffi.FFI()
+ffi.cdef("void *memchr(const void *, int, size_t);")
+lib = ffi.dlopen(None)
+
+N = 100000
+ints = ffi.new("int[]", N)
+ptrs = ffi.new("int *[]", [ints + i for i in range(N)])
+buf = ffi.new("char[]", b"hello")
+
+
+def index_loop():
+    for i in range(N):
+        ptrs[i]
+
+def iterate():
+    for x in ptrs:
+        pass
+
+def call_loop():
+    memchr = lib.memchr
+    for i in range(N):
+        memchr(buf, 108, 5)
+
+CASES = [
+    ("p[i]", index_loop),
+    ("for x in p", iterate),
+    ("call returning void *", call_loop),
+]
+
+
+def bench(repeat=5, number=10):
+    default_max = backend._cdata_freelist_stats()['max_size']
+    print("%-22s %14s %14s" % ("ns per item", "no freelist", "freelist"))
+    for name, func in CASES:
+        times = []
+        for max_size in [0, default_max]:
+            backend._set_cdata_freelist_max(max_size)
+            t = min(timeit.repeat(func, repeat=repeat, number=number))
+            times.append(t * 1e9 / (number * N))
+        print("%-22s %14.1f %14.1f" % (name, times[0], times[1]))
+    print(backend._cdata_freelist_stats())
+
+
+if __name__ == '__main__':
+    bench(*[int(x) for x in sys.argv[1:2]])
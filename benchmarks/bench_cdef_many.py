@@ -0,0 +1,40 @@
+"""
+Benchmark for calling ffi.cdef() many times with small declarations.
+
+Each cdef() declares one typedef, a struct and a function that use the
+typedef of the previous call.  The time per cdef() should stay roughly
+constant when the total number of declarations grows; before, every
+cdef() repeated all the typedefs seen so far, which made the total
+time quadratic.
+
+    python benchmarks/bench_cdef_many.py [repeat]
+"""
+import sys
+import time
+import cffi
+
+
+CHUNK = """
+    typedef struct s%(i)d { t%(j)d x; int y[4]; } t%(i)d;
+    int f%(i)d(t%(i)d *, t%(j)d *);
+"""
+
+
+def run(n):
+    ffi = cffi.FFI()
+    ffi.cdef("typedef int t0;")
+    t0 = time.perf_counter()
+    for i in range(1, n + 1):
+        ffi.cdef(CHUNK % {'i': i, 'j': i - 1})
+    return time.perf_counter() - t0
+
+
+def bench(repeat=3):
+    print("%8s %12s %14s" % ("cdefs", "total", "per cdef"))
+    for n in (250, 500, 1000, 2000):
+        t = min([run(n) for _ in range(repeat)])
+        print("%8d %10.3f s %11.1f us" % (n, t, t * 1e6 / n))
+
+
+if __name__ == '__main__':
+    bench(*[int(x) for x in sys.argv[1:2]])
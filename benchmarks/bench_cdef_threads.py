@@ -0,0 +1,58 @@
+"""
+Benchmark for calling ffi.cdef() from several threads at once.
+
+Parses the same set of large cdefs, first sequentially and then from
+N threads, each thread with its own FFI instance.  Every thread uses
+its own pycparser parser, so that on a free-threaded build of Python
+the threads parse in parallel; with the GIL, expect no speedup.
+
+    python benchmarks/bench_cdef_threads.py [nthreads]
+"""
+import sys
+import threading
+import time
+import cffi
+
+
+def make_cdef(prefix, n=300):
+    return "\n".join(["""
+        typedef struct %(p)s_s%(i)d {
+            int a; double b[4]; struct %(p)s_s%(i)d *next;
+        } %(p)s_t%(i)d;
+        int %(p)s_f%(i)d(%(p)s_t%(i)d *, const char *, long[%(i)d]);
+        #define %(P)s_C%(i)d %(i)d
+    """ % {'p': prefix, 'P': prefix.upper(), 'i': i} for i in range(n)])
+
+
+def parse(sources):
+    for csource in sources:
+        cffi.FFI().cdef(csource)
+
+
+def bench(nthreads=4, ncdefs=4):
+    sources = [[make_cdef("t%d_%d" % (j, k)) for k in range(ncdefs)]
+               for j in range(nthreads)]
+    t0 = time.perf_counter()
+    for j in range(nthreads):
+        parse(sources[j])
+    serial = time.perf_counter() - t0
+    #
+    threads = [threading.Thread(target=parse, args=(sources[j],))
+               for j in range(nthreads)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    parallel = time.perf_counter() - t0
+    #
+    gil = getattr(sys, '_is_gil_enabled', lambda: True)()
+    print("%d threads x %d cdefs (GIL %s)" % (nthreads, ncdefs,
+                                             "enabled" if gil else "disabled"))
+    print("sequential: %8.3f s" % (serial,))
+    print("threads:    %8.3f s   speedup %.2fx" % (parallel,
+                                                   serial / parallel))
+
+
+if __name__ == '__main__':
+    bench(*[int(x) for x in sys.argv[1:2]])
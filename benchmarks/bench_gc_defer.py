@@ -0,0 +1,51 @@
+"""
+Microbenchmark for the destructors of ffi.gc().
+
+Makes a list of 'ffi.gc(lib.malloc(64), destructor)' objects and times
+dropping it.  The destructor is a Python function calling lib.free(),
+or directly the C function lib.free, and it is called immediately or
+deferred with defer=True.  For the deferred cases, the time of the
+ffi.gc_flush() that follows is shown separately: dropping the list is
+the latency seen by the code that drops the objects.
+
+    python benchmarks/bench_gc_defer.py [repeat]
+"""
+import sys
+import time
+import cffi
+
+ffi = cffi.FFI()
+ffi.cdef("void *malloc(size_t); void free(void *);")
+lib = ffi.dlopen(None)
+
+N = 200000
+
+
+def run(destructor, defer):
+    malloc = lib.malloc
+    lst = [ffi.gc(malloc(64), destructor, defer=defer) for i in range(N)]
+    t0 = time.perf_counter()
+    del lst
+    t1 = time.perf_counter()
+    ffi.gc_flush()
+    t2 = time.perf_counter()
+    return t1 - t0, t2 - t1
+
+
+def bench(repeat=5):
+    free = lib.free
+    cases = [("Python destructor", lambda p: free(p)),
+             ("C destructor", free)]
+    print("%-32s %12s %12s" % ("ns per object", "drop", "gc_flush()"))
+    for name, destructor in cases:
+        for defer in [False, True]:
+            times = [run(destructor, defer) for i in range(repeat)]
+            drop = min([t[0] for t in times])
+            flush = min([t[1] for t in times])
+            print("%-32s %12.1f %12.1f" % (
+                "%s%s" % (name, ", defer=True" if defer else ""),
+                drop * 1e9 / N, flush * 1e9 / N))
+
+
+if __name__ == '__main__':
+    bench(*[int(x) for x in sys.argv[1:2]])
@@ -0,0 +1,46 @@
+"""
+Microbenchmark for reading and writing global variables of a library
+opened with ffi.dlopen().
+
+'lib.optind' uses a descriptor whose address was looked up once; the
+second column calls read_variable()/write_variable() on the backend
+library, which calls dlsym() every time, as every access used to do.
+
+    python benchmarks/bench_globals.py [repeat]
+"""
+import sys
+import timeit
+import cffi
+
+ffi = cffi.FFI()
+ffi.cdef("extern int optind;")
+lib = ffi.dlopen(None)
+backendlib = ffi._backend.load_library(None)
+BInt = ffi.typeof("int")
+
+
+def read_cached():
+    return lib.optind
+
+def write_cached():
+    lib.optind = 1
+
+def read_dlsym():
+    return backendlib.read_variable(BInt, "optind")
+
+def write_dlsym():
+    backendlib.write_variable(BInt, "optind", 1)
+
+
+def bench(repeat=5, number=1000000):
+    print("%-6s %16s %16s" % ("", "lib.optind", "dlsym"))
+    for name, cached, dlsym in [("read", read_cached, read_dlsym),
+                                ("write", write_cached, write_dlsym)]:
+        fast = min(timeit.repeat(cached, repeat=repeat, number=number))
+        slow = min(timeit.repeat(dlsym, repeat=repeat, number=number))
+        print("%-6s %13.1f ns %13.1f ns" % (name, fast * 1e9 / number,
+                                           slow * 1e9 / number))
+
+
+if __name__ == '__main__':
+    bench(*[int(x) for x in sys.argv[1:2]])
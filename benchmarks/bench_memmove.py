@@ -0,0 +1,49 @@
+"""
+Benchmark for ffi.memmove() on large buffers.
+
+Copies from a bytearray into a cdata array of the same size, for sizes
+from 64 KB to 256 MB, and prints the throughput in GB/s with
+threads=1 (the default) and with a few more threads.  Copies of at
+least 128 KB release the GIL; the ones of at least 8 MB can use two
+threads or more, with at least 4 MB per thread.
+
+    python benchmarks/bench_memmove.py [repeat]
+"""
+import sys
+import time
+import cffi
+
+ffi = cffi.FFI()
+
+SIZES = [64 << 10, 1 << 20, 16 << 20, 64 << 20, 256 << 20]
+THREADS = [1, 2, 4, 8]
+
+
+def throughput(dest, src, size, threads, repeat):
+    number = max(1, (256 << 20) // size)
+    best = float('inf')
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        for j in range(number):
+            ffi.memmove(dest, src, size, threads=threads)
+        best = min(best, time.perf_counter() - t0)
+    return size * number / best / 1e9
+
+
+def bench(repeat=5):
+    print("%-10s" % "size" + "".join(["%12s" % ("threads=%d" % t)
+                                      for t in THREADS]))
+    for size in SIZES:
+        src = bytearray(b"x" * size)
+        dest = ffi.new("char[]", size)
+        ffi.memmove(dest, src, size)      # touch all pages first
+        line = "%-10s" % ("%d KB" % (size >> 10) if size < (1 << 20)
+                          else "%d MB" % (size >> 20))
+        for threads in THREADS:
+            line += "%7.1f GB/s" % throughput(dest, src, size, threads,
+                                              repeat)
+        print(line)
+
+
+if __name__ == '__main__':
+    bench(*[int(x) for x in sys.argv[1:2]])
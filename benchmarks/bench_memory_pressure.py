@@ -0,0 +1,55 @@
+"""
+Benchmark for ffi.set_memory_pressure().
+
+Makes reference cycles that each keep alive a 1 MB buffer from
+lib.malloc(), given to 'ffi.gc(..., size=1MB)', and reports the peak
+of the memory owned by cdata objects, without and with a threshold of
+64 MB.  Without it, only Python's own allocation counting triggers the
+collection of the cycles.  The cost of ffi.new("char[64]"), which now
+includes the accounting of its memory, is shown too.
+
+    python benchmarks/bench_memory_pressure.py [repeat]
+"""
+import sys
+import gc
+import timeit
+import cffi
+
+ffi = cffi.FFI()
+ffi.cdef("void *malloc(size_t); void free(void *);")
+lib = ffi.dlopen(None)
+
+SIZE = 1024 * 1024
+N = 2000
+
+
+class Node(object):
+    pass
+
+
+def run():
+    gc.collect()
+    peak = 0
+    for i in range(N):
+        node = Node()
+        node.self = node
+        node.buf = ffi.gc(lib.malloc(SIZE), lib.free, size=SIZE)
+        peak = max(peak, ffi.memory_stats()['owned'])
+    return peak
+
+
+def bench(repeat=5):
+    for name, threshold in [("no threshold", 0),
+                            ("threshold 64 MB", 64 * 1024 * 1024)]:
+        ffi.set_memory_pressure(threshold)
+        peak = max([run() for i in range(repeat)])
+        print("%-20s peak owned: %8.1f MB" % (name, peak / float(SIZE)))
+    ffi.set_memory_pressure(0)
+    number = 1000000
+    t = min(timeit.repeat(lambda: ffi.new("char[64]"),
+                          repeat=repeat, number=number))
+    print("%-20s %11.1f ns" % ('ffi.new("char[64]")', t * 1e9 / number))
+
+
+if __name__ == '__main__':
+    bench(*[int(x) for x in sys.argv[1:2]])
@@ -0,0 +1,45 @@
+"""
+Benchmark for ffi.new(..., align=N) and ffi.new_allocator(huge_pages=True).
+
+First measures the cost of ffi.new("double[]", 16) with the default
+alignment and with align=64.  Then allocates a 64 MB array, once with
+ffi.new() and once with a huge_pages allocator, and times the
+allocation followed by a first write over the whole array with
+lib.memset(): with huge pages, there are 512 times fewer page faults.
+
+    python benchmarks/bench_new_aligned.py [repeat]
+"""
+import sys
+import time
+import timeit
+import cffi
+
+ffi = cffi.FFI()
+ffi.cdef("void *memset(void *, int, size_t);")
+lib = ffi.dlopen(None)
+
+BIG = 64 * 1024 * 1024
+
+
+def touch(new):
+    t0 = time.perf_counter()
+    p = new("char[]", BIG)
+    lib.memset(p, 1, BIG)
+    t1 = time.perf_counter()
+    del p
+    return t1 - t0
+
+
+def bench(repeat=5, number=1000000):
+    for name, kwds in [("default", {}), ("align=64", {"align": 64})]:
+        t = min(timeit.repeat(lambda: ffi.new("double[]", 16, **kwds),
+                              repeat=repeat, number=number))
+        print("ffi.new, %-22s %10.1f ns" % (name, t * 1e9 / number))
+    huge = ffi.new_allocator(huge_pages=True)
+    for name, new in [("ffi.new()", ffi.new), ("huge_pages=True", huge)]:
+        t = min([touch(new) for i in range(repeat)])
+        print("64 MB + memset, %-15s %10.2f ms" % (name, t * 1e3))
+
+
+if __name__ == '__main__':
+    bench(*[int(x) for x in sys.argv[1:2]])
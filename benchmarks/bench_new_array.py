@@ -0,0 +1,45 @@
+"""
+Microbenchmark for initializing C arrays from Python objects.
+
+Measures ffi.new("double[]", x) and ffi.new("int[]", x) where 'x' is a
+list of floats or ints, and where 'x' is an array.array of the same
+item type, whose content is copied with a single memcpy().  Run it
+against two builds of _cffi_backend to compare them.
+
+    python benchmarks/bench_new_array.py [repeat]
+"""
+import sys
+import timeit
+import array
+import cffi
+
+ffi = cffi.FFI()
+
+N = 1000000
+floats = [i * 0.5 for i in range(N)]
+ints = list(range(N))
+
+CASES = [
+    ("double[] from list", "double[]", floats),
+    ("double[] from tuple", "double[]", tuple(floats)),
+    ("double[] from array('d')", "double[]", array.array('d', floats)),
+    ("int[] from list", "int[]", ints),
+    ("int[] from array('i')", "int[]", array.array('i', ints)),
+]
+
+
+def bench(repeat=5, number=10):
+    print("%-26s %14s" % ("", "ns per item"))
+    for name, cdecl, init in CASES:
+        try:
+            ffi.new(cdecl, init)
+        except TypeError:       # older versions
+            print("%-26s %14s" % (name, "unsupported"))
+            continue
+        t = min(timeit.repeat(lambda: ffi.new(cdecl, init),
+                              repeat=repeat, number=number))
+        print("%-26s %14.2f" % (name, t * 1e9 / (number * N)))
+
+
+if __name__ == '__main__':
+    bench(*[int(x) for x in sys.argv[1:2]])
@@ -0,0 +1,56 @@
+"""
+Microbenchmark for ffi.new_pool().
+
+Allocates and releases short-lived 'struct msg *' and 'double[4]'
+objects, one at a time and in batches that stay alive together, with
+ffi.new() and with a pool.  ffi.new() is given the ctype object, not
+the string, to leave out the cost of looking up the type.  The pool statistics are printed at the end.
+
+    python benchmarks/bench_pool.py [repeat]
+"""
+import sys
+import timeit
+import cffi
+
+ffi = cffi.FFI()
+ffi.cdef("struct msg { int kind; unsigned int length; double stamp; "
+         "char payload[40]; };")
+
+N = 100000
+BATCH = 1000
+
+
+def one_at_a_time(new, ctype):
+    def run():
+        for i in range(N):
+            new(ctype)
+    return run
+
+def batches(new, ctype):
+    def run():
+        for j in range(N // BATCH):
+            lst = [new(ctype) for i in range(BATCH)]
+    return run
+
+
+def bench(repeat=5, number=10):
+    pools = {}
+    print("%-30s %10s %10s" % ("ns per object", "ffi.new", "pool"))
+    for cdecl in ["struct msg *", "double[4]"]:
+        pool = pools[cdecl] = ffi.new_pool(cdecl)
+        pool_new = lambda ctype, pool=pool: pool()
+        for name, make in [("one at a time", one_at_a_time),
+                           ("batches of %d" % BATCH, batches)]:
+            times = []
+            for new in [ffi.new, pool_new]:
+                t = min(timeit.repeat(make(new, ffi.typeof(cdecl)),
+                                      repeat=repeat, number=number))
+                times.append(t * 1e9 / (number * N))
+            print("%-30s %10.1f %10.1f" % ("%s, %s" % (cdecl, name),
+                                           times[0], times[1]))
+    for cdecl, pool in pools.items():
+        print("%-12s %s" % (cdecl, pool.stats()))
+
+
+if __name__ == '__main__':
+    bench(*[int(x) for x in sys.argv[1:2]])
@@ -0,0 +1,50 @@
+"""
+Microbenchmark for ffi.strings().
+
+Converts a 'char **' of 1000 short strings into a list of Python
+strings, once with a list comprehension calling ffi.string() on each
+item and once with a single call to ffi.strings().  Both are done
+returning bytes and returning str decoded from UTF-8.
+
+    python benchmarks/bench_strings.py [repeat]
+"""
+import sys
+import timeit
+import cffi
+
+ffi = cffi.FFI()
+
+N = 1000
+keepalive = [ffi.new("char[]", b"column_%d" % i) for i in range(N)]
+names = ffi.new("char *[]", keepalive)
+
+
+def loop_bytes():
+    string = ffi.string
+    return [string(names[i]) for i in range(N)]
+
+def loop_str():
+    string = ffi.string
+    return [string(names[i]).decode('utf-8') for i in range(N)]
+
+def bulk_bytes():
+    return ffi.strings(names, N)
+
+def bulk_str():
+    return ffi.strings(names, N, encoding='utf-8')
+
+
+def bench(repeat=5, number=2000):
+    assert loop_bytes() == bulk_bytes()
+    assert loop_str() == bulk_str()
+    print("%-8s %18s %16s" % ("", "ffi.string() loop", "ffi.strings()"))
+    for name, loop, bulk in [("bytes", loop_bytes, bulk_bytes),
+                             ("str", loop_str, bulk_str)]:
+        t_loop = min(timeit.repeat(loop, repeat=repeat, number=number))
+        t_bulk = min(timeit.repeat(bulk, repeat=repeat, number=number))
+        print("%-8s %15.1f us %13.1f us" % (name, t_loop * 1e6 / number,
+                                           t_bulk * 1e6 / number))
+
+
+if __name__ == '__main__':
+    bench(*[int(x) for x in sys.argv[1:2]])
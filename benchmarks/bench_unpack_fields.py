@@ -0,0 +1,64 @@
+"""
+Benchmark for reading fields out of an array of structs.
+
+Compares a Python loop doing 'p[i].field' for every struct with one
+call to ffi.unpack_fields(), which copies each field into its own
+contiguous column, either newly allocated or given with 'out='.  A plain ffi.memmove() of the same total number of
+bytes is shown as a reference for memcpy speed.
+
+    python benchmarks/bench_unpack_fields.py [repeat]
+"""
+import sys
+import timeit
+import cffi
+
+ffi = cffi.FFI()
+ffi.cdef("""
+    struct hdr { unsigned short len; unsigned char flags; };
+    struct rec { struct hdr hdr; double t; int id; float value; };
+""")
+
+N = 1000000
+recs = ffi.new("struct rec[]", N)
+for i in range(0, N, 997):
+    recs[i].hdr.len = i & 0xffff
+    recs[i].t = i * 0.5
+    recs[i].id = i
+FIELDS = ["hdr.len", "t", "id", "value"]
+dest = ffi.new("char[]", N * (2 + 8 + 4 + 4))
+columns = [ffi.new("unsigned short[]", N), ffi.new("double[]", N),
+           ffi.new("int[]", N), ffi.new("float[]", N)]
+
+
+def python_loop(n):
+    lens = []; ts = []; ids = []; values = []
+    for i in range(n):
+        r = recs[i]
+        lens.append(r.hdr.len)
+        ts.append(r.t)
+        ids.append(r.id)
+        values.append(r.value)
+    return lens, ts, ids, values
+
+def unpack_fields(n):
+    return ffi.unpack_fields(recs, n, FIELDS)
+
+def unpack_fields_out(n):
+    return ffi.unpack_fields(recs, n, FIELDS, out=columns)
+
+def memmove(n):
+    ffi.memmove(dest, recs, n * (2 + 8 + 4 + 4))
+
+
+def bench(repeat=5):
+    print("%-16s %12s" % ("", "ns per struct"))
+    for name, func, n in [("python loop", python_loop, N // 10),
+                          ("unpack_fields", unpack_fields, N),
+                          ("  with out=", unpack_fields_out, N),
+                          ("memmove", memmove, N)]:
+        t = min(timeit.repeat(lambda: func(n), repeat=repeat, number=1))
+        print("%-16s %12.2f" % (name, t * 1e9 / n))
+
+
+if __name__ == '__main__':
+    bench(*[int(x) for x in sys.argv[1:2]])
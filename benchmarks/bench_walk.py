@@ -0,0 +1,57 @@
+"""
+Microbenchmark for walking a C linked list.
+
+Compares the Python loop 'while p: ...; p = p.next' with ffi.walk(),
+both to get the list of node pointers and to gather one field of
+every node into a buffer.
+
+    python benchmarks/bench_walk.py [repeat]
+"""
+import sys
+import timeit
+import cffi
+
+ffi = cffi.FFI()
+ffi.cdef("struct node { struct node *next; int value; };")
+
+N = 100000
+nodes = ffi.new("struct node[]", N)
+for i in range(N - 1):
+    nodes[i].next = nodes + i + 1
+    nodes[i].value = i
+head = nodes + 0
+
+
+def python_nodes():
+    result = []
+    p = head
+    while p:
+        result.append(p)
+        p = p.next
+    return result
+
+def python_values():
+    result = []
+    p = head
+    while p:
+        result.append(p.value)
+        p = p.next
+    return result
+
+CASES = [
+    ("nodes, python loop", python_nodes),
+    ("nodes, ffi.walk()", lambda: ffi.walk(head, "next", N)),
+    ("values, python loop", python_values),
+    ("values, ffi.walk()", lambda: ffi.walk(head, "next", N, "value")),
+]
+
+
+def bench(repeat=5, number=10):
+    print("%-22s %12s" % ("", "ns per node"))
+    for name, func in CASES:
+        t = min(timeit.repeat(func, repeat=repeat, number=number))
+        print("%-22s %12.1f" % (name, t * 1e9 / (number * N)))
+
+
+if __name__ == '__main__':
+    bench(*[int(x) for x in sys.argv[1:2]])
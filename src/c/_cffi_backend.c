@@ -199,12 +199,19 @@
 
 #if PY_VERSION_HEX < 0x030900a4
 # define Py_SET_REFCNT(obj, val) (Py_REFCNT(obj) = (val))
+# define Py_SET_TYPE(obj, val) (Py_TYPE(obj) = (val))
 #endif
 
 #if PY_VERSION_HEX >= 0x03080000
 # define USE_WRITEUNRAISABLEMSG
 #endif
 
+#if PY_VERSION_HEX >= 0x03090000
+/* calls to function pointer cdata objects go through the vectorcall
+   protocol, which avoids building a tuple of arguments for every call */
+# define CFFI_USE_VECTORCALL
+#endif
+
 #if PY_VERSION_HEX <= 0x030d00a1
 static int PyDict_GetItemRef(PyObject *mp, PyObject *key, PyObject **result)
 {
@@ -304,6 +311,9 @@ typedef struct _ctypedescr {
     PyObject *ct_unique_key;    /* key in unique_cache (a string, but not
                                    human-readable) */
 
+    struct cffi_varcache_s *ct_varcache;  /* variadic function types: cache
+                                             of cif_descriptions, or NULL */
+
     Py_ssize_t ct_size;     /* size of instances, or -1 if unknown */
     Py_ssize_t ct_length;   /* length of arrays, or -1 if unknown;
                                or alignment of primitive and struct types;
@@ -346,15 +356,38 @@ static PyTypeObject CDataOwning_Type;
 static PyTypeObject CDataOwningGC_Type;
 static PyTypeObject CDataFromBuf_Type;
 static PyTypeObject CDataGCP_Type;
+static PyTypeObject CDataPooled_Type;
+static PyTypeObject CDataOwningMapped_Type;
+static PyTypeObject CDataArena_Type;
+static PyTypeObject CDataArenaClosed_Type;
+static PyTypeObject CDataFuncPtr_Type;
 
 #define CTypeDescr_Check(ob)  (Py_TYPE(ob) == &CTypeDescr_Type)
 #define CData_Check(ob)       (Py_TYPE(ob) == &CData_Type ||            \
                                Py_TYPE(ob) == &CDataOwning_Type ||      \
                                Py_TYPE(ob) == &CDataOwningGC_Type ||    \
                                Py_TYPE(ob) == &CDataFromBuf_Type ||     \
-                               Py_TYPE(ob) == &CDataGCP_Type)
+                               Py_TYPE(ob) == &CDataGCP_Type ||         \
+                               Py_TYPE(ob) == &CDataPooled_Type ||      \
+                               Py_TYPE(ob) == &CDataOwningMapped_Type ||\
+                               Py_TYPE(ob) == &CDataArena_Type ||       \
+                               Py_TYPE(ob) == &CDataFuncPtr_Type)
 #define CDataOwn_Check(ob)    (Py_TYPE(ob) == &CDataOwning_Type ||      \
-                               Py_TYPE(ob) == &CDataOwningGC_Type)
+                               Py_TYPE(ob) == &CDataOwningGC_Type ||    \
+                               Py_TYPE(ob) == &CDataPooled_Type ||      \
+                               Py_TYPE(ob) == &CDataOwningMapped_Type)
+
+#ifdef CFFI_USE_VECTORCALL
+static PyObject *cdata_vectorcall(PyObject *, PyObject *const *, size_t,
+                                  PyObject *);     /* forward */
+# define CDATA_INIT_VECTORCALL(cd)  ((cd)->c_vectorcall = cdata_vectorcall)
+# define CDATA_VECTORCALL_OFFSET    offsetof(CDataObject_funcptr, c_vectorcall)
+# define CDATA_TPFLAGS_VECTORCALL   Py_TPFLAGS_HAVE_VECTORCALL
+#else
+# define CDATA_INIT_VECTORCALL(cd)  ((void)0)
+# define CDATA_VECTORCALL_OFFSET    0
+# define CDATA_TPFLAGS_VECTORCALL   0
+#endif
 
 typedef union {
     unsigned char m_char;
@@ -388,6 +421,28 @@ typedef struct {
     PyObject *structobj;   /* for ffi.new_handle() or ffi.new("struct *") */
 } CDataObject_own_structptr;
 
+typedef struct {
+    CDataObject head;
+    Py_ssize_t length;     /* same as CDataObject_own_length up to here */
+    size_t mapped_size;    /* the data was obtained with mmap() */
+} CDataObject_own_mapped;
+
+typedef struct {
+    /* the non-owning cdata objects of function pointer type, which are
+       the ones that are usually called; only they pay for the vectorcall
+       slot.  Other cdatas (e.g. callbacks) are called via tp_call. */
+    CDataObject head;
+#ifdef CFFI_USE_VECTORCALL
+    vectorcallfunc c_vectorcall;
+#endif
+} CDataObject_funcptr;
+
+#ifdef MS_WIN32
+# define CFFI_HAVE_HUGE_PAGES   0
+#else
+# define CFFI_HAVE_HUGE_PAGES   1
+#endif
+
 typedef struct {
     CDataObject head;
     Py_ssize_t length;     /* same as CDataObject_own_length up to here */
@@ -399,8 +454,13 @@ typedef struct {
     Py_ssize_t length;     /* same as CDataObject_own_length up to here */
     PyObject *origobj;
     PyObject *destructor;
+    int flags;             /* GCP_xxx */
+    Py_ssize_t size;       /* from ffi.gc(..., size), or 0 */
 } CDataObject_gcp;
 
+#define GCP_C_DESTRUCTOR   0x01   /* 'destructor' is called with libffi */
+#define GCP_DEFERRED       0x02   /* ffi.gc(..., defer=True) */
+
 typedef struct {
     CDataObject head;
     ffi_closure *closure;
@@ -418,6 +478,27 @@ typedef struct {
     Py_ssize_t exchange_offset_arg[1];
 } cif_description_t;
 
+/* Variadic functions have no cif_description in ct_extra, because it
+   depends on the types of the arguments passed in the '...' part.  The
+   most recently used ones are kept in a small LRU cache on the function
+   ctype, keyed by the ctypes of these variadic arguments.  An entry is
+   removed from the list while a call is using it, and put back at the
+   front afterwards. */
+#define CFFI_VARCACHE_MAXSIZE  8
+
+typedef struct cffi_varcache_entry_s {
+    struct cffi_varcache_entry_s *next;
+    cif_description_t *cif_descr;
+    Py_ssize_t nvarargs;
+    CTypeDescrObject *varargs[1];   /* 'nvarargs' references */
+} cffi_varcache_entry_t;
+
+struct cffi_varcache_s {
+    cffi_varcache_entry_t *first;   /* most recently used first */
+    Py_ssize_t length;
+    Py_ssize_t hits, misses;
+};
+
 #define ADD_WRAPAROUND(x, y)  ((Py_ssize_t)(((size_t)(x)) + ((size_t)(y))))
 #define MUL_WRAPAROUND(x, y)  ((Py_ssize_t)(((size_t)(x)) * ((size_t)(y))))
 
@@ -445,8 +526,10 @@ typedef struct {
 typedef struct _cffi_allocator_s {
     PyObject *ca_alloc, *ca_free;
     int ca_dont_clear;
+    int ca_huge_pages;
+    Py_ssize_t ca_align;   /* 0 or a power of two */
 } cffi_allocator_t;
-static const cffi_allocator_t default_allocator = { NULL, NULL, 0 };
+static const cffi_allocator_t default_allocator = { NULL, NULL, 0, 0, 0 };
 static PyObject *FFIError;
 
 #ifdef Py_GIL_DISABLED
@@ -469,6 +552,7 @@ ctypedescr_new(int name_size)
     ct->ct_stuff = NULL;
     ct->ct_weakreflist = NULL;
     ct->ct_unique_key = NULL;
+    ct->ct_varcache = NULL;
     ct->ct_lazy_field_list = 0;
     ct->ct_under_construction = 0;
     ct->ct_unrealized_struct_or_union = 0;
@@ -512,6 +596,9 @@ ctypedescr_repr(CTypeDescrObject *ct)
 }
 
 static void remove_dead_unique_reference(PyObject *unique_key);
+static void varcache_free(struct cffi_varcache_s *vc);
+static int varcache_traverse(struct cffi_varcache_s *vc, visitproc visit,
+                             void *arg);
 
 static void
 ctypedescr_dealloc(CTypeDescrObject *ct)
@@ -529,6 +616,8 @@ ctypedescr_dealloc(CTypeDescrObject *ct)
     Py_XDECREF(ct->ct_stuff);
     if (ct->ct_flags & CT_FUNCTIONPTR)
         PyObject_Free(ct->ct_extra);
+    if (ct->ct_varcache != NULL)
+        varcache_free(ct->ct_varcache);
     Py_TYPE(ct)->tp_free((PyObject *)ct);
 }
 
@@ -537,14 +626,20 @@ ctypedescr_traverse(CTypeDescrObject *ct, visitproc visit, void *arg)
 {
     Py_VISIT(ct->ct_itemdescr);
     Py_VISIT(ct->ct_stuff);
+    if (ct->ct_varcache != NULL)
+        return varcache_traverse(ct->ct_varcache, visit, arg);
     return 0;
 }
 
 static int
 ctypedescr_clear(CTypeDescrObject *ct)
 {
+    struct cffi_varcache_s *vc = ct->ct_varcache;
+    ct->ct_varcache = NULL;
     Py_CLEAR(ct->ct_itemdescr);
     Py_CLEAR(ct->ct_stuff);
+    if (vc != NULL)
+        varcache_free(vc);
     return 0;
 }
 
@@ -702,6 +797,25 @@ static PyObject *ctypeget_ellipsis(CTypeDescrObject *ct, void *context)
     return nosuchattr("ellipsis");
 }
 
+static PyObject *ctypeget_varargs_cache_info(CTypeDescrObject *ct,
+                                             void *context)
+{
+    if ((ct->ct_flags & CT_FUNCTIONPTR) && ct->ct_extra == NULL) {
+        /* (hits, misses, maxsize, currsize), like functools.lru_cache */
+        Py_ssize_t hits = 0, misses = 0, length = 0;
+        Py_BEGIN_CRITICAL_SECTION(ct);
+        if (ct->ct_varcache != NULL) {
+            hits = ct->ct_varcache->hits;
+            misses = ct->ct_varcache->misses;
+            length = ct->ct_varcache->length;
+        }
+        Py_END_CRITICAL_SECTION();
+        return Py_BuildValue("nnin", hits, misses, CFFI_VARCACHE_MAXSIZE,
+                             length);
+    }
+    return nosuchattr("varargs_cache_info");
+}
+
 static PyObject *ctypeget_abi(CTypeDescrObject *ct, void *context)
 {
     if (ct->ct_flags & CT_FUNCTIONPTR) {
@@ -741,6 +855,8 @@ static PyGetSetDef ctypedescr_getsets[] = {
     {"args", (getter)ctypeget_args, NULL, "function argument types"},
     {"result", (getter)ctypeget_result, NULL, "function result type"},
     {"ellipsis", (getter)ctypeget_ellipsis, NULL, "function has '...'"},
+    {"varargs_cache_info", (getter)ctypeget_varargs_cache_info, NULL,
+                           "cache of calls to a function with '...'"},
     {"abi", (getter)ctypeget_abi, NULL, "function ABI"},
     {"elements", (getter)ctypeget_elements, NULL, "enum elements"},
     {"relements", (getter)ctypeget_relements, NULL, "enum elements, reverse"},
@@ -1125,12 +1241,118 @@ write_raw_complex_data(char *target, Py_complex source, int size)
     Py_FatalError("write_raw_complex_data: bad complex size");
 }
 
-static PyObject *
-new_simple_cdata(char *data, CTypeDescrObject *ct)
+/* Plain cdata objects, like the ones returned by p[i] on an array of
+   pointers or by a call returning a pointer, are often short-lived.
+   Every thread keeps a freelist of some dead ones, chained through
+   their 'c_data' field, and new_simple_cdata() reuses them.  All the
+   objects of type exactly CData_Type can go into the freelist, as they
+   are at least as big as a CDataObject.  When a thread ends, freeing
+   its freelist would need the GIL; instead, it is moved to the list of
+   orphans, which the next thread with an empty freelist adopts. */
+#define CFFI_CDATA_FREELIST_MAX  128
+
+static Py_ssize_t cdata_freelist_max = CFFI_CDATA_FREELIST_MAX;
+static CDataObject *cdata_orphans = NULL;     /* with TLS_ZOM_LOCK */
+static Py_ssize_t cdata_orphans_count = 0;
+
+static void cdata_freelist_orphan(struct cffi_tls_s *tls)
 {
-    CDataObject *cd = PyObject_New(CDataObject, &CData_Type);
+    /* called by cffi_thread_shutdown(), with TLS_ZOM_LOCK */
+    CDataObject *cd = (CDataObject *)tls->free_cdata;
     if (cd == NULL)
+        return;
+    while (cd->c_data != NULL)
+        cd = (CDataObject *)cd->c_data;
+    cd->c_data = (char *)cdata_orphans;
+    cdata_orphans = (CDataObject *)tls->free_cdata;
+    cdata_orphans_count += tls->free_cdata_count;
+    tls->free_cdata = NULL;
+    tls->free_cdata_count = 0;
+}
+
+static CDataObject *cdata_freelist_take(void)
+{
+    struct cffi_tls_s *tls = get_cffi_tls();
+    CDataObject *cd;
+
+    if (tls == NULL)
         return NULL;
+    cd = (CDataObject *)tls->free_cdata;
+    if (cd == NULL) {
+#ifdef Py_GIL_DISABLED
+        if (cffi_atomic_load((void **)&cdata_orphans) != NULL) {
+#else
+        if (cdata_orphans != NULL) {
+#endif
+            TLS_ZOM_LOCK();
+            tls->free_cdata = cdata_orphans;
+            tls->free_cdata_count = cdata_orphans_count;
+            cdata_orphans = NULL;
+            cdata_orphans_count = 0;
+            TLS_ZOM_UNLOCK();
+            /* free the ones above the maximum, which we can do here */
+            while (tls->free_cdata_count > cdata_freelist_max) {
+                cd = (CDataObject *)tls->free_cdata;
+                tls->free_cdata = cd->c_data;
+                tls->free_cdata_count--;
+                tls->cdata_released++;
+                CData_Type.tp_free((PyObject *)cd);
+            }
+            cd = (CDataObject *)tls->free_cdata;
+        }
+        if (cd == NULL) {
+            tls->cdata_allocated++;
+            return NULL;
+        }
+    }
+    tls->free_cdata = cd->c_data;
+    tls->free_cdata_count--;
+    tls->cdata_reused++;
+    return cd;
+}
+
+static int cdata_freelist_give(CDataObject *cd)
+{
+    /* returns 1 if 'cd' was put in the freelist, 0 if it must be freed */
+    struct cffi_tls_s *tls;
+
+    if (Py_TYPE(cd) != &CData_Type)
+        return 0;
+    tls = get_cffi_tls();
+    if (tls == NULL)
+        return 0;
+    if (tls->free_cdata_count >= cdata_freelist_max) {
+        tls->cdata_released++;
+        return 0;
+    }
+    cd->c_data = (char *)tls->free_cdata;
+    tls->free_cdata = cd;
+    tls->free_cdata_count++;
+    return 1;
+}
+
+static PyObject *
+new_simple_cdata(char *data, CTypeDescrObject *ct)
+{
+    CDataObject *cd;
+
+    if (ct->ct_flags & CT_FUNCTIONPTR) {
+        /* with a vectorcall slot, and not from the freelist, which only
+           contains objects of the size of a CDataObject */
+        CDataObject_funcptr *fcd = PyObject_New(CDataObject_funcptr,
+                                                &CDataFuncPtr_Type);
+        if (fcd == NULL)
+            return NULL;
+        CDATA_INIT_VECTORCALL(fcd);
+        cd = &fcd->head;
+    }
+    else if ((cd = cdata_freelist_take()) != NULL)
+        PyObject_Init((PyObject *)cd, &CData_Type);
+    else {
+        cd = PyObject_New(CDataObject, &CData_Type);
+        if (cd == NULL)
+            return NULL;
+    }
     Py_INCREF(ct);
     cd->c_data = data;
     cd->c_type = ct;
@@ -1413,6 +1635,38 @@ convert_from_object(char *data, CTypeDescrObject *ct, PyObject *init);
 static int    /* forward */
 convert_from_object_bitfield(char *data, CFieldObject *cf, PyObject *init);
 
+static int _format_matches_ctype(const char *format,
+                                 CTypeDescrObject *ct);  /* forward */
+
+static int
+_get_array_buffer(PyObject *init, CTypeDescrObject *ctitem, Py_buffer *view)
+{
+    /* If 'init' is an object supporting the buffer interface whose items
+       are exactly of the primitive type 'ctitem', like an array.array or
+       a contiguous numpy array, fill 'view' and return 1.  Otherwise,
+       return 0 without setting an exception.  Arrays
+       of characters are only initialized from strings, which add the
+       null terminator (see test_newp_from_bytearray_doesnt_work); but
+       arrays of 'uint8_t' or 'unsigned char' accept a bytearray.  A 0-d
+       buffer, like a NumPy scalar, is not an array: it is used as an
+       integer by get_new_array_length() instead. */
+    if (!(ctitem->ct_flags & CT_PRIMITIVE_ANY) ||
+            (ctitem->ct_flags & CT_PRIMITIVE_CHAR) ||
+            CData_Check(init) || !PyObject_CheckBuffer(init))
+        return 0;
+    if (PyObject_GetBuffer(init, view, PyBUF_ND | PyBUF_FORMAT) < 0) {
+        /* not contiguous, for example */
+        PyErr_Clear();
+        return 0;
+    }
+    if (view->ndim >= 1 && view->itemsize == ctitem->ct_size &&
+            _format_matches_ctype(view->format, ctitem) &&
+            PyBuffer_IsContiguous(view, 'C'))
+        return 1;
+    PyBuffer_Release(view);
+    return 0;
+}
+
 static Py_ssize_t
 get_new_array_length(CTypeDescrObject *ctitem, PyObject **pvalue)
 {
@@ -1436,6 +1690,13 @@ get_new_array_length(CTypeDescrObject *ctitem, PyObject **pvalue)
     }
     else {
         Py_ssize_t explicitlength;
+        Py_buffer view;
+        if (_get_array_buffer(value, ctitem, &view)) {
+            /* from a buffer of the same item type, like an array.array */
+            explicitlength = view.len / ctitem->ct_size;
+            PyBuffer_Release(&view);
+            return explicitlength;
+        }
         explicitlength = PyNumber_AsSsize_t(value, PyExc_OverflowError);
         if (explicitlength < 0) {
             if (PyErr_Occurred()) {
@@ -1549,6 +1810,102 @@ get_array_length(CDataObject *cd)
         return cd->c_type->ct_length;
 }
 
+static int
+convert_primitive_items(char *data, CTypeDescrObject *ctitem,
+                        PyObject **items, Py_ssize_t n)
+{
+    /* Same as calling convert_from_object() on each of the 'n' items,
+       but with a tight loop for the common cases of exact ints and
+       floats.  The other items, and ints out of range, still go through
+       convert_from_object(), which converts them or raises. */
+    Py_ssize_t i;
+    PY_LONG_LONG vmin, vmax;
+
+    if (ctitem->ct_flags & CT_PRIMITIVE_FLOAT) {
+        if (ctitem->ct_flags & CT_IS_LONGDOUBLE)
+            goto generic;
+
+#define _CONVERT_FLOAT_LOOP(TYPE)                                       \
+        for (i = 0; i < n; i++) {                                       \
+            PyObject *x = items[i];                                     \
+            if (PyFloat_CheckExact(x))                                  \
+                ((TYPE *)data)[i] = (TYPE)PyFloat_AS_DOUBLE(x);         \
+            else if (convert_from_object(data + i * sizeof(TYPE),       \
+                                         ctitem, x) < 0)                \
+                return -1;                                              \
+        }                                                               \
+        return 0
+
+        if (ctitem->ct_size == sizeof(double)) {
+            _CONVERT_FLOAT_LOOP(double);
+        }
+        if (ctitem->ct_size == sizeof(float)) {
+            _CONVERT_FLOAT_LOOP(float);
+        }
+#undef _CONVERT_FLOAT_LOOP
+        goto generic;
+    }
+
+    if (ctitem->ct_size > (Py_ssize_t)sizeof(PY_LONG_LONG))
+        goto generic;
+    if (ctitem->ct_flags & CT_PRIMITIVE_SIGNED) {
+        if (ctitem->ct_size == sizeof(PY_LONG_LONG)) {
+            vmax = PY_LLONG_MAX;
+            vmin = PY_LLONG_MIN;
+        }
+        else {
+            vmax = (1LL << (ctitem->ct_size * 8 - 1)) - 1;
+            vmin = -vmax - 1;
+        }
+    }
+    else if (ctitem->ct_flags & CT_PRIMITIVE_UNSIGNED) {
+        /* values above PY_LLONG_MAX take the generic path */
+        if (ctitem->ct_flags & CT_IS_BOOL)
+            vmax = 1;
+        else if (ctitem->ct_size == sizeof(PY_LONG_LONG))
+            vmax = PY_LLONG_MAX;
+        else
+            vmax = (1LL << (ctitem->ct_size * 8)) - 1;
+        vmin = 0;
+    }
+    else
+        goto generic;
+
+    /* the items are in range, so storing them as unsigned integers of
+       the right size gives the same bytes as the signed type would */
+#define _CONVERT_INT_LOOP(TYPE)                                         \
+    for (i = 0; i < n; i++) {                                           \
+        PyObject *x = items[i];                                         \
+        if (PyLong_CheckExact(x)) {                                     \
+            int overflow;                                               \
+            PY_LONG_LONG v = PyLong_AsLongLongAndOverflow(x, &overflow);\
+            if (!overflow && vmin <= v && v <= vmax) {                  \
+                ((TYPE *)data)[i] = (TYPE)v;                            \
+                continue;                                               \
+            }                                                           \
+        }                                                               \
+        if (convert_from_object(data + i * sizeof(TYPE), ctitem, x) < 0)\
+            return -1;                                                  \
+    }                                                                   \
+    return 0
+
+    switch (ctitem->ct_size) {
+    case 1: _CONVERT_INT_LOOP(uint8_t);
+    case 2: _CONVERT_INT_LOOP(uint16_t);
+    case 4: _CONVERT_INT_LOOP(uint32_t);
+    case 8: _CONVERT_INT_LOOP(uint64_t);
+    }
+#undef _CONVERT_INT_LOOP
+
+ generic:
+    for (i = 0; i < n; i++) {
+        if (convert_from_object(data, ctitem, items[i]) < 0)
+            return -1;
+        data += ctitem->ct_size;
+    }
+    return 0;
+}
+
 static int
 convert_array_from_object(char *data, CTypeDescrObject *ct, PyObject *init)
 {
@@ -1569,6 +1926,8 @@ convert_array_from_object(char *data, CTypeDescrObject *ct, PyObject *init)
             return -1;
         }
         items = PySequence_Fast_ITEMS(init);
+        if (ctitem->ct_flags & CT_PRIMITIVE_ANY)
+            return convert_primitive_items(data, ctitem, items, n);
         for (i=0; i<n; i++) {
             if (convert_from_object(data, ctitem, items[i]) < 0)
                 return -1;
@@ -1634,6 +1993,29 @@ convert_array_from_object(char *data, CTypeDescrObject *ct, PyObject *init)
     }
 
  cannot_convert:
+    if (ct->ct_flags & CT_ARRAY) {
+        Py_buffer view;
+        if (_get_array_buffer(init, ctitem, &view)) {
+            /* from a buffer of the same item type: copy it */
+            int res;
+            Py_ssize_t n = view.len / ctitem->ct_size;
+            if (ct->ct_length >= 0 && n > ct->ct_length) {
+                PyErr_Format(PyExc_IndexError,
+                             "too many initializers for '%s' (got %zd)",
+                             ct->ct_name, n);
+                res = -1;
+            }
+            else if ((ctitem->ct_flags & CT_IS_BOOL) &&
+                     must_be_array_of_zero_or_one(view.buf, n) < 0)
+                res = -1;
+            else {
+                memcpy(data, view.buf, view.len);
+                res = 0;
+            }
+            PyBuffer_Release(&view);
+            return res;
+        }
+    }
     if ((ct->ct_flags & CT_ARRAY) && CData_Check(init))
     {
         CDataObject *cd = (CDataObject *)init;
@@ -1993,8 +2375,142 @@ static void cdata_dealloc(CDataObject *cd)
 
     Py_DECREF(cd->c_type);
 #ifndef CFFI_MEM_LEAK     /* never release anything, tests only */
-    Py_TYPE(cd)->tp_free((PyObject *)cd);
+    if (!cdata_freelist_give(cd))
+        Py_TYPE(cd)->tp_free((PyObject *)cd);
+#endif
+}
+
+/* forward */
+static void _my_PyErr_WriteUnraisable(PyObject *t, PyObject *v, PyObject *tb,
+                                      char *objdescr, PyObject *obj,
+                                      char *extra_error_line);
+
+/* Process-wide accounting of the memory owned by cdata objects: the
+   data of the ffi.new() objects that use the default allocator, and
+   the 'size' given to ffi.gc().  Python's GC only sees the small cdata
+   objects, so when this memory grows by more than 'threshold' bytes
+   since the last time, we call gc.collect() or the callback given to
+   ffi.set_memory_pressure().  The memory is also reported to
+   tracemalloc, in the domain CFFI_TRACEMALLOC_DOMAIN.
+
+   All this is only done while a threshold is set, so that ffi.new()
+   and the deallocation of cdata objects don't pay for it otherwise.
+   The count starts at 0 when it is enabled; memory allocated before
+   and freed afterwards is subtracted too, but the count does not go
+   below 0.  Once it was enabled, the memory is always untracked from
+   tracemalloc when freed, to avoid leaving stale traces behind. */
+#define CFFI_TRACEMALLOC_DOMAIN   0xCFF1
+
+static Py_ssize_t cdata_memory = 0;            /* bytes currently owned */
+static Py_ssize_t cdata_memory_mark = 0;       /* low point since trigger */
+static Py_ssize_t cdata_memory_threshold = 0;  /* 0: disabled */
+static Py_ssize_t cdata_memory_triggers = 0;
+static Py_ssize_t cdata_memory_untrack = 0;    /* was ever enabled */
+static PyObject *cdata_memory_callback = NULL; /* NULL: gc.collect() */
+static int cdata_memory_triggering = 0;
+
+#ifdef Py_GIL_DISABLED
+static PyMutex cdata_memory_lock;
+# define LOCK_CDATA_MEMORY()     PyMutex_Lock(&cdata_memory_lock)
+# define UNLOCK_CDATA_MEMORY()   PyMutex_Unlock(&cdata_memory_lock)
+# define cdata_memory_add(n)     cffi_atomic_add_ssize(&cdata_memory, (n))
+# define cdata_memory_get(x)     cffi_atomic_load_ssize(&(x))
+# define cdata_memory_set(x, v)  cffi_atomic_store_ssize(&(x), (v))
+#else
+# define LOCK_CDATA_MEMORY()     /* nothing */
+# define UNLOCK_CDATA_MEMORY()   /* nothing */
+# define cdata_memory_add(n)     (cdata_memory += (n))
+# define cdata_memory_get(x)     (x)
+# define cdata_memory_set(x, v)  ((x) = (v))
 #endif
+
+static void cdata_memory_pressure(void)
+{
+    PyObject *callback;
+    PyObject *error_type, *error_value, *error_traceback;
+
+    LOCK_CDATA_MEMORY();
+    if (cdata_memory_triggering) {
+        /* the callback itself allocates memory */
+        UNLOCK_CDATA_MEMORY();
+        return;
+    }
+    cdata_memory_triggering = 1;
+    cdata_memory_triggers++;
+    callback = cdata_memory_callback;
+    Py_XINCREF(callback);
+    UNLOCK_CDATA_MEMORY();
+
+    PyErr_Fetch(&error_type, &error_value, &error_traceback);
+    if (callback == NULL) {
+        PyGC_Collect();
+    }
+    else {
+        PyObject *result = PyObject_CallFunction(callback, "n",
+                                         cdata_memory_get(cdata_memory));
+        if (result != NULL) {
+            Py_DECREF(result);
+        }
+        else {
+            PyObject *t, *v, *tb;
+            PyErr_Fetch(&t, &v, &tb);
+            _my_PyErr_WriteUnraisable(t, v, tb,
+                                      "From callback for memory pressure ",
+                                      callback, NULL);
+        }
+        Py_DECREF(callback);
+    }
+    PyErr_Restore(error_type, error_value, error_traceback);
+
+    LOCK_CDATA_MEMORY();
+    cdata_memory_set(cdata_memory_mark, cdata_memory_get(cdata_memory));
+    cdata_memory_triggering = 0;
+    UNLOCK_CDATA_MEMORY();
+}
+
+static void cdata_memory_acquire(void *key, Py_ssize_t size)
+{
+    /* 'key' is the object that owns the memory, and which will call
+       cdata_memory_release() with the same 'size' */
+    Py_ssize_t total, threshold;
+
+    threshold = cdata_memory_get(cdata_memory_threshold);
+    if (threshold == 0 || size <= 0)
+        return;
+    PyTraceMalloc_Track(CFFI_TRACEMALLOC_DOMAIN, (uintptr_t)key, size);
+    total = cdata_memory_add(size);
+    if (total - cdata_memory_get(cdata_memory_mark) > threshold)
+        cdata_memory_pressure();
+}
+
+static void cdata_memory_release(void *key, Py_ssize_t size)
+{
+    Py_ssize_t total;
+
+    if (!cdata_memory_get(cdata_memory_untrack) || size <= 0)
+        return;
+    PyTraceMalloc_Untrack(CFFI_TRACEMALLOC_DOMAIN, (uintptr_t)key);
+    if (cdata_memory_get(cdata_memory_threshold) == 0)
+        return;
+    total = cdata_memory_add(-size);
+    if (total < 0) {
+        /* this memory was allocated before the count started */
+        cdata_memory_add(-total);
+        total = 0;
+    }
+    if (total < cdata_memory_get(cdata_memory_mark))
+        cdata_memory_set(cdata_memory_mark, total);
+}
+
+static Py_ssize_t cdataowning_size_bytes(CDataObject *cd);   /*forward*/
+
+static void cdataowning_track(CDataObject *cd)
+{
+    /* for the object owning the data of ffi.new(), after its length
+       is stored; but not for the "struct *" returned to the user */
+    if (Py_TYPE(cd) == &CDataOwning_Type ||
+            Py_TYPE(cd) == &CDataOwningMapped_Type)
+        cdata_memory_acquire(cd, cdataowning_size_bytes(cd));
 }
 
 static void cdataowning_dealloc(CDataObject *cd)
@@ -2005,6 +2521,9 @@ static void cdataowning_dealloc(CDataObject *cd)
         /* for ffi.new("struct *") */
         Py_DECREF(((CDataObject_own_structptr *)cd)->structobj);
     }
+    else {
+        cdata_memory_release(cd, cdataowning_size_bytes(cd));
+    }
 #if defined(CFFI_MEM_DEBUG) || defined(CFFI_MEM_LEAK)
     if (cd->c_type->ct_flags & (CT_PRIMITIVE_ANY | CT_STRUCT | CT_UNION)) {
         assert(cd->c_type->ct_size >= 0);
@@ -2021,6 +2540,29 @@ static void cdataowning_dealloc(CDataObject *cd)
     cdata_dealloc(cd);
 }
 
+static void cdataownmapped_release(CDataObject *cd)
+{
+    /* for ffi.new_allocator(huge_pages=True): unmap the memory, either
+       from ffi.release() or when the object dies.  Afterwards, c_data
+       is NULL, and an array has a length of 0; indexing and
+       _fetch_as_buffer() check for that. */
+    if (cd->c_data == NULL)
+        return;
+    cdata_memory_release(cd, cdataowning_size_bytes(cd));
+#if CFFI_HAVE_HUGE_PAGES && !defined(CFFI_MEM_LEAK)
+    /* (CFFI_MEM_LEAK: never release anything, tests only) */
+    munmap(cd->c_data, ((CDataObject_own_mapped *)cd)->mapped_size);
+#endif
+    cd->c_data = NULL;
+    ((CDataObject_own_mapped *)cd)->length = 0;
+}
+
+static void cdataownmapped_dealloc(CDataObject *cd)
+{
+    cdataownmapped_release(cd);
+    cdata_dealloc(cd);
+}
+
 static void cdataowninggc_dealloc(CDataObject *cd)
 {
     PyObject_GC_UnTrack(cd);
@@ -2102,17 +2644,44 @@ static int cdatafrombuf_clear(CDataObject *cd)
     return 0;
 }
 
-/* forward */
-static void _my_PyErr_WriteUnraisable(PyObject *t, PyObject *v, PyObject *tb,
-                                      char *objdescr, PyObject *obj,
-                                      char *extra_error_line);
 
+static void gcp_call_c_destructor(CDataObject *destructor,
+                                  CDataObject *origobj)
+{
+    /* 'destructor' is a C function pointer checked by
+       gcp_is_c_destructor(): call it directly, without converting
+       'origobj' into an argument tuple and back */
+    cif_description_t *cif_descr =
+        (cif_description_t *)destructor->c_type->ct_extra;
+    union {
+        ffi_arg r;
+        union_alignment alignment;
+    } result;
+    void *arg = origobj->c_data;
+    void *args[1] = { &arg };
+
+    /* like _cdata_call(): release the GIL and keep the C-level errno
+       separate from the Python-level one, because the destructor may
+       block or touch errno */
+    Py_BEGIN_ALLOW_THREADS
+    restore_errno();
+    ffi_call(&cif_descr->cif,
+             CFFI_CLOSURE_TO_FNPTR(void (*)(void), destructor->c_data),
+             &result, args);
+    save_errno();
+    Py_END_ALLOW_THREADS
+}
 
-static void gcp_finalize(PyObject *destructor, PyObject *origobj)
+static void gcp_finalize(PyObject *destructor, PyObject *origobj, int flags)
 {
     /* NOTE: this decrements the reference count of the two arguments */
 
-    if (destructor != NULL) {
+    if (destructor != NULL && (flags & GCP_C_DESTRUCTOR)) {
+        gcp_call_c_destructor((CDataObject *)destructor,
+                              (CDataObject *)origobj);
+        Py_DECREF(destructor);
+    }
+    else if (destructor != NULL) {
         PyObject *result;
         PyObject *error_type, *error_value, *error_traceback;
 
@@ -2142,23 +2711,183 @@ static void gcp_finalize(PyObject *destructor, PyObject *origobj)
     Py_XDECREF(origobj);
 }
 
+/* The destructors of ffi.gc(..., defer=True) objects are not called
+   when the objects die, but put in a queue.  The queue is emptied by
+   ffi.gc_flush(), or when it reaches CFFI_GC_DEFERRED_BATCH items, at
+   the next point where the main thread runs Python's pending calls.
+   It is protected by the GIL, or by a lock on free-threaded Python.
+   It is also emptied by an atexit function, and once the interpreter
+   is finalizing, the destructors are called immediately again. */
+#define CFFI_GC_DEFERRED_BATCH   256
+
+struct cffi_gc_deferred_s {
+    PyObject *destructor;
+    PyObject *origobj;
+    int flags;
+};
+
+static struct cffi_gc_deferred_s *gc_deferred = NULL;
+static Py_ssize_t gc_deferred_count = 0, gc_deferred_allocated = 0;
+static int gc_deferred_scheduled = 0;
+
+#ifdef Py_GIL_DISABLED
+static PyMutex gc_deferred_lock;
+# define LOCK_GC_DEFERRED()     PyMutex_Lock(&gc_deferred_lock)
+# define UNLOCK_GC_DEFERRED()   PyMutex_Unlock(&gc_deferred_lock)
+#else
+# define LOCK_GC_DEFERRED()     /* nothing */
+# define UNLOCK_GC_DEFERRED()   /* nothing */
+#endif
+
+static Py_ssize_t gc_deferred_flush(void)
+{
+    /* run all the deferred destructors, including the ones that are
+       added while doing so; returns how many were run */
+    Py_ssize_t i, total = 0;
+
+    while (1) {
+        struct cffi_gc_deferred_s *items;
+        Py_ssize_t count;
+
+        LOCK_GC_DEFERRED();
+        items = gc_deferred;
+        count = gc_deferred_count;
+        gc_deferred = NULL;
+        gc_deferred_count = 0;
+        gc_deferred_allocated = 0;
+        UNLOCK_GC_DEFERRED();
+
+        if (count == 0) {
+            PyMem_Free(items);
+            break;
+        }
+        for (i = 0; i < count; i++)
+            gcp_finalize(items[i].destructor, items[i].origobj,
+                         items[i].flags);
+        PyMem_Free(items);
+        total += count;
+    }
+    return total;
+}
+
+static int gc_deferred_pending_call(void *arg)
+{
+    LOCK_GC_DEFERRED();
+    gc_deferred_scheduled = 0;
+    UNLOCK_GC_DEFERRED();
+    gc_deferred_flush();
+    return 0;
+}
+
+static int init_gc_deferred(PyObject *m)
+{
+    PyObject *atexit, *flush, *res;
+
+    atexit = PyImport_ImportModule("atexit");
+    if (atexit == NULL)
+        return -1;
+    flush = PyObject_GetAttrString(m, "gc_flush");
+    if (flush == NULL) {
+        Py_DECREF(atexit);
+        return -1;
+    }
+    res = PyObject_CallMethod(atexit, "register", "O", flush);
+    Py_DECREF(flush);
+    Py_DECREF(atexit);
+    if (res == NULL)
+        return -1;
+    Py_DECREF(res);
+    return 0;
+}
+
+#if PY_VERSION_HEX >= 0x030D0000
+# define cffi_is_finalizing()   Py_IsFinalizing()
+#else
+# define cffi_is_finalizing()   _Py_IsFinalizing()
+#endif
+
+static void gcp_finalize_or_defer(PyObject *destructor, PyObject *origobj,
+                                  int flags)
+{
+    int schedule = 0;
+
+    if (destructor == NULL || !(flags & GCP_DEFERRED) ||
+            cffi_is_finalizing()) {
+        gcp_finalize(destructor, origobj, flags);
+        return;
+    }
+    LOCK_GC_DEFERRED();
+    if (gc_deferred_count == gc_deferred_allocated) {
+        struct cffi_gc_deferred_s *items;
+        Py_ssize_t allocated = gc_deferred_allocated * 2 + 16;
+        items = PyMem_Realloc(gc_deferred,
+                              allocated * sizeof(struct cffi_gc_deferred_s));
+        if (items == NULL) {
+            /* out of memory: call the destructor now */
+            UNLOCK_GC_DEFERRED();
+            gcp_finalize(destructor, origobj, flags);
+            return;
+        }
+        gc_deferred = items;
+        gc_deferred_allocated = allocated;
+    }
+    gc_deferred[gc_deferred_count].destructor = destructor;
+    gc_deferred[gc_deferred_count].origobj = origobj;
+    gc_deferred[gc_deferred_count].flags = flags;
+    gc_deferred_count++;
+    if (gc_deferred_count >= CFFI_GC_DEFERRED_BATCH &&
+            !gc_deferred_scheduled) {
+        gc_deferred_scheduled = 1;
+        schedule = 1;
+    }
+    UNLOCK_GC_DEFERRED();
+
+    if (schedule && Py_AddPendingCall(gc_deferred_pending_call, NULL) < 0) {
+        /* the queue of pending calls is full; try again next time */
+        LOCK_GC_DEFERRED();
+        gc_deferred_scheduled = 0;
+        UNLOCK_GC_DEFERRED();
+    }
+}
+
+static void cdatagcp_release_size(CDataObject_gcp *cd)
+{
+    cdata_memory_release(cd, cd->size);
+    cd->size = 0;
+}
+
 static void cdatagcp_finalize(CDataObject_gcp *cd)
 {
+    /* ffi.release(), or the 'with' statement: always done now */
+    PyObject *destructor = cd->destructor;
+    PyObject *origobj = cd->origobj;
+    cd->destructor = NULL;
+    cd->origobj = NULL;
+    cdatagcp_release_size(cd);
+    gcp_finalize(destructor, origobj, cd->flags);
+}
+
+static void cdatagcp_tp_finalize(CDataObject_gcp *cd)
+{
+    /* called by the GC, if the object is part of a cycle */
     PyObject *destructor = cd->destructor;
     PyObject *origobj = cd->origobj;
     cd->destructor = NULL;
     cd->origobj = NULL;
-    gcp_finalize(destructor, origobj);
+    cdatagcp_release_size(cd);
+    gcp_finalize_or_defer(destructor, origobj, cd->flags);
 }
 
 static void cdatagcp_dealloc(CDataObject_gcp *cd)
 {
     PyObject *destructor = cd->destructor;
     PyObject *origobj = cd->origobj;
+    int flags = cd->flags;
     PyObject_GC_UnTrack(cd);
+    cdatagcp_release_size(cd);
     cdata_dealloc((CDataObject *)cd);
 
-    gcp_finalize(destructor, origobj);
+    gcp_finalize_or_defer(destructor, origobj, flags);
 }
 
 static int cdatagcp_traverse(CDataObject_gcp *cd, visitproc visit, void *arg)
@@ -2269,6 +2998,14 @@ static Py_ssize_t _cdata_var_byte_size(CDataObject *cd)
     /* If 'cd' is a 'struct foo' or 'struct foo *' allocated with
        ffi.new(), and if the struct foo contains a varsize array,
        then return the real allocated size.  Otherwise, return -1. */
+    if (Py_TYPE(cd) == &CDataArena_Type) {
+        /* a 'struct foo *' from arena.new() is a single object, which
+           stores the allocated size in place of the array length */
+        if ((cd->c_type->ct_flags & CT_POINTER) &&
+                cffi_check_flag(cd->c_type->ct_itemdescr->ct_with_var_array))
+            return ((CDataObject_own_length *)cd)->length;
+        return -1;
+    }
     if (!CDataOwn_Check(cd))
         return -1;
 
@@ -2584,16 +3321,22 @@ _cdata_get_indexed_ptr(CDataObject *cd, PyObject *key)
                 return NULL;
             }
         }
-        else {
-            if (cd->c_data == NULL) {
-                PyErr_Format(PyExc_RuntimeError,
-                             "cannot dereference null pointer from cdata '%s'",
-                             cd->c_type->ct_name);
-                return NULL;
-            }
-        }
+        if (cd->c_data == NULL) {
+            /* (owning cdatas are only NULL after ffi.release(), for
+               ffi.new_allocator(huge_pages=True)) */
+            PyErr_Format(PyExc_RuntimeError,
+                         "cannot dereference null pointer from cdata '%s'",
+                         cd->c_type->ct_name);
+            return NULL;
+        }
     }
     else if (cd->c_type->ct_flags & CT_ARRAY) {
+        if (cd->c_data == NULL) {
+            PyErr_Format(PyExc_RuntimeError,
+                         "cannot index cdata '%s': it was released",
+                         cd->c_type->ct_name);
+            return NULL;
+        }
         if (i < 0) {
             PyErr_SetString(PyExc_IndexError,
                             "negative index");
@@ -3071,6 +3814,185 @@ fb_prepare_cif(PyObject *fargs, CTypeDescrObject *, Py_ssize_t, ffi_abi);
 static CTypeDescrObject *_get_ct_int(void);
 /* forward, implemented in realize_c_type.c */
 
+/* The temporary memory needed by cdata_call() comes from the stack if
+   it is small enough.  Otherwise, it is a scratch block, and every
+   thread caches one of them for the next calls.  The cached block is
+   removed from the cache while it is in use, so that a callback which
+   calls again into C from the same thread gets a fresh one. */
+#define CFFI_EXCHANGE_ON_STACK   1024
+#define CFFI_ARRAY_ARG_ON_STACK  512
+#define CFFI_SCRATCH_KEEP_MAX    (256 * 1024)
+
+struct cffi_scratch_s {
+    struct cffi_scratch_s *next;     /* to chain the blocks of a call */
+    size_t size;
+    union_alignment alignment;
+};
+
+static struct cffi_scratch_s *cffi_scratch_take(Py_ssize_t size)
+{
+    struct cffi_tls_s *tls = get_cffi_tls();
+    struct cffi_scratch_s *s;
+
+    if (tls != NULL) {
+        s = tls->scratch;
+        if (s != NULL && s->size >= (size_t)size) {
+            tls->scratch = NULL;
+            s->next = NULL;
+            return s;
+        }
+    }
+    s = malloc(offsetof(struct cffi_scratch_s, alignment) + (size_t)size);
+    if (s == NULL) {
+        PyErr_NoMemory();
+        return NULL;
+    }
+    s->next = NULL;
+    s->size = (size_t)size;
+    return s;
+}
+
+static void cffi_scratch_give(struct cffi_scratch_s *s)
+{
+    /* keep the largest block not above CFFI_SCRATCH_KEEP_MAX */
+    if (s->size <= CFFI_SCRATCH_KEEP_MAX) {
+        struct cffi_tls_s *tls = get_cffi_tls();
+        if (tls != NULL) {
+            struct cffi_scratch_s *old = tls->scratch;
+            if (old == NULL || old->size < s->size) {
+                tls->scratch = s;
+                s = old;
+            }
+        }
+    }
+    free(s);
+}
+
+static void varcache_free_entry(cffi_varcache_entry_t *entry)
+{
+    Py_ssize_t i;
+    for (i = 0; i < entry->nvarargs; i++)
+        Py_DECREF(entry->varargs[i]);
+    PyObject_Free(entry->cif_descr);
+    PyObject_Free(entry);
+}
+
+static void varcache_free(struct cffi_varcache_s *vc)
+{
+    while (vc->first != NULL) {
+        cffi_varcache_entry_t *entry = vc->first;
+        vc->first = entry->next;
+        varcache_free_entry(entry);
+    }
+    PyMem_Free(vc);
+}
+
+static int varcache_traverse(struct cffi_varcache_s *vc, visitproc visit,
+                             void *arg)
+{
+    cffi_varcache_entry_t *entry;
+    Py_ssize_t i;
+    for (entry = vc->first; entry != NULL; entry = entry->next)
+        for (i = 0; i < entry->nvarargs; i++)
+            Py_VISIT(entry->varargs[i]);
+    return 0;
+}
+
+static cffi_varcache_entry_t *varcache_take(CTypeDescrObject *fct,
+                                            CTypeDescrObject **varargs,
+                                            Py_ssize_t nvarargs)
+{
+    /* returns the matching entry, removed from the cache, or NULL */
+    struct cffi_varcache_s *vc;
+    cffi_varcache_entry_t *entry = NULL, **pentry;
+
+    Py_BEGIN_CRITICAL_SECTION(fct);
+    vc = fct->ct_varcache;
+    if (vc != NULL) {
+        for (pentry = &vc->first; *pentry != NULL;
+                                  pentry = &(*pentry)->next) {
+            if ((*pentry)->nvarargs == nvarargs &&
+                    memcmp((*pentry)->varargs, varargs,
+                           nvarargs * sizeof(CTypeDescrObject *)) == 0) {
+                entry = *pentry;
+                *pentry = entry->next;
+                vc->length--;
+                break;
+            }
+        }
+        if (entry != NULL)
+            vc->hits++;
+        else
+            vc->misses++;
+    }
+    Py_END_CRITICAL_SECTION();
+    return entry;
+}
+
+static cffi_varcache_entry_t *varcache_new_entry(cif_description_t *cif_descr,
+                                                 CTypeDescrObject **varargs,
+                                                 Py_ssize_t nvarargs)
+{
+    /* steals 'cif_descr', even in case of error */
+    Py_ssize_t i;
+    cffi_varcache_entry_t *entry = PyObject_Malloc(
+        offsetof(cffi_varcache_entry_t, varargs) +
+        nvarargs * sizeof(CTypeDescrObject *));
+    if (entry == NULL) {
+        PyObject_Free(cif_descr);
+        PyErr_NoMemory();
+        return NULL;
+    }
+    entry->next = NULL;
+    entry->cif_descr = cif_descr;
+    entry->nvarargs = nvarargs;
+    for (i = 0; i < nvarargs; i++) {
+        Py_INCREF(varargs[i]);
+        entry->varargs[i] = varargs[i];
+    }
+    return entry;
+}
+
+static void varcache_give(CTypeDescrObject *fct, cffi_varcache_entry_t *entry)
+{
+    /* put 'entry' back at the front of the cache, and drop the least
+       recently used entry if the cache is full */
+    struct cffi_varcache_s *vc;
+    cffi_varcache_entry_t *dropped = NULL, **pentry;
+
+    Py_BEGIN_CRITICAL_SECTION(fct);
+    vc = fct->ct_varcache;
+    if (vc == NULL) {
+        vc = PyMem_Malloc(sizeof(struct cffi_varcache_s));
+        if (vc != NULL) {
+            vc->first = NULL;
+            vc->length = 0;
+            vc->hits = 0;
+            vc->misses = 1;    /* the miss that created this entry */
+            fct->ct_varcache = vc;
+        }
+    }
+    if (vc != NULL) {
+        entry->next = vc->first;
+        vc->first = entry;
+        entry = NULL;
+        if (++vc->length > CFFI_VARCACHE_MAXSIZE) {
+            pentry = &vc->first;
+            while ((*pentry)->next != NULL)
+                pentry = &(*pentry)->next;
+            dropped = *pentry;
+            *pentry = NULL;
+            vc->length--;
+        }
+    }
+    Py_END_CRITICAL_SECTION();
+
+    if (entry != NULL)        /* out of memory: just drop it */
+        varcache_free_entry(entry);
+    if (dropped != NULL)
+        varcache_free_entry(dropped);
+}
+
 static Py_ssize_t
 _prepare_pointer_call_argument(CTypeDescrObject *ctptr, PyObject *init,
                                char **output_data)
@@ -3156,20 +4078,20 @@ _prepare_pointer_call_argument(CTypeDescrObject *ctptr, PyObject *init,
 }
 
 static PyObject*
-cdata_call(CDataObject *cd, PyObject *args, PyObject *kwds)
+_cdata_call(CDataObject *cd, PyObject *const *args, Py_ssize_t nargs)
 {
+    /* common implementation of cdata_call() and cdata_vectorcall():
+       'args' is a C array of 'nargs' positional arguments */
     char *buffer;
     void** buffer_array;
     cif_description_t *cif_descr;
-    Py_ssize_t i, nargs, nargs_declared;
-    PyObject *signature, *res = NULL, *fvarargs;
-    CTypeDescrObject *fresult;
+    Py_ssize_t i, nargs_declared;
+    PyObject *signature, *res = NULL;
+    CTypeDescrObject *fresult, **varargs = NULL;
+    cffi_varcache_entry_t *varentry = NULL;
     char *resultdata;
     char *errormsg;
-    struct freeme_s {
-        struct freeme_s *next;
-        union_alignment alignment;
-    } *freeme = NULL;
+    struct cffi_scratch_s *exchange = NULL, *freeme = NULL;
 
     if (!(cd->c_type->ct_flags & CT_FUNCTIONPTR)) {
         PyErr_Format(PyExc_TypeError, "cdata '%s' is not callable",
@@ -3182,18 +4104,9 @@ cdata_call(CDataObject *cd, PyObject *args, PyObject *kwds)
                      cd->c_type->ct_name);
         return NULL;
     }
-    if (kwds != NULL && PyDict_Size(kwds) != 0) {
-        PyErr_SetString(PyExc_TypeError,
-                "a cdata function cannot be called with keyword arguments");
-        return NULL;
-    }
     signature = cd->c_type->ct_stuff;
-    nargs = PyTuple_Size(args);
-    if (nargs < 0)
-        return NULL;
     nargs_declared = PyTuple_GET_SIZE(signature) - 2;
     fresult = (CTypeDescrObject *)PyTuple_GET_ITEM(signature, 1);
-    fvarargs = NULL;
     buffer = NULL;
 
     cif_descr = (cif_description_t *)cd->c_type->ct_extra;
@@ -3210,21 +4123,20 @@ cdata_call(CDataObject *cd, PyObject *args, PyObject *kwds)
     }
     else {
         /* call of a variadic function */
-        ffi_abi fabi;
+        Py_ssize_t nvarargs = nargs - nargs_declared;
         if (nargs < nargs_declared) {
             errormsg = "'%s' expects at least %zd arguments, got %zd";
             goto bad_number_of_arguments;
         }
-        fvarargs = PyTuple_New(nargs);
-        if (fvarargs == NULL)
-            goto error;
+        /* 'varargs' is the list of types of all arguments, including the
+           declared ones; it contains borrowed references */
+        varargs = alloca(nargs * sizeof(CTypeDescrObject *));
         for (i = 0; i < nargs_declared; i++) {
-            PyObject *o = PyTuple_GET_ITEM(signature, 2 + i);
-            Py_INCREF(o);
-            PyTuple_SET_ITEM(fvarargs, i, o);
+            varargs[i] = (CTypeDescrObject *)PyTuple_GET_ITEM(signature,
+                                                              2 + i);
         }
         for (i = nargs_declared; i < nargs; i++) {
-            PyObject *obj = PyTuple_GET_ITEM(args, i);
+            PyObject *obj = args[i];
             CTypeDescrObject *ct;
 
             if (CData_Check(obj)) {
@@ -3240,7 +4152,6 @@ cdata_call(CDataObject *cd, PyObject *args, PyObject *kwds)
                 else if (ct->ct_flags & CT_ARRAY) {
                     ct = (CTypeDescrObject *)ct->ct_stuff;
                 }
-                Py_INCREF(ct);
             }
             else {
                 PyErr_Format(PyExc_TypeError,
@@ -3249,22 +4160,48 @@ cdata_call(CDataObject *cd, PyObject *args, PyObject *kwds)
                              i + 1, Py_TYPE(obj)->tp_name);
                 goto error;
             }
-            PyTuple_SET_ITEM(fvarargs, i, (PyObject *)ct);
+            varargs[i] = ct;
         }
+
+        varentry = varcache_take(cd->c_type, varargs + nargs_declared,
+                                 nvarargs);
+        if (varentry == NULL) {
+            PyObject *fvarargs;
+            ffi_abi fabi;
+
+            fvarargs = PyTuple_New(nargs);
+            if (fvarargs == NULL)
+                goto error;
+            for (i = 0; i < nargs; i++) {
+                Py_INCREF(varargs[i]);
+                PyTuple_SET_ITEM(fvarargs, i, (PyObject *)varargs[i]);
+            }
 #if PY_MAJOR_VERSION < 3
-        fabi = PyInt_AS_LONG(PyTuple_GET_ITEM(signature, 0));
+            fabi = PyInt_AS_LONG(PyTuple_GET_ITEM(signature, 0));
 #else
-        fabi = PyLong_AS_LONG(PyTuple_GET_ITEM(signature, 0));
+            fabi = PyLong_AS_LONG(PyTuple_GET_ITEM(signature, 0));
 #endif
-        cif_descr = fb_prepare_cif(fvarargs, fresult, nargs_declared, fabi);
-        if (cif_descr == NULL)
-            goto error;
+            cif_descr = fb_prepare_cif(fvarargs, fresult, nargs_declared,
+                                       fabi);
+            Py_DECREF(fvarargs);
+            if (cif_descr == NULL)
+                goto error;
+            varentry = varcache_new_entry(cif_descr, varargs + nargs_declared,
+                                          nvarargs);
+            if (varentry == NULL)
+                goto error;
+        }
+        cif_descr = varentry->cif_descr;
     }
 
-    buffer = PyObject_Malloc(cif_descr->exchange_size);
-    if (buffer == NULL) {
-        PyErr_NoMemory();
-        goto error;
+    if (cif_descr->exchange_size <= CFFI_EXCHANGE_ON_STACK) {
+        buffer = alloca(cif_descr->exchange_size);
+    }
+    else {
+        exchange = cffi_scratch_take(cif_descr->exchange_size);
+        if (exchange == NULL)
+            goto error;
+        buffer = (char *)&exchange->alignment;
     }
 
     buffer_array = (void **)buffer;
@@ -3272,14 +4209,14 @@ cdata_call(CDataObject *cd, PyObject *args, PyObject *kwds)
     for (i=0; i<nargs; i++) {
         CTypeDescrObject *argtype;
         char *data = buffer + cif_descr->exchange_offset_arg[1 + i];
-        PyObject *obj = PyTuple_GET_ITEM(args, i);
+        PyObject *obj = args[i];
 
         buffer_array[i] = data;
 
         if (i < nargs_declared)
             argtype = (CTypeDescrObject *)PyTuple_GET_ITEM(signature, 2 + i);
         else
-            argtype = (CTypeDescrObject *)PyTuple_GET_ITEM(fvarargs, i);
+            argtype = varargs[i];
 
         if (argtype->ct_flags & CT_POINTER) {
             char *tmpbuf;
@@ -3290,17 +4227,13 @@ cdata_call(CDataObject *cd, PyObject *args, PyObject *kwds)
             else if (datasize < 0)
                 goto error;
             else {
-                if (datasize <= 512) {
+                if (datasize <= CFFI_ARRAY_ARG_ON_STACK) {
                     tmpbuf = alloca(datasize);
                 }
                 else {
-                    struct freeme_s *fp = (struct freeme_s *)PyObject_Malloc(
-                        offsetof(struct freeme_s, alignment) +
-                        (size_t)datasize);
-                    if (fp == NULL) {
-                        PyErr_NoMemory();
+                    struct cffi_scratch_s *fp = cffi_scratch_take(datasize);
+                    if (fp == NULL)
                         goto error;
-                    }
                     fp->next = freeme;
                     freeme = fp;
                     tmpbuf = (char *)&fp->alignment;
@@ -3350,20 +4283,43 @@ cdata_call(CDataObject *cd, PyObject *args, PyObject *kwds)
 
  error:
     while (freeme != NULL) {
-        void *p = (void *)freeme;
+        struct cffi_scratch_s *fp = freeme;
         freeme = freeme->next;
-        PyObject_Free(p);
-    }
-    if (buffer)
-        PyObject_Free(buffer);
-    if (fvarargs != NULL) {
-        Py_DECREF(fvarargs);
-        if (cif_descr != NULL)  /* but only if fvarargs != NULL, if variadic */
-            PyObject_Free(cif_descr);
+        cffi_scratch_give(fp);
     }
+    if (exchange != NULL)
+        cffi_scratch_give(exchange);
+    if (varentry != NULL)
+        varcache_give(cd->c_type, varentry);
     return res;
 }
 
+static PyObject*
+cdata_call(CDataObject *cd, PyObject *args, PyObject *kwds)
+{
+    if (kwds != NULL && PyDict_Size(kwds) != 0) {
+        PyErr_SetString(PyExc_TypeError,
+                "a cdata function cannot be called with keyword arguments");
+        return NULL;
+    }
+    return _cdata_call(cd, &PyTuple_GET_ITEM(args, 0),
+                       PyTuple_GET_SIZE(args));
+}
+
+#ifdef CFFI_USE_VECTORCALL
+static PyObject*
+cdata_vectorcall(PyObject *cd, PyObject *const *args, size_t nargsf,
+                 PyObject *kwnames)
+{
+    if (kwnames != NULL && PyTuple_GET_SIZE(kwnames) != 0) {
+        PyErr_SetString(PyExc_TypeError,
+                "a cdata function cannot be called with keyword arguments");
+        return NULL;
+    }
+    return _cdata_call((CDataObject *)cd, args, PyVectorcall_NARGS(nargsf));
+}
+#endif
+
 static PyObject *cdata_dir(PyObject *cd, PyObject *noarg)
 {
     CTypeDescrObject *ct = ((CDataObject *)cd)->c_type;
@@ -3407,7 +4363,9 @@ static PyObject *cdata_complex(PyObject *cd_, PyObject *noarg)
 static int explicit_release_case(PyObject *cd)
 {
     CTypeDescrObject *ct = ((CDataObject *)cd)->c_type;
-    if (Py_TYPE(cd) == &CDataOwning_Type) {
+    if (Py_TYPE(cd) == &CDataOwning_Type ||
+            Py_TYPE(cd) == &CDataPooled_Type ||
+            Py_TYPE(cd) == &CDataOwningMapped_Type) {
         if ((ct->ct_flags & (CT_POINTER | CT_ARRAY)) != 0)   /* ffi.new() */
             return 0;
     }
@@ -3443,7 +4401,8 @@ static PyObject *cdata_exit(PyObject *cd, PyObject *args)
             /* no effect on CPython: raw memory is allocated with the
                same malloc() as the object itself, so it can't be
                released independently.  If we use a custom allocator,
-               then it's implemented with ffi.gc(). */
+               then it's implemented with ffi.gc().  With huge_pages=True,
+               the memory is unmapped now. */
             ct = ((CDataObject *)cd)->c_type;
             if (ct->ct_flags & CT_IS_PTR_TO_OWNED) {
                 PyObject *x = ((CDataObject_own_structptr *)cd)->structobj;
@@ -3452,6 +4411,13 @@ static PyObject *cdata_exit(PyObject *cd, PyObject *args)
                        ffi.new_allocator()("struct-or-union *") */
                     cdatagcp_finalize((CDataObject_gcp *)x);
                 }
+                else if (Py_TYPE(x) == &CDataOwningMapped_Type) {
+                    cdataownmapped_release((CDataObject *)x);
+                    ((CDataObject *)cd)->c_data = NULL;
+                }
+            }
+            else if (Py_TYPE(cd) == &CDataOwningMapped_Type) {
+                cdataownmapped_release((CDataObject *)cd);
             }
             break;
 
@@ -3572,6 +4538,42 @@ static PyTypeObject CData_Type = {
     PyObject_Del,                               /* tp_free */
 };
 
+static PyTypeObject CDataFuncPtr_Type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "_cffi_ft_backend.__CDataFuncPtr",
+    sizeof(CDataObject_funcptr),
+    0,
+    (destructor)cdata_dealloc,                  /* tp_dealloc */
+    CDATA_VECTORCALL_OFFSET,                    /* tp_vectorcall_offset */
+    0,                                          /* tp_getattr */
+    0,                                          /* tp_setattr */
+    0,                                          /* tp_compare */
+    0,  /* inherited */                         /* tp_repr */
+    0,  /* inherited */                         /* tp_as_number */
+    0,                                          /* tp_as_sequence */
+    0,  /* inherited */                         /* tp_as_mapping */
+    0,  /* inherited */                         /* tp_hash */
+    (ternaryfunc)cdata_call,                    /* tp_call */
+    0,                                          /* tp_str */
+    0,  /* inherited */                         /* tp_getattro */
+    0,  /* inherited */                         /* tp_setattro */
+    0,                                          /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_CHECKTYPES  /* tp_flags */
+                       | CDATA_TPFLAGS_VECTORCALL,
+    "This is an internal subtype of _CDataBase for performance only on "
+    "CPython.  Check with isinstance(x, ffi.CData).",   /* tp_doc */
+    0,                                          /* tp_traverse */
+    0,                                          /* tp_clear */
+    0,  /* inherited */                         /* tp_richcompare */
+    0,  /* inherited */                         /* tp_weaklistoffset */
+    0,  /* inherited */                         /* tp_iter */
+    0,                                          /* tp_iternext */
+    0,  /* inherited */                         /* tp_methods */
+    0,                                          /* tp_members */
+    0,                                          /* tp_getset */
+    &CData_Type,                                /* tp_base */
+};
+
 static PyTypeObject CDataOwning_Type = {
     PyVarObject_HEAD_INIT(NULL, 0)
     "_cffi_ft_backend.__CDataOwn",
@@ -3615,6 +4617,41 @@ static PyTypeObject CDataOwning_Type = {
     free,                                       /* tp_free */
 };
 
+static PyTypeObject CDataOwningMapped_Type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "_cffi_ft_backend.__CDataOwnMapped",
+    sizeof(CDataObject_own_mapped),
+    0,
+    (destructor)cdataownmapped_dealloc,         /* tp_dealloc */
+    0,                                          /* tp_print */
+    0,                                          /* tp_getattr */
+    0,                                          /* tp_setattr */
+    0,                                          /* tp_compare */
+    0,  /* inherited */                         /* tp_repr */
+    0,  /* inherited */                         /* tp_as_number */
+    0,                                          /* tp_as_sequence */
+    0,  /* inherited */                         /* tp_as_mapping */
+    0,  /* inherited */                         /* tp_hash */
+    0,  /* inherited */                         /* tp_call */
+    0,                                          /* tp_str */
+    0,  /* inherited */                         /* tp_getattro */
+    0,  /* inherited */                         /* tp_setattro */
+    0,                                          /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_CHECKTYPES, /* tp_flags */
+    "This is an internal subtype of _CDataBase for performance only on "
+    "CPython.  Check with isinstance(x, ffi.CData).",   /* tp_doc */
+    0,                                          /* tp_traverse */
+    0,                                          /* tp_clear */
+    0,  /* inherited */                         /* tp_richcompare */
+    0,  /* inherited */                         /* tp_weaklistoffset */
+    0,  /* inherited */                         /* tp_iter */
+    0,                                          /* tp_iternext */
+    0,  /* inherited */                         /* tp_methods */
+    0,                                          /* tp_members */
+    0,                                          /* tp_getset */
+    &CDataOwning_Type,                          /* tp_base */
+};
+
 static PyTypeObject CDataOwningGC_Type = {
     PyVarObject_HEAD_INIT(NULL, 0)
     "_cffi_ft_backend.__CDataOwnGC",
@@ -3757,7 +4794,7 @@ static PyTypeObject CDataGCP_Type = {
     0,                                          /* tp_weaklist */
     0,                                          /* tp_del */
     0,                                          /* version_tag */
-    (destructor)cdatagcp_finalize,              /* tp_finalize */
+    (destructor)cdatagcp_tp_finalize,           /* tp_finalize */
 #endif
 };
 
@@ -3888,9 +4925,38 @@ convert_struct_to_owning_object(char *data, CTypeDescrObject *ct)
     cd->c_data = ((char *)cd) + dataoffset;
 
     memcpy(cd->c_data, data, datasize);
+    cdata_memory_acquire(cd, datasize);
     return (PyObject *)cd;
 }
 
+static int gcp_is_c_destructor(PyObject *destructor, CDataObject *origobj)
+{
+    /* can 'destructor(origobj)' be done by gcp_call_c_destructor()?
+       Yes if 'destructor' is a C function pointer taking one pointer
+       argument, which accepts 'origobj' without any conversion, and
+       returning nothing or a primitive */
+    CTypeDescrObject *ct, *ctarg, *ctresult;
+
+    if (!CData_Check(destructor))
+        return 0;
+    ct = ((CDataObject *)destructor)->c_type;
+    if (!(ct->ct_flags & CT_FUNCTIONPTR) || ct->ct_extra == NULL ||
+            ((CDataObject *)destructor)->c_data == NULL ||
+            PyTuple_GET_SIZE(ct->ct_stuff) != 3)
+        return 0;
+    ctresult = (CTypeDescrObject *)PyTuple_GET_ITEM(ct->ct_stuff, 1);
+    ctarg = (CTypeDescrObject *)PyTuple_GET_ITEM(ct->ct_stuff, 2);
+    if (!(ctresult->ct_flags & (CT_VOID | CT_PRIMITIVE_ANY | CT_POINTER |
+                                CT_FUNCTIONPTR)))
+        return 0;
+    if (!(ctarg->ct_flags & CT_POINTER) ||
+            !(origobj->c_type->ct_flags & CT_POINTER))
+        return 0;
+    return (ctarg == origobj->c_type ||
+            (ctarg->ct_flags & CT_IS_VOID_PTR) ||
+            (origobj->c_type->ct_flags & CT_IS_VOID_PTR));
+}
+
 static CDataObject *allocate_gcp_object(CDataObject *origobj,
                                         CTypeDescrObject *ct,
                                         PyObject *destructor)
@@ -3907,27 +4973,127 @@ static CDataObject *allocate_gcp_object(CDataObject *origobj,
     cd->head.c_weakreflist = NULL;
     cd->origobj = (PyObject *)origobj;
     cd->destructor = destructor;
+    cd->flags = 0;
+    cd->size = 0;
+    if (destructor != NULL && gcp_is_c_destructor(destructor, origobj))
+        cd->flags |= GCP_C_DESTRUCTOR;
 
     PyObject_GC_Track(cd);
     return (CDataObject *)cd;
 }
 
+static int check_alignment_arg(Py_ssize_t align)
+{
+    if (align < 0 || (align & (align - 1)) != 0) {
+        PyErr_SetString(PyExc_ValueError,
+                        "'align' must be 0 or a power of two");
+        return -1;
+    }
+    return 0;
+}
+
+#define ALIGN_POINTER(p, align)                                         \
+    ((char *)((((uintptr_t)(p)) + (align) - 1) & ~(uintptr_t)((align) - 1)))
+
+#define CFFI_HUGE_PAGE_SIZE     (2 * 1024 * 1024)
+
+#if CFFI_HAVE_HUGE_PAGES
+static char *mmap_huge_pages(size_t size, size_t align)
+{
+    /* Return 'size' bytes of zeroed memory aligned to 'align', which is
+       a multiple of CFFI_HUGE_PAGE_SIZE.  We first try explicit huge
+       pages, which only work if the system reserved some; otherwise,
+       we map more than needed, trim it to an aligned range and ask for
+       transparent huge pages. */
+    char *raw, *data;
+    size_t total;
+#ifdef MAP_HUGETLB
+    raw = mmap(NULL, size, PROT_READ | PROT_WRITE,
+               MAP_PRIVATE | MAP_ANONYMOUS | MAP_HUGETLB, -1, 0);
+    if (raw != MAP_FAILED) {
+        if (((uintptr_t)raw & (align - 1)) == 0)
+            return raw;
+        munmap(raw, size);
+    }
+#endif
+    total = size + align;
+    if (total < size)
+        return NULL;
+    raw = mmap(NULL, total, PROT_READ | PROT_WRITE,
+               MAP_PRIVATE | MAP_ANONYMOUS, -1, 0);
+    if (raw == MAP_FAILED)
+        return NULL;
+    data = ALIGN_POINTER(raw, align);
+    if (data > raw)
+        munmap(raw, data - raw);
+    if (raw + total > data + size)
+        munmap(data + size, (raw + total) - (data + size));
+#ifdef MADV_HUGEPAGE
+    madvise(data, size, MADV_HUGEPAGE);
+#endif
+    return data;
+}
+
+static CDataObject *allocate_mapped_object(Py_ssize_t datasize,
+                                           CTypeDescrObject *ct,
+                                           Py_ssize_t align)
+{
+    /* the memory from mmap() is already cleared */
+    CDataObject *cd;
+    size_t mapped_size;
+    char *data;
+
+    mapped_size = ((size_t)datasize + CFFI_HUGE_PAGE_SIZE - 1) &
+                  ~(size_t)(CFFI_HUGE_PAGE_SIZE - 1);
+    if (align < CFFI_HUGE_PAGE_SIZE)
+        align = CFFI_HUGE_PAGE_SIZE;
+    data = mmap_huge_pages(mapped_size, align);
+    if (data == NULL)
+        return (CDataObject *)PyErr_NoMemory();
+
+    cd = malloc(sizeof(CDataObject_own_mapped));
+    if (PyObject_Init((PyObject *)cd, &CDataOwningMapped_Type) == NULL) {
+        munmap(data, mapped_size);
+        return NULL;
+    }
+    Py_INCREF(ct);
+    cd->c_type = ct;
+    cd->c_data = data;
+    cd->c_weakreflist = NULL;
+    ((CDataObject_own_mapped *)cd)->mapped_size = mapped_size;
+    return cd;
+}
+#endif
+
 static CDataObject *allocate_with_allocator(Py_ssize_t basesize,
                                             Py_ssize_t datasize,
                                             CTypeDescrObject *ct,
                                             const cffi_allocator_t *allocator)
 {
     CDataObject *cd;
+    Py_ssize_t align = allocator->ca_align;
+    Py_ssize_t extra = align > 0 ? align - 1 : 0;
 
+    if (datasize > PY_SSIZE_T_MAX - basesize - extra) {
+        PyErr_NoMemory();
+        return NULL;
+    }
     if (allocator->ca_alloc == NULL) {
-        cd = allocate_owning_object(basesize + datasize, ct,
+#if CFFI_HAVE_HUGE_PAGES
+        if (allocator->ca_huge_pages && datasize >= CFFI_HUGE_PAGE_SIZE)
+            return allocate_mapped_object(datasize, ct, align);
+#endif
+        cd = allocate_owning_object(basesize + extra + datasize, ct,
                                     allocator->ca_dont_clear);
         if (cd == NULL)
             return NULL;
         cd->c_data = ((char *)cd) + basesize;
+        if (align > 0)
+            cd->c_data = ALIGN_POINTER(cd->c_data, align);
     }
     else {
-        PyObject *res = PyObject_CallFunction(allocator->ca_alloc, "n", datasize);
+        PyObject *res = PyObject_CallFunction(allocator->ca_alloc, "n",
+                                              extra + datasize);
         if (res == NULL)
             return NULL;
 
@@ -3954,33 +5120,38 @@ static CDataObject *allocate_with_allocator(Py_ssize_t basesize,
 
         cd = allocate_gcp_object(cd, ct, allocator->ca_free);
         Py_DECREF(res);
+        if (cd == NULL)
+            return NULL;
+        if (align > 0)
+            cd->c_data = ALIGN_POINTER(cd->c_data, align);
         if (!allocator->ca_dont_clear)
             memset(cd->c_data, 0, datasize);
     }
     return cd;
 }
 
-static PyObject *direct_newp(CTypeDescrObject *ct, PyObject *init,
-                             const cffi_allocator_t *allocator)
+static Py_ssize_t get_new_data_size(CTypeDescrObject *ct, PyObject **pinit,
+                                    Py_ssize_t *pexplicitlength)
 {
+    /* Return the size of the data allocated by ffi.new(ct, *pinit), or
+       -1 with an exception set.  For 'T[]', '*pexplicitlength' is set to
+       the length of the array and '*pinit' may be replaced; otherwise,
+       '*pexplicitlength' is set to -1. */
     CTypeDescrObject *ctitem;
-    CDataObject *cd;
-    Py_ssize_t dataoffset, datasize, explicitlength;
+    Py_ssize_t datasize, explicitlength = -1;
 
-    explicitlength = -1;
     if (ct->ct_flags & CT_POINTER) {
-        dataoffset = offsetof(CDataObject_own_nolength, alignment);
         ctitem = ct->ct_itemdescr;
         if (ctitem->ct_flags & (CT_STRUCT | CT_UNION)) {
             if (force_lazy_struct(ctitem) < 0)
-                return NULL;
+                return -1;
         }
         datasize = cffi_get_size(ctitem);
         if (datasize < 0) {
             PyErr_Format(PyExc_TypeError,
                          "cannot instantiate ctype '%s' of unknown size",
                          ctitem->ct_name);
-            return NULL;
+            return -1;
         }
         if (ctitem->ct_flags & CT_PRIMITIVE_CHAR)
             datasize *= 2;   /* forcefully add another character: a null */
@@ -3988,33 +5159,29 @@ static PyObject *direct_newp(CTypeDescrObject *ct, PyObject *init,
         if (ctitem->ct_flags & (CT_STRUCT | CT_UNION)) {
             if (cffi_check_flag(ctitem->ct_with_var_array)) {
                 assert(ct->ct_flags & CT_IS_PTR_TO_OWNED);
-                dataoffset = offsetof(CDataObject_own_length, alignment);
-
-                if (init != Py_None) {
+                if (*pinit != Py_None) {
                     Py_ssize_t optvarsize = datasize;
-                    if (convert_struct_from_object(NULL, ctitem, init,
+                    if (convert_struct_from_object(NULL, ctitem, *pinit,
                                                    &optvarsize) < 0)
-                        return NULL;
+                        return -1;
                     datasize = optvarsize;
                 }
             }
         }
     }
     else if (ct->ct_flags & CT_ARRAY) {
-        dataoffset = offsetof(CDataObject_own_nolength, alignment);
         datasize = ct->ct_size;
         if (datasize < 0) {
-            explicitlength = get_new_array_length(ct->ct_itemdescr, &init);
+            explicitlength = get_new_array_length(ct->ct_itemdescr, pinit);
             if (explicitlength < 0)
-                return NULL;
+                return -1;
             ctitem = ct->ct_itemdescr;
-            dataoffset = offsetof(CDataObject_own_length, alignment);
             datasize = MUL_WRAPAROUND(explicitlength, ctitem->ct_size);
             if (explicitlength > 0 &&
                     (datasize / explicitlength) != ctitem->ct_size) {
                 PyErr_SetString(PyExc_OverflowError,
                                 "array size would overflow a Py_ssize_t");
-                return NULL;
+                return -1;
             }
         }
     }
@@ -4022,8 +5189,27 @@ static PyObject *direct_newp(CTypeDescrObject *ct, PyObject *init,
         PyErr_Format(PyExc_TypeError,
                      "expected a pointer or array ctype, got '%s'",
                      ct->ct_name);
-        return NULL;
+        return -1;
     }
+    *pexplicitlength = explicitlength;
+    return datasize;
+}
+
+static PyObject *direct_newp(CTypeDescrObject *ct, PyObject *init,
+                             const cffi_allocator_t *allocator)
+{
+    CDataObject *cd;
+    Py_ssize_t dataoffset, datasize, explicitlength;
+
+    datasize = get_new_data_size(ct, &init, &explicitlength);
+    if (datasize < 0)
+        return NULL;
+    if (explicitlength >= 0 ||
+            ((ct->ct_flags & CT_IS_PTR_TO_OWNED) &&
+             cffi_check_flag(ct->ct_itemdescr->ct_with_var_array)))
+        dataoffset = offsetof(CDataObject_own_length, alignment);
+    else
+        dataoffset = offsetof(CDataObject_own_nolength, alignment);
 
     if (ct->ct_flags & CT_IS_PTR_TO_OWNED) {
         /* common case of ptr-to-struct (or ptr-to-union): for this case
@@ -4036,6 +5222,11 @@ static PyObject *direct_newp(CTypeDescrObject *ct, PyObject *init,
                                       allocator);
         if (cds == NULL)
             return NULL;
+        /* store information about the allocated size of the struct */
+        if (dataoffset == offsetof(CDataObject_own_length, alignment)) {
+            ((CDataObject_own_length *)cds)->length = datasize;
+        }
+        cdataowning_track(cds);
 
         cd = allocate_owning_object(sizeof(CDataObject_own_structptr), ct,
                                     /*dont_clear=*/1);
@@ -4045,10 +5236,6 @@ static PyObject *direct_newp(CTypeDescrObject *ct, PyObject *init,
         }
         /* store the only reference to cds into cd */
         ((CDataObject_own_structptr *)cd)->structobj = (PyObject *)cds;
-        /* store information about the allocated size of the struct */
-        if (dataoffset == offsetof(CDataObject_own_length, alignment)) {
-            ((CDataObject_own_length *)cds)->length = datasize;
-        }
         assert(explicitlength < 0);
 
         cd->c_data = cds->c_data;
@@ -4060,6 +5247,7 @@ static PyObject *direct_newp(CTypeDescrObject *ct, PyObject *init,
 
         if (explicitlength >= 0)
             ((CDataObject_own_length*)cd)->length = explicitlength;
+        cdataowning_track(cd);
     }
 
     if (init != Py_None) {
@@ -4076,9 +5264,13 @@ static PyObject *b_newp(PyObject *self, PyObject *args)
 {
     CTypeDescrObject *ct;
     PyObject *init = Py_None;
-    if (!PyArg_ParseTuple(args, "O!|O:newp", &CTypeDescr_Type, &ct, &init))
+    cffi_allocator_t alloc1 = default_allocator;
+    if (!PyArg_ParseTuple(args, "O!|On:newp", &CTypeDescr_Type, &ct, &init,
+                          &alloc1.ca_align))
         return NULL;
-    return direct_newp(ct, init, &default_allocator);
+    if (check_alignment_arg(alloc1.ca_align) < 0)
+        return NULL;
+    return direct_newp(ct, init, &alloc1);
 }
 
 static int
@@ -4555,10 +5747,140 @@ static PyObject *dl_close_lib(DynLibObject *dlobj, PyObject *no_args)
     return Py_None;
 }
 
+/* A descriptor for a global variable of a CLibrary.  The address is
+   looked up with dlsym() only once, when the descriptor is created;
+   every access then only checks that the library was not closed in
+   the meantime, which invalidates the address. */
+typedef struct {
+    PyObject_HEAD
+    DynLibObject *dv_lib;
+    CTypeDescrObject *dv_type;
+    PyObject *dv_name;
+    char *dv_data;
+} DynLibVarObject;
+
+static void dlvar_dealloc(DynLibVarObject *dv)
+{
+    Py_DECREF(dv->dv_lib);
+    Py_DECREF(dv->dv_type);
+    Py_DECREF(dv->dv_name);
+    PyObject_Del(dv);
+}
+
+static PyObject *dlvar_repr(DynLibVarObject *dv)
+{
+    return PyText_FromFormat("<clibrary variable '%s' of type '%s'>",
+                             PyText_AS_UTF8(dv->dv_name),
+                             dv->dv_type->ct_name);
+}
+
+static PyObject *dlvar_descr_get(DynLibVarObject *dv, PyObject *obj,
+                                 PyObject *type)
+{
+    if (obj == NULL) {
+        Py_INCREF(dv);
+        return (PyObject *)dv;
+    }
+    if (dl_check_closed(dv->dv_lib) < 0)
+        return NULL;
+    return convert_to_object(dv->dv_data, dv->dv_type);
+}
+
+static int dlvar_descr_set(DynLibVarObject *dv, PyObject *obj,
+                           PyObject *value)
+{
+    if (value == NULL) {
+        PyErr_Format(PyExc_AttributeError,
+                     "cannot delete the global variable '%s'",
+                     PyText_AS_UTF8(dv->dv_name));
+        return -1;
+    }
+    if (dl_check_closed(dv->dv_lib) < 0)
+        return -1;
+    return convert_from_object(dv->dv_data, dv->dv_type, value);
+}
+
+static PyTypeObject dlvar_type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "_cffi_ft_backend.__CLibraryVariable",  /* tp_name */
+    sizeof(DynLibVarObject),            /* tp_basicsize */
+    0,                                  /* tp_itemsize */
+    /* methods */
+    (destructor)dlvar_dealloc,          /* tp_dealloc */
+    0,                                  /* tp_print */
+    0,                                  /* tp_getattr */
+    0,                                  /* tp_setattr */
+    0,                                  /* tp_compare */
+    (reprfunc)dlvar_repr,               /* tp_repr */
+    0,                                  /* tp_as_number */
+    0,                                  /* tp_as_sequence */
+    0,                                  /* tp_as_mapping */
+    0,                                  /* tp_hash */
+    0,                                  /* tp_call */
+    0,                                  /* tp_str */
+    PyObject_GenericGetAttr,            /* tp_getattro */
+    0,                                  /* tp_setattro */
+    0,                                  /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT,                 /* tp_flags */
+    0,                                  /* tp_doc */
+    0,                                  /* tp_traverse */
+    0,                                  /* tp_clear */
+    0,                                  /* tp_richcompare */
+    0,                                  /* tp_weaklistoffset */
+    0,                                  /* tp_iter */
+    0,                                  /* tp_iternext */
+    0,                                  /* tp_methods */
+    0,                                  /* tp_members */
+    0,                                  /* tp_getset */
+    0,                                  /* tp_base */
+    0,                                  /* tp_dict */
+    (descrgetfunc)dlvar_descr_get,      /* tp_descr_get */
+    (descrsetfunc)dlvar_descr_set,      /* tp_descr_set */
+};
+
+static PyObject *dl_variable_descriptor(DynLibObject *dlobj, PyObject *args)
+{
+    CTypeDescrObject *ct;
+    PyObject *name;
+    char *data;
+    DynLibVarObject *dv;
+
+    if (!PyArg_ParseTuple(args, "O!O!:variable_descriptor",
+                          &CTypeDescr_Type, &ct, &PyText_Type, &name))
+        return NULL;
+
+    if (dl_check_closed(dlobj) < 0)
+        return NULL;
+
+    dlerror();   /* clear error condition */
+    data = dlsym(dlobj->dl_handle, PyText_AS_UTF8(name));
+    if (data == NULL) {
+        const char *error = dlerror();
+        PyErr_Format(PyExc_KeyError,
+                     "variable '%s' not found in library '%s': %s",
+                     PyText_AS_UTF8(name), dlobj->dl_name, error);
+        return NULL;
+    }
+
+    dv = PyObject_New(DynLibVarObject, &dlvar_type);
+    if (dv == NULL)
+        return NULL;
+    Py_INCREF(dlobj);
+    Py_INCREF(ct);
+    Py_INCREF(name);
+    dv->dv_lib = dlobj;
+    dv->dv_type = ct;
+    dv->dv_name = name;
+    dv->dv_data = data;
+    return (PyObject *)dv;
+}
+
 static PyMethodDef dl_methods[] = {
     {"load_function",   (PyCFunction)dl_load_function,  METH_VARARGS},
     {"read_variable",   (PyCFunction)dl_read_variable,  METH_VARARGS},
     {"write_variable",  (PyCFunction)dl_write_variable, METH_VARARGS},
+    {"variable_descriptor", (PyCFunction)dl_variable_descriptor,
+                                                        METH_VARARGS},
     {"close_lib",       (PyCFunction)dl_close_lib,      METH_NOARGS},
     {NULL,              NULL}           /* sentinel */
 };
@@ -7253,17 +8575,236 @@ static PyObject *b_unpack(PyObject *self, PyObject *args, PyObject *kwds)
     return result;
 }
 
+/* Building the PEP 3118 format string of ffi.buffer(..., typed=True) */
+
+struct cffi_format_s {
+    char *data;
+    Py_ssize_t length, allocated;
+};
+
+static int _format_append(struct cffi_format_s *f, const char *s)
+{
+    Py_ssize_t n = strlen(s);
+    if (f->length + n + 1 > f->allocated) {
+        Py_ssize_t newsize = (f->length + n + 1) * 2;
+        char *p = PyMem_Realloc(f->data, newsize);
+        if (p == NULL) {
+            PyErr_NoMemory();
+            return -1;
+        }
+        f->data = p;
+        f->allocated = newsize;
+    }
+    memcpy(f->data + f->length, s, n + 1);
+    f->length += n;
+    return 0;
+}
+
+static void _format_truncate(struct cffi_format_s *f, Py_ssize_t length)
+{
+    if (f->length > length) {
+        f->length = length;
+        f->data[length] = 0;
+    }
+}
+
+static const char *_primitive_format(CTypeDescrObject *ct)
+{
+    /* the native PEP 3118 code of a primitive or pointer type, or NULL */
+    Py_ssize_t size = ct->ct_size;
+
+    if (ct->ct_flags & (CT_POINTER | CT_FUNCTIONPTR))
+        return "P";
+    if (ct->ct_flags & CT_IS_BOOL)
+        return "?";
+    if (ct->ct_flags & (CT_PRIMITIVE_SIGNED | CT_PRIMITIVE_UNSIGNED)) {
+        int sgn = (ct->ct_flags & CT_PRIMITIVE_SIGNED) != 0;
+        if (size == sizeof(char))      return sgn ? "b" : "B";
+        if (size == sizeof(short))     return sgn ? "h" : "H";
+        if (size == sizeof(int))       return sgn ? "i" : "I";
+        if (size == sizeof(long))      return sgn ? "l" : "L";
+        if (size == sizeof(PY_LONG_LONG)) return sgn ? "q" : "Q";
+        return NULL;
+    }
+    if (ct->ct_flags & CT_PRIMITIVE_CHAR) {
+        if (size == 1) return "c";
+        if (size == 2) return "u";
+        if (size == 4) return "w";
+        return NULL;
+    }
+    if (ct->ct_flags & CT_PRIMITIVE_FLOAT) {
+        if (ct->ct_flags & CT_IS_LONGDOUBLE) return "g";
+        if (size == sizeof(float))  return "f";
+        if (size == sizeof(double)) return "d";
+        return NULL;
+    }
+    if (ct->ct_flags & CT_PRIMITIVE_COMPLEX) {
+        if (size == 2 * sizeof(float))  return "Zf";
+        if (size == 2 * sizeof(double)) return "Zd";
+        return NULL;
+    }
+    return NULL;
+}
+
+static int _format_item(struct cffi_format_s *f, CTypeDescrObject *ct);
+
+static int _format_struct(struct cffi_format_s *f, CTypeDescrObject *ct)
+{
+    /* "T{^...}" with explicit padding: '^' means native sizes without
+       automatic alignment, so that packed structs are described too.
+       Bitfields and overlapping fields (from anonymous unions) cannot
+       be described; then return 1 after appending nothing. */
+    CFieldObject *cf;
+    Py_ssize_t start = f->length, pos = 0;
+    char buf[64];
+    int res;
+
+    res = force_lazy_struct(ct);
+    if (res <= 0)
+        return res < 0 ? -1 : 1;
+    if (_format_append(f, "T{^") < 0)
+        return -1;
+    for (cf = (CFieldObject *)ct->ct_extra; cf != NULL; cf = cf->cf_next) {
+        if (cf->cf_bitshift == BS_EMPTY_ARRAY)
+            continue;
+        if (cf->cf_bitshift != BS_REGULAR || cf->cf_offset < pos ||
+                cf->cf_type->ct_size < 0)
+            goto cannot;
+        if (cf->cf_offset > pos) {
+            sprintf(buf, "%zdx", cf->cf_offset - pos);
+            if (_format_append(f, buf) < 0)
+                return -1;
+        }
+        res = _format_item(f, cf->cf_type);
+        if (res < 0)
+            return -1;
+        if (res > 0) {
+            /* an undescribable field, e.g. a union: use raw bytes */
+            sprintf(buf, "%zds", cf->cf_type->ct_size);
+            if (_format_append(f, buf) < 0)
+                return -1;
+        }
+        if (_format_append(f, ":") < 0 ||
+            _format_append(f, PyText_AS_UTF8(get_field_name(ct, cf))) < 0 ||
+            _format_append(f, ":") < 0)
+            return -1;
+        pos = cf->cf_offset + cf->cf_type->ct_size;
+    }
+    if (ct->ct_size > pos) {
+        sprintf(buf, "%zdx", ct->ct_size - pos);
+        if (_format_append(f, buf) < 0)
+            return -1;
+    }
+    return _format_append(f, "}");
+
+ cannot:
+    _format_truncate(f, start);
+    return 1;
+}
+
+static int _format_item(struct cffi_format_s *f, CTypeDescrObject *ct)
+{
+    /* append the format of one item of type 'ct'.  Returns -1 on error,
+       or 1 if 'ct' cannot be described, after appending nothing */
+    const char *code;
+
+    if (ct->ct_flags & CT_ARRAY) {
+        /* "(n,m)..." */
+        Py_ssize_t start = f->length;
+        char buf[64];
+        char sep = '(';
+        int res;
+        while ((ct->ct_flags & CT_ARRAY) && ct->ct_length >= 0) {
+            sprintf(buf, "%c%zd", sep, ct->ct_length);
+            if (_format_append(f, buf) < 0)
+                return -1;
+            sep = ',';
+            ct = ct->ct_itemdescr;
+        }
+        if (sep == '(')
+            return 1;
+        if (_format_append(f, ")") < 0)
+            return -1;
+        res = _format_item(f, ct);
+        if (res > 0)
+            _format_truncate(f, start);
+        return res;
+    }
+    if (ct->ct_flags & CT_STRUCT)
+        return _format_struct(f, ct);
+    code = _primitive_format(ct);
+    if (code == NULL)
+        return 1;
+    return _format_append(f, code);
+}
+
+static int _minibuffer_set_type(MiniBufferObj *mb, CTypeDescrObject *ct)
+{
+    /* describe 'mb' as an array of items of type 'ct'; nested arrays
+       of fixed length become additional dimensions */
+    struct cffi_format_s f = {NULL, 0, 0};
+    CTypeDescrObject *itemct = ct;
+    Py_ssize_t *shape;
+    int i, ndim = 1, res;
+
+    if (ct->ct_size <= 0 || mb->mb_size % ct->ct_size != 0) {
+        PyErr_Format(PyExc_TypeError,
+                     "cannot make a typed buffer of %zd bytes with items "
+                     "of type '%s'", mb->mb_size, ct->ct_name);
+        return -1;
+    }
+    while ((itemct->ct_flags & CT_ARRAY) && itemct->ct_length >= 0) {
+        ndim++;
+        itemct = itemct->ct_itemdescr;
+    }
+    shape = PyMem_Malloc(2 * ndim * sizeof(Py_ssize_t));
+    if (shape == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    res = _format_item(&f, itemct);
+    if (res > 0) {
+        char buf[64];
+        sprintf(buf, "%zds", itemct->ct_size);
+        res = _format_append(&f, buf);
+    }
+    if (res < 0) {
+        PyMem_Free(f.data);
+        PyMem_Free(shape);
+        return -1;
+    }
+    mb->mb_format = PyBytes_FromStringAndSize(f.data, f.length);
+    PyMem_Free(f.data);
+    if (mb->mb_format == NULL) {
+        PyMem_Free(shape);
+        return -1;
+    }
+    shape[0] = mb->mb_size / ct->ct_size;
+    for (i = 1; i < ndim; i++) {
+        shape[i] = ct->ct_length;
+        ct = ct->ct_itemdescr;
+    }
+    shape[2 * ndim - 1] = itemct->ct_size;
+    for (i = ndim - 1; i > 0; i--)
+        shape[ndim + i - 1] = shape[ndim + i] * shape[i];
+    mb->mb_itemsize = itemct->ct_size;
+    mb->mb_ndim = ndim;
+    mb->mb_shape = shape;
+    return 0;
+}
+
 static PyObject *
 b_buffer_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
 {
     /* this is the constructor of the type implemented in minibuffer.h */
     CDataObject *cd;
     Py_ssize_t size = -1;
-    int explicit_size;
-    static char *keywords[] = {"cdata", "size", NULL};
+    int explicit_size, typed = 0;
+    PyObject *mb;
+    static char *keywords[] = {"cdata", "size", "typed", NULL};
 
-    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!|n:buffer", keywords,
-                                     &CData_Type, &cd, &size))
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!|np:buffer", keywords,
+                                     &CData_Type, &cd, &size, &typed))
         return NULL;
 
     explicit_size = size >= 0;
@@ -7290,6 +8831,13 @@ b_buffer_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
                      cd->c_type->ct_name);
         return NULL;
     }
+    if (cd->c_data == NULL && CDataOwn_Check(cd)) {
+        /* ffi.new_allocator(huge_pages=True), after ffi.release() */
+        PyErr_Format(PyExc_RuntimeError,
+                     "cannot use cdata '%s': it was released",
+                     cd->c_type->ct_name);
+        return NULL;
+    }
 
     if (explicit_size && CDataOwn_Check(cd)) {
         Py_ssize_t size_max = cdataowning_size_bytes(cd);
@@ -7305,7 +8853,15 @@ b_buffer_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
         }
     }
     /*WRITE(cd->c_data, size)*/
-    return minibuffer_new(cd->c_data, size, (PyObject *)cd);
+    mb = minibuffer_new(cd->c_data, size, (PyObject *)cd);
+    if (mb != NULL && typed) {
+        if (_minibuffer_set_type((MiniBufferObj *)mb,
+                                 cd->c_type->ct_itemdescr) < 0) {
+            Py_DECREF(mb);
+            return NULL;
+        }
+    }
+    return mb;
 }
 
 static PyObject *b_get_errno(PyObject *self, PyObject *noarg)
@@ -7399,7 +8955,7 @@ static PyObject *b_from_handle(PyObject *self, PyObject *arg)
 }
 
 static int _my_PyObject_GetContiguousBuffer(PyObject *x, Py_buffer *view,
-                                            int writable_only)
+                                            int writable_only, int format)
 {
 #if PY_MAJOR_VERSION < 3
     /* Some objects only support the buffer interface and CPython doesn't
@@ -7441,8 +8997,9 @@ static int _my_PyObject_GetContiguousBuffer(PyObject *x, Py_buffer *view,
     }
 #endif
 
-    if (PyObject_GetBuffer(x, view, writable_only ? PyBUF_WRITABLE
-                                                  : PyBUF_SIMPLE) < 0)
+    if (PyObject_GetBuffer(x, view, (writable_only ? PyBUF_WRITABLE
+                                                   : PyBUF_SIMPLE) |
+                                    (format ? PyBUF_FORMAT : 0)) < 0)
         return -1;
 
     if (!PyBuffer_IsContiguous(view, 'A')) {
@@ -7453,165 +9010,2879 @@ static int _my_PyObject_GetContiguousBuffer(PyObject *x, Py_buffer *view,
     return 0;
 }
 
-static PyObject *direct_from_buffer(CTypeDescrObject *ct, PyObject *x,
-                                    int require_writable)
-{
-    CDataObject *cd;
-    Py_buffer *view;
-    Py_ssize_t arraylength, minimumlength = 0;
+/* Checking the layout of the items of a buffer, as described by its
+   PEP 3118 format, against a struct type in ffi.from_buffer().  Both
+   sides are flattened to a list of runs of scalar items. */
 
-    if (!(ct->ct_flags & (CT_ARRAY | CT_POINTER))) {
-        PyErr_Format(PyExc_TypeError,
-                     "expected a pointer or array ctype, got '%s'",
-                     ct->ct_name);
-        return NULL;
-    }
+struct cffi_leaf_s {
+    Py_ssize_t offset, itemsize, count;
+    char kind;      /* 'i'nteger, 'f'loat, 'c'omplex, 'p'ointer, 's' bytes */
+    const char *name;
+};
 
-    /* PyPy 5.7 can obtain buffers for string (python 2)
-       or bytes (python 3). from_buffer(u"foo") is disallowed.
-     */
-    if (PyUnicode_Check(x)) {
-        PyErr_SetString(PyExc_TypeError,
-                        "from_buffer() cannot return the address "
-                        "of a unicode object");
-        return NULL;
-    }
+struct cffi_layout_s {
+    struct cffi_leaf_s *items;
+    Py_ssize_t length, allocated;
+};
 
-    view = PyObject_Malloc(sizeof(Py_buffer));
-    if (view == NULL) {
-        PyErr_NoMemory();
-        return NULL;
+static int _layout_add(struct cffi_layout_s *L, Py_ssize_t offset,
+                       Py_ssize_t itemsize, Py_ssize_t count, char kind,
+                       const char *name)
+{
+    struct cffi_leaf_s *leaf;
+    if (count == 0)
+        return 0;
+    if (L->length > 0) {
+        /* merge with the previous run of the same field if contiguous */
+        leaf = &L->items[L->length - 1];
+        if (leaf->kind == kind && leaf->itemsize == itemsize &&
+                leaf->name == name &&
+                leaf->offset + leaf->itemsize * leaf->count == offset) {
+            leaf->count += count;
+            return 0;
+        }
     }
-    if (_my_PyObject_GetContiguousBuffer(x, view, require_writable) < 0)
-        goto error1;
+    if (L->length == L->allocated) {
+        Py_ssize_t newsize = L->allocated * 2 + 8;
+        leaf = PyMem_Realloc(L->items, newsize * sizeof(struct cffi_leaf_s));
+        if (leaf == NULL) {
+            PyErr_NoMemory();
+            return -1;
+        }
+        L->items = leaf;
+        L->allocated = newsize;
+    }
+    leaf = &L->items[L->length++];
+    leaf->offset = offset;
+    leaf->itemsize = itemsize;
+    leaf->count = count;
+    leaf->kind = kind;
+    leaf->name = name;
+    return 0;
+}
 
-    if (ct->ct_flags & CT_POINTER)
-    {
-        arraylength = view->len;   /* number of bytes, not used so far */
+static int _layout_of_ctype(struct cffi_layout_s *L, CTypeDescrObject *ct,
+                            Py_ssize_t offset, const char *name)
+{
+    /* returns -1 on error, or 1 if 'ct' contains bitfields or
+       overlapping fields, which a buffer format cannot describe */
+    int res;
+
+    if (ct->ct_flags & CT_STRUCT) {
+        CFieldObject *cf;
+        Py_ssize_t pos = 0;
+        res = force_lazy_struct(ct);
+        if (res <= 0)
+            return res < 0 ? -1 : 1;
+        for (cf = (CFieldObject *)ct->ct_extra; cf != NULL;
+                 cf = cf->cf_next) {
+            if (cf->cf_bitshift == BS_EMPTY_ARRAY)
+                continue;
+            if (cf->cf_bitshift != BS_REGULAR || cf->cf_offset < pos)
+                return 1;
+            res = _layout_of_ctype(L, cf->cf_type, offset + cf->cf_offset,
+                               PyText_AS_UTF8(get_field_name(ct, cf)));
+            if (res != 0)
+                return res;
+            pos = cf->cf_offset + cf->cf_type->ct_size;
+        }
+        return 0;
     }
-    else {
-        /* ct->ct_flags & CT_ARRAY */
-        if (ct->ct_length >= 0) {
-            /* it's an array with a fixed length; make sure that the
-               buffer contains enough bytes. */
-            minimumlength = ct->ct_size;
-            arraylength = ct->ct_length;
+    if (ct->ct_flags & CT_ARRAY) {
+        CTypeDescrObject *itemct = ct->ct_itemdescr;
+        Py_ssize_t i;
+        if (ct->ct_length < 0)
+            return 1;
+        if (ct->ct_length == 0)
+            return 0;
+        if (!(itemct->ct_flags & (CT_STRUCT | CT_ARRAY | CT_UNION))) {
+            res = _layout_of_ctype(L, itemct, offset, name);
+            if (res == 0)
+                L->items[L->length - 1].count += ct->ct_length - 1;
+            return res;
         }
-        else {
-            /* it's an open 'array[]' */
-            if (ct->ct_itemdescr->ct_size == 1) {
-                /* fast path, performance only */
-                arraylength = view->len;
-            }
-            else if (ct->ct_itemdescr->ct_size > 0) {
-                /* give it as many items as fit the buffer.  Ignore a
-                   partial last element. */
-                arraylength = view->len / ct->ct_itemdescr->ct_size;
-            }
-            else {
-                /* it's an array 'empty[]'.  Unsupported obscure case:
-                   the problem is that setting the length of the result
-                   to anything large (like SSIZE_T_MAX) is dangerous,
-                   because if someone tries to loop over it, it will
-                   turn effectively into an infinite loop. */
-                PyErr_Format(PyExc_ZeroDivisionError,
-                    "from_buffer('%s', ..): the actual length of the array "
-                    "cannot be computed", ct->ct_name);
-                goto error2;
-            }
+        for (i = 0; i < ct->ct_length; i++) {
+            res = _layout_of_ctype(L, itemct, offset + i * itemct->ct_size,
+                                   name);
+            if (res != 0)
+                return res;
         }
+        return 0;
     }
-    if (view->len < minimumlength) {
-        PyErr_Format(PyExc_ValueError,
-            "buffer is too small (%zd bytes) for '%s' (%zd bytes)",
-            view->len, ct->ct_name, minimumlength);
-        goto error2;
-    }
+    if (ct->ct_flags & CT_UNION)
+        return _layout_add(L, offset, 1, ct->ct_size, 's', name);
+    if (ct->ct_flags & (CT_POINTER | CT_FUNCTIONPTR))
+        return _layout_add(L, offset, ct->ct_size, 1, 'p', name);
+    if (ct->ct_flags & CT_PRIMITIVE_FLOAT)
+        return _layout_add(L, offset, ct->ct_size, 1, 'f', name);
+    if (ct->ct_flags & CT_PRIMITIVE_COMPLEX)
+        return _layout_add(L, offset, ct->ct_size, 1, 'c', name);
+    if ((ct->ct_flags & CT_PRIMITIVE_CHAR) && ct->ct_size == 1)
+        return _layout_add(L, offset, 1, 1, 's', name);
+    if (ct->ct_flags & CT_PRIMITIVE_ANY)
+        return _layout_add(L, offset, ct->ct_size, 1, 'i', name);
+    return 1;
+}
 
-    cd = (CDataObject *)PyObject_GC_New(CDataObject_frombuf,
-                                        &CDataFromBuf_Type);
-    if (cd == NULL)
-        goto error2;
+struct _cffi_align_short { char x; short y; };
+struct _cffi_align_int { char x; int y; };
+struct _cffi_align_long { char x; long y; };
+struct _cffi_align_longlong { char x; PY_LONG_LONG y; };
+struct _cffi_align_size_t { char x; size_t y; };
+struct _cffi_align_float { char x; float y; };
+struct _cffi_align_double { char x; double y; };
+struct _cffi_align_longdouble { char x; long double y; };
+struct _cffi_align_voidp { char x; void *y; };
+#define _CFFI_ALIGNOF(name)  offsetof(struct _cffi_align_##name, y)
+
+static int _layout_of_format(struct cffi_layout_s *L, const char **pformat,
+                             char terminator, int force_aligned,
+                             Py_ssize_t *p_size, Py_ssize_t *p_align)
+{
+    /* Parse a PEP 3118 format up to 'terminator'.  The offsets of the
+       leaves are relative to the start.  Returns -1 on error, 1 if the
+       format is not understood, or 2 if it uses a non-native byte order.
+       If 'force_aligned', the items in the '=', '<', '>' and '!' modes
+       get the native alignment too and the size of every struct is
+       rounded up to its alignment, like a C compiler does: ctypes
+       describes its native structs as 'T{<i:x:<d:y:}', for example. */
+    const char *f = *pformat;
+    int native = 1, aligned = 1;
+    Py_ssize_t offset = 0, maxalign = 1;
+
+    while (1) {
+        Py_ssize_t count = 1, size, align;
+        char c, kind;
+
+        c = *f++;
+        if (c == terminator)
+            break;
+        switch (c) {
+        case '\0':
+            return 1;
+        case ' ': case '\t': case '\n':
+            continue;
+        case '@':
+            native = 1; aligned = 1;
+            continue;
+        case '^':
+            native = 1; aligned = 0;
+            continue;
+        case '=':
+            native = 0; aligned = force_aligned;
+            continue;
+        case '<': case '>': case '!':
+#ifdef WORDS_BIGENDIAN
+            if (c == '<')
+#else
+            if (c != '<')
+#endif
+                return 2;     /* non-native byte order */
+            native = 0; aligned = force_aligned;
+            continue;
+        case '(':
+            /* a shape "(n,m,...)" */
+            count = 1;
+            while (1) {
+                Py_ssize_t n = 0;
+                if (!(*f >= '0' && *f <= '9'))
+                    return 1;
+                while (*f >= '0' && *f <= '9')
+                    n = n * 10 + (*f++ - '0');
+                count *= n;
+                if (*f == ')')
+                    break;
+                if (*f++ != ',')
+                    return 1;
+            }
+            f++;
+            c = *f++;
+            break;
+        }
+        if (c >= '0' && c <= '9') {
+            Py_ssize_t repeat = c - '0';
+            while (*f >= '0' && *f <= '9')
+                repeat = repeat * 10 + (*f++ - '0');
+            count *= repeat;
+            c = *f++;
+        }
+
+        switch (c) {
+        case 'x':
+            offset += count;
+            continue;
+        case 's': case 'p':
+            if (_layout_add(L, offset, 1, count, 's', NULL) < 0)
+                return -1;
+            offset += count;
+            goto skip_name;
+        case 'T': {
+            Py_ssize_t start = L->length, i, j;
+            int res;
+            if (*f++ != '{')
+                return 1;
+            res = _layout_of_format(L, &f, '}', force_aligned, &size, &align);
+            if (res != 0)
+                return res;
+            if (!aligned)
+                align = 1;
+            offset = (offset + align - 1) & ~(align - 1);
+            for (i = start; i < L->length; i++)
+                L->items[i].offset += offset;
+            /* repeat the leaves 'count' times */
+            for (j = 1; j < count; j++) {
+                Py_ssize_t end = L->length;
+                for (i = start; i < end; i++) {
+                    struct cffi_leaf_s leaf = L->items[i];
+                    if (_layout_add(L, leaf.offset + j * size, leaf.itemsize,
+                                    leaf.count, leaf.kind, NULL) < 0)
+                        return -1;
+                }
+            }
+            if (align > maxalign)
+                maxalign = align;
+            offset += size * count;
+            goto skip_name;
+        }
+        case 'Z':
+            c = *f++;
+            kind = 'c';
+            if (c == 'f') {
+                size = 2 * sizeof(float); align = _CFFI_ALIGNOF(float);
+            }
+            else if (c == 'd') {
+                size = 2 * sizeof(double); align = _CFFI_ALIGNOF(double);
+            }
+            else if (c == 'g' && native) {
+                size = 2 * sizeof(long double);
+                align = _CFFI_ALIGNOF(longdouble);
+            }
+            else
+                return 1;
+            break;
+        case 'c':
+            kind = 's'; size = 1; align = 1;
+            break;
+        case '?': case 'b': case 'B':
+            kind = 'i'; size = 1; align = 1;
+            break;
+        case 'h': case 'H':
+            kind = 'i'; size = native ? sizeof(short) : 2;
+            align = _CFFI_ALIGNOF(short);
+            break;
+        case 'i': case 'I':
+            kind = 'i'; size = native ? sizeof(int) : 4;
+            align = _CFFI_ALIGNOF(int);
+            break;
+        case 'l': case 'L':
+            kind = 'i'; size = native ? sizeof(long) : 4;
+            align = _CFFI_ALIGNOF(long);
+            break;
+        case 'q': case 'Q':
+            kind = 'i'; size = 8;
+            align = _CFFI_ALIGNOF(longlong);
+            break;
+        case 'n': case 'N':
+            if (!native)
+                return 1;
+            kind = 'i'; size = sizeof(size_t);
+            align = _CFFI_ALIGNOF(size_t);
+            break;
+        case 'u':
+            kind = 'i'; size = 2; align = 2;
+            break;
+        case 'w':
+            kind = 'i'; size = 4; align = 4;
+            break;
+        case 'e':
+            kind = 'f'; size = 2; align = 2;
+            break;
+        case 'f':
+            kind = 'f'; size = 4; align = _CFFI_ALIGNOF(float);
+            break;
+        case 'd':
+            kind = 'f'; size = 8; align = _CFFI_ALIGNOF(double);
+            break;
+        case 'g':
+            if (!native)
+                return 1;
+            kind = 'f'; size = sizeof(long double);
+            align = _CFFI_ALIGNOF(longdouble);
+            break;
+        case 'P':
+            if (!native)
+                return 1;
+            kind = 'p'; size = sizeof(void *);
+            align = _CFFI_ALIGNOF(voidp);
+            break;
+        default:
+            return 1;
+        }
+        if (!aligned)
+            align = 1;
+        offset = (offset + align - 1) & ~(align - 1);
+        if (align > maxalign)
+            maxalign = align;
+        if (_layout_add(L, offset, size, count, kind, NULL) < 0)
+            return -1;
+        offset += size * count;
+
+     skip_name:
+        if (*f == ':') {
+            f = strchr(f + 1, ':');
+            if (f == NULL)
+                return 1;
+            f++;
+        }
+    }
+    if (force_aligned)
+        offset = (offset + maxalign - 1) & ~(maxalign - 1);
+    *pformat = f;
+    *p_size = offset;
+    *p_align = maxalign;
+    return 0;
+}
+
+#undef _CFFI_ALIGNOF
+
+static void _describe_item(char *buf, struct cffi_leaf_s *leaf,
+                           Py_ssize_t offset)
+{
+    const char *what;
+    switch (leaf->kind) {
+    case 'i': what = "integer"; break;
+    case 'f': what = "float"; break;
+    case 'c': what = "complex"; break;
+    case 'p': what = "pointer"; break;
+    default:
+        sprintf(buf, "bytes at offset %zd", offset);
+        return;
+    }
+    sprintf(buf, "%s (%zd bytes) at offset %zd", what, leaf->itemsize, offset);
+}
+
+static int _items_match(struct cffi_leaf_s *a, struct cffi_leaf_s *b)
+{
+    if (a->kind == b->kind && a->itemsize == b->itemsize)
+        return 1;
+    /* raw bytes also match 1-byte integers */
+    return ((a->kind == 's' || b->kind == 's') &&
+            a->itemsize == 1 && b->itemsize == 1);
+}
+
+static int _check_buffer_layout(CTypeDescrObject *ct, Py_buffer *view)
+{
+    /* 'ct' is a struct type.  If the format of 'view' describes its
+       items as a struct, check that the layouts are the same. */
+    struct cffi_layout_s L1 = {NULL, 0, 0}, L2 = {NULL, 0, 0};
+    const char *format = view->format;
+    Py_ssize_t size, align, i, j, k1, k2;
+    int res;
+
+    if (format == NULL)
+        return 0;
+    while (*format == '@' || *format == '^' || *format == '=' ||
+           *format == '<' || *format == '>' || *format == '!')
+        format++;
+    if (format[0] != 'T' || format[1] != '{')
+        return 0;     /* plain bytes, or not a struct: not checked */
+
+    if (view->itemsize != ct->ct_size) {
+        PyErr_Format(PyExc_TypeError,
+                     "from_buffer(): the buffer has items of %zd bytes, "
+                     "but '%s' has %zd bytes (format '%s')",
+                     view->itemsize, ct->ct_name, ct->ct_size, view->format);
+        return -1;
+    }
+    format = view->format;
+    res = _layout_of_format(&L2, &format, '\0', 0, &size, &align);
+    if (res == 0 && size != view->itemsize) {
+        /* try again with the native alignment, see _layout_of_format() */
+        L2.length = 0;
+        format = view->format;
+        res = _layout_of_format(&L2, &format, '\0', 1, &size, &align);
+        if (res == 0 && size != view->itemsize) {
+            PyErr_Format(PyExc_TypeError,
+                         "from_buffer(): the format '%s' describes items of "
+                         "%zd bytes, but the buffer has items of %zd bytes",
+                         view->format, size, view->itemsize);
+            res = -1;
+        }
+    }
+    if (res == 2) {
+        PyErr_Format(PyExc_TypeError,
+                     "from_buffer(): the buffer uses a non-native byte order "
+                     "(format '%s'), it cannot be used as '%s'",
+                     view->format, ct->ct_name);
+        res = -1;
+    }
+    if (res == 0)
+        res = _layout_of_ctype(&L1, ct, 0, NULL);
+    if (res != 0)
+        goto done;   /* error, or cannot check */
+
+    /* compare the items one by one, consuming the runs on both sides */
+    i = j = k1 = k2 = 0;
+    while (i < L1.length || j < L2.length) {
+        struct cffi_leaf_s *a = i < L1.length ? &L1.items[i] : NULL;
+        struct cffi_leaf_s *b = j < L2.length ? &L2.items[j] : NULL;
+        Py_ssize_t off_a = a ? a->offset + k1 * a->itemsize : 0;
+        Py_ssize_t off_b = b ? b->offset + k2 * b->itemsize : 0;
+        Py_ssize_t n;
+        char buf1[100], buf2[100];
+
+        if (a == NULL || b == NULL || off_a != off_b || !_items_match(a, b)) {
+            if (b != NULL)
+                _describe_item(buf2, b, off_b);
+            if (a == NULL)
+                PyErr_Format(PyExc_TypeError,
+                             "from_buffer(): layout mismatch with '%s': the "
+                             "buffer has %s, after the last field of the "
+                             "struct (format '%s')",
+                             ct->ct_name, buf2, view->format);
+            else {
+                _describe_item(buf1, a, off_a);
+                PyErr_Format(PyExc_TypeError,
+                             "from_buffer(): layout mismatch with '%s': "
+                             "field '%s' is %s, but the buffer has %s "
+                             "(format '%s')",
+                             ct->ct_name, a->name, buf1,
+                             b ? buf2 : "nothing there", view->format);
+            }
+            res = -1;
+            break;
+        }
+        n = a->count - k1;
+        if (n > b->count - k2)
+            n = b->count - k2;
+        k1 += n;
+        k2 += n;
+        if (k1 == a->count) {
+            i++;
+            k1 = 0;
+        }
+        if (k2 == b->count) {
+            j++;
+            k2 = 0;
+        }
+    }
+ done:
+    PyMem_Free(L1.items);
+    PyMem_Free(L2.items);
+    return res < 0 ? -1 : 0;
+}
+
+static PyObject *direct_from_buffer(CTypeDescrObject *ct, PyObject *x,
+                                    int require_writable)
+{
+    CDataObject *cd;
+    Py_buffer *view;
+    Py_ssize_t arraylength, minimumlength = 0;
+    int is_struct;
+
+    if (!(ct->ct_flags & (CT_ARRAY | CT_POINTER))) {
+        PyErr_Format(PyExc_TypeError,
+                     "expected a pointer or array ctype, got '%s'",
+                     ct->ct_name);
+        return NULL;
+    }
+
+    /* PyPy 5.7 can obtain buffers for string (python 2)
+       or bytes (python 3). from_buffer(u"foo") is disallowed.
+     */
+    if (PyUnicode_Check(x)) {
+        PyErr_SetString(PyExc_TypeError,
+                        "from_buffer() cannot return the address "
+                        "of a unicode object");
+        return NULL;
+    }
+
+    view = PyObject_Malloc(sizeof(Py_buffer));
+    if (view == NULL) {
+        PyErr_NoMemory();
+        return NULL;
+    }
+    is_struct = (ct->ct_itemdescr->ct_flags & CT_STRUCT) != 0;
+    if (_my_PyObject_GetContiguousBuffer(x, view, require_writable,
+                                         is_struct) < 0)
+        goto error1;
+    if (is_struct && _check_buffer_layout(ct->ct_itemdescr, view) < 0)
+        goto error2;
+
+    if (ct->ct_flags & CT_POINTER)
+    {
+        arraylength = view->len;   /* number of bytes, not used so far */
+    }
+    else {
+        /* ct->ct_flags & CT_ARRAY */
+        if (ct->ct_length >= 0) {
+            /* it's an array with a fixed length; make sure that the
+               buffer contains enough bytes. */
+            minimumlength = ct->ct_size;
+            arraylength = ct->ct_length;
+        }
+        else {
+            /* it's an open 'array[]' */
+            if (ct->ct_itemdescr->ct_size == 1) {
+                /* fast path, performance only */
+                arraylength = view->len;
+            }
+            else if (ct->ct_itemdescr->ct_size > 0) {
+                /* give it as many items as fit the buffer.  Ignore a
+                   partial last element. */
+                arraylength = view->len / ct->ct_itemdescr->ct_size;
+            }
+            else {
+                /* it's an array 'empty[]'.  Unsupported obscure case:
+                   the problem is that setting the length of the result
+                   to anything large (like SSIZE_T_MAX) is dangerous,
+                   because if someone tries to loop over it, it will
+                   turn effectively into an infinite loop. */
+                PyErr_Format(PyExc_ZeroDivisionError,
+                    "from_buffer('%s', ..): the actual length of the array "
+                    "cannot be computed", ct->ct_name);
+                goto error2;
+            }
+        }
+    }
+    if (view->len < minimumlength) {
+        PyErr_Format(PyExc_ValueError,
+            "buffer is too small (%zd bytes) for '%s' (%zd bytes)",
+            view->len, ct->ct_name, minimumlength);
+        goto error2;
+    }
+
+    cd = (CDataObject *)PyObject_GC_New(CDataObject_frombuf,
+                                        &CDataFromBuf_Type);
+    if (cd == NULL)
+        goto error2;
+
+    Py_INCREF(ct);
+    cd->c_type = ct;
+    cd->c_data = view->buf;
+    cd->c_weakreflist = NULL;
+    ((CDataObject_frombuf *)cd)->length = arraylength;
+    ((CDataObject_frombuf *)cd)->bufferview = view;
+    PyObject_GC_Track(cd);
+    return (PyObject *)cd;
+
+ error2:
+    PyBuffer_Release(view);
+ error1:
+    PyObject_Free(view);
+    return NULL;
+}
+
+static PyObject *b_from_buffer(PyObject *self, PyObject *args)
+{
+    CTypeDescrObject *ct;
+    PyObject *x;
+    int require_writable = 0;
+
+    if (!PyArg_ParseTuple(args, "O!O|i", &CTypeDescr_Type, &ct, &x,
+                          &require_writable))
+        return NULL;
+
+    return direct_from_buffer(ct, x, require_writable);
+}
+
+static int _fetch_as_buffer(PyObject *x, Py_buffer *view, int writable_only)
+{
+    if (CData_Check(x)) {
+        CTypeDescrObject *ct = ((CDataObject *)x)->c_type;
+        if (!(ct->ct_flags & (CT_POINTER|CT_ARRAY))) {
+            PyErr_Format(PyExc_TypeError,
+                         "expected a pointer or array ctype, got '%s'",
+                         ct->ct_name);
+            return -1;
+        }
+        if (((CDataObject *)x)->c_data == NULL &&
+                ((ct->ct_flags & CT_ARRAY) || CDataOwn_Check(x))) {
+            PyErr_Format(PyExc_RuntimeError,
+                         "cannot use cdata '%s': it was released",
+                         ct->ct_name);
+            return -1;
+        }
+        view->buf = ((CDataObject *)x)->c_data;
+        view->obj = NULL;
+        return 0;
+    }
+    else {
+        return _my_PyObject_GetContiguousBuffer(x, view, writable_only, 0);
+    }
+}
+
+/* copies of at least this many bytes are done without the GIL */
+#define CFFI_MEMMOVE_NOGIL         (128 * 1024)
+/* with 'threads', each thread copies at least this many bytes */
+#define CFFI_MEMMOVE_PER_THREAD    (4 * 1024 * 1024)
+
+struct cffi_memmove_chunk_s {
+    char *dest;
+    const char *src;
+    size_t size;
+};
+
+CFFI_THREAD_FUNC(memmove_chunk)
+{
+    struct cffi_memmove_chunk_s *chunk = (struct cffi_memmove_chunk_s *)arg;
+    memcpy(chunk->dest, chunk->src, chunk->size);
+    CFFI_THREAD_RETURN;
+}
+
+static void _memmove_parallel(char *dest, const char *src, size_t n,
+                              int threads)
+{
+    /* may be called without the GIL */
+    struct cffi_memmove_chunk_s chunks[CFFI_PARALLEL_MAX];
+    size_t chunk_size, offset = 0;
+    int i;
+
+    if (n / CFFI_MEMMOVE_PER_THREAD < (size_t)threads)
+        threads = (int)(n / CFFI_MEMMOVE_PER_THREAD);
+    /* overlapping areas must be copied in the right order */
+    if (threads <= 1 || (dest < src + n && src < dest + n)) {
+        memmove(dest, src, n);
+        return;
+    }
+    /* chunks that are multiple of 4096 bytes, except the last one */
+    chunk_size = ((n / threads) + 4095) & ~(size_t)4095;
+    for (i = 0; i < threads; i++) {
+        size_t size = n - offset < chunk_size ? n - offset : chunk_size;
+        chunks[i].dest = dest + offset;
+        chunks[i].src = src + offset;
+        chunks[i].size = size;
+        offset += size;
+    }
+    cffi_parallel_run(memmove_chunk, (char *)chunks,
+                      sizeof(struct cffi_memmove_chunk_s), threads);
+}
+
+static PyObject *b_memmove(PyObject *self, PyObject *args, PyObject *kwds)
+{
+    PyObject *dest_obj, *src_obj;
+    Py_buffer dest_view, src_view;
+    Py_ssize_t n;
+    int threads = 1;
+    static char *keywords[] = {"dest", "src", "n", "threads", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "OOn|i", keywords,
+                                     &dest_obj, &src_obj, &n, &threads))
+        return NULL;
+    if (n < 0) {
+        PyErr_SetString(PyExc_ValueError, "negative size");
+        return NULL;
+    }
+    if (threads < 1 || threads > CFFI_PARALLEL_MAX) {
+        PyErr_Format(PyExc_ValueError,
+                     "'threads' must be between 1 and %d", CFFI_PARALLEL_MAX);
+        return NULL;
+    }
+
+    if (_fetch_as_buffer(src_obj, &src_view, 0) < 0) {
+        return NULL;
+    }
+    if (_fetch_as_buffer(dest_obj, &dest_view, 1) < 0) {
+        PyBuffer_Release(&src_view);
+        return NULL;
+    }
+
+    if (n < CFFI_MEMMOVE_NOGIL) {
+        memmove(dest_view.buf, src_view.buf, n);
+    }
+    else if (dest_view.obj == NULL || src_view.obj == NULL) {
+        /* a cdata is not pinned by anything: if we released the GIL,
+           another thread could free its memory with ffi.release() */
+        _memmove_parallel(dest_view.buf, src_view.buf, n, threads);
+    }
+    else {
+        /* the views keep the Python buffers alive and pinned */
+        Py_BEGIN_ALLOW_THREADS
+        _memmove_parallel(dest_view.buf, src_view.buf, n, threads);
+        Py_END_ALLOW_THREADS
+    }
+
+    PyBuffer_Release(&dest_view);
+    PyBuffer_Release(&src_view);
+    Py_INCREF(Py_None);
+    return Py_None;
+}
+
+static int _format_matches_ctype(const char *format, CTypeDescrObject *ct)
+{
+    /* Check that the PEP 3118 'format' describes exactly one item of the
+       primitive or pointer ctype 'ct'.  Only the formats of single
+       items from the 'struct' module are understood. */
+    int native = 1;
+    Py_ssize_t size;
+    char c;
+
+    if (format == NULL)
+        format = "B";
+    switch (*format) {
+    case '@':
+        format++;
+        break;
+    case '=':
+#ifdef WORDS_BIGENDIAN
+    case '>':
+    case '!':
+#else
+    case '<':
+#endif
+        native = 0;
+        format++;
+        break;
+    }
+
+    c = *format++;
+    if (c == 'Z') {
+        /* complex numbers */
+        c = *format++;
+        if (*format != '\0' || !(ct->ct_flags & CT_PRIMITIVE_COMPLEX))
+            return 0;
+        if (c == 'f')
+            return ct->ct_size == 2 * sizeof(float);
+        if (c == 'd')
+            return ct->ct_size == 2 * sizeof(double);
+        return 0;
+    }
+    if (*format != '\0')
+        return 0;
+
+    switch (c) {
+    case 'c': case 'b': case 'B': case '?': size = 1; break;
+    case 'h': case 'H': size = native ? sizeof(short) : 2; break;
+    case 'i': case 'I': size = native ? sizeof(int) : 4; break;
+    case 'l': case 'L': size = native ? sizeof(long) : 4; break;
+    case 'q': case 'Q': size = native ? sizeof(PY_LONG_LONG) : 8; break;
+    case 'f': size = 4; break;
+    case 'd': size = 8; break;
+    case 'n': case 'N': size = native ? sizeof(size_t) : 0; break;
+    case 'g': size = native ? sizeof(long double) : 0; break;
+    case 'P': size = native ? sizeof(void *) : 0; break;
+    default: return 0;
+    }
+    if (size != ct->ct_size)
+        return 0;
+
+    switch (c) {
+    case 'c':
+        return (ct->ct_flags & CT_PRIMITIVE_CHAR) != 0;
+    case '?':
+        return (ct->ct_flags & CT_IS_BOOL) != 0;
+    case 'b': case 'h': case 'i': case 'l': case 'q': case 'n':
+        return (ct->ct_flags & (CT_PRIMITIVE_SIGNED | CT_PRIMITIVE_CHAR)) != 0;
+    case 'B': case 'H': case 'I': case 'L': case 'Q': case 'N':
+        return (ct->ct_flags & (CT_PRIMITIVE_UNSIGNED | CT_PRIMITIVE_CHAR)) != 0
+            && !(ct->ct_flags & CT_IS_BOOL);
+    case 'f': case 'd': case 'g':
+        return (ct->ct_flags & CT_PRIMITIVE_FLOAT) != 0;
+    case 'P':
+        return (ct->ct_flags & (CT_POINTER | CT_FUNCTIONPTR)) != 0;
+    }
+    return 0;
+}
+
+struct cffi_column_s {
+    char *data;
+    Py_ssize_t stride;
+    Py_ssize_t length;
+    Py_ssize_t itemsize;
+    Py_buffer view;      /* view.obj == NULL if not from a Python buffer */
+};
+
+static int _fetch_column(PyObject *x, CTypeDescrObject *ct,
+                         struct cffi_column_s *col, int writable,
+                         const char *name, Py_ssize_t index)
+{
+    col->view.obj = NULL;
+    col->itemsize = ct->ct_size;
+
+    if (CData_Check(x)) {
+        CDataObject *cd = (CDataObject *)x;
+        if (!(cd->c_type->ct_flags & CT_ARRAY) ||
+                cd->c_type->ct_itemdescr != ct) {
+            PyErr_Format(PyExc_TypeError,
+                         "%s%zd: expected an array of '%s', got cdata '%s'",
+                         name, index, ct->ct_name, cd->c_type->ct_name);
+            return -1;
+        }
+        col->data = cd->c_data;
+        col->stride = ct->ct_size;
+        col->length = get_array_length(cd);
+        return 0;
+    }
+
+    if (PyObject_GetBuffer(x, &col->view, writable ? PyBUF_RECORDS
+                                                   : PyBUF_RECORDS_RO) < 0)
+        return -1;
+    if (col->view.ndim != 1) {
+        PyErr_Format(PyExc_TypeError,
+                     "%s%zd: expected a 1-dimensional buffer, got %d "
+                     "dimensions", name, index, col->view.ndim);
+        goto error;
+    }
+    if (col->view.itemsize != ct->ct_size ||
+            !_format_matches_ctype(col->view.format, ct)) {
+        PyErr_Format(PyExc_TypeError,
+                     "%s%zd: expected a buffer of '%s', got format '%s' "
+                     "with items of %zd bytes", name, index, ct->ct_name,
+                     col->view.format ? col->view.format : "B",
+                     col->view.itemsize);
+        goto error;
+    }
+    col->data = col->view.buf;
+    col->stride = col->view.strides[0];
+    col->length = col->view.shape[0];
+    return 0;
+
+ error:
+    PyBuffer_Release(&col->view);
+    col->view.obj = NULL;
+    return -1;
+}
+
+static PyObject *_new_array_of(CTypeDescrObject *ct, Py_ssize_t length)
+{
+    /* return a new owning cdata 'ct[length]', zero-initialized */
+    PyObject *ctptr, *ctarray, *lengthobj, *res;
+
+    ctptr = new_pointer_type(ct);
+    if (ctptr == NULL)
+        return NULL;
+    ctarray = new_array_type((CTypeDescrObject *)ctptr, -1);
+    Py_DECREF(ctptr);
+    if (ctarray == NULL)
+        return NULL;
+    lengthobj = PyInt_FromSsize_t(length);
+    if (lengthobj == NULL) {
+        Py_DECREF(ctarray);
+        return NULL;
+    }
+    res = direct_newp((CTypeDescrObject *)ctarray, lengthobj,
+                      &default_allocator);
+    Py_DECREF(lengthobj);
+    Py_DECREF(ctarray);
+    return res;
+}
+
+static void _call_many_loop(ffi_cif *cif, void (*fn)(void),
+                            struct cffi_column_s *cols, Py_ssize_t nargs,
+                            struct cffi_column_s *outcol, Py_ssize_t length,
+                            void **buffer_array, char *rvalue,
+                            char *resultdata, Py_ssize_t resultsize)
+{
+    Py_ssize_t i, row;
+
+    for (row = 0; row < length; row++) {
+        for (i = 0; i < nargs; i++) {
+            memcpy(buffer_array[i], cols[i].data + row * cols[i].stride,
+                   cols[i].itemsize);
+        }
+        ffi_call(cif, fn, rvalue, buffer_array);
+        if (resultsize > 0)
+            memcpy(outcol->data + row * outcol->stride, resultdata,
+                   resultsize);
+    }
+}
+
+static PyObject *b_call_many(PyObject *self, PyObject *args, PyObject *kwds)
+{
+    static char *keywords[] = {"out", NULL};
+    CDataObject *cd;
+    CTypeDescrObject *fresult;
+    cif_description_t *cif_descr;
+    PyObject *signature, *out = Py_None, *res = NULL;
+    struct cffi_column_s *cols = NULL, outcol;
+    struct cffi_scratch_s *exchange = NULL;
+    void (*fn)(void);
+    void **buffer_array;
+    char *buffer, *rvalue, *resultdata;
+    Py_ssize_t i, nargs, ncols = 0, length = -1, resultsize = 0;
+    int nogil, new_out = 0;
+
+    if (kwds != NULL) {
+        PyObject *noargs = PyTuple_New(0);
+        int ok;
+        if (noargs == NULL)
+            return NULL;
+        ok = PyArg_ParseTupleAndKeywords(noargs, kwds, "|O:call_many",
+                                         keywords, &out);
+        Py_DECREF(noargs);
+        if (!ok)
+            return NULL;
+    }
+    if (PyTuple_GET_SIZE(args) < 1 || !CData_Check(PyTuple_GET_ITEM(args, 0))
+        || !(((CDataObject *)PyTuple_GET_ITEM(args, 0))->c_type->ct_flags &
+             CT_FUNCTIONPTR)) {
+        PyErr_SetString(PyExc_TypeError,
+                        "call_many() expects a cdata function pointer "
+                        "as first argument");
+        return NULL;
+    }
+    cd = (CDataObject *)PyTuple_GET_ITEM(args, 0);
+    if (cd->c_data == NULL) {
+        PyErr_Format(PyExc_RuntimeError,
+                     "cannot call null pointer pointer from cdata '%s'",
+                     cd->c_type->ct_name);
+        return NULL;
+    }
+    cif_descr = (cif_description_t *)cd->c_type->ct_extra;
+    if (cif_descr == NULL) {
+        PyErr_Format(PyExc_TypeError,
+                     "call_many() does not support functions with '...' "
+                     "(got '%s')", cd->c_type->ct_name);
+        return NULL;
+    }
+    signature = cd->c_type->ct_stuff;
+    nargs = PyTuple_GET_SIZE(signature) - 2;
+    fresult = (CTypeDescrObject *)PyTuple_GET_ITEM(signature, 1);
+
+    if (PyTuple_GET_SIZE(args) - 1 != nargs) {
+        PyErr_Format(PyExc_TypeError, "'%s' expects %zd arguments, got %zd",
+                     cd->c_type->ct_name, nargs, PyTuple_GET_SIZE(args) - 1);
+        return NULL;
+    }
+    for (i = -1; i < nargs; i++) {
+        CTypeDescrObject *ct = i < 0 ? fresult :
+            (CTypeDescrObject *)PyTuple_GET_ITEM(signature, 2 + i);
+        if (!(ct->ct_flags & (CT_PRIMITIVE_ANY | CT_POINTER | CT_FUNCTIONPTR))
+            && !(i < 0 && (ct->ct_flags & CT_VOID))) {
+            PyErr_Format(PyExc_TypeError,
+                         "call_many() only supports functions with primitive "
+                         "or pointer arguments and results, not '%s'",
+                         ct->ct_name);
+            return NULL;
+        }
+    }
+
+    cols = PyMem_Malloc((nargs + 1) * sizeof(struct cffi_column_s));
+    if (cols == NULL)
+        return PyErr_NoMemory();
+    outcol.view.obj = NULL;
+
+    for (ncols = 0; ncols < nargs; ncols++) {
+        if (_fetch_column(PyTuple_GET_ITEM(args, 1 + ncols),
+                (CTypeDescrObject *)PyTuple_GET_ITEM(signature, 2 + ncols),
+                &cols[ncols], 0, "argument ", ncols + 1) < 0)
+            goto error;
+        if (length < 0) {
+            length = cols[ncols].length;
+        }
+        else if (cols[ncols].length != length) {
+            PyErr_Format(PyExc_ValueError,
+                         "argument %zd has %zd items, but argument 1 "
+                         "has %zd", ncols + 1, cols[ncols].length, length);
+            ncols++;
+            goto error;
+        }
+    }
+
+    if (fresult->ct_flags & CT_VOID) {
+        if (out != Py_None) {
+            PyErr_Format(PyExc_TypeError,
+                         "'%s' returns void, 'out' must be None",
+                         cd->c_type->ct_name);
+            goto error;
+        }
+        res = Py_None;
+        Py_INCREF(res);
+        outcol.data = NULL;
+        outcol.stride = 0;
+    }
+    else {
+        if (out == Py_None) {
+            if (length < 0) {
+                PyErr_SetString(PyExc_TypeError,
+                                "call_many() of a function without "
+                                "arguments needs an 'out' buffer");
+                goto error;
+            }
+            res = _new_array_of(fresult, length);
+            if (res == NULL)
+                goto error;
+            out = res;
+            new_out = 1;
+        }
+        else {
+            res = out;
+            Py_INCREF(res);
+        }
+        if (_fetch_column(out, fresult, &outcol, 1, "'out'", 0) < 0)
+            goto error;
+        if (length < 0) {
+            length = outcol.length;
+        }
+        else if (outcol.length != length) {
+            PyErr_Format(PyExc_ValueError,
+                         "'out' has %zd items, but the arguments have %zd",
+                         outcol.length, length);
+            goto error;
+        }
+        resultsize = fresult->ct_size;
+    }
+
+    exchange = cffi_scratch_take(cif_descr->exchange_size);
+    if (exchange == NULL)
+        goto error;
+    buffer = (char *)&exchange->alignment;
+    buffer_array = (void **)buffer;
+    for (i = 0; i < nargs; i++)
+        buffer_array[i] = buffer + cif_descr->exchange_offset_arg[1 + i];
+    rvalue = resultdata = buffer + cif_descr->exchange_offset_arg[0];
+#ifdef WORDS_BIGENDIAN
+    /* see _cdata_call() */
+    if ((fresult->ct_flags & (CT_PRIMITIVE_CHAR | CT_PRIMITIVE_SIGNED |
+                              CT_PRIMITIVE_UNSIGNED)) &&
+            fresult->ct_size < sizeof(ffi_arg))
+        resultdata += (sizeof(ffi_arg) - fresult->ct_size);
+#endif
+    fn = CFFI_CLOSURE_TO_FNPTR(void (*)(void), cd->c_data);
+
+    /* the whole loop runs without the GIL if the Python buffers are
+       all held by a view.  A cdata column is not pinned by anything:
+       another thread could ffi.release() it, so then we keep the GIL.
+       The 'out' array that we allocated ourselves is not visible to
+       other threads yet. */
+    nogil = 1;
+    for (i = 0; i < nargs; i++)
+        if (cols[i].view.obj == NULL)
+            nogil = 0;
+    if (outcol.data != NULL && outcol.view.obj == NULL && !new_out)
+        nogil = 0;
+    if (!nogil) {
+        restore_errno();
+        _call_many_loop(&cif_descr->cif, fn, cols, nargs, &outcol, length,
+                        buffer_array, rvalue, resultdata, resultsize);
+        save_errno();
+    }
+    else {
+        Py_BEGIN_ALLOW_THREADS
+        restore_errno();
+        _call_many_loop(&cif_descr->cif, fn, cols, nargs, &outcol, length,
+                        buffer_array, rvalue, resultdata, resultsize);
+        save_errno();
+        Py_END_ALLOW_THREADS
+    }
+
+    cffi_scratch_give(exchange);
+    goto done;
+
+ error:
+    Py_CLEAR(res);
+ done:
+    if (outcol.view.obj != NULL)
+        PyBuffer_Release(&outcol.view);
+    while (ncols > 0) {
+        ncols--;
+        if (cols[ncols].view.obj != NULL)
+            PyBuffer_Release(&cols[ncols].view);
+    }
+    PyMem_Free(cols);
+    return res;
+}
+
+static int _resolve_field_path(CTypeDescrObject *ct, PyObject *path,
+                               Py_ssize_t *p_offset,
+                               CTypeDescrObject **p_type,
+                               CFieldObject **p_field)
+{
+    /* 'path' is a field name, or several separated with dots to reach
+       into nested structs or unions.  If 'p_field' is not NULL, the last
+       field can be a bitfield, and '*p_field' is set to a new reference
+       to it. */
+    const char *p, *start;
+    Py_ssize_t offset = 0;
+    CFieldObject *cf = NULL;
+    PyObject *d;
+
+    if (!PyText_Check(path)) {
+        PyErr_Format(PyExc_TypeError,
+                     "field names must be strings, not %.200s",
+                     Py_TYPE(path)->tp_name);
+        return -1;
+    }
+    start = p = PyText_AS_UTF8(path);
+    if (p == NULL)
+        return -1;
+    while (1) {
+        const char *end = strchr(p, '.');
+        PyObject *name;
+        int res;
+
+        if (end == NULL)
+            end = p + strlen(p);
+        if (!(ct->ct_flags & (CT_STRUCT | CT_UNION))) {
+            PyErr_Format(PyExc_TypeError,
+                         "field path '%s': '%s' is not a struct or union",
+                         start, ct->ct_name);
+            goto error;
+        }
+        res = force_lazy_struct(ct);
+        if (res < 0)
+            goto error;
+        name = PyText_FromStringAndSize(p, end - p);
+        if (name == NULL)
+            goto error;
+        Py_XDECREF(cf);
+        cf = NULL;
+        if (res > 0) {
+#ifdef Py_GIL_DISABLED
+            d = (PyObject *)cffi_atomic_load((void **)&ct->ct_stuff);
+#else
+            d = ct->ct_stuff;
+#endif
+            if (PyDict_GetItemRef(d, name, (PyObject **)&cf) < 0) {
+                Py_DECREF(name);
+                goto error;
+            }
+        }
+        if (cf == NULL) {
+            PyErr_Format(PyExc_AttributeError,
+                         "field path '%s': '%s' has no field '%s'",
+                         start, ct->ct_name, PyText_AS_UTF8(name));
+            Py_DECREF(name);
+            goto error;
+        }
+        if (cf->cf_bitshift >= 0 && (p_field == NULL || *end != '\0')) {
+            PyErr_Format(PyExc_TypeError,
+                         "field path '%s': '%s' is a bitfield",
+                         start, PyText_AS_UTF8(name));
+            Py_DECREF(name);
+            goto error;
+        }
+        Py_DECREF(name);
+        offset += cf->cf_offset;
+        ct = cf->cf_type;
+        if (*end == '\0')
+            break;
+        p = end + 1;
+    }
+    if (ct->ct_size < 0) {
+        PyErr_Format(PyExc_TypeError,
+                     "field path '%s': '%s' has no known size",
+                     start, ct->ct_name);
+        goto error;
+    }
+    *p_offset = offset;
+    *p_type = ct;
+    if (p_field != NULL)
+        *p_field = cf;
+    else
+        Py_DECREF(cf);
+    return 0;
+
+ error:
+    Py_XDECREF(cf);
+    return -1;
+}
+
+#define UNPACK_FIELDS_BLOCK  512
+
+static PyObject *b_unpack_fields(PyObject *self, PyObject *args,
+                                 PyObject *kwds)
+{
+    CDataObject *cd;
+    CTypeDescrObject *ctitem;
+    PyObject *fields, *out = Py_None, *res = NULL;
+    struct cffi_column_s *cols = NULL;
+    Py_ssize_t *offsets = NULL;
+    Py_ssize_t i, length, nfields, ncols = 0, row, stride;
+    char *src;
+    static char *keywords[] = {"cdata", "length", "fields", "out", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!nO|O:unpack_fields",
+                                     keywords, &CData_Type, &cd, &length,
+                                     &fields, &out))
+        return NULL;
+
+    if (!(cd->c_type->ct_flags & (CT_ARRAY | CT_POINTER)) ||
+        !(cd->c_type->ct_itemdescr->ct_flags & (CT_STRUCT | CT_UNION))) {
+        PyErr_Format(PyExc_TypeError,
+                     "expected a pointer to or array of structs or unions, "
+                     "got '%s'", cd->c_type->ct_name);
+        return NULL;
+    }
+    if (length < 0) {
+        PyErr_SetString(PyExc_ValueError, "'length' cannot be negative");
+        return NULL;
+    }
+    if ((cd->c_type->ct_flags & CT_ARRAY) && length > get_array_length(cd)) {
+        PyErr_Format(PyExc_IndexError,
+                     "'length' is %zd, but the array has only %zd items",
+                     length, get_array_length(cd));
+        return NULL;
+    }
+    if (cd->c_data == NULL && length > 0) {
+        PyErr_SetString(PyExc_RuntimeError,
+                        "cannot use unpack_fields() on a NULL pointer");
+        return NULL;
+    }
+    ctitem = cd->c_type->ct_itemdescr;
+    if (force_lazy_struct(ctitem) < 0)
+        return NULL;
+    stride = ctitem->ct_size;
+
+    fields = PySequence_Fast(fields, "'fields' must be a list of strings");
+    if (fields == NULL)
+        return NULL;
+    nfields = PySequence_Fast_GET_SIZE(fields);
+    if (out != Py_None) {
+        out = PySequence_Fast(out, "'out' must be a list of buffers");
+        if (out == NULL)
+            goto error;
+        if (PySequence_Fast_GET_SIZE(out) != nfields) {
+            PyErr_Format(PyExc_ValueError,
+                         "'out' has %zd items, but there are %zd fields",
+                         PySequence_Fast_GET_SIZE(out), nfields);
+            goto error;
+        }
+    }
+    else
+        Py_INCREF(out);
+    res = PyList_New(nfields);
+    cols = PyMem_Malloc((nfields + 1) * sizeof(struct cffi_column_s));
+    offsets = PyMem_Malloc((nfields + 1) * sizeof(Py_ssize_t));
+    if (res == NULL || cols == NULL || offsets == NULL) {
+        PyErr_NoMemory();
+        goto error;
+    }
+
+    for (ncols = 0; ncols < nfields; ncols++) {
+        CTypeDescrObject *ftype;
+        PyObject *column;
+
+        cols[ncols].view.obj = NULL;
+        if (_resolve_field_path(ctitem,
+                                PySequence_Fast_GET_ITEM(fields, ncols),
+                                &offsets[ncols], &ftype, NULL) < 0)
+            goto error;
+        if (out == Py_None) {
+            PyObject *array = _new_array_of(ftype, length);
+            if (array == NULL)
+                goto error;
+            column = minibuffer_new(((CDataObject *)array)->c_data,
+                                    length * ftype->ct_size, array);
+            Py_DECREF(array);
+            if (column == NULL)
+                goto error;
+            PyList_SET_ITEM(res, ncols, column);
+            if (_minibuffer_set_type((MiniBufferObj *)column, ftype) < 0)
+                goto error;
+            cols[ncols].data = ((MiniBufferObj *)column)->mb_data;
+            cols[ncols].stride = ftype->ct_size;
+            cols[ncols].itemsize = ftype->ct_size;
+        }
+        else {
+            column = PySequence_Fast_GET_ITEM(out, ncols);
+            Py_INCREF(column);
+            PyList_SET_ITEM(res, ncols, column);
+            if (_fetch_column(column, ftype, &cols[ncols], 1,
+                              "'out' column ", ncols) < 0)
+                goto error;
+            if (cols[ncols].length < length) {
+                PyErr_Format(PyExc_ValueError,
+                             "'out' column %zd has %zd items, but 'length' "
+                             "is %zd", ncols, cols[ncols].length, length);
+                ncols++;
+                goto error;
+            }
+        }
+    }
+
+    /* copy by blocks of rows, so that the source structs stay in the
+       cache while we copy every field out of them.  This is done with
+       the GIL: the source cdata is not pinned by anything, and another
+       thread could ffi.release() it if we released the GIL. */
+    src = cd->c_data;
+    for (row = 0; row < length; row += UNPACK_FIELDS_BLOCK) {
+        Py_ssize_t nrows = length - row, j;
+        if (nrows > UNPACK_FIELDS_BLOCK)
+            nrows = UNPACK_FIELDS_BLOCK;
+        for (i = 0; i < nfields; i++) {
+            const char *s = src + row * stride + offsets[i];
+            char *d = cols[i].data + row * cols[i].stride;
+            Py_ssize_t dstride = cols[i].stride;
+
+#define UNPACK_FIELDS_LOOP(size)                                \
+            for (j = 0; j < nrows; j++) {                       \
+                memcpy(d, s, size);                             \
+                s += stride;                                    \
+                d += dstride;                                   \
+            }                                                   \
+            break;
+
+            switch (cols[i].itemsize) {
+            case 1: UNPACK_FIELDS_LOOP(1)
+            case 2: UNPACK_FIELDS_LOOP(2)
+            case 4: UNPACK_FIELDS_LOOP(4)
+            case 8: UNPACK_FIELDS_LOOP(8)
+            case 16: UNPACK_FIELDS_LOOP(16)
+            default: UNPACK_FIELDS_LOOP(cols[i].itemsize)
+            }
+#undef UNPACK_FIELDS_LOOP
+        }
+    }
+    goto done;
+
+ error:
+    Py_CLEAR(res);
+ done:
+    while (ncols > 0) {
+        ncols--;
+        if (cols[ncols].view.obj != NULL)
+            PyBuffer_Release(&cols[ncols].view);
+    }
+    PyMem_Free(cols);
+    PyMem_Free(offsets);
+    Py_XDECREF(out);
+    Py_DECREF(fields);
+    return res;
+}
+
+#undef UNPACK_FIELDS_BLOCK
+
+/* A field accessor, returned by ffi.accessor(struct_type, "a.b.c").
+   The field path is resolved once, when the accessor is created; then
+   reading or writing the field of a struct only checks the type of the
+   cdata and converts the value. */
+typedef struct {
+    PyObject_HEAD
+    CTypeDescrObject *fa_struct;    /* the struct or union type */
+    CFieldObject *fa_field;         /* the last field of the path */
+    PyObject *fa_path;
+    Py_ssize_t fa_offset;           /* of the last field in 'fa_struct' */
+} FieldAccessorObject;
+
+static void fieldaccessor_dealloc(FieldAccessorObject *fa)
+{
+    Py_DECREF(fa->fa_struct);
+    Py_DECREF(fa->fa_field);
+    Py_DECREF(fa->fa_path);
+    PyObject_Del(fa);
+}
+
+static PyObject *fieldaccessor_repr(FieldAccessorObject *fa)
+{
+    return PyText_FromFormat("<accessor '%s' of '%s'>",
+                             PyText_AS_UTF8(fa->fa_path),
+                             fa->fa_struct->ct_name);
+}
+
+static char *_fieldaccessor_data(FieldAccessorObject *fa, PyObject *x,
+                                 int many, Py_ssize_t length)
+{
+    /* Return the address of the struct 'x', which is a struct cdata or a
+       pointer to a struct; with 'many', it is a pointer to or an array
+       of at least 'length' structs. */
+    CTypeDescrObject *ct;
+    char *data;
+
+    if (!CData_Check(x))
+        goto wrong_type;
+    ct = ((CDataObject *)x)->c_type;
+    data = ((CDataObject *)x)->c_data;
+    if (ct == fa->fa_struct && !many)
+        return data;
+    if (!(ct->ct_flags & (many ? CT_POINTER | CT_ARRAY : CT_POINTER)) ||
+            ct->ct_itemdescr != fa->fa_struct)
+        goto wrong_type;
+    if ((ct->ct_flags & CT_ARRAY) &&
+            length > get_array_length((CDataObject *)x)) {
+        PyErr_Format(PyExc_IndexError,
+                     "cannot access %zd items of '%s', which has only %zd",
+                     length, ct->ct_name, get_array_length((CDataObject *)x));
+        return NULL;
+    }
+    if (data == NULL && (length > 0 || !many)) {
+        PyErr_Format(PyExc_RuntimeError,
+                     "cannot read or write the field '%s' of a NULL pointer",
+                     PyText_AS_UTF8(fa->fa_path));
+        return NULL;
+    }
+    return data;
+
+ wrong_type:
+    PyErr_Format(PyExc_TypeError,
+                 "accessor for '%s' cannot be applied to %s%s%s",
+                 fa->fa_struct->ct_name,
+                 CData_Check(x) ? "'" : "",
+                 CData_Check(x) ? ((CDataObject *)x)->c_type->ct_name
+                                : Py_TYPE(x)->tp_name,
+                 CData_Check(x) ? "'" : "");
+    return NULL;
+}
+
+static PyObject *_fieldaccessor_read(FieldAccessorObject *fa, char *data)
+{
+    data += fa->fa_offset;
+    if (fa->fa_field->cf_bitshift >= 0)
+        return convert_to_object_bitfield(data, fa->fa_field);
+    else
+        return convert_to_object(data, fa->fa_field->cf_type);
+}
+
+static int _fieldaccessor_write(FieldAccessorObject *fa, char *data,
+                                PyObject *value)
+{
+    data += fa->fa_offset;
+    if (fa->fa_field->cf_bitshift >= 0)
+        return convert_from_object_bitfield(data, fa->fa_field, value);
+    else
+        return convert_from_object(data, fa->fa_field->cf_type, value);
+}
+
+static PyObject *fieldaccessor_get(FieldAccessorObject *fa, PyObject *x)
+{
+    char *data = _fieldaccessor_data(fa, x, 0, 1);
+    if (data == NULL)
+        return NULL;
+    return _fieldaccessor_read(fa, data);
+}
+
+static PyObject *fieldaccessor_set(FieldAccessorObject *fa, PyObject *args)
+{
+    PyObject *x, *value;
+    char *data;
+
+    if (!PyArg_UnpackTuple(args, "set", 2, 2, &x, &value))
+        return NULL;
+    data = _fieldaccessor_data(fa, x, 0, 1);
+    if (data == NULL)
+        return NULL;
+    if (_fieldaccessor_write(fa, data, value) < 0)
+        return NULL;
+    Py_INCREF(Py_None);
+    return Py_None;
+}
+
+static PyObject *fieldaccessor_get_many(FieldAccessorObject *fa,
+                                        PyObject *args)
+{
+    PyObject *x, *res;
+    Py_ssize_t i, length, stride = fa->fa_struct->ct_size;
+    char *data;
+
+    if (!PyArg_ParseTuple(args, "On:get_many", &x, &length))
+        return NULL;
+    if (length < 0) {
+        PyErr_SetString(PyExc_ValueError, "'length' cannot be negative");
+        return NULL;
+    }
+    data = _fieldaccessor_data(fa, x, 1, length);
+    if (data == NULL)
+        return NULL;
+    res = PyList_New(length);
+    if (res == NULL)
+        return NULL;
+    for (i = 0; i < length; i++) {
+        PyObject *item = _fieldaccessor_read(fa, data);
+        if (item == NULL) {
+            Py_DECREF(res);
+            return NULL;
+        }
+        PyList_SET_ITEM(res, i, item);
+        data += stride;
+    }
+    return res;
+}
+
+static PyObject *fieldaccessor_set_many(FieldAccessorObject *fa,
+                                        PyObject *args)
+{
+    PyObject *x, *values;
+    Py_ssize_t i, length, stride = fa->fa_struct->ct_size;
+    char *data;
+
+    if (!PyArg_UnpackTuple(args, "set_many", 2, 2, &x, &values))
+        return NULL;
+    values = PySequence_Fast(values, "'values' must be a sequence");
+    if (values == NULL)
+        return NULL;
+    length = PySequence_Fast_GET_SIZE(values);
+    data = _fieldaccessor_data(fa, x, 1, length);
+    if (data == NULL)
+        goto error;
+    for (i = 0; i < length; i++) {
+        if (_fieldaccessor_write(fa, data,
+                                 PySequence_Fast_GET_ITEM(values, i)) < 0)
+            goto error;
+        data += stride;
+    }
+    Py_DECREF(values);
+    Py_INCREF(Py_None);
+    return Py_None;
+
+ error:
+    Py_DECREF(values);
+    return NULL;
+}
+
+static PyMethodDef fieldaccessor_methods[] = {
+    {"get",       (PyCFunction)fieldaccessor_get,       METH_O},
+    {"set",       (PyCFunction)fieldaccessor_set,       METH_VARARGS},
+    {"get_many",  (PyCFunction)fieldaccessor_get_many,  METH_VARARGS},
+    {"set_many",  (PyCFunction)fieldaccessor_set_many,  METH_VARARGS},
+    {NULL,        NULL}           /* sentinel */
+};
+
+#define OFF(x) offsetof(FieldAccessorObject, x)
+
+static PyMemberDef fieldaccessor_members[] = {
+    {"struct", T_OBJECT, OFF(fa_struct), READONLY},
+    {"field", T_OBJECT, OFF(fa_field), READONLY},
+    {"path", T_OBJECT, OFF(fa_path), READONLY},
+    {"offset", T_PYSSIZET, OFF(fa_offset), READONLY},
+    {NULL}      /* Sentinel */
+};
+#undef OFF
+
+static PyTypeObject FieldAccessor_Type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "_cffi_ft_backend.__FieldAccessor",     /* tp_name */
+    sizeof(FieldAccessorObject),            /* tp_basicsize */
+    0,                                      /* tp_itemsize */
+    /* methods */
+    (destructor)fieldaccessor_dealloc,      /* tp_dealloc */
+    0,                                      /* tp_print */
+    0,                                      /* tp_getattr */
+    0,                                      /* tp_setattr */
+    0,                                      /* tp_compare */
+    (reprfunc)fieldaccessor_repr,           /* tp_repr */
+    0,                                      /* tp_as_number */
+    0,                                      /* tp_as_sequence */
+    0,                                      /* tp_as_mapping */
+    0,                                      /* tp_hash */
+    0,                                      /* tp_call */
+    0,                                      /* tp_str */
+    PyObject_GenericGetAttr,                /* tp_getattro */
+    0,                                      /* tp_setattro */
+    0,                                      /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT,                     /* tp_flags */
+    0,                                      /* tp_doc */
+    0,                                      /* tp_traverse */
+    0,                                      /* tp_clear */
+    0,                                      /* tp_richcompare */
+    0,                                      /* tp_weaklistoffset */
+    0,                                      /* tp_iter */
+    0,                                      /* tp_iternext */
+    fieldaccessor_methods,                  /* tp_methods */
+    fieldaccessor_members,                  /* tp_members */
+};
+
+static PyObject *direct_accessor(CTypeDescrObject *ct, PyObject *path)
+{
+    FieldAccessorObject *fa;
+    CTypeDescrObject *ftype;
+    CFieldObject *cf;
+    Py_ssize_t offset;
+
+    if ((ct->ct_flags & CT_POINTER) &&
+            (ct->ct_itemdescr->ct_flags & (CT_STRUCT | CT_UNION)))
+        ct = ct->ct_itemdescr;
+    if (!(ct->ct_flags & (CT_STRUCT | CT_UNION))) {
+        PyErr_Format(PyExc_TypeError,
+                     "expected a struct or union type, got '%s'",
+                     ct->ct_name);
+        return NULL;
+    }
+    if (_resolve_field_path(ct, path, &offset, &ftype, &cf) < 0)
+        return NULL;
+
+    fa = PyObject_New(FieldAccessorObject, &FieldAccessor_Type);
+    if (fa == NULL) {
+        Py_DECREF(cf);
+        return NULL;
+    }
+    Py_INCREF(ct);
+    fa->fa_struct = ct;
+    fa->fa_field = cf;     /* new reference */
+    Py_INCREF(path);
+    fa->fa_path = path;
+    fa->fa_offset = offset;
+    return (PyObject *)fa;
+}
+
+static PyObject *b_accessor(PyObject *self, PyObject *args)
+{
+    CTypeDescrObject *ct;
+    PyObject *path;
+
+    if (!PyArg_ParseTuple(args, "O!O:accessor",
+                          &CTypeDescr_Type, &ct, &path))
+        return NULL;
+    return direct_accessor(ct, path);
+}
+
+static PyObject *b_walk(PyObject *self, PyObject *args, PyObject *kwds)
+{
+    CDataObject *cd;
+    CTypeDescrObject *ctitem, *ftype = NULL;
+    PyObject *links, *field = Py_None, *res = NULL;
+    Py_ssize_t *offsets = NULL, foffset = 0;
+    Py_ssize_t i, limit, nlinks, count = 0, allocated = 0, depth = 0;
+    Py_ssize_t stack_allocated;
+    char **nodes = NULL, **stack = NULL;
+    static char *keywords[] = {"start", "link", "limit", "field", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!On|O:walk", keywords,
+                                     &CData_Type, &cd, &links, &limit,
+                                     &field))
+        return NULL;
+
+    if (!(cd->c_type->ct_flags & CT_POINTER) ||
+        !(cd->c_type->ct_itemdescr->ct_flags & (CT_STRUCT | CT_UNION))) {
+        PyErr_Format(PyExc_TypeError,
+                     "expected a pointer to a struct or union, got '%s'",
+                     cd->c_type->ct_name);
+        return NULL;
+    }
+    if (limit < 0) {
+        PyErr_SetString(PyExc_ValueError, "'limit' cannot be negative");
+        return NULL;
+    }
+    ctitem = cd->c_type->ct_itemdescr;
+    if (force_lazy_struct(ctitem) < 0)
+        return NULL;
+
+    /* 'link' is one field name, or a list of them for trees */
+    if (PyText_Check(links))
+        links = PyTuple_Pack(1, links);
+    else
+        links = PySequence_Fast(links,
+                                "'link' must be a string or a list of strings");
+    if (links == NULL)
+        return NULL;
+    nlinks = PySequence_Fast_GET_SIZE(links);
+    offsets = PyMem_Malloc((nlinks + 1) * sizeof(Py_ssize_t));
+    if (offsets == NULL) {
+        PyErr_NoMemory();
+        goto error;
+    }
+    for (i = 0; i < nlinks; i++) {
+        CTypeDescrObject *ltype;
+        PyObject *link = PySequence_Fast_GET_ITEM(links, i);
+        if (_resolve_field_path(ctitem, link, &offsets[i], &ltype, NULL) < 0)
+            goto error;
+        if (!(ltype->ct_flags & CT_POINTER) ||
+                ltype->ct_itemdescr != ctitem) {
+            PyErr_Format(PyExc_TypeError,
+                         "link field '%s' is of type '%s', not '%s'",
+                         PyText_AS_UTF8(link), ltype->ct_name,
+                         cd->c_type->ct_name);
+            goto error;
+        }
+    }
+    if (field != Py_None &&
+            _resolve_field_path(ctitem, field, &foffset, &ftype, NULL) < 0)
+        goto error;
+
+    /* collect the nodes, in depth-first pre-order if there are several
+       links; with only one link, 'stack' never holds more than one node */
+    stack_allocated = nlinks + 1;
+    stack = PyMem_Malloc(stack_allocated * sizeof(char *));
+    if (stack == NULL) {
+        PyErr_NoMemory();
+        goto error;
+    }
+    if (cd->c_data != NULL)
+        stack[depth++] = cd->c_data;
+    while (depth > 0 && count < limit) {
+        char *node = stack[--depth];
+        if (count == allocated) {
+            char **newnodes;
+            allocated = allocated < 16 ? 16 : allocated * 2;
+            if (allocated > limit)
+                allocated = limit;
+            newnodes = PyMem_Realloc(nodes, allocated * sizeof(char *));
+            if (newnodes == NULL) {
+                PyErr_NoMemory();
+                goto error;
+            }
+            nodes = newnodes;
+        }
+        nodes[count++] = node;
+        if (depth + nlinks > stack_allocated) {
+            char **newstack;
+            stack_allocated = (depth + nlinks) * 2;
+            newstack = PyMem_Realloc(stack, stack_allocated * sizeof(char *));
+            if (newstack == NULL) {
+                PyErr_NoMemory();
+                goto error;
+            }
+            stack = newstack;
+        }
+        for (i = nlinks; i > 0; i--) {
+            char *child = *(char **)(node + offsets[i - 1]);
+            if (child != NULL)
+                stack[depth++] = child;
+        }
+    }
+
+    if (ftype == NULL) {
+        res = PyList_New(count);
+        if (res == NULL)
+            goto error;
+        for (i = 0; i < count; i++) {
+            PyObject *x = new_simple_cdata(nodes[i], cd->c_type);
+            if (x == NULL)
+                goto error;
+            PyList_SET_ITEM(res, i, x);
+        }
+    }
+    else {
+        PyObject *array = _new_array_of(ftype, count);
+        char *dest;
+        if (array == NULL)
+            goto error;
+        res = minibuffer_new(((CDataObject *)array)->c_data,
+                             count * ftype->ct_size, array);
+        Py_DECREF(array);
+        if (res == NULL)
+            goto error;
+        if (_minibuffer_set_type((MiniBufferObj *)res, ftype) < 0)
+            goto error;
+        dest = ((MiniBufferObj *)res)->mb_data;
+        for (i = 0; i < count; i++) {
+            memcpy(dest, nodes[i] + foffset, ftype->ct_size);
+            dest += ftype->ct_size;
+        }
+    }
+    goto done;
+
+ error:
+    Py_CLEAR(res);
+ done:
+    PyMem_Free(stack);
+    PyMem_Free(nodes);
+    PyMem_Free(offsets);
+    Py_DECREF(links);
+    return res;
+}
+
+static PyObject *_string_from_chars(const char *data, CTypeDescrObject *ctchar,
+                                    Py_ssize_t maxlen, const char *encoding,
+                                    const char *errors)
+{
+    /* like b_string() on a 'ctchar *' pointing to 'data', or on a
+       'ctchar[maxlen]' if 'maxlen' is not -1 */
+    Py_ssize_t length = 0;
+
+    switch (ctchar->ct_size) {
+    case 1: {
+        if (maxlen < 0) {
+            length = strlen(data);
+        }
+        else {
+            const char *end = (const char *)memchr(data, 0, maxlen);
+            length = end != NULL ? end - data : maxlen;
+        }
+        if (encoding == NULL)
+            return PyBytes_FromStringAndSize(data, length);
+        return PyUnicode_Decode(data, length, encoding, errors);
+    }
+    case 2: {
+        const cffi_char16_t *start = (const cffi_char16_t *)data;
+        while (length != maxlen && start[length])
+            length++;
+        return _my_PyUnicode_FromChar16(start, length);
+    }
+    default: {
+        const cffi_char32_t *start = (const cffi_char32_t *)data;
+        while (length != maxlen && start[length])
+            length++;
+        return _my_PyUnicode_FromChar32(start, length);
+    }
+    }
+}
+
+static PyObject *b_strings(PyObject *self, PyObject *args, PyObject *kwds)
+{
+    CDataObject *cd;
+    CTypeDescrObject *ctitem, *ctfield, *ctchar;
+    PyObject *field = Py_None, *null = Py_None, *res;
+    const char *encoding = NULL, *errors = NULL;
+    Py_ssize_t i, length = -1, offset = 0, maxlen = -1;
+    static char *keywords[] = {"cdata", "length", "field", "encoding",
+                               "errors", "null", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!|nOzzO:strings", keywords,
+                                     &CData_Type, &cd, &length, &field,
+                                     &encoding, &errors, &null))
+        return NULL;
+
+    if (!(cd->c_type->ct_flags & (CT_POINTER | CT_ARRAY))) {
+        PyErr_Format(PyExc_TypeError,
+                     "expected a pointer or array, got '%s'",
+                     cd->c_type->ct_name);
+        return NULL;
+    }
+    ctitem = cd->c_type->ct_itemdescr;
+    ctfield = ctitem;
+    if (field != Py_None) {
+        if (!(ctitem->ct_flags & (CT_STRUCT | CT_UNION))) {
+            PyErr_Format(PyExc_TypeError,
+                         "'field' needs a pointer to or array of structs, "
+                         "got '%s'", cd->c_type->ct_name);
+            return NULL;
+        }
+        if (force_lazy_struct(ctitem) < 0)
+            return NULL;
+        if (_resolve_field_path(ctitem, field, &offset, &ctfield, NULL) < 0)
+            return NULL;
+    }
+
+    /* the items are either 'char *' or 'char[N]', or the same with
+       another character type */
+    if (!(ctfield->ct_flags & (CT_POINTER | CT_ARRAY)) ||
+        !(ctfield->ct_itemdescr->ct_flags & (CT_PRIMITIVE_CHAR |
+                                             CT_PRIMITIVE_SIGNED |
+                                             CT_PRIMITIVE_UNSIGNED)) ||
+        (ctfield->ct_itemdescr->ct_flags & CT_IS_BOOL) ||
+        (ctfield->ct_itemdescr->ct_size != sizeof(char) &&
+         !(ctfield->ct_itemdescr->ct_flags & CT_PRIMITIVE_CHAR))) {
+        PyErr_Format(PyExc_TypeError,
+                     "strings(): expected items of type 'char *' or "
+                     "'char[N]', got '%s'", ctfield->ct_name);
+        return NULL;
+    }
+    ctchar = ctfield->ct_itemdescr;
+    if (encoding != NULL && ctchar->ct_size != sizeof(char)) {
+        PyErr_Format(PyExc_TypeError,
+                     "strings(): 'encoding' cannot be used with '%s'",
+                     ctfield->ct_name);
+        return NULL;
+    }
+    if (ctfield->ct_flags & CT_ARRAY)
+        maxlen = ctfield->ct_length;   /* -1 for 'char[]' */
+
+    if (length < 0) {
+        if (cd->c_type->ct_flags & CT_ARRAY) {
+            length = get_array_length(cd);
+        }
+        else if (field != Py_None || !(ctfield->ct_flags & CT_POINTER)) {
+            PyErr_SetString(PyExc_TypeError,
+                            "strings(): 'length' is required here");
+            return NULL;
+        }
+    }
+    if (cd->c_data == NULL && length != 0) {
+        PyObject *s = cdata_repr(cd);
+        if (s != NULL) {
+            PyErr_Format(PyExc_RuntimeError,
+                         "cannot use strings() on %s", PyText_AS_UTF8(s));
+            Py_DECREF(s);
+        }
+        return NULL;
+    }
+    if (length < 0) {
+        /* a 'char **' terminated by NULL, like 'argv' */
+        char **items = (char **)cd->c_data;
+        length = 0;
+        while (items[length] != NULL)
+            length++;
+    }
+
+    res = PyList_New(length);
+    if (res == NULL)
+        return NULL;
+    for (i = 0; i < length; i++) {
+        char *data = cd->c_data + i * ctitem->ct_size + offset;
+        PyObject *x;
+        if (ctfield->ct_flags & CT_POINTER)
+            data = *(char **)data;
+        if (data == NULL) {
+            x = null;
+            Py_INCREF(x);
+        }
+        else {
+            x = _string_from_chars(data, ctchar, maxlen, encoding, errors);
+            if (x == NULL) {
+                Py_DECREF(res);
+                return NULL;
+            }
+        }
+        PyList_SET_ITEM(res, i, x);
+    }
+    return res;
+}
+
+/************************************************************/
+/* Pools of fixed-size cdata objects, for ffi.new_pool()    */
+
+#define CFFI_POOL_SLAB_SIZE   65536     /* default size of slabs, bytes */
+
+struct cffi_pool_slab_s {
+    struct cffi_pool_slab_s *next;
+    union_alignment alignment;          /* the blocks follow */
+};
+
+typedef struct {
+    PyObject_HEAD
+    CTypeDescrObject *pl_type;    /* 'T *' or 'T[N]' */
+    Py_ssize_t pl_objoffset;      /* offset of the memory-owning cdata */
+    Py_ssize_t pl_dataoffset;     /* offset of the raw data */
+    Py_ssize_t pl_datasize;
+    Py_ssize_t pl_blocksize;
+    Py_ssize_t pl_per_slab;
+    int pl_dont_clear;
+    char *pl_free;                /* released blocks, chained by 1st word */
+    char *pl_bump, *pl_bump_end;  /* never-used blocks of the last slab */
+    struct cffi_pool_slab_s *pl_slabs;
+    Py_ssize_t pl_nslabs, pl_live, pl_high_water, pl_reused;
+#ifdef Py_GIL_DISABLED
+    PyMutex pl_lock;
+#endif
+} PoolObject;
+
+#ifdef Py_GIL_DISABLED
+# define POOL_LOCK(pl)     PyMutex_Lock(&(pl)->pl_lock)
+# define POOL_UNLOCK(pl)   PyMutex_Unlock(&(pl)->pl_lock)
+#else
+# define POOL_LOCK(pl)     /* the GIL protects the pool */
+# define POOL_UNLOCK(pl)
+#endif
+
+typedef struct {
+    CDataObject head;
+    PoolObject *pool;
+    union_alignment alignment;
+} CDataObject_pooled;
+
+typedef struct {
+    CDataObject_own_structptr ptr;    /* the 'struct foo *' returned */
+    CDataObject_pooled obj;           /* the 'struct foo' owning the data */
+} CDataObject_pooled_structptr;
+
+static char *pool_take(PoolObject *pl)
+{
+    char *block;
+
+    POOL_LOCK(pl);
+    block = pl->pl_free;
+    if (block != NULL) {
+        pl->pl_free = *(char **)block;
+        pl->pl_reused++;
+    }
+    else {
+        if (pl->pl_bump == pl->pl_bump_end) {
+            struct cffi_pool_slab_s *slab;
+            slab = malloc(offsetof(struct cffi_pool_slab_s, alignment) +
+                          pl->pl_per_slab * pl->pl_blocksize);
+            if (slab == NULL) {
+                POOL_UNLOCK(pl);
+                PyErr_NoMemory();
+                return NULL;
+            }
+            slab->next = pl->pl_slabs;
+            pl->pl_slabs = slab;
+            pl->pl_nslabs++;
+            pl->pl_bump = (char *)&slab->alignment;
+            pl->pl_bump_end = pl->pl_bump + pl->pl_per_slab * pl->pl_blocksize;
+        }
+        /* blocks never used so far are taken in order from the last slab */
+        block = pl->pl_bump;
+        pl->pl_bump += pl->pl_blocksize;
+    }
+    pl->pl_live++;
+    if (pl->pl_live > pl->pl_high_water)
+        pl->pl_high_water = pl->pl_live;
+    POOL_UNLOCK(pl);
+    return block;
+}
+
+static void pool_give(PoolObject *pl, char *block)
+{
+    POOL_LOCK(pl);
+    *(char **)block = pl->pl_free;
+    pl->pl_free = block;
+    pl->pl_live--;
+    POOL_UNLOCK(pl);
+}
+
+static void cdatapooled_dealloc(CDataObject *cd)
+{
+    PoolObject *pl;
+
+    if (cd->c_weakreflist != NULL)
+        PyObject_ClearWeakRefs((PyObject *) cd);
+
+    if (cd->c_type->ct_flags & CT_IS_PTR_TO_OWNED) {
+        /* the 'struct foo *' at the start of the block: the block goes
+           back to the pool only when the 'struct foo' dies too, which
+           may be right now */
+        PyObject *x = ((CDataObject_own_structptr *)cd)->structobj;
+        Py_DECREF(cd->c_type);
+        Py_DECREF(x);
+        return;
+    }
+    pl = ((CDataObject_pooled *)cd)->pool;
+    Py_DECREF(cd->c_type);
+#ifndef CFFI_MEM_LEAK     /* never release anything, tests only */
+    pool_give(pl, ((char *)cd) - pl->pl_objoffset);
+#endif
+    Py_DECREF(pl);
+}
+
+static PyTypeObject CDataPooled_Type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "_cffi_ft_backend.__CDataPooled",
+    sizeof(CDataObject_pooled),
+    0,
+    (destructor)cdatapooled_dealloc,            /* tp_dealloc */
+    0,                                          /* tp_print */
+    0,                                          /* tp_getattr */
+    0,                                          /* tp_setattr */
+    0,                                          /* tp_compare */
+    0,  /* inherited */                         /* tp_repr */
+    0,  /* inherited */                         /* tp_as_number */
+    0,                                          /* tp_as_sequence */
+    0,  /* inherited */                         /* tp_as_mapping */
+    0,  /* inherited */                         /* tp_hash */
+    0,  /* inherited */                         /* tp_call */
+    0,                                          /* tp_str */
+    0,  /* inherited */                         /* tp_getattro */
+    0,  /* inherited */                         /* tp_setattro */
+    0,                                          /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_CHECKTYPES, /* tp_flags */
+    "This is an internal subtype of _CDataBase for performance only on "
+    "CPython.  Check with isinstance(x, ffi.CData).",   /* tp_doc */
+    0,                                          /* tp_traverse */
+    0,                                          /* tp_clear */
+    0,  /* inherited */                         /* tp_richcompare */
+    0,  /* inherited */                         /* tp_weaklistoffset */
+    0,  /* inherited */                         /* tp_iter */
+    0,                                          /* tp_iternext */
+    0,  /* inherited */                         /* tp_methods */
+    0,                                          /* tp_members */
+    0,                                          /* tp_getset */
+    &CDataOwning_Type,                          /* tp_base */
+};
+
+static void pool_dealloc(PoolObject *pl)
+{
+    /* every pooled cdata keeps the pool alive, so all blocks are free */
+    struct cffi_pool_slab_s *slab = pl->pl_slabs;
+    assert(pl->pl_live == 0);
+    while (slab != NULL) {
+        struct cffi_pool_slab_s *next = slab->next;
+        free(slab);
+        slab = next;
+    }
+    Py_DECREF(pl->pl_type);
+    PyObject_Del(pl);
+}
+
+static PyObject *pool_repr(PoolObject *pl)
+{
+    return PyText_FromFormat("<pool of '%s' with %zd live objects>",
+                             pl->pl_type->ct_name, pl->pl_live);
+}
+
+static PyObject *pool_call(PoolObject *pl, PyObject *args, PyObject *kwds)
+{
+    CTypeDescrObject *ct = pl->pl_type;
+    CDataObject *cd, *cds;
+    PyObject *init = Py_None;
+    char *block;
+    static char *keywords[] = {"init", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|O:pool", keywords, &init))
+        return NULL;
+    block = pool_take(pl);
+    if (block == NULL)
+        return NULL;
+
+    cds = (CDataObject *)(block + pl->pl_objoffset);
+    PyObject_Init((PyObject *)cds, &CDataPooled_Type);
+    Py_INCREF(pl);
+    ((CDataObject_pooled *)cds)->pool = pl;
+    cds->c_data = block + pl->pl_dataoffset;
+    cds->c_weakreflist = NULL;
+    if (!pl->pl_dont_clear)
+        memset(cds->c_data, 0, pl->pl_datasize);
+
+    if (ct->ct_flags & CT_IS_PTR_TO_OWNED) {
+        /* like ffi.new("struct foo *"), there are two objects, but here
+           they are both in the same block */
+        Py_INCREF(ct->ct_itemdescr);
+        cds->c_type = ct->ct_itemdescr;
+        cd = (CDataObject *)block;
+        PyObject_Init((PyObject *)cd, &CDataPooled_Type);
+        cd->c_data = cds->c_data;
+        cd->c_weakreflist = NULL;
+        ((CDataObject_own_structptr *)cd)->structobj = (PyObject *)cds;
+    }
+    else {
+        cd = cds;
+    }
+    Py_INCREF(ct);
+    cd->c_type = ct;
+
+    if (init != Py_None) {
+        if (convert_from_object(cd->c_data,
+              (ct->ct_flags & CT_POINTER) ? ct->ct_itemdescr : ct, init) < 0) {
+            Py_DECREF(cd);
+            return NULL;
+        }
+    }
+    return (PyObject *)cd;
+}
+
+static PyObject *pool_stats(PoolObject *pl, PyObject *noarg)
+{
+    Py_ssize_t nslabs, live, high_water, reused;
+
+    POOL_LOCK(pl);
+    nslabs = pl->pl_nslabs;
+    live = pl->pl_live;
+    high_water = pl->pl_high_water;
+    reused = pl->pl_reused;
+    POOL_UNLOCK(pl);
+    return Py_BuildValue("{sn,sn,sn,sn,sn,sn}",
+                         "slabs", nslabs,
+                         "objects_per_slab", pl->pl_per_slab,
+                         "block_size", pl->pl_blocksize,
+                         "live", live,
+                         "high_water", high_water,
+                         "reused", reused);
+}
+
+static PyMethodDef pool_methods[] = {
+    {"stats",     (PyCFunction)pool_stats,      METH_NOARGS},
+    {NULL,        NULL}           /* sentinel */
+};
+
+static PyMemberDef pool_members[] = {
+    {"type", T_OBJECT, offsetof(PoolObject, pl_type), READONLY},
+    {NULL}      /* Sentinel */
+};
+
+static PyTypeObject Pool_Type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "_cffi_ft_backend.__Pool",              /* tp_name */
+    sizeof(PoolObject),                     /* tp_basicsize */
+    0,                                      /* tp_itemsize */
+    /* methods */
+    (destructor)pool_dealloc,               /* tp_dealloc */
+    0,                                      /* tp_print */
+    0,                                      /* tp_getattr */
+    0,                                      /* tp_setattr */
+    0,                                      /* tp_compare */
+    (reprfunc)pool_repr,                    /* tp_repr */
+    0,                                      /* tp_as_number */
+    0,                                      /* tp_as_sequence */
+    0,                                      /* tp_as_mapping */
+    0,                                      /* tp_hash */
+    (ternaryfunc)pool_call,                 /* tp_call */
+    0,                                      /* tp_str */
+    PyObject_GenericGetAttr,                /* tp_getattro */
+    0,                                      /* tp_setattro */
+    0,                                      /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT,                     /* tp_flags */
+    0,                                      /* tp_doc */
+    0,                                      /* tp_traverse */
+    0,                                      /* tp_clear */
+    0,                                      /* tp_richcompare */
+    0,                                      /* tp_weaklistoffset */
+    0,                                      /* tp_iter */
+    0,                                      /* tp_iternext */
+    pool_methods,                           /* tp_methods */
+    pool_members,                           /* tp_members */
+};
+
+static PyObject *direct_new_pool(CTypeDescrObject *ct, Py_ssize_t per_slab,
+                                 int dont_clear)
+{
+    PoolObject *pl;
+    CTypeDescrObject *ctitem;
+    Py_ssize_t objoffset = 0, datasize, blocksize;
+    const Py_ssize_t align = sizeof(union_alignment);
+
+    if (ct->ct_flags & CT_POINTER) {
+        ctitem = ct->ct_itemdescr;
+        if (ctitem->ct_flags & (CT_STRUCT | CT_UNION)) {
+            if (force_lazy_struct(ctitem) < 0)
+                return NULL;
+            if (cffi_check_flag(ctitem->ct_with_var_array)) {
+                PyErr_Format(PyExc_TypeError,
+                             "cannot make a pool of '%s', which has a "
+                             "varsize array member", ctitem->ct_name);
+                return NULL;
+            }
+        }
+        datasize = cffi_get_size(ctitem);
+        if (datasize < 0) {
+            PyErr_Format(PyExc_TypeError,
+                         "cannot instantiate ctype '%s' of unknown size",
+                         ctitem->ct_name);
+            return NULL;
+        }
+        if (ctitem->ct_flags & CT_PRIMITIVE_CHAR)
+            datasize *= 2;   /* forcefully add another character: a null */
+        if (ct->ct_flags & CT_IS_PTR_TO_OWNED)
+            objoffset = offsetof(CDataObject_pooled_structptr, obj);
+    }
+    else if (ct->ct_flags & CT_ARRAY) {
+        datasize = ct->ct_size;
+        if (datasize < 0) {
+            PyErr_Format(PyExc_TypeError,
+                         "cannot make a pool of '%s': the length of the "
+                         "array must be fixed", ct->ct_name);
+            return NULL;
+        }
+    }
+    else {
+        PyErr_Format(PyExc_TypeError,
+                     "expected a pointer or array ctype, got '%s'",
+                     ct->ct_name);
+        return NULL;
+    }
+    if (per_slab < 0) {
+        PyErr_SetString(PyExc_ValueError,
+                        "'objects_per_slab' cannot be negative");
+        return NULL;
+    }
+
+    blocksize = objoffset + offsetof(CDataObject_pooled, alignment);
+    if (datasize > PY_SSIZE_T_MAX - blocksize - align)
+        goto too_big;
+    blocksize = (blocksize + datasize + align - 1) / align * align;
+    if (per_slab == 0) {
+        per_slab = CFFI_POOL_SLAB_SIZE / blocksize;
+        if (per_slab < 8)
+            per_slab = 8;
+    }
+    if (per_slab > (PY_SSIZE_T_MAX - (Py_ssize_t)sizeof(
+                           struct cffi_pool_slab_s)) / blocksize)
+        goto too_big;
+
+    pl = PyObject_New(PoolObject, &Pool_Type);
+    if (pl == NULL)
+        return NULL;
+    Py_INCREF(ct);
+    pl->pl_type = ct;
+    pl->pl_objoffset = objoffset;
+    pl->pl_dataoffset = objoffset + offsetof(CDataObject_pooled, alignment);
+    pl->pl_datasize = datasize;
+    pl->pl_blocksize = blocksize;
+    pl->pl_per_slab = per_slab;
+    pl->pl_dont_clear = dont_clear;
+    pl->pl_free = NULL;
+    pl->pl_bump = NULL;
+    pl->pl_bump_end = NULL;
+    pl->pl_slabs = NULL;
+    pl->pl_nslabs = 0;
+    pl->pl_live = 0;
+    pl->pl_high_water = 0;
+    pl->pl_reused = 0;
+#ifdef Py_GIL_DISABLED
+    memset(&pl->pl_lock, 0, sizeof(PyMutex));
+#endif
+    return (PyObject *)pl;
+
+ too_big:
+    PyErr_SetString(PyExc_OverflowError, "pool slabs would be too large");
+    return NULL;
+}
+
+static PyObject *b_new_pool(PyObject *self, PyObject *args, PyObject *kwds)
+{
+    CTypeDescrObject *ct;
+    Py_ssize_t per_slab = 0;
+    int should_clear_after_alloc = 1;
+    static char *keywords[] = {"cdecl", "objects_per_slab",
+                               "should_clear_after_alloc", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!|ni:new_pool", keywords,
+                                     &CTypeDescr_Type, &ct, &per_slab,
+                                     &should_clear_after_alloc))
+        return NULL;
+    return direct_new_pool(ct, per_slab, !should_clear_after_alloc);
+}
+
+/************************************************************/
+/* Arenas, for ffi.new_arena()                              */
+
+#define CFFI_ARENA_CHUNK_SIZE   65536   /* default size of chunks, bytes */
+
+struct cffi_arena_chunk_s {
+    struct cffi_arena_chunk_s *next;
+    union_alignment alignment;          /* the data follows */
+};
+
+typedef struct {
+    PyObject_HEAD
+    PyObject *ar_typeof;          /* to turn strings into ctypes, or NULL */
+    Py_ssize_t ar_chunk_size;
+    struct cffi_arena_chunk_s *ar_chunks;
+    char *ar_next, *ar_end;       /* free part of the current chunk */
+    Py_ssize_t ar_nchunks, ar_bytes, ar_live;
+    PyObject **ar_objects;        /* the live cdata objects, or NULLs */
+    Py_ssize_t ar_nobjects, ar_objects_allocated;
+    int ar_closed;
+#ifdef Py_GIL_DISABLED
+    PyMutex ar_lock;
+#endif
+} ArenaObject;
+
+#ifdef Py_GIL_DISABLED
+# define ARENA_LOCK(ar)    PyMutex_Lock(&(ar)->ar_lock)
+# define ARENA_UNLOCK(ar)  PyMutex_Unlock(&(ar)->ar_lock)
+#else
+# define ARENA_LOCK(ar)    /* the GIL protects the arena */
+# define ARENA_UNLOCK(ar)
+#endif
+
+typedef struct {
+    CDataObject head;
+    Py_ssize_t length;     /* same as CDataObject_own_length up to here */
+    ArenaObject *arena;
+    Py_ssize_t index;      /* in arena->ar_objects */
+} CDataObject_arena;
+
+static char *arena_alloc(ArenaObject *ar, Py_ssize_t size)
+{
+    /* must be called with the lock */
+    struct cffi_arena_chunk_s *chunk;
+    const Py_ssize_t align = sizeof(union_alignment);
+    Py_ssize_t chunk_size = ar->ar_chunk_size;
+    int dedicated;
+    char *result;
+
+    if (size > PY_SSIZE_T_MAX - align - (Py_ssize_t)sizeof(*chunk))
+        return NULL;
+    size = size > 0 ? (size + align - 1) / align * align : align;
+    if (size <= ar->ar_end - ar->ar_next) {
+        result = ar->ar_next;
+        ar->ar_next += size;
+        ar->ar_bytes += size;
+        return result;
+    }
+    /* big requests get a chunk of their own, and the current chunk
+       stays in use for the following small ones */
+    dedicated = size > chunk_size / 4;
+    if (dedicated)
+        chunk_size = size;
+    chunk = malloc(offsetof(struct cffi_arena_chunk_s, alignment) +
+                   chunk_size);
+    if (chunk == NULL)
+        return NULL;
+    chunk->next = ar->ar_chunks;
+    ar->ar_chunks = chunk;
+    ar->ar_nchunks++;
+    ar->ar_bytes += size;
+    result = (char *)&chunk->alignment;
+    if (!dedicated) {
+        ar->ar_next = result + size;
+        ar->ar_end = result + chunk_size;
+    }
+    return result;
+}
+
+static int arena_register(ArenaObject *ar, CDataObject_arena *cd)
+{
+    /* must be called with the lock */
+    if (ar->ar_nobjects == ar->ar_objects_allocated) {
+        /* first drop the objects that died, if there are enough */
+        Py_ssize_t i, j = 0;
+        if (ar->ar_live < ar->ar_nobjects / 2) {
+            for (i = 0; i < ar->ar_nobjects; i++) {
+                PyObject *x = ar->ar_objects[i];
+                if (x != NULL) {
+                    ((CDataObject_arena *)x)->index = j;
+                    ar->ar_objects[j++] = x;
+                }
+            }
+            ar->ar_nobjects = j;
+        }
+        else {
+            PyObject **newobjects;
+            Py_ssize_t allocated = ar->ar_objects_allocated * 2 + 16;
+            newobjects = PyMem_Realloc(ar->ar_objects,
+                                       allocated * sizeof(PyObject *));
+            if (newobjects == NULL)
+                return -1;
+            ar->ar_objects = newobjects;
+            ar->ar_objects_allocated = allocated;
+        }
+    }
+    cd->index = ar->ar_nobjects;
+    ar->ar_objects[ar->ar_nobjects++] = (PyObject *)cd;
+    ar->ar_live++;
+    return 0;
+}
+
+static void arena_close(ArenaObject *ar)
+{
+    struct cffi_arena_chunk_s *chunk;
+    Py_ssize_t i;
+
+    ARENA_LOCK(ar);
+    if (ar->ar_closed) {
+        ARENA_UNLOCK(ar);
+        return;
+    }
+    ar->ar_closed = 1;
+    /* the objects that are still alive cannot be used any more.  They
+       keep their old address in 'c_data', which is never read again,
+       apart from hashing and comparing them.  Changing their type is
+       not synchronized with other threads that use them at the same
+       time: the documentation says that close() must not race with
+       them.  (Taking the critical section of each object would not be
+       enough anyway, because most uses of a cdata don't take it.) */
+    for (i = 0; i < ar->ar_nobjects; i++) {
+        CDataObject *cd = (CDataObject *)ar->ar_objects[i];
+        if (cd != NULL)
+            Py_SET_TYPE(cd, &CDataArenaClosed_Type);
+    }
+    PyMem_Free(ar->ar_objects);
+    ar->ar_objects = NULL;
+    ar->ar_nobjects = 0;
+    ar->ar_objects_allocated = 0;
+    ar->ar_live = 0;
+
+    chunk = ar->ar_chunks;
+    while (chunk != NULL) {
+        struct cffi_arena_chunk_s *next = chunk->next;
+        free(chunk);
+        chunk = next;
+    }
+    ar->ar_chunks = NULL;
+    ar->ar_next = NULL;
+    ar->ar_end = NULL;
+    ARENA_UNLOCK(ar);
+}
+
+static void cdataarena_dealloc(CDataObject *cd)
+{
+    ArenaObject *ar = ((CDataObject_arena *)cd)->arena;
+
+    if (cd->c_weakreflist != NULL)
+        PyObject_ClearWeakRefs((PyObject *) cd);
+
+    ARENA_LOCK(ar);
+    if (Py_TYPE(cd) == &CDataArena_Type) {     /* else, arena closed */
+        ar->ar_objects[((CDataObject_arena *)cd)->index] = NULL;
+        ar->ar_live--;
+    }
+    ARENA_UNLOCK(ar);
+    Py_DECREF(cd->c_type);
+    PyObject_Del(cd);
+    Py_DECREF(ar);
+}
 
-    Py_INCREF(ct);
-    cd->c_type = ct;
-    cd->c_data = view->buf;
-    cd->c_weakreflist = NULL;
-    ((CDataObject_frombuf *)cd)->length = arraylength;
-    ((CDataObject_frombuf *)cd)->bufferview = view;
-    PyObject_GC_Track(cd);
-    return (PyObject *)cd;
+static PyObject *cdataarena_repr(CDataObject *cd)
+{
+    return PyText_FromFormat("<cdata '%s' owning %zd bytes in an arena>",
+                             cd->c_type->ct_name, cdataowning_size_bytes(cd));
+}
 
- error2:
-    PyBuffer_Release(view);
- error1:
-    PyObject_Free(view);
+static PyObject *cdataarenaclosed_repr(CDataObject *cd)
+{
+    return PyText_FromFormat("<cdata '%s' from a closed arena>",
+                             cd->c_type->ct_name);
+}
+
+static PyObject *_cdataarenaclosed_error(void)
+{
+    PyErr_SetString(PyExc_ValueError,
+                    "cdata object used after its arena was closed");
     return NULL;
 }
 
-static PyObject *b_from_buffer(PyObject *self, PyObject *args)
+static PyObject *cdataarenaclosed_getattro(PyObject *cd, PyObject *attr)
 {
-    CTypeDescrObject *ct;
-    PyObject *x;
-    int require_writable = 0;
+    /* special attributes like '__class__' still work */
+    if (PyText_Check(attr) && strncmp(PyText_AS_UTF8(attr), "__", 2) == 0)
+        return PyObject_GenericGetAttr(cd, attr);
+    return _cdataarenaclosed_error();
+}
 
-    if (!PyArg_ParseTuple(args, "O!O|i", &CTypeDescr_Type, &ct, &x,
-                          &require_writable))
-        return NULL;
+static Py_ssize_t cdataarenaclosed_length(PyObject *cd)
+{
+    _cdataarenaclosed_error();
+    return -1;
+}
 
-    return direct_from_buffer(ct, x, require_writable);
+static PyObject *cdataarenaclosed_subscript(PyObject *cd, PyObject *key)
+{
+    return _cdataarenaclosed_error();
 }
 
-static int _fetch_as_buffer(PyObject *x, Py_buffer *view, int writable_only)
+static int cdataarenaclosed_ass_sub(PyObject *cd, PyObject *key, PyObject *v)
 {
-    if (CData_Check(x)) {
-        CTypeDescrObject *ct = ((CDataObject *)x)->c_type;
-        if (!(ct->ct_flags & (CT_POINTER|CT_ARRAY))) {
-            PyErr_Format(PyExc_TypeError,
-                         "expected a pointer or array ctype, got '%s'",
-                         ct->ct_name);
-            return -1;
+    _cdataarenaclosed_error();
+    return -1;
+}
+
+static Py_hash_t cdataarenaclosed_hash(PyObject *cd)
+{
+    /* same as cdata_hash() on the pointer or array that it was, so that
+       it can still be found in dicts and sets */
+#if PY_VERSION_HEX < 0x030D0000
+    return _Py_HashPointer(((CDataObject *)cd)->c_data);
+#else
+    return Py_HashPointer(((CDataObject *)cd)->c_data);
+#endif
+}
+
+static PyObject *cdataarenaclosed_richcompare(PyObject *v, PyObject *w,
+                                              int op)
+{
+    /* like cdata_richcompare(): compare the addresses, with another
+       cdata pointer or array or with another invalidated object */
+    char *v_cdata = ((CDataObject *)v)->c_data;
+    char *w_cdata;
+    PyObject *pyres;
+
+    if (Py_TYPE(w) == &CDataArenaClosed_Type ||
+            (CData_Check(w) &&
+             !(((CDataObject *)w)->c_type->ct_flags & CT_PRIMITIVE_ANY))) {
+        w_cdata = ((CDataObject *)w)->c_data;
+        switch (op) {
+        case Py_EQ: pyres = (v_cdata == w_cdata) ? Py_True : Py_False; break;
+        case Py_NE: pyres = (v_cdata != w_cdata) ? Py_True : Py_False; break;
+        case Py_LT: pyres = (v_cdata <  w_cdata) ? Py_True : Py_False; break;
+        case Py_LE: pyres = (v_cdata <= w_cdata) ? Py_True : Py_False; break;
+        case Py_GT: pyres = (v_cdata >  w_cdata) ? Py_True : Py_False; break;
+        case Py_GE: pyres = (v_cdata >= w_cdata) ? Py_True : Py_False; break;
+        default: pyres = Py_NotImplemented;
         }
-        view->buf = ((CDataObject *)x)->c_data;
-        view->obj = NULL;
-        return 0;
-    }
-    else {
-        return _my_PyObject_GetContiguousBuffer(x, view, writable_only);
     }
+    else
+        pyres = Py_NotImplemented;
+    Py_INCREF(pyres);
+    return pyres;
 }
 
-static PyObject *b_memmove(PyObject *self, PyObject *args, PyObject *kwds)
+static PyMappingMethods CDataArenaClosed_as_mapping = {
+    (lenfunc)cdataarenaclosed_length, /*mp_length*/
+    (binaryfunc)cdataarenaclosed_subscript, /*mp_subscript*/
+    (objobjargproc)cdataarenaclosed_ass_sub, /*mp_ass_subscript*/
+};
+
+static PyTypeObject CDataArena_Type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "_cffi_ft_backend.__CDataArena",
+    sizeof(CDataObject_arena),
+    0,
+    (destructor)cdataarena_dealloc,             /* tp_dealloc */
+    0,                                          /* tp_print */
+    0,                                          /* tp_getattr */
+    0,                                          /* tp_setattr */
+    0,                                          /* tp_compare */
+    (reprfunc)cdataarena_repr,                  /* tp_repr */
+    0,  /* inherited */                         /* tp_as_number */
+    0,                                          /* tp_as_sequence */
+    0,  /* inherited */                         /* tp_as_mapping */
+    0,  /* inherited */                         /* tp_hash */
+    0,  /* inherited */                         /* tp_call */
+    0,                                          /* tp_str */
+    0,  /* inherited */                         /* tp_getattro */
+    0,  /* inherited */                         /* tp_setattro */
+    0,                                          /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_CHECKTYPES, /* tp_flags */
+    "This is an internal subtype of _CDataBase for performance only on "
+    "CPython.  Check with isinstance(x, ffi.CData).",   /* tp_doc */
+    0,                                          /* tp_traverse */
+    0,                                          /* tp_clear */
+    0,  /* inherited */                         /* tp_richcompare */
+    0,  /* inherited */                         /* tp_weaklistoffset */
+    0,  /* inherited */                         /* tp_iter */
+    0,                                          /* tp_iternext */
+    0,  /* inherited */                         /* tp_methods */
+    0,                                          /* tp_members */
+    0,                                          /* tp_getset */
+    &CData_Type,                                /* tp_base */
+};
+
+/* the type of the objects that were still alive when their arena was
+   closed: they are not instances of _CDataBase any more, and using them
+   raises ValueError */
+static PyTypeObject CDataArenaClosed_Type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "_cffi_ft_backend.__CDataArenaClosed",
+    sizeof(CDataObject_arena),
+    0,
+    (destructor)cdataarena_dealloc,             /* tp_dealloc */
+    0,                                          /* tp_print */
+    0,                                          /* tp_getattr */
+    0,                                          /* tp_setattr */
+    0,                                          /* tp_compare */
+    (reprfunc)cdataarenaclosed_repr,            /* tp_repr */
+    0,                                          /* tp_as_number */
+    0,                                          /* tp_as_sequence */
+    &CDataArenaClosed_as_mapping,               /* tp_as_mapping */
+    cdataarenaclosed_hash,                      /* tp_hash */
+    0,                                          /* tp_call */
+    0,                                          /* tp_str */
+    cdataarenaclosed_getattro,                  /* tp_getattro */
+    0,                                          /* tp_setattro */
+    0,                                          /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT,                         /* tp_flags */
+    0,                                          /* tp_doc */
+    0,                                          /* tp_traverse */
+    0,                                          /* tp_clear */
+    cdataarenaclosed_richcompare,               /* tp_richcompare */
+    offsetof(CDataObject, c_weakreflist),       /* tp_weaklistoffset */
+};
+
+static void arena_dealloc(ArenaObject *ar)
 {
-    PyObject *dest_obj, *src_obj;
-    Py_buffer dest_view, src_view;
-    Py_ssize_t n;
-    static char *keywords[] = {"dest", "src", "n", NULL};
+    /* every cdata from the arena keeps it alive, so they are all dead */
+    arena_close(ar);
+    Py_XDECREF(ar->ar_typeof);
+    PyObject_Del(ar);
+}
+
+static PyObject *arena_repr(ArenaObject *ar)
+{
+    if (ar->ar_closed)
+        return PyText_FromFormat("<closed arena>");
+    return PyText_FromFormat("<arena with %zd live objects>", ar->ar_live);
+}
+
+static PyObject *arena_new(ArenaObject *ar, PyObject *args, PyObject *kwds)
+{
+    PyObject *arg, *init = Py_None;
+    CTypeDescrObject *ct;
+    CDataObject_arena *cd;
+    Py_ssize_t datasize, explicitlength;
+    char *data;
+    static char *keywords[] = {"cdecl", "init", NULL};
 
-    if (!PyArg_ParseTupleAndKeywords(args, kwds, "OOn", keywords,
-                                     &dest_obj, &src_obj, &n))
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|O:new", keywords,
+                                     &arg, &init))
         return NULL;
-    if (n < 0) {
-        PyErr_SetString(PyExc_ValueError, "negative size");
+    if (CTypeDescr_Check(arg)) {
+        ct = (CTypeDescrObject *)arg;
+        Py_INCREF(ct);
+    }
+    else if (ar->ar_typeof != NULL) {
+        ct = (CTypeDescrObject *)PyObject_CallFunctionObjArgs(ar->ar_typeof,
+                                                              arg, NULL);
+        if (ct == NULL)
+            return NULL;
+        if (!CTypeDescr_Check(ct)) {
+            PyErr_Format(PyExc_TypeError,
+                         "typeof() must return a ctype object, not %.200s",
+                         Py_TYPE(ct)->tp_name);
+            Py_DECREF(ct);
+            return NULL;
+        }
+    }
+    else {
+        PyErr_Format(PyExc_TypeError, "expected a ctype object, got %.200s",
+                     Py_TYPE(arg)->tp_name);
         return NULL;
     }
 
-    if (_fetch_as_buffer(src_obj, &src_view, 0) < 0) {
-        return NULL;
+    datasize = get_new_data_size(ct, &init, &explicitlength);
+    if (datasize < 0)
+        goto error;
+    cd = PyObject_New(CDataObject_arena, &CDataArena_Type);
+    if (cd == NULL)
+        goto error;
+
+    ARENA_LOCK(ar);
+    if (ar->ar_closed) {
+        ARENA_UNLOCK(ar);
+        PyObject_Del(cd);
+        PyErr_SetString(PyExc_ValueError, "the arena is closed");
+        goto error;
     }
-    if (_fetch_as_buffer(dest_obj, &dest_view, 1) < 0) {
-        PyBuffer_Release(&src_view);
-        return NULL;
+    data = arena_alloc(ar, datasize);
+    if (data == NULL || arena_register(ar, cd) < 0) {
+        ARENA_UNLOCK(ar);
+        PyObject_Del(cd);
+        PyErr_NoMemory();
+        goto error;
     }
+    ARENA_UNLOCK(ar);
 
-    memmove(dest_view.buf, src_view.buf, n);
+    memset(data, 0, datasize);
+    Py_INCREF(ar);
+    cd->arena = ar;
+    if ((ct->ct_flags & CT_POINTER) &&
+            cffi_check_flag(ct->ct_itemdescr->ct_with_var_array))
+        cd->length = datasize;      /* see _cdata_var_byte_size() */
+    else
+        cd->length = explicitlength;
+    cd->head.c_type = ct;      /* steals the reference */
+    cd->head.c_data = data;
+    cd->head.c_weakreflist = NULL;
 
-    PyBuffer_Release(&dest_view);
-    PyBuffer_Release(&src_view);
+    if (init != Py_None) {
+        if (convert_from_object(data,
+              (ct->ct_flags & CT_POINTER) ? ct->ct_itemdescr : ct, init) < 0) {
+            Py_DECREF(cd);
+            return NULL;
+        }
+    }
+    return (PyObject *)cd;
+
+ error:
+    Py_DECREF(ct);
+    return NULL;
+}
+
+static PyObject *arena_close_meth(ArenaObject *ar, PyObject *noarg)
+{
+    arena_close(ar);
+    Py_INCREF(Py_None);
+    return Py_None;
+}
+
+static PyObject *arena_enter(ArenaObject *ar, PyObject *noarg)
+{
+    Py_INCREF(ar);
+    return (PyObject *)ar;
+}
+
+static PyObject *arena_exit(ArenaObject *ar, PyObject *args)
+{
+    /* 'args' ignored */
+    arena_close(ar);
     Py_INCREF(Py_None);
     return Py_None;
 }
 
+static PyObject *arena_stats(ArenaObject *ar, PyObject *noarg)
+{
+    Py_ssize_t nchunks, nbytes, live;
+
+    ARENA_LOCK(ar);
+    nchunks = ar->ar_nchunks;
+    nbytes = ar->ar_bytes;
+    live = ar->ar_live;
+    ARENA_UNLOCK(ar);
+    return Py_BuildValue("{sn,sn,sn,sO}",
+                         "chunks", nchunks,
+                         "bytes", nbytes,
+                         "live", live,
+                         "closed", ar->ar_closed ? Py_True : Py_False);
+}
+
+static PyMethodDef arena_methods[] = {
+    {"new",       (PyCFunction)arena_new,        METH_VARARGS | METH_KEYWORDS},
+    {"close",     (PyCFunction)arena_close_meth, METH_NOARGS},
+    {"stats",     (PyCFunction)arena_stats,      METH_NOARGS},
+    {"__enter__", (PyCFunction)arena_enter,      METH_NOARGS},
+    {"__exit__",  (PyCFunction)arena_exit,       METH_VARARGS},
+    {NULL,        NULL}           /* sentinel */
+};
+
+static PyTypeObject Arena_Type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "_cffi_ft_backend.__Arena",             /* tp_name */
+    sizeof(ArenaObject),                    /* tp_basicsize */
+    0,                                      /* tp_itemsize */
+    /* methods */
+    (destructor)arena_dealloc,              /* tp_dealloc */
+    0,                                      /* tp_print */
+    0,                                      /* tp_getattr */
+    0,                                      /* tp_setattr */
+    0,                                      /* tp_compare */
+    (reprfunc)arena_repr,                   /* tp_repr */
+    0,                                      /* tp_as_number */
+    0,                                      /* tp_as_sequence */
+    0,                                      /* tp_as_mapping */
+    0,                                      /* tp_hash */
+    0,                                      /* tp_call */
+    0,                                      /* tp_str */
+    PyObject_GenericGetAttr,                /* tp_getattro */
+    0,                                      /* tp_setattro */
+    0,                                      /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT,                     /* tp_flags */
+    0,                                      /* tp_doc */
+    0,                                      /* tp_traverse */
+    0,                                      /* tp_clear */
+    0,                                      /* tp_richcompare */
+    0,                                      /* tp_weaklistoffset */
+    0,                                      /* tp_iter */
+    0,                                      /* tp_iternext */
+    arena_methods,                          /* tp_methods */
+};
+
+static PyObject *direct_new_arena(Py_ssize_t chunk_size, PyObject *typeof_fn)
+{
+    ArenaObject *ar;
+
+    if (chunk_size < 0) {
+        PyErr_SetString(PyExc_ValueError, "'chunk_size' cannot be negative");
+        return NULL;
+    }
+    ar = PyObject_New(ArenaObject, &Arena_Type);
+    if (ar == NULL)
+        return NULL;
+    Py_XINCREF(typeof_fn);
+    ar->ar_typeof = typeof_fn;
+    ar->ar_chunk_size = chunk_size > 0 ? chunk_size : CFFI_ARENA_CHUNK_SIZE;
+    ar->ar_chunks = NULL;
+    ar->ar_next = NULL;
+    ar->ar_end = NULL;
+    ar->ar_nchunks = 0;
+    ar->ar_bytes = 0;
+    ar->ar_live = 0;
+    ar->ar_objects = NULL;
+    ar->ar_nobjects = 0;
+    ar->ar_objects_allocated = 0;
+    ar->ar_closed = 0;
+#ifdef Py_GIL_DISABLED
+    memset(&ar->ar_lock, 0, sizeof(PyMutex));
+#endif
+    return (PyObject *)ar;
+}
+
+static PyObject *b_new_arena(PyObject *self, PyObject *args, PyObject *kwds)
+{
+    Py_ssize_t chunk_size = 0;
+    PyObject *typeof_fn = Py_None;
+    static char *keywords[] = {"chunk_size", "typeof", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|nO:new_arena", keywords,
+                                     &chunk_size, &typeof_fn))
+        return NULL;
+    if (typeof_fn == Py_None)
+        typeof_fn = NULL;
+    return direct_new_arena(chunk_size, typeof_fn);
+}
+
+static PyObject *b__cdata_freelist_stats(PyObject *self, PyObject *noarg)
+{
+    /* the counters of the current thread */
+    struct cffi_tls_s *tls = get_cffi_tls();
+    Py_ssize_t orphans;
+    if (tls == NULL)
+        return PyErr_NoMemory();
+    TLS_ZOM_LOCK();
+    orphans = cdata_orphans_count;
+    TLS_ZOM_UNLOCK();
+    return Py_BuildValue("{sn,sn,sn,sn,sn,sn}",
+                         "size", tls->free_cdata_count,
+                         "max_size", cdata_freelist_max,
+                         "reused", tls->cdata_reused,
+                         "allocated", tls->cdata_allocated,
+                         "released", tls->cdata_released,
+                         "orphans", orphans);
+}
+
+static PyObject *b__set_cdata_freelist_max(PyObject *self, PyObject *arg)
+{
+    Py_ssize_t old = cdata_freelist_max;
+    Py_ssize_t value = PyNumber_AsSsize_t(arg, PyExc_OverflowError);
+    if (value == -1 && PyErr_Occurred())
+        return NULL;
+    if (value < 0) {
+        PyErr_SetString(PyExc_ValueError, "negative freelist size");
+        return NULL;
+    }
+    cdata_freelist_max = value;
+    return PyInt_FromSsize_t(old);
+}
+
 static PyObject *b__get_types(PyObject *self, PyObject *noarg)
 {
     return PyTuple_Pack(2, (PyObject *)&CData_Type,
@@ -7626,12 +11897,13 @@ static PyObject *b_gcp(PyObject *self, PyObject *args, PyObject *kwds)
     CDataObject *cd;
     CDataObject *origobj;
     PyObject *destructor;
-    Py_ssize_t ignored;   /* for pypy */
-    static char *keywords[] = {"cdata", "destructor", "size", NULL};
+    Py_ssize_t size = 0;
+    int defer = 0;
+    static char *keywords[] = {"cdata", "destructor", "size", "defer", NULL};
 
-    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!O|n:gc", keywords,
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!O|ni:gc", keywords,
                                      &CData_Type, &origobj, &destructor,
-                                     &ignored))
+                                     &size, &defer))
         return NULL;
 
     if (destructor == Py_None) {
@@ -7642,13 +11914,81 @@ static PyObject *b_gcp(PyObject *self, PyObject *args, PyObject *kwds)
 	    return NULL;
 	}
 	Py_CLEAR(((CDataObject_gcp *)origobj)->destructor);
+	cdatagcp_release_size((CDataObject_gcp *)origobj);
 	Py_RETURN_NONE;
     }
 
     cd = allocate_gcp_object(origobj, origobj->c_type, destructor);
+    if (cd == NULL)
+        return NULL;
+    if (defer)
+        ((CDataObject_gcp *)cd)->flags |= GCP_DEFERRED;
+    if (size > 0) {
+        ((CDataObject_gcp *)cd)->size = size;
+        cdata_memory_acquire(cd, size);
+    }
     return (PyObject *)cd;
 }
 
+static PyObject *b_gc_flush(PyObject *self, PyObject *noarg)
+{
+    return PyInt_FromSsize_t(gc_deferred_flush());
+}
+
+static PyObject *b_set_memory_pressure(PyObject *self, PyObject *args,
+                                       PyObject *kwds)
+{
+    Py_ssize_t threshold;
+    PyObject *callback = Py_None, *old_callback;
+    static char *keywords[] = {"threshold", "callback", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "n|O:set_memory_pressure",
+                                     keywords, &threshold, &callback))
+        return NULL;
+    if (threshold < 0) {
+        PyErr_SetString(PyExc_ValueError, "threshold must be >= 0");
+        return NULL;
+    }
+    if (callback == Py_None)
+        callback = NULL;
+    else if (!PyCallable_Check(callback)) {
+        PyErr_Format(PyExc_TypeError,
+                     "expected a callable object or None, not %.200s",
+                     Py_TYPE(callback)->tp_name);
+        return NULL;
+    }
+    Py_XINCREF(callback);
+
+    LOCK_CDATA_MEMORY();
+    old_callback = cdata_memory_callback;
+    cdata_memory_callback = callback;
+    if (threshold == 0 || cdata_memory_get(cdata_memory_threshold) == 0) {
+        /* disabling or enabling: (re)start the count from 0 */
+        cdata_memory_set(cdata_memory, 0);
+    }
+    if (threshold > 0)
+        cdata_memory_set(cdata_memory_untrack, 1);
+    cdata_memory_set(cdata_memory_threshold, threshold);
+    cdata_memory_set(cdata_memory_mark, cdata_memory_get(cdata_memory));
+    UNLOCK_CDATA_MEMORY();
+
+    Py_XDECREF(old_callback);
+    Py_RETURN_NONE;
+}
+
+static PyObject *b_memory_stats(PyObject *self, PyObject *noarg)
+{
+    Py_ssize_t triggers;
+
+    LOCK_CDATA_MEMORY();
+    triggers = cdata_memory_triggers;
+    UNLOCK_CDATA_MEMORY();
+    return Py_BuildValue("{sn,sn,sn}",
+                         "owned", cdata_memory_get(cdata_memory),
+                         "threshold", cdata_memory_get(cdata_memory_threshold),
+                         "triggers", triggers);
+}
+
 static PyObject *b_release(PyObject *self, PyObject *arg)
 {
     if (!CData_Check(arg)) {
@@ -7974,19 +12314,33 @@ static PyMethodDef FFIBackendMethods[] = {
     {"rawaddressof", b_rawaddressof, METH_VARARGS},
     {"getcname", b_getcname, METH_VARARGS},
     {"string", (PyCFunction)b_string, METH_VARARGS | METH_KEYWORDS},
+    {"strings", (PyCFunction)b_strings, METH_VARARGS | METH_KEYWORDS},
     {"unpack", (PyCFunction)b_unpack, METH_VARARGS | METH_KEYWORDS},
+    {"unpack_fields", (PyCFunction)b_unpack_fields,
+                                          METH_VARARGS | METH_KEYWORDS},
+    {"accessor", b_accessor, METH_VARARGS},
+    {"walk", (PyCFunction)b_walk, METH_VARARGS | METH_KEYWORDS},
+    {"new_pool", (PyCFunction)b_new_pool, METH_VARARGS | METH_KEYWORDS},
+    {"new_arena", (PyCFunction)b_new_arena, METH_VARARGS | METH_KEYWORDS},
     {"get_errno", b_get_errno, METH_NOARGS},
     {"set_errno", b_set_errno, METH_O},
     {"newp_handle", b_newp_handle, METH_VARARGS},
     {"from_handle", b_from_handle, METH_O},
     {"from_buffer", b_from_buffer, METH_VARARGS},
     {"memmove", (PyCFunction)b_memmove, METH_VARARGS | METH_KEYWORDS},
+    {"call_many", (PyCFunction)b_call_many, METH_VARARGS | METH_KEYWORDS},
     {"gcp", (PyCFunction)b_gcp, METH_VARARGS | METH_KEYWORDS},
+    {"gc_flush", b_gc_flush, METH_NOARGS},
+    {"set_memory_pressure", (PyCFunction)b_set_memory_pressure,
+                                          METH_VARARGS | METH_KEYWORDS},
+    {"memory_stats", b_memory_stats, METH_NOARGS},
     {"release", b_release, METH_O},
 #ifdef MS_WIN32
     {"getwinerror", (PyCFunction)b_getwinerror, METH_VARARGS | METH_KEYWORDS},
 #endif
     {"_get_types", b__get_types, METH_NOARGS},
+    {"_cdata_freelist_stats", b__cdata_freelist_stats, METH_NOARGS},
+    {"_set_cdata_freelist_max", b__set_cdata_freelist_max, METH_O},
     {"_get_common_types", b__get_common_types, METH_O},
     {"_testfunc", b__testfunc, METH_VARARGS},
     {"_testbuff", b__testbuff, METH_VARARGS},
@@ -8229,6 +12583,7 @@ init_cffi_backend(void)
     static char init_done = 0;
     static PyTypeObject *all_types[] = {
         &dl_type,
+        &dlvar_type,
         &CTypeDescr_Type,
         &CField_Type,
         &CData_Type,
@@ -8236,8 +12591,16 @@ init_cffi_backend(void)
         &CDataOwningGC_Type,
         &CDataFromBuf_Type,
         &CDataGCP_Type,
+        &CDataPooled_Type,
+        &CDataOwningMapped_Type,
+        &CDataArena_Type,
+        &CDataArenaClosed_Type,
+        &CDataFuncPtr_Type,
         &CDataIter_Type,
         &MiniBuffer_Type,
+        &FieldAccessor_Type,
+        &Pool_Type,
+        &Arena_Type,
         &FFI_Type,
         &Lib_Type,
         &GlobSupport_Type,
@@ -8315,6 +12678,8 @@ init_cffi_backend(void)
         PyModule_AddIntConstant(m, "FFI_STDCALL", FFI_STDCALL) < 0 ||
 #endif
         PyModule_AddIntConstant(m, "FFI_CDECL", FFI_DEFAULT_ABI) < 0 ||
+        PyModule_AddIntConstant(m, "TRACEMALLOC_DOMAIN",
+                                CFFI_TRACEMALLOC_DOMAIN) < 0 ||
 
 #ifdef MS_WIN32
 #  ifdef _WIN64
@@ -8343,6 +12708,9 @@ init_cffi_backend(void)
     if (init_ffi_lib(m) < 0)
         INITERROR;
 
+    if (init_gc_deferred(m) < 0)
+        INITERROR;
+
 #if PY_MAJOR_VERSION >= 3
     if (init_file_emulator() < 0)
         INITERROR;
@@ -4,7 +4,8 @@
 
 #define CFFI_VERSION_MIN            0x2601
 #define CFFI_VERSION_CHAR16CHAR32   0x2801
-#define CFFI_VERSION_MAX            0x28FF
+#define CFFI_VERSION_FASTCALL       0x2901
+#define CFFI_VERSION_MAX            0x29FF
 
 typedef struct FFIObject_s FFIObject;
 typedef struct LibObject_s LibObject;
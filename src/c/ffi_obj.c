@@ -352,22 +352,34 @@ PyDoc_STRVAR(ffi_new_doc,
 "the value of type 'cdecl' that it points to.  This means that the raw\n"
 "data can be used as long as this object is kept alive, but must not be\n"
 "used for a longer time.  Be careful about that when copying the\n"
-"pointer to the memory somewhere else, e.g. into another structure.");
+"pointer to the memory somewhere else, e.g. into another structure.\n"
+"\n"
+"If 'align' is given, it must be a power of two, and the memory is\n"
+"aligned to at least that many bytes.");
 
 static PyObject *_ffi_new(FFIObject *self, PyObject *args, PyObject *kwds,
                           const cffi_allocator_t *allocator)
 {
     CTypeDescrObject *ct;
     PyObject *arg, *init = Py_None;
-    static char *keywords[] = {"cdecl", "init", NULL};
-    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|O:new", keywords,
-                                     &arg, &init))
+    Py_ssize_t align = 0;
+    cffi_allocator_t alloc1;
+    static char *keywords[] = {"cdecl", "init", "align", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|On:new", keywords,
+                                     &arg, &init, &align))
+        return NULL;
+    if (check_alignment_arg(align) < 0)
         return NULL;
 
     ct = _ffi_type(self, arg, ACCEPT_STRING|ACCEPT_CTYPE);
     if (ct == NULL)
         return NULL;
 
+    if (align > allocator->ca_align) {
+        alloc1 = *allocator;
+        alloc1.ca_align = align;
+        allocator = &alloc1;
+    }
     return direct_newp(ct, init, allocator);
 }
 
@@ -386,6 +398,8 @@ static PyObject *_ffi_new_with_allocator(PyObject *allocator, PyObject *args,
     alloc1.ca_alloc = (my_alloc == Py_None ? NULL : my_alloc);
     alloc1.ca_free  = (my_free  == Py_None ? NULL : my_free);
     alloc1.ca_dont_clear = (PyTuple_GET_ITEM(allocator, 3) == Py_False);
+    alloc1.ca_huge_pages = (PyTuple_GET_ITEM(allocator, 4) == Py_True);
+    alloc1.ca_align = PyInt_AsSsize_t(PyTuple_GET_ITEM(allocator, 5));
 
     return _ffi_new((FFIObject *)PyTuple_GET_ITEM(allocator, 0),
                     args, kwds, &alloc1);
@@ -403,31 +417,51 @@ PyDoc_STRVAR(ffi_new_allocator_doc,
 "\n"
 "If 'should_clear_after_alloc' is set to False, then the memory\n"
 "returned by 'alloc' is assumed to be already cleared (or you are\n"
-"fine with garbage); otherwise CFFI will clear it.");
+"fine with garbage); otherwise CFFI will clear it.\n"
+"\n"
+"If 'align' is given, it must be a power of two, and the memory is\n"
+"aligned to at least that many bytes.  If 'huge_pages' is true, the\n"
+"default allocator gets the objects of at least 2 MB directly with\n"
+"mmap(), and asks for huge pages (not on Windows).");
 
 static PyObject *ffi_new_allocator(FFIObject *self, PyObject *args,
                                    PyObject *kwds)
 {
-    PyObject *allocator, *result;
+    PyObject *allocator, *result, *x_align;
     PyObject *my_alloc = Py_None, *my_free = Py_None;
-    int should_clear_after_alloc = 1;
+    int should_clear_after_alloc = 1, huge_pages = 0;
+    Py_ssize_t align = 0;
     static char *keywords[] = {"alloc", "free", "should_clear_after_alloc",
-                               NULL};
-    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|OOi:new_allocator", keywords,
-                                     &my_alloc, &my_free,
-                                     &should_clear_after_alloc))
+                               "align", "huge_pages", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|OOini:new_allocator",
+                                     keywords, &my_alloc, &my_free,
+                                     &should_clear_after_alloc,
+                                     &align, &huge_pages))
         return NULL;
 
     if (my_alloc == Py_None && my_free != Py_None) {
         PyErr_SetString(PyExc_TypeError, "cannot pass 'free' without 'alloc'");
         return NULL;
     }
+    if (huge_pages && my_alloc != Py_None) {
+        PyErr_SetString(PyExc_TypeError,
+                        "cannot pass 'huge_pages' together with 'alloc'");
+        return NULL;
+    }
+    if (check_alignment_arg(align) < 0)
+        return NULL;
 
-    allocator = PyTuple_Pack(4,
+    x_align = PyInt_FromSsize_t(align);
+    if (x_align == NULL)
+        return NULL;
+    allocator = PyTuple_Pack(6,
                              (PyObject *)self,
                              my_alloc,
                              my_free,
-                             PyBool_FromLong(should_clear_after_alloc));
+                             PyBool_FromLong(should_clear_after_alloc),
+                             PyBool_FromLong(huge_pages),
+                             x_align);
+    Py_DECREF(x_align);
     if (allocator == NULL)
         return NULL;
 
@@ -441,6 +475,68 @@ static PyObject *ffi_new_allocator(FFIObject *self, PyObject *args,
     return result;
 }
 
+PyDoc_STRVAR(ffi_new_pool_doc,
+"Return a pool of objects of the C type 'cdecl', which must be a pointer\n"
+"or an array of fixed length.  The pool is called like ffi.new(cdecl,\n"
+"init=None), but allocates objects from slabs of 'objects_per_slab'\n"
+"objects, and puts the memory back into the pool when the objects are\n"
+"released instead of freeing it.  pool.stats() returns a dict with the\n"
+"number of 'slabs', the number of 'live' objects, and their 'high_water'\n"
+"mark.\n"
+"\n"
+"If 'should_clear_after_alloc' is set to False, then the memory is not\n"
+"cleared before being reused.");
+
+static PyObject *ffi_new_pool(FFIObject *self, PyObject *args,
+                              PyObject *kwds)
+{
+    CTypeDescrObject *ct;
+    PyObject *arg;
+    Py_ssize_t per_slab = 0;
+    int should_clear_after_alloc = 1;
+    static char *keywords[] = {"cdecl", "objects_per_slab",
+                               "should_clear_after_alloc", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|ni:new_pool", keywords,
+                                     &arg, &per_slab,
+                                     &should_clear_after_alloc))
+        return NULL;
+
+    ct = _ffi_type(self, arg, ACCEPT_STRING|ACCEPT_CTYPE);
+    if (ct == NULL)
+        return NULL;
+    return direct_new_pool(ct, per_slab, !should_clear_after_alloc);
+}
+
+PyDoc_STRVAR(ffi_new_arena_doc,
+"Return a new arena, to be used in a 'with' statement:\n"
+"\n"
+"    with ffi.new_arena() as arena:\n"
+"        p = arena.new(cdecl, init=None)\n"
+"\n"
+"arena.new() behaves like ffi.new(), but the memory is carved out of\n"
+"large chunks of 'chunk_size' bytes, which are all freed together when\n"
+"the 'with' block ends, or when arena.close() is called.  The cdata\n"
+"objects from arena.new() that are still alive then cannot be used any\n"
+"more: doing so raises ValueError.");
+
+static PyObject *ffi_new_arena(FFIObject *self, PyObject *args,
+                               PyObject *kwds)
+{
+    PyObject *typeof_fn, *result;
+    Py_ssize_t chunk_size = 0;
+    static char *keywords[] = {"chunk_size", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|n:new_arena", keywords,
+                                     &chunk_size))
+        return NULL;
+
+    typeof_fn = PyObject_GetAttrString((PyObject *)self, "typeof");
+    if (typeof_fn == NULL)
+        return NULL;
+    result = direct_new_arena(chunk_size, typeof_fn);
+    Py_DECREF(typeof_fn);
+    return result;
+}
+
 PyDoc_STRVAR(ffi_cast_doc,
 "Similar to a C cast: returns an instance of the named C\n"
 "type initialized with the given 'source'.  The source is\n"
@@ -479,6 +575,20 @@ PyDoc_STRVAR(ffi_string_doc,
 #define ffi_string  b_string     /* ffi_string() => b_string()
                                     from _cffi_backend.c */
 
+PyDoc_STRVAR(ffi_strings_doc,
+"ffi.strings(cdata, length=-1, field=None, encoding=None, errors=None,\n"
+"null=None) returns a list of 'length' strings, like ffi.string() on\n"
+"each item of 'cdata', which is a pointer to or an array of 'char *'\n"
+"or 'char[N]'.  If 'field' is given, 'cdata' is instead a pointer to\n"
+"or an array of structs, and the strings are the given field of each\n"
+"struct.  If 'length' is -1, it is the length of the array, or for a\n"
+"'char **' the number of items before the first NULL.\n"
+"\n"
+"The strings are byte strings, or unicode strings decoded with\n"
+"'encoding' and 'errors' if given.  NULL pointers give 'null'.");
+
+#define ffi_strings  b_strings   /* from _cffi_backend.c */
+
 PyDoc_STRVAR(ffi_unpack_doc,
 "Unpack an array of C data of the given length,\n"
 "returning a Python string/unicode/list.\n"
@@ -497,6 +607,60 @@ PyDoc_STRVAR(ffi_unpack_doc,
 #define ffi_unpack  b_unpack     /* ffi_unpack() => b_unpack()
                                     from _cffi_backend.c */
 
+PyDoc_STRVAR(ffi_unpack_fields_doc,
+"ffi.unpack_fields(cdata, length, fields, out=None) copies the given\n"
+"fields of 'length' structs out of 'cdata', which is a pointer to or an\n"
+"array of structs.  'fields' is a list of field names; use 'a.b' for\n"
+"the field 'b' of the nested struct 'a'.\n"
+"\n"
+"Returns a list with one column per field.  By default each column is\n"
+"a new ffi.buffer(..., typed=True) over 'length' contiguous items of\n"
+"the type of the field, usable with memoryview() or numpy.asarray().\n"
+"If 'out' is given, it is a list of columns to write into instead:\n"
+"writable one-dimensional Python buffers (like array.array or numpy\n"
+"arrays) with items of the type of the field, or cdata arrays.\n"
+"The copy is done without the GIL.");
+
+#define ffi_unpack_fields  b_unpack_fields  /* from _cffi_backend.c */
+
+
+PyDoc_STRVAR(ffi_accessor_doc,
+"ffi.accessor(cdecl, path) returns an object to read or write the field\n"
+"'path' of a struct or union given as a C type name.  Like for\n"
+"ffi.offsetof(), 'path' can be 'a.b' for the field 'b' of the nested\n"
+"struct 'a'.  It is resolved once, and then:\n"
+"\n"
+"- accessor.get(p) is equivalent to p.a.b;\n"
+"- accessor.set(p, value) is equivalent to p.a.b = value;\n"
+"- accessor.get_many(p, n) returns [p[i].a.b for i in range(n)];\n"
+"- accessor.set_many(p, values) sets p[i].a.b = values[i] for every i.\n"
+"\n"
+"'p' is a pointer to the struct or a struct cdata; for the *_many()\n"
+"methods it can also be an array of structs.");
+
+static PyObject *ffi_accessor(FFIObject *self, PyObject *args)
+{
+    PyObject *arg, *path;
+    CTypeDescrObject *ct;
+
+    if (!PyArg_ParseTuple(args, "OO:accessor", &arg, &path))
+        return NULL;
+    ct = _ffi_type(self, arg, ACCEPT_STRING|ACCEPT_CTYPE);
+    if (ct == NULL)
+        return NULL;
+    return direct_accessor(ct, path);
+}
+
+PyDoc_STRVAR(ffi_walk_doc,
+"ffi.walk(start, link, limit, field=None) follows the pointers stored in\n"
+"the field 'link' of the struct, starting from the pointer 'start', and\n"
+"returns the list of at most 'limit' pointers to the nodes visited,\n"
+"stopping at NULL.  'link' can also be a list of fields, like ['left',\n"
+"'right'], to visit a tree in depth-first pre-order.  If 'field' is\n"
+"given, returns instead a new ffi.buffer(..., typed=True) with the value\n"
+"of this field in each node.");
+
+#define ffi_walk  b_walk  /* ffi_walk() => b_walk() from _cffi_backend.c */
 
 PyDoc_STRVAR(ffi_offsetof_doc,
 "Return the offset of the named field inside the given structure or\n"
@@ -750,13 +914,40 @@ PyDoc_STRVAR(ffi_gc_doc,
 "'destructor(old_cdata_object)' will be called.\n"
 "\n"
 "The optional 'size' gives an estimate of the size, used to\n"
-"trigger the garbage collection more eagerly.  So far only used\n"
-"on PyPy.  It tells the GC that the returned object keeps alive\n"
-"roughly 'size' bytes of external memory.");
+"trigger the garbage collection more eagerly.  It tells the GC that\n"
+"the returned object keeps alive roughly 'size' bytes of external\n"
+"memory; see ffi.set_memory_pressure().\n"
+"\n"
+"If 'defer' is true, the destructor is not called immediately when the\n"
+"object dies, but queued and called later in a batch, by ffi.gc_flush(),\n"
+"automatically once enough destructors are waiting, or at exit.");
 
 #define ffi_gc  b_gcp     /* ffi_gc() => b_gcp()
                              from _cffi_backend.c */
 
+PyDoc_STRVAR(ffi_gc_flush_doc,
+"Call now all the destructors of ffi.gc(..., defer=True) objects that\n"
+"died, and return how many were called.");
+
+#define ffi_gc_flush  b_gc_flush  /* from _cffi_backend.c */
+
+PyDoc_STRVAR(ffi_set_memory_pressure_doc,
+"Call 'callback(owned)' every time the memory owned by cdata objects\n"
+"grows by more than 'threshold' bytes.  This memory is the data of\n"
+"ffi.new() objects plus the 'size' given to ffi.gc().  If 'callback'\n"
+"is None, call gc.collect() instead.  A 'threshold' of 0 disables it.\n"
+"The memory is only counted, and reported to tracemalloc, while a\n"
+"threshold is set; the count starts at 0 when it is enabled.");
+
+#define ffi_set_memory_pressure  b_set_memory_pressure  /* from _cffi_backend.c */
+
+PyDoc_STRVAR(ffi_memory_stats_doc,
+"Return a dict with the number of bytes 'owned' by cdata objects (only\n"
+"counted while ffi.set_memory_pressure() is enabled), the current\n"
+"'threshold', and the number of times it was reached ('triggers').");
+
+#define ffi_memory_stats  b_memory_stats  /* from _cffi_backend.c */
+
 PyDoc_STRVAR(ffi_def_extern_doc,
 "A decorator.  Attaches the decorated Python function to the C code\n"
 "generated for the 'extern \"Python\"' function of the same name.\n"
@@ -967,7 +1158,8 @@ static PyObject *ffi_list_types(FFIObject *self, PyObject *noargs)
 }
 
 PyDoc_STRVAR(ffi_memmove_doc,
-"ffi.memmove(dest, src, n) copies n bytes of memory from src to dest.\n"
+"ffi.memmove(dest, src, n, threads=1) copies n bytes of memory from src\n"
+"to dest.\n"
 "\n"
 "Like the C function memmove(), the memory areas may overlap;\n"
 "apart from that it behaves like the C function memcpy().\n"
@@ -978,11 +1170,32 @@ PyDoc_STRVAR(ffi_memmove_doc,
 "\n"
 "Unlike other methods, this one supports all Python buffer including\n"
 "byte strings and bytearrays---but it still does not support\n"
-"non-contiguous buffers.");
+"non-contiguous buffers.\n"
+"\n"
+"Large copies are done without the GIL.  If 'threads' is more than 1,\n"
+"very large copies are split between up to that many threads, unless\n"
+"the memory areas overlap.");
 
 #define ffi_memmove  b_memmove     /* ffi_memmove() => b_memmove()
                                       from _cffi_backend.c */
 
+PyDoc_STRVAR(ffi_call_many_doc,
+"ffi.call_many(func, *columns, out=None) calls the C function 'func'\n"
+"once for every row of the given argument columns.\n"
+"\n"
+"Each column is a one-dimensional Python buffer (like an array.array\n"
+"or a numpy array) or a cdata array, whose items have exactly the type\n"
+"of the corresponding argument of 'func'.  All columns must have the\n"
+"same length.  The results are written into 'out', which must be a\n"
+"writable column of the result type; if it is None, a new cdata array\n"
+"is allocated.  Returns 'out' (or None for functions returning void).\n"
+"\n"
+"Only functions with primitive or pointer arguments and result are\n"
+"supported.  The GIL is released once for the whole loop.");
+
+#define ffi_call_many  b_call_many     /* ffi_call_many() => b_call_many()
+                                          from _cffi_backend.c */
+
 PyDoc_STRVAR(ffi_init_once_doc,
 "init_once(function, tag): run function() once.  More precisely,\n"
 "'function()' is called the first time we see a given 'tag'.\n"
@@ -1127,16 +1340,19 @@ PyDoc_STRVAR(ffi_release_doc,
 
 #define METH_VKW  (METH_VARARGS | METH_KEYWORDS)
 static PyMethodDef ffi_methods[] = {
+ {"accessor",   (PyCFunction)ffi_accessor,   METH_VARARGS, ffi_accessor_doc},
  {"addressof",  (PyCFunction)ffi_addressof,  METH_VARARGS, ffi_addressof_doc},
  {"alignof",    (PyCFunction)ffi_alignof,    METH_O,       ffi_alignof_doc},
  {"def_extern", (PyCFunction)ffi_def_extern, METH_VKW,     ffi_def_extern_doc},
  {"callback",   (PyCFunction)ffi_callback,   METH_VKW,     ffi_callback_doc},
+ {"call_many",  (PyCFunction)ffi_call_many,  METH_VKW,     ffi_call_many_doc},
  {"cast",       (PyCFunction)ffi_cast,       METH_VARARGS, ffi_cast_doc},
  {"dlclose",    (PyCFunction)ffi_dlclose,    METH_VARARGS, ffi_dlclose_doc},
  {"dlopen",     (PyCFunction)ffi_dlopen,     METH_VARARGS, ffi_dlopen_doc},
  {"from_buffer",(PyCFunction)ffi_from_buffer,METH_VKW,     ffi_from_buffer_doc},
  {"from_handle",(PyCFunction)ffi_from_handle,METH_O,       ffi_from_handle_doc},
  {"gc",         (PyCFunction)ffi_gc,         METH_VKW,     ffi_gc_doc},
+ {"gc_flush",   (PyCFunction)ffi_gc_flush,   METH_NOARGS,  ffi_gc_flush_doc},
  {"getctype",   (PyCFunction)ffi_getctype,   METH_VKW,     ffi_getctype_doc},
 #ifdef MS_WIN32
  {"getwinerror",(PyCFunction)ffi_getwinerror,METH_VKW,     ffi_getwinerror_doc},
@@ -1144,16 +1360,24 @@ static PyMethodDef ffi_methods[] = {
  {"init_once",  (PyCFunction)ffi_init_once,  METH_VKW,     ffi_init_once_doc},
  {"integer_const",(PyCFunction)ffi_int_const,METH_VKW,     ffi_int_const_doc},
  {"list_types", (PyCFunction)ffi_list_types, METH_NOARGS,  ffi_list_types_doc},
+ {"memory_stats",(PyCFunction)ffi_memory_stats,METH_NOARGS,ffi_memory_stats_doc},
  {"memmove",    (PyCFunction)ffi_memmove,    METH_VKW,     ffi_memmove_doc},
  {"new",        (PyCFunction)ffi_new,        METH_VKW,     ffi_new_doc},
 {"new_allocator",(PyCFunction)ffi_new_allocator,METH_VKW,ffi_new_allocator_doc},
+ {"new_arena",  (PyCFunction)ffi_new_arena,  METH_VKW,     ffi_new_arena_doc},
  {"new_handle", (PyCFunction)ffi_new_handle, METH_O,       ffi_new_handle_doc},
+ {"new_pool",   (PyCFunction)ffi_new_pool,   METH_VKW,     ffi_new_pool_doc},
  {"offsetof",   (PyCFunction)ffi_offsetof,   METH_VARARGS, ffi_offsetof_doc},
  {"release",    (PyCFunction)ffi_release,    METH_O,       ffi_release_doc},
+{"set_memory_pressure",(PyCFunction)ffi_set_memory_pressure,METH_VKW,
+                                              ffi_set_memory_pressure_doc},
  {"sizeof",     (PyCFunction)ffi_sizeof,     METH_O,       ffi_sizeof_doc},
  {"string",     (PyCFunction)ffi_string,     METH_VKW,     ffi_string_doc},
+ {"strings",    (PyCFunction)ffi_strings,    METH_VKW,     ffi_strings_doc},
  {"typeof",     (PyCFunction)ffi_typeof,     METH_O,       ffi_typeof_doc},
  {"unpack",     (PyCFunction)ffi_unpack,     METH_VKW,     ffi_unpack_doc},
+ {"unpack_fields",(PyCFunction)ffi_unpack_fields,METH_VKW,ffi_unpack_fields_doc},
+ {"walk",       (PyCFunction)ffi_walk,       METH_VKW,     ffi_walk_doc},
  {NULL}
 };
 
@@ -11,6 +11,12 @@ typedef struct {
     Py_ssize_t mb_size;
     PyObject  *mb_keepalive;
     PyObject  *mb_weakreflist;    /* weakref support */
+    /* for ffi.buffer(..., typed=True): the PEP 3118 description of the
+       items, exported to consumers that ask for a format; else NULL */
+    PyObject  *mb_format;         /* a bytes object */
+    Py_ssize_t mb_itemsize;
+    int        mb_ndim;
+    Py_ssize_t *mb_shape;         /* 'ndim' shapes followed by 'ndim' strides */
 } MiniBufferObj;
 
 static Py_ssize_t mb_length(MiniBufferObj *self)
@@ -110,9 +116,22 @@ static PyObject *mb_str(MiniBufferObj *self)
 
 static int mb_getbuf(MiniBufferObj *self, Py_buffer *view, int flags)
 {
-    return PyBuffer_FillInfo(view, (PyObject *)self,
-                             self->mb_data, self->mb_size,
-                             /*readonly=*/0, flags);
+    if (PyBuffer_FillInfo(view, (PyObject *)self,
+                          self->mb_data, self->mb_size,
+                          /*readonly=*/0, flags) < 0)
+        return -1;
+    /* consumers that don't ask for the format get plain bytes */
+    if (self->mb_format != NULL && (flags & PyBUF_FORMAT)) {
+        view->format = PyBytes_AS_STRING(self->mb_format);
+        view->itemsize = self->mb_itemsize;
+        if ((flags & PyBUF_ND) == PyBUF_ND) {
+            view->ndim = self->mb_ndim;
+            view->shape = self->mb_shape;
+        }
+        if ((flags & PyBUF_STRIDES) == PyBUF_STRIDES)
+            view->strides = self->mb_shape + self->mb_ndim;
+    }
+    return 0;
 }
 
 static PySequenceMethods mb_as_sequence = {
@@ -143,6 +162,8 @@ mb_dealloc(MiniBufferObj *ob)
     if (ob->mb_weakreflist != NULL)
         PyObject_ClearWeakRefs((PyObject *)ob);
     Py_XDECREF(ob->mb_keepalive);
+    Py_XDECREF(ob->mb_format);
+    PyMem_Free(ob->mb_shape);
     Py_TYPE(ob)->tp_free((PyObject *)ob);
 }
 
@@ -327,7 +348,7 @@ static PyMappingMethods mb_as_mapping = {
 #endif
 
 PyDoc_STRVAR(ffi_buffer_doc,
-"ffi.buffer(cdata[, byte_size]):\n"
+"ffi.buffer(cdata[, byte_size][, typed=False]):\n"
 "Return a read-write buffer object that references the raw C data\n"
 "pointed to by the given 'cdata'.  The 'cdata' must be a pointer or an\n"
 "array.  Can be passed to functions expecting a buffer, or directly\n"
@@ -336,7 +357,10 @@ PyDoc_STRVAR(ffi_buffer_doc,
 "    buf[:]          get a copy of it in a regular string, or\n"
 "    buf[idx]        as a single character\n"
 "    buf[:] = ...\n"
-"    buf[idx] = ...  change the content");
+"    buf[idx] = ...  change the content\n"
+"\n"
+"With typed=True, the buffer also exports the format, shape and strides\n"
+"of the C items, e.g. for memoryview() or numpy.asarray().");
 
 static PyObject *            /* forward, implemented in _cffi_backend.c */
 b_buffer_new(PyTypeObject *type, PyObject *args, PyObject *kwds);
@@ -402,6 +426,10 @@ static PyObject *minibuffer_new(char *data, Py_ssize_t size,
         ob->mb_size = size;
         ob->mb_keepalive = keepalive; Py_INCREF(keepalive);
         ob->mb_weakreflist = NULL;
+        ob->mb_format = NULL;
+        ob->mb_itemsize = 1;
+        ob->mb_ndim = 1;
+        ob->mb_shape = NULL;
         PyObject_GC_Track(ob);
     }
     return (PyObject *)ob;
@@ -23,10 +23,23 @@ struct cffi_tls_s {
     /* The saved lasterror, on Windows. */
     int saved_lasterror;
 #endif
+
+    /* A cached scratch block for cdata_call(), or NULL if there is
+       none or if it is currently in use by a call in this thread. */
+    struct cffi_scratch_s *scratch;
+
+    /* A freelist of dead plain cdata objects, ready to be reused by
+       this thread, with its length, and the counters returned by
+       _cdata_freelist_stats().  See new_simple_cdata(). */
+    void *free_cdata;
+    Py_ssize_t free_cdata_count;
+    Py_ssize_t cdata_reused, cdata_allocated, cdata_released;
 };
 
 static struct cffi_tls_s *get_cffi_tls(void);   /* in misc_thread_posix.h
                                                    or misc_win32.h */
+static void cdata_freelist_orphan(struct cffi_tls_s *tls);
+                                                /* in _cffi_backend.c */
 
 
 /* We try to keep the PyThreadState around in a thread not started by
@@ -280,8 +293,10 @@ static void cffi_thread_shutdown(void *p)
         tls->local_thread_canary->tls = NULL;
         thread_canary_make_zombie(tls->local_thread_canary);
     }
+    cdata_freelist_orphan(tls);
     TLS_ZOM_UNLOCK();
     //fprintf(stderr, "thread_shutdown(%p)\n", tls);
+    free(tls->scratch);
     free(tls);
 }
 
@@ -21,9 +21,23 @@
 
 static pthread_key_t cffi_tls_key;
 
+#ifdef USE__THREAD
+/* a faster copy of pthread_getspecific(cffi_tls_key), which is needed
+   for every cdata allocated or freed (see new_simple_cdata()) */
+static __thread struct cffi_tls_s *cffi_tls_cache = NULL;
+#endif
+
+static void cffi_tls_destructor(void *p)
+{
+#ifdef USE__THREAD
+    cffi_tls_cache = NULL;
+#endif
+    cffi_thread_shutdown(p);
+}
+
 static void init_cffi_tls(void)
 {
-    if (pthread_key_create(&cffi_tls_key, &cffi_thread_shutdown) != 0)
+    if (pthread_key_create(&cffi_tls_key, &cffi_tls_destructor) != 0)
         PyErr_SetString(PyExc_OSError, "pthread_key_create() failed");
 }
 
@@ -41,9 +55,17 @@ static struct cffi_tls_s *_make_cffi_tls(void)
 
 static struct cffi_tls_s *get_cffi_tls(void)
 {
-    void *p = pthread_getspecific(cffi_tls_key);
+    void *p;
+#ifdef USE__THREAD
+    if (cffi_tls_cache != NULL)
+        return cffi_tls_cache;
+#endif
+    p = pthread_getspecific(cffi_tls_key);
     if (p == NULL)
         p = _make_cffi_tls();
+#ifdef USE__THREAD
+    cffi_tls_cache = (struct cffi_tls_s *)p;
+#endif
     return (struct cffi_tls_s *)p;
 }
 
@@ -86,6 +108,42 @@ static void cffi_atomic_store_ssize(Py_ssize_t *ptr, Py_ssize_t value)
     __atomic_store_n(ptr, value, __ATOMIC_SEQ_CST);
 }
 
+static Py_ssize_t cffi_atomic_add_ssize(Py_ssize_t *ptr, Py_ssize_t value)
+{
+    /* returns the new value */
+    return __atomic_add_fetch(ptr, value, __ATOMIC_SEQ_CST);
+}
+
 #endif
 
+
+/* Minimal support for running work in parallel, without the GIL */
+#define CFFI_PARALLEL_MAX  64
+#define CFFI_THREAD_FUNC(name)   static void *name(void *arg)
+#define CFFI_THREAD_RETURN       return NULL
+typedef void *(*cffi_thread_func_t)(void *);
+
+static void cffi_parallel_run(cffi_thread_func_t func, char *args,
+                              size_t argsize, int n)
+{
+    /* call func(args + i * argsize) for 0 <= i < n, in n - 1 new threads
+       and in the current one.  If a thread cannot be started, its part
+       is done in the current thread. */
+    pthread_t threads[CFFI_PARALLEL_MAX];
+    int started[CFFI_PARALLEL_MAX];
+    int i;
+
+    assert(n <= CFFI_PARALLEL_MAX);
+    for (i = 1; i < n; i++)
+        started[i] = pthread_create(&threads[i], NULL, func,
+                                    args + i * argsize) == 0;
+    func(args);
+    for (i = 1; i < n; i++) {
+        if (started[i])
+            pthread_join(threads[i], NULL);
+        else
+            func(args + i * argsize);
+    }
+}
+
 #endif /* CFFI_MISC_THREAD_POSIX_H */
@@ -311,6 +311,16 @@ static void cffi_atomic_store_ssize(Py_ssize_t *ptr, Py_ssize_t value)
     _InterlockedExchangePointer(ptr, value);
 }
 
+static Py_ssize_t cffi_atomic_add_ssize(Py_ssize_t *ptr, Py_ssize_t value)
+{
+    /* returns the new value */
+#ifdef _WIN64
+    return _InterlockedExchangeAdd64((volatile __int64 *)ptr, value) + value;
+#else
+    return _InterlockedExchangeAdd((volatile long *)ptr, value) + value;
+#endif
+}
+
 static void cffi_atomic_store(void **ptr, void *value)
 {
     _InterlockedExchangePointer(ptr, value);
@@ -321,4 +331,34 @@ static void cffi_atomic_store_uint8(uint8_t *ptr, uint8_t value)
     _InterlockedExchange8(ptr, value);
 }
 
+
+/* Minimal support for running work in parallel, without the GIL */
+#define CFFI_PARALLEL_MAX  64
+#define CFFI_THREAD_FUNC(name)   static DWORD WINAPI name(LPVOID arg)
+#define CFFI_THREAD_RETURN       return 0
+typedef LPTHREAD_START_ROUTINE cffi_thread_func_t;
+
+static void cffi_parallel_run(cffi_thread_func_t func, char *args,
+                              size_t argsize, int n)
+{
+    /* call func(args + i * argsize) for 0 <= i < n, in n - 1 new threads
+       and in the current one.  If a thread cannot be started, its part
+       is done in the current thread. */
+    HANDLE threads[CFFI_PARALLEL_MAX];
+    int i;
+
+    assert(n <= CFFI_PARALLEL_MAX);
+    for (i = 1; i < n; i++)
+        threads[i] = CreateThread(NULL, 0, func, args + i * argsize, 0, NULL);
+    func(args);
+    for (i = 1; i < n; i++) {
+        if (threads[i] != NULL) {
+            WaitForSingleObject(threads[i], INFINITE);
+            CloseHandle(threads[i]);
+        }
+        else
+            func(args + i * argsize);
+    }
+}
+
 #endif /* CFFI_MISC_WIN32_H */
@@ -23,6 +23,7 @@ def _setup_path():
 _setup_path()
 from _cffi_ft_backend import *
 from _cffi_ft_backend import _get_types, _get_common_types
+from _cffi_ft_backend import _cdata_freelist_stats, _set_cdata_freelist_max
 try:
     from _cffi_ft_backend import _testfunc
 except ImportError:
@@ -650,6 +651,77 @@ def test_array_initializer():
         assert a[i] == 100 + i
     assert a[42] == 0      # extra uninitialized item
 
+def test_array_initializer_primitive_items():
+    for name, values, bad in [
+            ("short", [-32768, 32767, 0], [32768, 1.5, "x"]),
+            ("unsigned char", [0, 255, 7], [256, -1, 2**70]),
+            ("_Bool", [0, 1, True], [2, -1]),
+            ("unsigned long long", [2**64 - 1, 2**63, 0], [2**64, -1]),
+            ("long long", [-2**63, 2**63 - 1, 0], [2**63, -2**63 - 1]),
+            ("double", [1.5, -2, 2**70], ["x", 10**400]),
+            ("float", [1.5, 0.25, -3], ["x"])]:
+        BItem = new_primitive_type(name)
+        BArray = new_array_type(new_pointer_type(BItem), None)
+        for seq in [values, tuple(values), values + [values[0]] * 1000]:
+            a = newp(BArray, seq)
+            assert list(a) == [type(a[0])(x) for x in seq]
+        for x in bad:
+            e = pytest.raises((TypeError, OverflowError), newp, BArray,
+                              [values[0], x])
+            e2 = pytest.raises(type(e.value), newp, new_pointer_type(BItem),
+                               x)
+            assert str(e.value) == str(e2.value)
+
+def test_array_initializer_from_buffer():
+    import array
+    BInt = new_primitive_type("int")
+    BIntArray = new_array_type(new_pointer_type(BInt), None)
+    a = newp(BIntArray, array.array('i', [5, 6, 7]))
+    assert len(a) == 3
+    assert list(a) == [5, 6, 7]
+    a = newp(new_array_type(new_pointer_type(BInt), 4),
+             array.array('i', [5, 6, 7]))
+    assert list(a) == [5, 6, 7, 0]
+    e = pytest.raises(IndexError, newp,
+                      new_array_type(new_pointer_type(BInt), 2),
+                      array.array('i', [5, 6, 7]))
+    assert str(e.value) == "too many initializers for 'int[2]' (got 3)"
+    pytest.raises(TypeError, newp, BIntArray, array.array('f', [5, 6, 7]))
+    pytest.raises(TypeError, newp, BIntArray, array.array('h', [5, 6, 7]))
+    BDouble = new_primitive_type("double")
+    a = newp(new_array_type(new_pointer_type(BDouble), None),
+             array.array('d', [1.5, 2.5]))
+    assert list(a) == [1.5, 2.5]
+    BBool = new_primitive_type("_Bool")
+    BBoolArray = new_array_type(new_pointer_type(BBool), None)
+    assert list(newp(BBoolArray, memoryview(b"\x00\x01").cast('?'))) == [
+        False, True]
+    pytest.raises(ValueError, newp, BBoolArray,
+                  memoryview(b"\x00\x02").cast('?'))
+    # non-contiguous buffers are not accepted
+    pytest.raises(TypeError, newp, BIntArray,
+                  memoryview(array.array('i', [5, 6, 7]))[::2])
+    # a 0-d buffer that also has __index__, like a NumPy integer scalar,
+    # gives the length of the array
+    import ctypes
+    class Scalar(ctypes.c_longlong):
+        def __index__(self):
+            return self.value
+    assert memoryview(Scalar(5)).ndim == 0
+    BLongLong = new_primitive_type("long long")
+    BLongLongArray = new_array_type(new_pointer_type(BLongLong), None)
+    a = newp(BLongLongArray, Scalar(5))
+    assert len(a) == 5
+    assert list(a) == [0] * 5
+    # arrays of 'unsigned char' accept a bytearray, but not arrays of 'char'
+    BUChar = new_primitive_type("unsigned char")
+    a = newp(new_array_type(new_pointer_type(BUChar), None),
+             bytearray(b"\x01\xff"))
+    assert list(a) == [1, 255]
+    BChar = new_primitive_type("char")
+    pytest.raises(TypeError, newp, new_array_type(new_pointer_type(BChar),
+                                                  None), bytearray(b"ab"))
+
 def test_array_add():
     p = new_primitive_type("int")
     p1 = new_array_type(new_pointer_type(p), 5)    # int[5]
@@ -1090,6 +1162,54 @@ def test_call_function_5():
     f = cast(BFunc5, _testfunc(5))
     f()   # did not crash
 
+def test_call_function_no_tuple():
+    BInt = new_primitive_type("int")
+    BLong = new_primitive_type("long")
+    BFunc1 = new_function_type((BInt, BLong), BLong, False)
+    f = cast(BFunc1, _testfunc(1))
+    args = (40, 2)
+    assert f(*args) == 42
+    assert type(f).__call__(f, *args) == 42      # goes via tp_call
+    e = pytest.raises(TypeError, f, 40, b=2)
+    assert str(e.value) == ("a cdata function cannot be called with "
+                            "keyword arguments")
+    e = pytest.raises(TypeError, type(f).__call__, f, 40, b=2)
+    assert str(e.value) == ("a cdata function cannot be called with "
+                            "keyword arguments")
+    e = pytest.raises(TypeError, f, 40)
+    assert str(e.value) == "'long(*)(int, long)' expects 2 arguments, got 1"
+    e = pytest.raises(TypeError, cast(BInt, 42))
+    assert str(e.value) == "cdata 'int' is not callable"
+
+def test_vectorcall_slot_only_in_function_pointers():
+    BInt = new_primitive_type("int")
+    BIntP = new_pointer_type(BInt)
+    BFunc1 = new_function_type((BInt, BInt), BInt, False)
+    f = cast(BFunc1, 0)
+    p = cast(BIntP, 0)
+    extra = sizeof(BIntP) if sys.version_info >= (3, 9) else 0
+    assert type(f).__basicsize__ == type(p).__basicsize__ + extra
+    assert isinstance(f, type(p))
+
+def test_call_function_large_buffers_reentrant():
+    # the exchange buffer and the array made from the list are too large
+    # for the stack, and the callback calls again into C while they are
+    # in use
+    BInt = new_primitive_type("int")
+    BIntPtr = new_pointer_type(BInt)
+    N = 150
+    BFunc = new_function_type((BIntPtr, BInt) + (BInt,) * N, BInt, False)
+    def cb(p, depth, *args):
+        assert list(args) == list(range(N))
+        if depth > 0:
+            nested = f(list(range(1000, 2000)), depth - 1, *range(N))
+        else:
+            nested = 0
+        return p[0] + p[999] + nested
+    f = callback(BFunc, cb)
+    for i in range(3):
+        assert f(list(range(1000)), 3, *range(N)) == 999 + 3 * 2999
+
 @pytest.mark.thread_unsafe
 def test_call_function_6():
     BInt = new_primitive_type("int")
@@ -1245,6 +1365,39 @@ def test_call_function_9():
     BSShort = new_primitive_type("short")
     assert f(3, cast(BSChar, -3), cast(BUChar, 200), cast(BSShort, -5)) == 192
 
+@pytest.mark.thread_unsafe
+def test_call_function_9_varargs_cache():
+    BInt = new_primitive_type("int")
+    BSChar = new_primitive_type("signed char")
+    BLong = new_primitive_type("long")
+    BFunc9 = new_function_type((BInt,), BInt, True)    # vararg
+    f = cast(BFunc9, _testfunc(9))
+    hits0, misses0, maxsize, currsize0 = BFunc9.varargs_cache_info
+    assert maxsize >= 2
+    assert f(2, cast(BInt, 40), cast(BInt, 2)) == 42
+    assert f(2, cast(BInt, 30), cast(BInt, 12)) == 42
+    # 'signed char' is promoted to 'int', so it's the same signature
+    assert f(2, cast(BSChar, 20), cast(BInt, 22)) == 42
+    hits, misses, _, currsize = BFunc9.varargs_cache_info
+    assert hits - hits0 >= 2
+    assert misses - misses0 <= 1
+    # fill the cache with other signatures, evicting the one above.
+    # (some of them may already be in the cache: the function type is
+    # shared with the other tests)
+    for i in range(3, maxsize + 3):
+        assert f(i, *[cast(BInt, 1)] * i) == i
+    hits1, misses1, _, currsize = BFunc9.varargs_cache_info
+    assert currsize == maxsize
+    assert f(2, cast(BInt, 40), cast(BInt, 2)) == 42
+    assert BFunc9.varargs_cache_info[1] == misses1 + 1
+    # a type error is not cached
+    pytest.raises(TypeError, f, 1, 42)
+    # not available on non-variadic function types
+    BFunc = new_function_type((BInt,), BLong, False)
+    pytest.raises(AttributeError, getattr, BFunc, "varargs_cache_info")
+    assert "varargs_cache_info" in dir(BFunc9)
+    assert "varargs_cache_info" not in dir(BFunc)
+
 def test_call_function_24():
     BFloat = new_primitive_type("float")
     BFloatComplex = new_primitive_type("_cffi_float_complex_t")
@@ -1361,6 +1514,32 @@ def test_write_variable():
     ll.close_lib()
     pytest.raises(ValueError, ll.write_variable, BVoidP, "stderr", stderr)
 
+@pytest.mark.thread_unsafe
+def test_variable_descriptor():
+    if not sys.platform.startswith("linux") or is_musl:
+        pytest.skip("untested")
+    BVoidP = new_pointer_type(new_void_type())
+    ll = find_and_load_library('c')
+    descr = ll.variable_descriptor(BVoidP, "stderr")
+    assert repr(descr) == "<clibrary variable 'stderr' of type 'void *'>"
+    pytest.raises(KeyError, ll.variable_descriptor, BVoidP, "nonexistent_xyz")
+    class Lib(object):
+        stderr = descr
+    assert Lib.stderr is descr
+    lib = Lib()
+    stderr = lib.stderr
+    assert stderr == ll.read_variable(BVoidP, "stderr")
+    lib.stderr = cast(BVoidP, 0)
+    assert not ll.read_variable(BVoidP, "stderr")
+    lib.stderr = stderr
+    assert lib.stderr == stderr
+    pytest.raises(AttributeError, delattr, lib, "stderr")
+    #
+    ll.close_lib()
+    pytest.raises(ValueError, getattr, lib, "stderr")
+    pytest.raises(ValueError, setattr, lib, "stderr", stderr)
+    pytest.raises(ValueError, ll.variable_descriptor, BVoidP, "stderr")
+
 
 def test_callback():
     BInt = new_primitive_type("int")
@@ -3152,6 +3331,63 @@ def test_buffer_keepalive():
         buf = buflist[i]
         assert buf[:] == str2bytes("hi there %d\x00" % i)
 
+def test_buffer_typed():
+    BInt = new_primitive_type("int")
+    BIntP = new_pointer_type(BInt)
+    BIntArray = new_array_type(BIntP, None)
+    c = newp(BIntArray, [10, -20, 30])
+    buf = buffer(c, typed=True)
+    assert len(buf) == 3 * size_of_int()        # still bytes here
+    assert buf[:] == buffer(c)[:]
+    m = memoryview(buf)
+    assert m.format == 'i'
+    assert m.itemsize == size_of_int()
+    assert m.shape == (3,)
+    assert m.tolist() == [10, -20, 30]
+    m[1] = 42
+    assert c[1] == 42
+    assert memoryview(buffer(c)).format == 'B'    # not typed by default
+    assert memoryview(buffer(c, 2 * size_of_int(), typed=True)).shape == (2,)
+    pytest.raises(TypeError, buffer, c, 5, typed=True)
+    #
+    BDouble = new_primitive_type("double")
+    BDoubleArray3 = new_array_type(new_pointer_type(BDouble), 3)
+    BMatrix = new_array_type(new_pointer_type(BDoubleArray3), 2)
+    c = newp(new_pointer_type(BMatrix), [[1, 2, 3], [4, 5, 6]])
+    m = memoryview(buffer(c, typed=True))
+    assert m.format == 'd'
+    assert m.shape == (1, 2, 3)
+    assert m.strides == (48, 24, 8)
+    assert m.tolist() == [[[1, 2, 3], [4, 5, 6]]]
+    #
+    BChar = new_primitive_type("char")
+    BShort = new_primitive_type("short")
+    BStruct = new_struct_type("struct foo")
+    complete_struct_or_union(BStruct, [
+        ('a', BChar, -1),
+        ('b', BDouble, -1),
+        ('c', new_array_type(new_pointer_type(BShort), 3), -1)])
+    c = newp(new_array_type(new_pointer_type(BStruct), None), 2)
+    m = memoryview(buffer(c, typed=True))
+    assert m.format == 'T{^c:a:7xd:b:(3)h:c:2x}'
+    assert m.itemsize == sizeof(BStruct) == 24
+    assert m.shape == (2,)
+    #
+    BUnion = new_union_type("union bar")
+    complete_struct_or_union(BUnion, [('x', BInt, -1), ('y', BChar, -1)])
+    BStruct2 = new_struct_type("struct foo2")
+    complete_struct_or_union(BStruct2, [('u', BUnion, -1),
+                                        ('k', BInt, -1),
+                                        ('bits', BInt, 3)])
+    m = memoryview(buffer(newp(new_pointer_type(BUnion)), typed=True))
+    assert m.format == '%ds' % size_of_int()
+    m = memoryview(buffer(newp(new_pointer_type(BStruct2)), typed=True))
+    assert m.format == '%ds' % sizeof(BStruct2)     # because of the bitfield
+    #
+    BVoidP = new_pointer_type(new_void_type())
+    c = cast(BVoidP, 0)
+    pytest.raises(TypeError, buffer, c, 8, typed=True)
+
 def test_slice():
     BIntP = new_pointer_type(new_primitive_type("int"))
     BIntArray = new_array_type(BIntP, None)
@@ -4003,6 +4239,89 @@ def test_from_buffer_types():
     with pytest.raises(ValueError):
         release(pv[0])
 
+def test_from_buffer_struct_layout():
+    BChar = new_primitive_type("char")
+    BLongLong = new_primitive_type("long long")
+    BFloat = new_primitive_type("float")
+    BDouble = new_primitive_type("double")
+    def make_struct(name, fields):
+        BStruct = new_struct_type(name)
+        complete_struct_or_union(BStruct, [(fname, ftype, -1)
+                                           for fname, ftype in fields])
+        return new_array_type(new_pointer_type(BStruct), None)
+    BPointA = make_struct("struct point", [('x', BDouble), ('y', BDouble)])
+    BPairA = make_struct("struct pair", [
+        ('c', new_array_type(new_pointer_type(BDouble), 2))])
+    BOtherA = make_struct("struct other", [('a', BLongLong), ('b', BDouble)])
+    BMixA = make_struct("struct mix", [('x', BDouble), ('y', BFloat)])
+    BNamedA = make_struct("struct named", [
+        ('p', BPointA.item), ('name', new_array_type(new_pointer_type(BChar), 8))])
+    BFlatA = make_struct("struct flat", [
+        ('a', BDouble), ('b', BDouble),
+        ('name', new_array_type(new_pointer_type(BChar), 8))])
+    #
+    points = newp(BPointA, [(1.5, 2.5), (3.5, 4.5)])
+    p = from_buffer(BPointA, buffer(points, typed=True))
+    assert len(p) == 2 and p[1].y == 4.5
+    # same layout, different structure or names
+    assert len(from_buffer(BPairA, buffer(points, typed=True))) == 2
+    assert len(from_buffer(BNamedA,
+                           buffer(newp(BFlatA, 3), typed=True))) == 3
+    # untyped buffers are not checked
+    assert len(from_buffer(BPointA, buffer(newp(BOtherA, 2)))) == 2
+    assert len(from_buffer(BPointA, bytearray(40))) == 2
+    #
+    e = pytest.raises(TypeError, from_buffer, BPointA,
+                      buffer(newp(BOtherA, 2), typed=True))
+    assert str(e.value) == (
+        "from_buffer(): layout mismatch with 'struct point': field 'x' is "
+        "float (8 bytes) at offset 0, but the buffer has integer (8 bytes) "
+        "at offset 0 (format '%s')" % memoryview(
+            buffer(newp(BOtherA, 1), typed=True)).format)
+    e = pytest.raises(TypeError, from_buffer, BMixA,
+                      buffer(points, typed=True))
+    assert "field 'y' is float (4 bytes) at offset 8, but the buffer has " \
+           "float (8 bytes) at offset 8" in str(e.value)
+    e = pytest.raises(TypeError, from_buffer, BPointA,
+                      buffer(newp(BNamedA, 1), typed=True))
+    assert str(e.value).startswith(
+        "from_buffer(): the buffer has items of 24 bytes, but 'struct point' "
+        "has 16 bytes (format 'T{^")
+
+def test_from_buffer_struct_layout_ctypes():
+    import ctypes
+    BInt = new_primitive_type("int")
+    BDouble = new_primitive_type("double")
+    def make_struct(name, fields):
+        BStruct = new_struct_type(name)
+        complete_struct_or_union(BStruct, [(fname, ftype, -1)
+                                           for fname, ftype in fields])
+        return new_array_type(new_pointer_type(BStruct), None)
+    BPointA = make_struct("struct point", [('x', BDouble), ('y', BDouble)])
+    BIDA = make_struct("struct id", [('x', BInt), ('y', BDouble)])
+    # ctypes gives the format 'T{<i:x:<d:y:}' with an item size of 16:
+    # the offsets are those of the native alignment
+    class CID(ctypes.Structure):
+        _fields_ = [('x', ctypes.c_int), ('y', ctypes.c_double)]
+    a = (CID * 2)((1, 2.5), (3, 4.5))
+    p = from_buffer(BIDA, a)
+    assert len(p) == 2 and p[1].x == 3 and p[1].y == 4.5
+    e = pytest.raises(TypeError, from_buffer, BPointA, a)
+    assert "field 'x' is float (8 bytes) at offset 0, but the buffer has " \
+           "integer (4 bytes) at offset 0" in str(e.value)
+    # non-native byte order
+    if sys.byteorder == 'little':
+        BaseStructure = ctypes.BigEndianStructure
+    else:
+        BaseStructure = ctypes.LittleEndianStructure
+    class CPoint(BaseStructure):
+        _fields_ = [('x', ctypes.c_double), ('y', ctypes.c_double)]
+    a = (CPoint * 2)()
+    e = pytest.raises(TypeError, from_buffer, BPointA, a)
+    assert str(e.value) == (
+        "from_buffer(): the buffer uses a non-native byte order (format "
+        "'%s'), it cannot be used as 'struct point'" % memoryview(a).format)
+
 def test_issue483():
     BInt = new_primitive_type("int")
     BIntP = new_pointer_type(BInt)
@@ -4089,6 +4408,86 @@ def test_memmove_bad_cdata():
     pytest.raises(TypeError, memmove, p, bytearray(b'a'), 1)
     pytest.raises(TypeError, memmove, bytearray(b'a'), p, 1)
 
+def test_call_many():
+    import array
+    BInt = new_primitive_type("int")
+    BLong = new_primitive_type("long")
+    BLongA = new_array_type(new_pointer_type(BLong), None)
+    BFunc1 = new_function_type((BInt, BLong), BLong, False)
+    f = cast(BFunc1, _testfunc(1))
+    a = array.array('i', range(1000))
+    b = array.array('l', [-3 * i for i in range(1000)])
+    res = call_many(f, a, b)
+    assert typeof(res) is BLongA
+    assert list(res) == [-2 * i for i in range(1000)]
+    out = array.array('l', [0] * 1000)
+    assert call_many(f, a, b, out=out) is out
+    assert out.tolist() == list(res)
+    # cdata arrays and strided buffers
+    out = newp(BLongA, 500)
+    call_many(f, memoryview(a)[::2], newp(BLongA, list(b[:500])), out=out)
+    assert list(out) == [-i for i in range(500)]
+    # empty columns
+    assert len(call_many(f, array.array('i'), array.array('l'))) == 0
+
+def test_call_many_float():
+    import array
+    BFloat = new_primitive_type("float")
+    BDouble = new_primitive_type("double")
+    BFunc3 = new_function_type((BFloat, BDouble), BDouble, False)
+    f = cast(BFunc3, _testfunc(3))
+    out = array.array('d', [0.0] * 3)
+    call_many(f, array.array('f', [1.25, 2.5, -1.0]),
+                 array.array('d', [5.1, 0.5, 1.0]), out=out)
+    assert out.tolist() == [1.25 + 5.1, 3.0, 0.0]
+
+def test_call_many_callback():
+    import array
+    BShort = new_primitive_type("short")
+    BFunc = new_function_type((BShort,), BShort, False)
+    seen = []
+    def cb(n):
+        seen.append(n)
+        return n * 2
+    f = callback(BFunc, cb)
+    out = array.array('h', [0] * 3)
+    call_many(f, array.array('h', [5, -6, 7]), out=out)
+    assert seen == [5, -6, 7]
+    assert out.tolist() == [10, -12, 14]
+    BVoidFunc = new_function_type((BShort,), new_void_type(), False)
+    seen = []
+    f = callback(BVoidFunc, seen.append)
+    assert call_many(f, array.array('h', [5, 6])) is None
+    assert seen == [5, 6]
+
+def test_call_many_errors():
+    import array
+    BInt = new_primitive_type("int")
+    BLong = new_primitive_type("long")
+    BFunc1 = new_function_type((BInt, BLong), BLong, False)
+    f = cast(BFunc1, _testfunc(1))
+    a = array.array('i', [1, 2])
+    b = array.array('l', [3, 4])
+    pytest.raises(TypeError, call_many, f, a)
+    pytest.raises(TypeError, call_many, f, a, b, b)
+    pytest.raises(TypeError, call_many, cast(BInt, 0), a, b)
+    e = pytest.raises(TypeError, call_many, f, b, a)
+    assert str(e.value) == ("argument 1: expected a buffer of 'int', got "
+                            "format 'l' with items of %d bytes"
+                            % (sizeof(BLong),))
+    pytest.raises(TypeError, call_many, f, array.array('I', [1, 2]), b)
+    pytest.raises(TypeError, call_many, f, a, memoryview(b"x" * 4 *
+                  sizeof(BLong)).cast('B', (2, 2 * sizeof(BLong))))
+    e = pytest.raises(ValueError, call_many, f, a, array.array('l', [3]))
+    assert str(e.value) == "argument 2 has 1 items, but argument 1 has 2"
+    pytest.raises(ValueError, call_many, f, a, b,
+                  out=array.array('l', [0] * 3))
+    pytest.raises((TypeError, BufferError), call_many, f, a, b,
+                  out=memoryview(array.array('l', [0, 0])).toreadonly())
+    BFunc9 = new_function_type((BInt,), BInt, True)
+    e = pytest.raises(TypeError, call_many, cast(BFunc9, _testfunc(9)), a)
+    assert "'...'" in str(e.value)
+
 def test_dereference_null_ptr():
     BInt = new_primitive_type("int")
     BIntPtr = new_pointer_type(BInt)
@@ -4509,6 +4908,78 @@ def test_get_types():
     assert CData is _cffi_backend._CDataBase
     assert CType is _cffi_backend.CType
 
+def test_cdata_freelist():
+    BInt = new_primitive_type("int")
+    BIntP = new_pointer_type(BInt)
+    BArray = new_array_type(new_pointer_type(BIntP), 10)
+    ints = newp(new_array_type(BIntP, 10), list(range(10)))
+    p = newp(BArray, [ints + i for i in range(10)])
+    stats = _cdata_freelist_stats()
+    assert sorted(stats) == ['allocated', 'max_size', 'orphans',
+                             'released', 'reused', 'size']
+    assert 0 <= stats['size'] <= stats['max_size']
+    for i in range(10):
+        x = p[i]
+        assert x[0] == i
+        assert typeof(x) is BIntP
+    del x
+    stats2 = _cdata_freelist_stats()
+    assert stats2['reused'] >= stats['reused'] + 9
+    # a cdata reused from the freelist is a fresh object
+    import weakref
+    y = p[1]
+    r = weakref.ref(y)
+    del y
+    assert r() is None
+    y = p[2]
+    assert y[0] == 2 and weakref.ref(y)() is y
+    #
+    old = _set_cdata_freelist_max(0)
+    try:
+        assert old == stats['max_size']
+        stats = _cdata_freelist_stats()
+        for i in range(20):
+            p[i % 10]
+        stats2 = _cdata_freelist_stats()
+        assert stats2['size'] == max(stats['size'] - 20, 0)
+        assert stats2['released'] == stats['released'] + 20
+        assert (stats2['reused'] + stats2['allocated'] ==
+                stats['reused'] + stats['allocated'] + 20)
+    finally:
+        _set_cdata_freelist_max(old)
+    pytest.raises(ValueError, _set_cdata_freelist_max, -1)
+
+@pytest.mark.thread_unsafe
+def test_cdata_freelist_thread_ends():
+    import threading
+    BIntP = new_pointer_type(new_primitive_type("int"))
+    p = newp(new_array_type(new_pointer_type(BIntP), 100), None)
+    def run():
+        items = [p[i] for i in range(100)]
+        del items
+        sizes.append(_cdata_freelist_stats()['size'])
+    sizes = []
+    t = threading.Thread(target=run)
+    t.start()
+    t.join()
+    assert sizes[0] > 0
+    # the OS thread may still be finishing after join()
+    import time
+    for _ in range(100):
+        if _cdata_freelist_stats()['orphans'] >= sizes[0]:
+            break
+        time.sleep(0.01)
+    stats = _cdata_freelist_stats()
+    assert stats['orphans'] >= sizes[0]
+    # the orphans are adopted when the freelist of this thread is empty
+    items = [p[i % 100] for i in range(stats['size'] + stats['orphans'] + 1)]
+    stats2 = _cdata_freelist_stats()
+    assert stats2['size'] == 0
+    assert stats2['orphans'] == 0
+    assert stats2['reused'] - stats['reused'] == (stats['size'] +
+                                                  stats['orphans'])
+    assert not any(items)
+
 def test_type_available_with_correct_names():
     import _cffi_ft_backend as _cffi_backend
     check_names = [
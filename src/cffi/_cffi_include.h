@@ -24,6 +24,13 @@
    remove the definition of Py_LIMITED_API here.
 
    See also 'py_limited_api' in cffi/setuptools_ext.py.
+
+   The plain Py_LIMITED_API means the 3.2 version of the limited API,
+   which does not include METH_FASTCALL (see below).  To get it, define
+   Py_LIMITED_API to 0x030A0000 or higher yourself, e.g. with
+   define_macros=[("Py_LIMITED_API", "0x030A0000")]; the module then
+   requires CPython >= 3.10.  We don't do that by default, because it
+   would silently raise the minimal version of every module.
 */
 #if !defined(_CFFI_USE_EMBEDDING) && !defined(Py_LIMITED_API)
 #  ifdef _MSC_VER
@@ -61,6 +68,16 @@ extern "C" {
 #include <stddef.h>
 #include "parse_c_type.h"
 
+/* Python.h only defines METH_FASTCALL if we can use it, which is not
+   the case with the limited API before Python 3.10.  Without it, the
+   functions taking two or more arguments fall back to METH_VARARGS. */
+#if defined(METH_FASTCALL) && !defined(PYPY_VERSION)
+#  define _CFFI_USE_FASTCALL
+#else
+#  undef _CFFI_OP_CPYTHON_BLTN_F
+#  define _CFFI_OP_CPYTHON_BLTN_F  _CFFI_OP_CPYTHON_BLTN_V
+#endif
+
 /* this block of #ifs should be kept exactly identical between
    c/_cffi_backend.c, cffi/vengine_cpy.py, cffi/vengine_gen.py
    and cffi/_cffi_include.h */
@@ -351,6 +368,19 @@ _cffi_free_array_arguments(struct _cffi_freeme_s *freeme)
     } while (freeme != NULL);
 }
 
+#ifdef _CFFI_USE_FASTCALL
+_CFFI_UNUSED_FN static int
+_cffi_check_nargs(const char *name, Py_ssize_t nargs, Py_ssize_t expected)
+{
+    /* same error message as PyArg_UnpackTuple() */
+    if (nargs == expected)
+        return 0;
+    PyErr_Format(PyExc_TypeError, "%s expected %zd arguments, got %zd",
+                 name, expected, nargs);
+    return -1;
+}
+#endif
+
 /**********  end CPython-specific section  **********/
 #else
 _CFFI_UNUSED_FN
@@ -239,7 +239,25 @@ class FFI(object):
             cdecl = self._typeof(cdecl)
         return self._typeoffsetof(cdecl, *fields_or_indexes)[1]
 
-    def new(self, cdecl, init=None):
+    def accessor(self, cdecl, path):
+        """Return an object to read or write the field 'path' of the
+        structure or union given as a C type name.  'path' can be 'a.b'
+        for the field 'b' of the nested structure 'a'.  It is resolved
+        only once:
+
+            accessor.get(p)                 # p.a.b
+            accessor.set(p, value)          # p.a.b = value
+            accessor.get_many(p, n)         # [p[i].a.b for i in range(n)]
+            accessor.set_many(p, values)    # p[i].a.b = values[i]
+
+        'p' is a pointer to the structure or a structure cdata; for the
+        *_many() methods it can also be an array of structures.
+        """
+        if isinstance(cdecl, basestring):
+            cdecl = self._typeof(cdecl)
+        return self._backend.accessor(cdecl, path)
+
+    def new(self, cdecl, init=None, align=0):
         """Allocate an instance according to the specified C type and
         return a pointer to it.  The specified C type must be either a
         pointer or an array: ``new('X *')`` allocates an X and returns
@@ -261,13 +279,19 @@ class FFI(object):
         kept alive, but must not be used for a longer time.  Be careful
         about that when copying the pointer to the memory somewhere
         else, e.g. into another structure.
+
+        If 'align' is given, it must be a power of two, and the memory
+        is aligned to at least that many bytes.
         """
         if isinstance(cdecl, basestring):
             cdecl = self._typeof(cdecl)
+        if align:
+            return self._backend.newp(cdecl, init, align)
         return self._backend.newp(cdecl, init)
 
     def new_allocator(self, alloc=None, free=None,
-                      should_clear_after_alloc=True):
+                      should_clear_after_alloc=True, align=0,
+                      huge_pages=False):
         """Return a new allocator, i.e. a function that behaves like ffi.new()
         but uses the provided low-level 'alloc' and 'free' functions.
 
@@ -280,16 +304,52 @@ class FFI(object):
         If 'should_clear_after_alloc' is set to False, then the memory
         returned by 'alloc' is assumed to be already cleared (or you are
         fine with garbage); otherwise CFFI will clear it.
+
+        If 'align' is given, it must be a power of two, and the memory is
+        aligned to at least that many bytes.  If 'huge_pages' is true,
+        the default allocator gets the objects of at least 2 MB directly
+        with mmap(), and asks for huge pages (not on Windows).
         """
         compiled_ffi = self._backend.FFI()
         allocator = compiled_ffi.new_allocator(alloc, free,
-                                               should_clear_after_alloc)
-        def allocate(cdecl, init=None):
+                                               should_clear_after_alloc,
+                                               align, huge_pages)
+        def allocate(cdecl, init=None, align=0):
             if isinstance(cdecl, basestring):
                 cdecl = self._typeof(cdecl)
-            return allocator(cdecl, init)
+            return allocator(cdecl, init, align)
         return allocate
 
+    def new_pool(self, cdecl, objects_per_slab=0,
+                 should_clear_after_alloc=True):
+        """Return a pool of objects of the C type 'cdecl', which must be
+        a pointer or an array of fixed length.  Calling the pool with an
+        optional 'init' behaves like ffi.new(cdecl, init), but the memory
+        comes from slabs of 'objects_per_slab' objects, and it goes back
+        into the pool when the object is released, to be reused by the
+        next call.  pool.stats() returns a dict with the number of
+        'slabs', the number of 'live' objects and their 'high_water'
+        mark.
+        """
+        if isinstance(cdecl, basestring):
+            cdecl = self._typeof(cdecl)
+        return self._backend.new_pool(cdecl, objects_per_slab,
+                                      should_clear_after_alloc)
+
+    def new_arena(self, chunk_size=0):
+        """Return a new arena, to be used in a 'with' statement:
+
+            with ffi.new_arena() as arena:
+                p = arena.new(cdecl, init=None)
+
+        arena.new() behaves like ffi.new(), but the memory is carved out
+        of large chunks of 'chunk_size' bytes, which are all freed
+        together when the 'with' block ends, or when arena.close() is
+        called.  The cdata objects from arena.new() that are still alive
+        then cannot be used any more: doing so raises ValueError.
+        """
+        return self._backend.new_arena(chunk_size, self._typeof)
+
     def cast(self, cdecl, source):
         """Similar to a C cast: returns an instance of the named C
         type initialized with the given 'source'.  The source is
@@ -317,6 +377,21 @@ class FFI(object):
         """
         return self._backend.string(cdata, maxlen)
 
+    def strings(self, cdata, length=-1, field=None, encoding=None,
+                errors=None, null=None):
+        """Return a list of 'length' strings, like ffi.string() on each
+        item of 'cdata', which is a pointer to or an array of 'char *' or
+        'char[N]'.  If 'field' is given, 'cdata' is instead a pointer to
+        or an array of structs, and the strings are the given field of
+        each struct.  If 'length' is -1, it is the length of the array,
+        or for a 'char **' the number of items before the first NULL.
+
+        The strings are byte strings, or unicode strings decoded with
+        'encoding' and 'errors' if given.  NULL pointers give 'null'.
+        """
+        return self._backend.strings(cdata, length, field, encoding,
+                                     errors, null)
+
     def unpack(self, cdata, length):
         """Unpack an array of C data of the given length,
         returning a Python string/unicode/list.
@@ -334,6 +409,35 @@ class FFI(object):
         """
         return self._backend.unpack(cdata, length)
 
+    def unpack_fields(self, cdata, length, fields, out=None):
+        """ffi.unpack_fields(cdata, length, fields, out=None) copies the given
+        fields of 'length' structs out of 'cdata', which is a pointer to or an
+        array of structs.  'fields' is a list of field names; use 'a.b' for
+        the field 'b' of the nested struct 'a'.
+
+        Returns a list with one column per field.  By default each column is
+        a new ffi.buffer(..., typed=True) over 'length' contiguous items of
+        the type of the field, usable with memoryview() or numpy.asarray().
+        If 'out' is given, it is a list of columns to write into instead:
+        writable one-dimensional Python buffers (like array.array or numpy
+        arrays) with items of the type of the field, or cdata arrays.
+        The copy is done without the GIL.
+        """
+        return self._backend.unpack_fields(cdata, length, fields, out)
+
+    def walk(self, start, link, limit, field=None):
+        """ffi.walk(start, link, limit, field=None) follows the pointers
+        in the field 'link' of each struct, starting from the pointer
+        'start', until NULL or until 'limit' nodes have been visited.
+        Returns the list of pointers to the nodes.  'link' can also be a
+        list of fields, like ['left', 'right'], to visit a tree in
+        depth-first pre-order.
+
+        If 'field' is given, returns instead a new ffi.buffer(...,
+        typed=True) with the value of this field in every node.
+        """
+        return self._backend.walk(start, link, limit, field)
+
    #def buffer(self, cdata, size=-1):
    #    """Return a read-write buffer object that references the raw C data
    #    pointed to by the given 'cdata'.  The 'cdata' must be a pointer or
@@ -365,8 +469,9 @@ class FFI(object):
         return self._backend.from_buffer(cdecl, python_buffer,
                                          require_writable)
 
-    def memmove(self, dest, src, n):
-        """ffi.memmove(dest, src, n) copies n bytes of memory from src to dest.
+    def memmove(self, dest, src, n, threads=1):
+        """ffi.memmove(dest, src, n, threads=1) copies n bytes of memory
+        from src to dest.
 
         Like the C function memmove(), the memory areas may overlap;
         apart from that it behaves like the C function memcpy().
@@ -378,9 +483,32 @@ class FFI(object):
         Unlike other methods, this one supports all Python buffer including
         byte strings and bytearrays---but it still does not support
         non-contiguous buffers.
+
+        Large copies are done without the GIL.  If 'threads' is more
+        than 1, very large copies are split between up to that many
+        threads, unless the memory areas overlap.
         """
+        if threads != 1:
+            return self._backend.memmove(dest, src, n, threads)
         return self._backend.memmove(dest, src, n)
 
+    def call_many(self, func, *columns, out=None):
+        """ffi.call_many(func, *columns, out=None) calls the C function
+        'func' once for every row of the given argument columns.
+
+        Each column is a one-dimensional Python buffer (like an
+        array.array or a numpy array) or a cdata array, whose items have
+        exactly the type of the corresponding argument of 'func'.  All
+        columns must have the same length.  The results are written into
+        'out', which must be a writable column of the result type; if it
+        is None, a new cdata array is allocated.  Returns 'out' (or None
+        for functions returning void).
+
+        Only functions with primitive or pointer arguments and result
+        are supported.  The GIL is released once for the whole loop.
+        """
+        return self._backend.call_many(func, *columns, out=out)
+
     def callback(self, cdecl, python_callable=None, error=None, onerror=None):
         """Return a callback object or a decorator making such a
         callback object.  'cdecl' must name a C function pointer type.
@@ -418,18 +546,47 @@ class FFI(object):
             replace_with = ' ' + replace_with
         return self._backend.getcname(cdecl, replace_with)
 
-    def gc(self, cdata, destructor, size=0):
+    def gc(self, cdata, destructor, size=0, defer=False):
         """Return a new cdata object that points to the same
         data.  Later, when this new cdata object is garbage-collected,
         'destructor(old_cdata_object)' will be called.
 
         The optional 'size' gives an estimate of the size, used to
-        trigger the garbage collection more eagerly.  So far only used
-        on PyPy.  It tells the GC that the returned object keeps alive
-        roughly 'size' bytes of external memory.
+        trigger the garbage collection more eagerly.  It tells the GC
+        that the returned object keeps alive roughly 'size' bytes of
+        external memory; see ffi.set_memory_pressure().
+
+        If 'defer' is true, the destructor is not called immediately
+        when the object dies, but queued and called later in a batch,
+        by ffi.gc_flush() or automatically once enough destructors are
+        waiting.
         """
+        if defer:
+            return self._backend.gcp(cdata, destructor, size, defer)
         return self._backend.gcp(cdata, destructor, size)
 
+    def gc_flush(self):
+        """Call now all the destructors of ffi.gc(..., defer=True)
+        objects that died, and return how many were called.
+        """
+        return self._backend.gc_flush()
+
+    def set_memory_pressure(self, threshold, callback=None):
+        """Call 'callback(owned)' every time the memory owned by cdata
+        objects grows by more than 'threshold' bytes.  This memory is
+        the data of ffi.new() objects plus the 'size' given to ffi.gc().
+        If 'callback' is None, call gc.collect() instead.  A 'threshold'
+        of 0 disables it.
+        """
+        self._backend.set_memory_pressure(threshold, callback)
+
+    def memory_stats(self):
+        """Return a dict with the number of bytes 'owned' by cdata
+        objects, the current 'threshold' of ffi.set_memory_pressure(),
+        and the number of times it was reached ('triggers').
+        """
+        return self._backend.memory_stats()
+
     def _get_cached_btype(self, type):
         assert self._lock.acquire(False) is False
         # call me with the lock!
@@ -709,7 +866,8 @@ class FFI(object):
                   c_file=filename, call_c_compiler=False,
                   uses_ffiplatform=False, **kwds)
 
-    def compile(self, tmpdir='.', verbose=0, target=None, debug=None):
+    def compile(self, tmpdir='.', verbose=0, target=None, debug=None,
+                cache_dir=None):
         """The 'target' argument gives the final file name of the
         compiled DLL.  Use '*' to force distutils' choice, suitable for
         regular CPython C API modules.  Use a file name ending in '.*'
@@ -718,6 +876,11 @@ class FFI(object):
 
         The default is '*' when building a non-embedded C API extension,
         and (module_name + '.*') when building an embedded library.
+
+        If 'cache_dir' is given (default: the environment variable
+        CFFI_CACHE_DIR), the compiled module is cached there and reused
+        by later builds of exactly the same source with the same compiler
+        and flags.  See the 'cffi-cache' command.
         """
         from .recompiler import recompile
         #
@@ -726,7 +889,8 @@ class FFI(object):
         module_name, source, source_extension, kwds = self._assigned_source
         return recompile(self, module_name, source, tmpdir=tmpdir,
                          target=target, source_extension=source_extension,
-                         compiler_verbose=verbose, debug=debug, **kwds)
+                         compiler_verbose=verbose, debug=debug,
+                         cache_dir=cache_dir, **kwds)
 
     def init_once(self, func, tag):
         # Read _init_once_cache[tag], which is either (False, lock) if
@@ -844,6 +1008,11 @@ def _make_ffi_library(ffi, libname, flags):
         key = 'variable ' + name
         tp, _ = ffi._parser._declarations[key]
         BType = ffi._get_cached_btype(tp)
+        if hasattr(backendlib, 'variable_descriptor'):
+            # the address is looked up only once
+            setattr(FFILibrary, name,
+                    backendlib.variable_descriptor(BType, name))
+            return
         read_variable = backendlib.read_variable
         write_variable = backendlib.write_variable
         setattr(FFILibrary, name, property(
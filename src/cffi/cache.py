@@ -0,0 +1,357 @@
+# On-disk cache of compiled extension modules, used by ffi.compile(),
+# and of parsed cdef() declarations
+import sys, os, stat, json, time, hashlib, shlex, subprocess, sysconfig, tempfile
+import warnings
+
+
+DEFAULT_MAX_SIZE = 1024 * 1024 * 1024     # 1 GB
+
+EXT_ATTRIBUTES = ['define_macros', 'undef_macros', 'include_dirs',
+                  'library_dirs', 'libraries', 'runtime_library_dirs',
+                  'extra_compile_args', 'extra_link_args',
+                  'export_symbols', 'language', 'py_limited_api']
+
+CONFIG_VARS = ['CC', 'CXX', 'CFLAGS', 'CCSHARED', 'LDSHARED', 'LDFLAGS',
+               'EXT_SUFFIX', 'SOABI']
+
+ENVIRON_VARS = ['CC', 'CXX', 'CFLAGS', 'CPPFLAGS', 'LDFLAGS', 'LDSHARED',
+                'ARCHFLAGS']
+
+# the compiled modules are imported, and the cdef() cache contains
+# pickles: both are only used from subdirectories of the cache that are
+# private to the current user (see get_private_dir())
+MODULES_SUBDIR = 'modules'
+CDEF_SUBDIR = 'cdef'
+SUBDIRS = (MODULES_SUBDIR, CDEF_SUBDIR)
+
+
+def get_cache_dir(cache_dir=None):
+    """Return the cache directory to use: 'cache_dir' if given, else
+    the value of the environment variable CFFI_CACHE_DIR, else None
+    (meaning that the cache is disabled).
+    """
+    if cache_dir is None:
+        cache_dir = os.environ.get('CFFI_CACHE_DIR') or None
+    return cache_dir
+
+def get_private_dir(cache_dir, name):
+    """Return the subdirectory 'name' of 'cache_dir', creating it with
+    the permissions 0o700 if needed.  Return None if it cannot be
+    created, or if it is a symlink, is not owned by the current user or
+    is accessible by other users: its content cannot be trusted then.
+    """
+    path = os.path.join(cache_dir, name)
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        st = os.lstat(path)
+    except OSError:
+        return None
+    if not stat.S_ISDIR(st.st_mode):
+        return None
+    if hasattr(os, 'getuid'):
+        if st.st_uid != os.getuid() or st.st_mode & 0o077:
+            return None
+    return path
+
+def get_max_size():
+    """Return the maximum total size of the cache in bytes, from the
+    environment variable CFFI_CACHE_MAX_SIZE (which accepts a K, M or G
+    suffix).
+    """
+    value = os.environ.get('CFFI_CACHE_MAX_SIZE')
+    if not value:
+        return DEFAULT_MAX_SIZE
+    number = value.strip().upper()
+    factor = 1
+    if number[-1:] in ('K', 'M', 'G'):
+        factor = 1024 ** ('KMG'.index(number[-1]) + 1)
+        number = number[:-1]
+    try:
+        return int(float(number) * factor)
+    except ValueError:
+        warnings.warn("ignoring invalid CFFI_CACHE_MAX_SIZE=%r" % (value,))
+        return DEFAULT_MAX_SIZE
+
+_compiler_versions = {}
+
+def _compiler_version(cc):
+    # the output of 'cc --version', or '' if we can't run it
+    # (e.g. on Windows, where the compiler is found by distutils)
+    try:
+        return _compiler_versions[cc]
+    except KeyError:
+        pass
+    try:
+        p = subprocess.Popen(shlex.split(cc) + ['--version'],
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out, err = p.communicate()
+        result = (out + err).decode('utf-8', 'replace')
+    except (OSError, ValueError):
+        result = ''
+    _compiler_versions[cc] = result
+    return result
+
+def _hash_file(h, filename):
+    try:
+        with open(filename, 'rb') as f:
+            data = f.read()
+    except IOError:
+        data = b''
+    h.update(b'%d:' % len(data))
+    h.update(data)
+
+def compute_key(ext, debug, output_name):
+    """Return the cache key for building the distutils Extension 'ext'
+    into a file called 'output_name'.  It is the SHA-256 of the contents
+    of the source files and 'depends' files, the compiler flags, the
+    Python ABI and the compiler version.  Note that headers not listed
+    in 'depends' are not part of the key.
+    """
+    import cffi
+    config = dict((name, ext.__dict__.get(name))
+                  for name in EXT_ATTRIBUTES)
+    config['name'] = ext.name
+    config['debug'] = bool(debug)
+    config['output_name'] = output_name
+    config['cffi'] = cffi.__version__
+    config['python'] = [sys.version, sys.platform,
+                        sys.implementation.cache_tag]
+    config['config_vars'] = [sysconfig.get_config_var(name)
+                             for name in CONFIG_VARS]
+    config['environ'] = [os.environ.get(name) for name in ENVIRON_VARS]
+    cc = os.environ.get('CC') or sysconfig.get_config_var('CC')
+    config['compiler'] = _compiler_version(cc) if cc else ''
+    #
+    h = hashlib.sha256()
+    data = json.dumps(config, sort_keys=True).encode('utf-8')
+    h.update(b'%d:' % len(data))
+    h.update(data)
+    for filename in list(ext.sources) + list(ext.depends or ()):
+        _hash_file(h, filename)
+    for filename in ext.extra_objects or ():
+        _hash_file(h, filename)
+    return h.hexdigest()
+
+def _entry_path(cache_dir, key, subdir):
+    dirname = get_private_dir(cache_dir, subdir)
+    if dirname is None:
+        raise OSError("the cache directory %r is not private to the "
+                      "current user" % (os.path.join(cache_dir, subdir),))
+    return os.path.join(dirname, key[:2], key)
+
+def _install(src, dest):
+    # hardlink or copy 'src' to a temporary file next to 'dest', and
+    # then atomically rename it to 'dest'
+    dirname = os.path.dirname(os.path.abspath(dest))
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname, exist_ok=True)
+    fd, tmpname = tempfile.mkstemp(dir=dirname, prefix='.cffi-')
+    os.close(fd)
+    try:
+        os.unlink(tmpname)
+        try:
+            os.link(src, tmpname)
+        except OSError:
+            with open(src, 'rb') as f, open(tmpname, 'wb') as g:
+                g.write(f.read())
+            os.chmod(tmpname, 0o755)
+        os.replace(tmpname, dest)
+    except:
+        try:
+            os.unlink(tmpname)
+        except OSError:
+            pass
+        raise
+
+def _touch(path):
+    try:
+        os.utime(path + '.json', None)    # for the LRU eviction
+    except OSError:
+        pass
+
+def lookup(cache_dir, key, dest, subdir=MODULES_SUBDIR):
+    """If the cache contains 'key', install it as the file 'dest' and
+    return True.  Otherwise, or if the subdirectory 'subdir' of the
+    cache is not private (see get_private_dir()), return False.
+    """
+    try:
+        path = _entry_path(cache_dir, key, subdir)
+        _install(path + '.module', dest)
+    except OSError:
+        return False
+    _touch(path)
+    return True
+
+def load_data(cache_dir, key, subdir=CDEF_SUBDIR):
+    """Return the content stored under 'key' as a byte string, or None
+    if the cache does not contain 'key' or if the subdirectory 'subdir'
+    of the cache is not private.
+    """
+    try:
+        path = _entry_path(cache_dir, key, subdir)
+        with open(path + '.module', 'rb') as f:
+            data = f.read()
+    except (IOError, OSError):
+        return None
+    _touch(path)
+    return data
+
+def store(cache_dir, key, filename, module_name, subdir=MODULES_SUBDIR):
+    """Store the compiled module 'filename' in the cache under 'key',
+    and then evict old entries if the cache is too big.  Concurrent
+    builders may store the same key; the last one wins, which is fine
+    because the content is equivalent.
+    """
+    with open(filename, 'rb') as f:
+        data = f.read()
+    store_data(cache_dir, key, data, module_name, os.path.basename(filename),
+               subdir)
+
+def store_data(cache_dir, key, data, module_name, filename,
+               subdir=CDEF_SUBDIR):
+    """Store the byte string 'data' in the cache under 'key'.  The
+    'module_name' and 'filename' are only used by 'cffi-cache list'.
+    Raises OSError if the subdirectory 'subdir' of the cache is not
+    private.
+    """
+    path = _entry_path(cache_dir, key, subdir)
+    dirname = os.path.dirname(path)
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname, exist_ok=True)
+    fd, tmpname = tempfile.mkstemp(dir=dirname, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as g:
+            g.write(data)
+        os.chmod(tmpname, 0o755)
+        os.replace(tmpname, path + '.module')
+    except:
+        try:
+            os.unlink(tmpname)
+        except OSError:
+            pass
+        raise
+    # the .json file is written last: entries are only listed if it exists
+    info = {'module': module_name,
+            'filename': filename,
+            'size': len(data),
+            'created': time.time()}
+    fd, tmpname = tempfile.mkstemp(dir=dirname, prefix='.tmp-')
+    with os.fdopen(fd, 'w') as g:
+        json.dump(info, g)
+    os.replace(tmpname, path + '.json')
+    prune(cache_dir, get_max_size())
+
+def list_entries(cache_dir):
+    """Return a list of dicts describing the entries of the cache, in
+    all its subdirectories, most recently used first.  Each dict has
+    the keys 'key', 'subdir', 'module', 'filename', 'size', 'created'
+    and 'used'.
+    """
+    result = []
+    for subdir in SUBDIRS:
+        topdir = os.path.join(cache_dir, subdir)
+        try:
+            names = os.listdir(topdir)
+        except OSError:
+            continue
+        for name in names:
+            dirname = os.path.join(topdir, name)
+            if len(name) != 2 or not os.path.isdir(dirname):
+                continue
+            for name in os.listdir(dirname):
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(dirname, name)
+                try:
+                    with open(path) as f:
+                        info = json.load(f)
+                    info['used'] = os.path.getmtime(path)
+                except (OSError, ValueError):
+                    continue
+                info['key'] = name[:-len('.json')]
+                info['subdir'] = subdir
+                result.append(info)
+    result.sort(key=lambda info: info['used'], reverse=True)
+    return result
+
+def remove_entry(cache_dir, key, subdir=MODULES_SUBDIR):
+    path = os.path.join(cache_dir, subdir, key[:2], key)
+    for suffix in ('.json', '.module'):
+        try:
+            os.unlink(path + suffix)
+        except OSError:
+            pass
+
+def prune(cache_dir, max_size):
+    """Remove the least recently used entries, from all subdirectories
+    together, until the total size of the cache is at most 'max_size'
+    bytes.  Returns the list of removed entries.
+    """
+    removed = []
+    entries = list_entries(cache_dir)
+    total = sum([info['size'] for info in entries])
+    while entries and total > max_size:
+        info = entries.pop()
+        remove_entry(cache_dir, info['key'], info['subdir'])
+        total -= info['size']
+        removed.append(info)
+    return removed
+
+# ____________________________________________________________
+
+def _format_size(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return '%d %s' % (size, unit)
+        size /= 1024.0
+    return '%.1f GB' % (size,)
+
+def main(argv=None):
+    """Entry point of the 'cffi-cache' command."""
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='cffi-cache',
+        description='Inspect the cache of modules compiled by ffi.compile().')
+    parser.add_argument('--dir', default=None,
+                        help='cache directory (default: $CFFI_CACHE_DIR)')
+    sub = parser.add_subparsers(dest='command')
+    sub.add_parser('info', help='show the location and size of the cache')
+    sub.add_parser('list', help='list the cached modules')
+    p = sub.add_parser('prune', help='evict the least recently used modules')
+    p.add_argument('--max-size', type=int, default=None,
+                   help='in bytes (default: $CFFI_CACHE_MAX_SIZE or 1GB)')
+    sub.add_parser('clear', help='remove all cached modules')
+    args = parser.parse_args(argv)
+    #
+    cache_dir = get_cache_dir(args.dir)
+    if cache_dir is None:
+        parser.error('no cache directory: use --dir or set CFFI_CACHE_DIR')
+    command = args.command or 'info'
+    entries = list_entries(cache_dir)
+    if command == 'info':
+        print('cache directory: %s' % (cache_dir,))
+        print('modules:         %d' % (len(entries),))
+        print('total size:      %s' % (
+            _format_size(sum([info['size'] for info in entries])),))
+        print('maximum size:    %s' % (_format_size(get_max_size()),))
+    elif command == 'list':
+        for info in entries:
+            print('%s  %10s  %s  %s' % (
+                info['key'][:16], _format_size(info['size']),
+                time.strftime('%Y-%m-%d %H:%M', time.localtime(info['used'])),
+                info['filename']))
+    elif command == 'prune':
+        max_size = args.max_size
+        if max_size is None:
+            max_size = get_max_size()
+        removed = prune(cache_dir, max_size)
+        print('removed %d module(s)' % (len(removed),))
+    elif command == 'clear':
+        for info in entries:
+            remove_entry(cache_dir, info['key'], info['subdir'])
+        print('removed %d module(s)' % (len(entries),))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
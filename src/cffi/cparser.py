@@ -5,16 +5,7 @@ try:
     from . import _pycparser as pycparser
 except ImportError:
     import pycparser
-import weakref, re, sys
-
-try:
-    if sys.version_info < (3,):
-        import thread as _thread
-    else:
-        import _thread
-    lock = _thread.allocate_lock()
-except ImportError:
-    lock = None
+import weakref, re, sys, threading
 
 def _workaround_for_static_import_finders():
     # Issue #392: packaging tools like cx_Freeze can not find these
@@ -34,7 +25,8 @@ _r_partial_enum = re.compile(r"=\s*\.\.\.\s*[,}]|\.\.\.\s*\}")
 _r_enum_dotdotdot = re.compile(r"__dotdotdot\d+__$")
 _r_partial_array = re.compile(r"\[\s*\.\.\.\s*\]")
 _r_words = re.compile(r"\w+|\S")
-_parser_cache = None
+_r_identifier = re.compile(r"\b[A-Za-z_]\w*")
+_parser_tls = threading.local()
 _r_int_literal = re.compile(r"-?0?x?[0-9a-f]+[lu]*$", re.IGNORECASE)
 _r_stdcall1 = re.compile(r"\b(__stdcall|WINAPI)\b")
 _r_stdcall2 = re.compile(r"[(]\s*(__stdcall|WINAPI)\b")
@@ -48,10 +40,22 @@ _r_int_dotdotdot = re.compile(r"(\b(int|long|short|signed|unsigned|char)\s*)+"
 _r_float_dotdotdot = re.compile(r"\b(double|float)\s*\.\.\.")
 
 def _get_parser():
-    global _parser_cache
-    if _parser_cache is None:
-        _parser_cache = pycparser.CParser()
-    return _parser_cache
+    # A CParser instance is not thread-safe, but independent instances
+    # can parse in parallel.  Keep one per thread, so that cdef() calls
+    # from several threads don't need a global lock.
+    try:
+        return _parser_tls.parser
+    except AttributeError:
+        parser = _parser_tls.parser = pycparser.CParser()
+        return parser
+
+def _cdef_cache_digest(key, data):
+    # the header of an entry of the cdef() cache, see
+    # Parser._internal_parse_with_cache()
+    import hashlib
+    h = hashlib.sha256(key.encode('ascii'))
+    h.update(data)
+    return h.hexdigest().encode('ascii')
 
 def _workaround_for_old_pycparser(csource):
     # Workaround for a pycparser issue (fixed between pycparser 2.10 and
@@ -309,15 +313,14 @@ class Parser(object):
         # XXX: for more efficiency we would need to poke into the
         # internals of CParser...  the following registers the
         # typedefs, because their presence or absence influences the
-        # parsing itself (but what they are typedef'ed to plays no role)
-        ctn = _common_type_names(csource)
-        typenames = []
-        for name in sorted(self._declarations):
-            if name.startswith('typedef '):
-                name = name[8:]
-                typenames.append(name)
-                ctn.discard(name)
-        typenames += sorted(ctn)
+        # parsing itself (but what they are typedef'ed to plays no role).
+        # Only the typedefs whose name appears in 'csource' are needed;
+        # repeating all of them would make many small cdef()s quadratic.
+        typenames = _common_type_names(csource)
+        for word in set(_r_identifier.findall(csource)):
+            if 'typedef ' + word in self._declarations:
+                typenames.add(word)
+        typenames = sorted(typenames)
         #
         csourcelines = []
         csourcelines.append('# 1 "<cdef automatic initialization code>"')
@@ -331,15 +334,10 @@ class Parser(object):
         csourcelines.append(csource)
         csourcelines.append('')   # see test_missing_newline_bug
         fullcsource = '\n'.join(csourcelines)
-        if lock is not None:
-            lock.acquire()     # pycparser is not thread-safe...
         try:
             ast = _get_parser().parse(fullcsource)
         except pycparser.c_parser.ParseError as e:
             self.convert_pycparser_error(e, csource)
-        finally:
-            if lock is not None:
-                lock.release()
         # csource will be used to find buggy source text
         return ast, macros, csource
 
@@ -387,10 +385,72 @@ class Parser(object):
             self._options = {'override': override,
                              'packed': pack,
                              'dllexport': dllexport}
-            self._internal_parse(csource)
+            self._internal_parse_with_cache(csource)
         finally:
             self._options = prev_options
 
+    # the part of the state of a Parser which is saved in the cdef cache
+    _CACHED_STATE = ('_declarations', '_included_declarations',
+                     '_anonymous_counter', '_int_constants', '_recomplete',
+                     '_uses_new_feature')
+
+    def _cache_key(self, csource):
+        import hashlib
+        from . import __version__
+        csource, macros = _preprocess(csource)
+        key = repr(('cdef', __version__,
+                    getattr(pycparser, '__version__', None),
+                    sys.version_info[:2], sorted(self._options.items()),
+                    sorted(macros.items()), csource))
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def _internal_parse_with_cache(self, csource):
+        # If the environment variable CFFI_CACHE_DIR is set, the result
+        # of parsing 'csource' is pickled and stored in this cache.  This
+        # is only done for the first cdef() of an FFI: otherwise, the
+        # result would also depend on the previous declarations, and
+        # restoring it would create copies of the existing types.
+        #
+        # Loading a pickle can run arbitrary code, so the pickles are
+        # kept in a subdirectory that must be private to the current
+        # user (see cache.get_private_dir(): otherwise, load_data()
+        # returns None and store_data() raises OSError), and each one
+        # starts with the SHA-256 of its key and content, checked before
+        # loading.  This protects against other users and against
+        # truncated or corrupted files, but not against someone who can
+        # already write files as the current user.
+        from . import cache
+        cache_dir = cache.get_cache_dir()
+        if (cache_dir is None or self._declarations or self._int_constants
+                or self._included_declarations or self._anonymous_counter
+                or self._recomplete):
+            self._internal_parse(csource)
+            return
+        import pickle
+        key = self._cache_key(csource)
+        data = cache.load_data(cache_dir, key)
+        if data is not None:
+            digest, _, data = data.partition(b'\n')
+            if digest == _cdef_cache_digest(key, data):
+                try:
+                    state = pickle.loads(data)
+                except Exception:
+                    pass      # from an incompatible version
+                else:
+                    for name in self._CACHED_STATE:
+                        setattr(self, name, state[name])
+                    return
+        self._internal_parse(csource)
+        state = dict([(name, getattr(self, name))
+                      for name in self._CACHED_STATE])
+        try:
+            data = pickle.dumps(state, pickle.HIGHEST_PROTOCOL)
+            data = _cdef_cache_digest(key, data) + b'\n' + data
+            cache.store_data(cache_dir, key, data, '<cdef>', '%d lines' % (
+                csource.count('\n') + 1,))
+        except (pickle.PicklingError, TypeError, AttributeError, OSError):
+            pass      # the cache is only an optimization
+
     def _internal_parse(self, csource):
         ast, macros, csource = self._parse(csource)
         # add the macros
@@ -12,12 +12,32 @@ def get_extension(srcfilename, modname, sources=(), **kwds):
         allsources.append(os.path.normpath(src))
     return Extension(name=modname, sources=allsources, **kwds)
 
-def compile(tmpdir, ext, compiler_verbose=0, debug=None):
-    """Compile a C extension module using distutils."""
+def compile(tmpdir, ext, compiler_verbose=0, debug=None, cache_dir=None):
+    """Compile a C extension module using distutils.
+
+    If 'cache_dir' is given, or if the environment variable
+    CFFI_CACHE_DIR is set, the compiled module is looked up in and
+    stored into that cache directory; see cffi.cache.  The cache is
+    not used if it is not private to the current user.
+    """
 
     saved_environ = os.environ.copy()
     try:
-        outputfilename = _build(tmpdir, ext, compiler_verbose, debug)
+        from . import cache
+        cache_dir = cache.get_cache_dir(cache_dir)
+        if (cache_dir is not None and
+                cache.get_private_dir(cache_dir,
+                                      cache.MODULES_SUBDIR) is None):
+            import warnings
+            warnings.warn("not using the cache of compiled modules in %r: "
+                          "it is not private to the current user"
+                          % (os.path.join(cache_dir, cache.MODULES_SUBDIR),))
+            cache_dir = None
+        if cache_dir is not None:
+            outputfilename = _build_cached(tmpdir, ext, compiler_verbose,
+                                           debug, cache_dir)
+        else:
+            outputfilename = _build(tmpdir, ext, compiler_verbose, debug)
         outputfilename = os.path.abspath(outputfilename)
     finally:
         # workaround for a distutils bugs where some env vars can
@@ -27,9 +47,8 @@ def compile(tmpdir, ext, compiler_verbose=0, debug=None):
                 os.environ[key] = value
     return outputfilename
 
-def _build(tmpdir, ext, compiler_verbose=0, debug=None):
-    # XXX compact but horrible :-(
-    from cffi._shimmed_dist_utils import Distribution, CompileError, LinkError, set_threshold, set_verbosity
+def _get_distribution(tmpdir, ext, debug):
+    from cffi._shimmed_dist_utils import Distribution
 
     dist = Distribution({'ext_modules': [ext]})
     dist.parse_config_files()
@@ -40,6 +59,13 @@ def _build(tmpdir, ext, compiler_verbose=0, debug=None):
     options['force'] = ('ffiplatform', True)
     options['build_lib'] = ('ffiplatform', tmpdir)
     options['build_temp'] = ('ffiplatform', tmpdir)
+    return dist
+
+def _build(tmpdir, ext, compiler_verbose=0, debug=None):
+    # XXX compact but horrible :-(
+    from cffi._shimmed_dist_utils import CompileError, LinkError, set_threshold, set_verbosity
+
+    dist = _get_distribution(tmpdir, ext, debug)
     #
     try:
         old_level = set_threshold(0) or 0
@@ -55,6 +81,29 @@ def _build(tmpdir, ext, compiler_verbose=0, debug=None):
     #
     return soname
 
+def _build_cached(tmpdir, ext, compiler_verbose, debug, cache_dir):
+    from . import cache
+    # ask distutils for the name of the output file, without compiling
+    cmd_obj = _get_distribution(tmpdir, ext, debug).get_command_obj(
+        'build_ext')
+    cmd_obj.ensure_finalized()
+    [soname] = cmd_obj.get_outputs()
+    if debug is None:
+        debug = sys.flags.debug
+    key = cache.compute_key(ext, debug, os.path.basename(soname))
+    if cache.lookup(cache_dir, key, soname):
+        if compiler_verbose:
+            print('using cached module %s' % (key,))
+        return soname
+    soname = _build(tmpdir, ext, compiler_verbose, debug)
+    try:
+        cache.store(cache_dir, key, soname, ext.name)
+    except OSError as e:
+        # a cache that is not writable should not make the build fail
+        if compiler_verbose:
+            print('cannot store the module in the cache: %s' % (e,))
+    return soname
+
 try:
     from os.path import samefile
 except ImportError:
@@ -6,6 +6,7 @@ from .cffi_opcode import *
 VERSION_BASE = 0x2601
 VERSION_EMBEDDED = 0x2701
 VERSION_CHAR16CHAR32 = 0x2801
+VERSION_FASTCALL = 0x2901
 
 USE_LIMITED_API = ((sys.platform != 'win32' or sys.version_info < (3, 0) or
                    sys.version_info >= (3, 5)) and
@@ -125,6 +126,7 @@ class TypenameExpr:
 
 class Recompiler:
     _num_externpy = 0
+    _num_fastcall = 0
 
     def __init__(self, ffi, module_name, target_is_python=False):
         self.ffi = ffi
@@ -448,8 +450,17 @@ class Recompiler:
         prnt('PyMODINIT_FUNC')
         prnt('PyInit_%s(void)' % (base_module_name,))
         prnt('{')
+        if self._num_fastcall > 0:
+            # the METH_FASTCALL wrappers need a more recent _cffi_backend,
+            # but only if they are really compiled in
+            prnt('#ifdef _CFFI_USE_FASTCALL')
+            prnt('  return _cffi_init("%s", 0x%x, &_cffi_type_context);' % (
+                self.module_name, max(self._version, VERSION_FASTCALL)))
+            prnt('#else')
         prnt('  return _cffi_init("%s", 0x%x, &_cffi_type_context);' % (
             self.module_name, self._version))
+        if self._num_fastcall > 0:
+            prnt('#endif')
         prnt('}')
         prnt('#else')
         prnt('PyMODINIT_FUNC')
@@ -707,7 +718,15 @@ class Recompiler:
         prnt('#ifndef PYPY_VERSION')        # ------------------------------
         #
         prnt('static PyObject *')
-        prnt('_cffi_f_%s(PyObject *self, PyObject *%s)' % (name, argname))
+        if numargs > 1:
+            prnt('#ifdef _CFFI_USE_FASTCALL')
+            prnt('_cffi_f_%s(PyObject *self, PyObject *const *args, '
+                 'Py_ssize_t nargs)' % (name,))
+            prnt('#else')
+            prnt('_cffi_f_%s(PyObject *self, PyObject *%s)' % (name, argname))
+            prnt('#endif')
+        else:
+            prnt('_cffi_f_%s(PyObject *self, PyObject *%s)' % (name, argname))
         prnt('{')
         #
         context = 'argument of %s' % name
@@ -737,10 +756,19 @@ class Recompiler:
             for i in rng:
                 prnt('  PyObject *arg%d;' % i)
             prnt()
+            prnt('#ifdef _CFFI_USE_FASTCALL')
+            prnt('  if (_cffi_check_nargs("%s", nargs, %d) < 0)' % (
+                name, len(rng)))
+            prnt('    return NULL;')
+            for i in rng:
+                prnt('  arg%d = args[%d];' % (i, i))
+            prnt('#else')
             prnt('  if (!PyArg_UnpackTuple(args, "%s", %d, %d, %s))' % (
                 name, len(rng), len(rng),
                 ', '.join(['&arg%d' % i for i in rng])))
             prnt('    return NULL;')
+            prnt('#endif')
+            self._num_fastcall += 1
         prnt()
         #
         for i, type in enumerate(tp.args):
@@ -837,7 +865,8 @@ class Recompiler:
         elif numargs == 1:
             meth_kind = OP_CPYTHON_BLTN_O   # 'METH_O'
         else:
-            meth_kind = OP_CPYTHON_BLTN_V   # 'METH_VARARGS'
+            # 'METH_FASTCALL', or 'METH_VARARGS' if not available
+            meth_kind = OP_CPYTHON_BLTN_F
         self._lsts["global"].append(
             GlobalExpr(name, '_cffi_f_%s' % name,
                        CffiOp(meth_kind, type_index),
@@ -1435,7 +1464,9 @@ def _make_c_or_py_source(ffi, module_name, preamble, target_file, verbose):
         return True
     f = NativeIO()
     recompiler.write_source_to_f(f, preamble)
-    output = f.getvalue()
+    return _write_source_if_changed(f.getvalue(), target_file, verbose)
+
+def _write_source_if_changed(output, target_file, verbose=False):
     try:
         with open(target_file, 'r') as f1:
             if f1.read(len(output) + 1) != output:
@@ -1530,7 +1561,7 @@ def _patch_for_target(patchlist, target):
 def recompile(ffi, module_name, preamble, tmpdir='.', call_c_compiler=True,
               c_file=None, source_extension='.c', extradir=None,
               compiler_verbose=1, target=None, debug=None,
-              uses_ffiplatform=True, **kwds):
+              uses_ffiplatform=True, cache_dir=None, **kwds):
     if not isinstance(module_name, str):
         module_name = module_name.encode('ascii')
     if ffi._windows_unicode:
@@ -1579,7 +1610,8 @@ def recompile(ffi, module_name, preamble, tmpdir='.', call_c_compiler=True,
                     print('%s %r' % (msg, os.path.abspath(tmpdir)))
                 os.chdir(tmpdir)
                 outputfilename = ffiplatform.compile('.', ext,
-                                                     compiler_verbose, debug)
+                                                     compiler_verbose, debug,
+                                                     cache_dir)
             finally:
                 os.chdir(cwd)
                 _unpatch_meths(patchlist)
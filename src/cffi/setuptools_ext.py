@@ -1,6 +1,7 @@
 import os
 import sys
 import sysconfig
+import time
 
 try:
     basestring
@@ -26,13 +27,16 @@ def execfile(filename, glob):
     exec(code, glob, glob)
 
 
-def add_cffi_module(dist, mod_spec):
-    from cffi.api import FFI
-
+def _check_mod_spec(mod_spec):
     if not isinstance(mod_spec, basestring):
         error("argument to 'cffi_modules=...' must be a str or a list of str,"
               " not %r" % (type(mod_spec).__name__,))
-    mod_spec = str(mod_spec)
+    return str(mod_spec)
+
+def _load_ffi(mod_spec):
+    # execute the build script and return the FFI instance from it
+    from cffi.api import FFI
+
     try:
         build_file_name, ffi_var_name = mod_spec.split(':')
     except ValueError:
@@ -61,10 +65,19 @@ def add_cffi_module(dist, mod_spec):
                                                       type(ffi).__name__))
     if not hasattr(ffi, '_assigned_source'):
         error("%r: the set_source() method was not called" % (mod_spec,))
+    return ffi
+
+def _get_source_and_kwds(ffi):
     module_name, source, source_extension, kwds = ffi._assigned_source
     if ffi._windows_unicode:
         kwds = kwds.copy()
         ffi._apply_windows_unicode(kwds)
+    return module_name, source, source_extension, kwds
+
+def add_cffi_module(dist, mod_spec):
+    mod_spec = _check_mod_spec(mod_spec)
+    ffi = _load_ffi(mod_spec)
+    module_name, source, source_extension, kwds = _get_source_and_kwds(ffi)
 
     if source is None:
         _add_py_module(dist, ffi, module_name)
@@ -116,7 +129,10 @@ def _set_py_limited_api(Extension, kwds):
         kwds.setdefault("define_macros", []).append(("_CFFI_NO_LIMITED_API", None))
     return kwds
 
-def _add_c_module(dist, ffi, module_name, source, source_extension, kwds):
+def _add_c_module(dist, ffi, module_name, source, source_extension, kwds,
+                  generated=None, mod_spec=None):
+    # If 'generated' is given, it is the already-generated C source, and
+    # 'ffi' is None: see _add_cffi_modules_parallel().
     # We are a setuptools extension. Need this build_ext for py_limited_api.
     from setuptools.command.build_ext import build_ext
     from cffi._shimmed_dist_utils import Extension, log, mkpath
@@ -135,9 +151,16 @@ def _add_c_module(dist, ffi, module_name, source, source_extension, kwds):
         # arguments just before we turn the ffi into C code.  To use it,
         # subclass the 'distutils.command.build_ext.build_ext' class and
         # add a method 'def pre_run(self, ext, ffi)'.
+        ffi1 = ffi
         if pre_run is not None:
-            pre_run(ext, ffi)
-        updated = recompiler.make_c_source(ffi, module_name, source, c_file)
+            if ffi1 is None:
+                ffi1 = _load_ffi(mod_spec)    # the hook needs the ffi
+            pre_run(ext, ffi1)
+        if ffi1 is None:
+            updated = recompiler._write_source_if_changed(generated, c_file)
+        else:
+            updated = recompiler.make_c_source(ffi1, module_name, source,
+                                               c_file)
         if not updated:
             log.info("already up-to-date")
         return c_file
@@ -153,6 +176,13 @@ def _add_c_module(dist, ffi, module_name, source, source_extension, kwds):
                 pre_run = getattr(self, 'pre_run', None)
                 ext.sources[0] = make_mod(self.build_temp, pre_run)
             base_class.run(self)
+        def build_extension(self, ext_to_build):
+            if ext_to_build is not ext:
+                return base_class.build_extension(self, ext_to_build)
+            start = time.time()
+            base_class.build_extension(self, ext_to_build)
+            log.info("building cffi module %r took %.2f seconds" % (
+                module_name, time.time() - start))
     dist.cmdclass['build_ext'] = build_ext_make_mod
     # NB. multiple runs here will create multiple 'build_ext_make_mod'
     # classes.  Even in this case the 'build_ext' command should be
@@ -160,7 +190,9 @@ def _add_c_module(dist, ffi, module_name, source, source_extension, kwds):
     # called again.
 
 
-def _add_py_module(dist, ffi, module_name):
+def _add_py_module(dist, ffi, module_name, generated=None):
+    # If 'generated' is given, it is the already-generated Python source,
+    # and 'ffi' is None: see _add_cffi_modules_parallel().
     from setuptools.command.build_py import build_py
     from setuptools.command.build_ext import build_ext
     from cffi._shimmed_dist_utils import log, mkpath
@@ -169,7 +201,10 @@ def _add_py_module(dist, ffi, module_name):
     def generate_mod(py_file):
         log.info("generating cffi module %r" % py_file)
         mkpath(os.path.dirname(py_file))
-        updated = recompiler.make_py_source(ffi, module_name, py_file)
+        if generated is not None:
+            updated = recompiler._write_source_if_changed(generated, py_file)
+        else:
+            updated = recompiler.make_py_source(ffi, module_name, py_file)
         if not updated:
             log.info("already up-to-date")
 
@@ -220,10 +255,102 @@ def _add_py_module(dist, ffi, module_name):
                 generate_mod(os.path.join(package_dir, file_name))
     dist.cmdclass['build_ext'] = build_ext_make_mod
 
+def _get_build_jobs():
+    """Return the number of parallel jobs from the environment variable
+    CFFI_BUILD_JOBS: 1 if not set, or the number of CPUs if set to 0.
+    """
+    value = os.environ.get('CFFI_BUILD_JOBS', '').strip()
+    if not value:
+        return 1
+    try:
+        jobs = int(value)
+    except ValueError:
+        error("CFFI_BUILD_JOBS must be an integer, got %r" % (value,))
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+    return jobs
+
+def _generate_module(mod_spec):
+    # Runs in a subprocess started by _add_cffi_modules_parallel(): load
+    # the build script and generate the source code of the module.
+    from cffi import recompiler
+
+    start = time.time()
+    ffi = _load_ffi(mod_spec)
+    module_name, source, source_extension, kwds = _get_source_and_kwds(ffi)
+    f = recompiler.NativeIO()
+    recompiler._make_c_or_py_source(ffi, module_name, source, f, False)
+    return (module_name, source, source_extension, kwds, f.getvalue(),
+            time.time() - start)
+
+def _generate_module_main(mod_spec, output_file):
+    import pickle
+    try:
+        result = ('ok', _generate_module(mod_spec))
+    except Exception as e:
+        result = ('error', e)
+    with open(output_file, 'wb') as f:
+        pickle.dump(result, f)
+
+def _run_generate_module(mod_spec):
+    # We use a fresh Python process instead of multiprocessing, because
+    # the latter would re-execute the setup.py with the 'spawn' method.
+    import pickle, subprocess, tempfile
+
+    fd, output_file = tempfile.mkstemp(prefix='cffi-', suffix='.pickle')
+    os.close(fd)
+    try:
+        env = os.environ.copy()
+        env['PYTHONPATH'] = os.pathsep.join([p for p in sys.path if p])
+        code = ("import sys; from cffi.setuptools_ext import "
+                "_generate_module_main; _generate_module_main(*sys.argv[1:])")
+        returncode = subprocess.call([sys.executable, '-c', code,
+                                      mod_spec, output_file], env=env)
+        if returncode != 0:
+            error("%r: generating the module failed (exit code %d)" % (
+                mod_spec, returncode))
+        with open(output_file, 'rb') as f:
+            status, result = pickle.load(f)
+    finally:
+        os.unlink(output_file)
+    if status == 'error':
+        raise result
+    return result
+
+def _add_cffi_modules_parallel(dist, mod_specs, jobs):
+    from concurrent.futures import ThreadPoolExecutor
+    from cffi._shimmed_dist_utils import log
+
+    mod_specs = [_check_mod_spec(mod_spec) for mod_spec in mod_specs]
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=min(jobs, len(mod_specs))) as pool:
+        results = list(pool.map(_run_generate_module, mod_specs))
+    log.info("generated %d cffi modules in %.2f seconds with %d jobs" % (
+        len(mod_specs), time.time() - start, jobs))
+
+    for mod_spec, result in zip(mod_specs, results):
+        module_name, source, source_extension, kwds, generated, t = result
+        log.info("generating cffi module %r took %.2f seconds" % (
+            module_name, t))
+        if source is None:
+            _add_py_module(dist, None, module_name, generated)
+        else:
+            _add_c_module(dist, None, module_name, source, source_extension,
+                          kwds, generated, mod_spec)
+
 def cffi_modules(dist, attr, value):
     assert attr == 'cffi_modules'
     if isinstance(value, basestring):
         value = [value]
 
-    for cffi_module in value:
-        add_cffi_module(dist, cffi_module)
+    jobs = _get_build_jobs()
+    if jobs > 1:
+        # compile the extension modules in parallel too, unless
+        # 'build_ext --parallel' is given explicitly
+        options = dist.get_option_dict('build_ext')
+        options.setdefault('parallel', ('CFFI_BUILD_JOBS', jobs))
+    if jobs > 1 and len(value) > 1:
+        _add_cffi_modules_parallel(dist, value, jobs)
+    else:
+        for cffi_module in value:
+            add_cffi_module(dist, cffi_module)
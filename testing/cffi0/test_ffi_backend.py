@@ -643,3 +643,560 @@ class TestBitfield:
             s = ffi.new("char32_t[]", u+'\ud808\udf00')
             assert len(s) == 3
             assert list(s) == [u+'\ud808', u+'\udf00', u+'\x00']
+
+
+class TestBulkData:
+    # converting many C items or fields at once
+
+    def test_unpack_fields(self):
+        import array
+        ffi = FFI()
+        ffi.cdef("struct hdr { short len; char tag[3]; };"
+                 "struct pkt { struct hdr hdr; double t; int id; int b:3; };")
+        p = ffi.new("struct pkt[4]")
+        for i in range(4):
+            p[i].hdr.len = i * 10
+            p[i].hdr.tag = b"t%d" % i
+            p[i].t = i / 4.0
+            p[i].id = -i
+        lens, tags, ts = ffi.unpack_fields(p, 4, ["hdr.len", "hdr.tag", "t"])
+        assert memoryview(lens).tolist() == [0, 10, 20, 30]
+        assert memoryview(tags).shape == (4, 3)
+        assert tags[:] == b"t0\x00t1\x00t2\x00t3\x00"
+        assert memoryview(ts).tolist() == [0.0, 0.25, 0.5, 0.75]
+        [hdrs] = ffi.unpack_fields(p, 4, ["hdr"])
+        assert len(hdrs) == 4 * ffi.sizeof("struct hdr")
+        #
+        ids = array.array('i', [99] * 5)
+        cts = ffi.new("double[3]")
+        res = ffi.unpack_fields(p + 1, 3, ["id", "t"], out=[ids, cts])
+        assert res == [ids, cts]
+        assert ids.tolist() == [-1, -2, -3, 99, 99]
+        assert list(cts) == [0.25, 0.5, 0.75]
+        assert ffi.unpack_fields(p, 0, ["id"])[0][:] == b""
+        #
+        pytest.raises(IndexError, ffi.unpack_fields, p, 5, ["id"])
+        e = pytest.raises(AttributeError, ffi.unpack_fields, p, 4,
+                          ["hdr.foo"])
+        assert str(e.value) == ("field path 'hdr.foo': 'struct hdr' has "
+                                "no field 'foo'")
+        pytest.raises(TypeError, ffi.unpack_fields, p, 4, ["t.x"])
+        pytest.raises(TypeError, ffi.unpack_fields, p, 4, ["b"])
+        pytest.raises(TypeError, ffi.unpack_fields, p, 4, ["id"],
+                      out=[array.array('d', [0] * 4)])
+        pytest.raises(ValueError, ffi.unpack_fields, p, 4, ["id"],
+                      out=[array.array('i', [0] * 3)])
+        pytest.raises(ValueError, ffi.unpack_fields, p, 4, ["id", "t"],
+                      out=[ids])
+        pytest.raises(TypeError, ffi.unpack_fields, ffi.new("int[4]"), 4,
+                      ["x"])
+
+    def test_accessor(self):
+        ffi = FFI()
+        ffi.cdef("struct hdr { unsigned short len; int flags: 3; };"
+                 "struct pkt { int id; struct hdr hdr; };")
+        length = ffi.accessor("struct pkt", "hdr.len")
+        assert repr(length) == "<accessor 'hdr.len' of 'struct pkt'>"
+        assert length.offset == ffi.offsetof("struct pkt", "hdr", "len")
+        assert length.struct is ffi.typeof("struct pkt")
+        assert length.field.type is ffi.typeof("unsigned short")
+        flags = ffi.accessor(ffi.typeof("struct pkt *"), "hdr.flags")
+        #
+        p = ffi.new("struct pkt[3]")
+        length.set(p + 1, 1500)
+        assert p[1].hdr.len == 1500
+        assert length.get(p + 1) == 1500
+        assert length.get(p[1]) == 1500
+        flags.set(p[2], -2)
+        assert p[2].hdr.flags == -2
+        assert flags.get(p + 2) == -2
+        pytest.raises(OverflowError, length.set, p + 0, -1)
+        pytest.raises(OverflowError, flags.set, p + 0, 4)
+        #
+        length.set_many(p, [10, 20, 30])
+        assert length.get_many(p, 3) == [10, 20, 30]
+        assert length.get_many(p + 1, 2) == [20, 30]
+        flags.set_many(p + 1, (3, -4))
+        assert flags.get_many(p, 3) == [0, 3, -4]
+        assert length.get_many(p, 0) == []
+        e = pytest.raises(IndexError, length.get_many, p, 4)
+        assert str(e.value) == ("cannot access 4 items of 'struct pkt[3]', "
+                                "which has only 3")
+        pytest.raises(IndexError, length.set_many, p, [1, 2, 3, 4])
+        #
+        e = pytest.raises(TypeError, length.get, p)
+        assert str(e.value) == ("accessor for 'struct pkt' cannot be "
+                                "applied to 'struct pkt[3]'")
+        pytest.raises(TypeError, length.get, ffi.new("struct hdr *"))
+        pytest.raises(TypeError, length.get, 42)
+        pytest.raises(RuntimeError, length.get,
+                      ffi.cast("struct pkt *", 0))
+        e = pytest.raises(AttributeError, ffi.accessor, "struct pkt",
+                          "hdr.foo")
+        assert str(e.value) == ("field path 'hdr.foo': 'struct hdr' has "
+                                "no field 'foo'")
+        pytest.raises(TypeError, ffi.accessor, "struct pkt", "id.x")
+        pytest.raises(TypeError, ffi.accessor, "int", "x")
+
+    def test_walk(self):
+        ffi = FFI()
+        ffi.cdef("struct node { struct node *next; int value; double w; };"
+                 "struct tree { struct tree *left, *right; short key; };")
+        nodes = ffi.new("struct node[5]")
+        for i in range(5):
+            nodes[i].value = i * 10
+            nodes[i].w = i / 2.0
+            if i < 4:
+                nodes[i].next = nodes + i + 1
+        res = ffi.walk(nodes + 0, "next", 100)
+        assert res == [nodes + i for i in range(5)]
+        assert ffi.typeof(res[0]) is ffi.typeof("struct node *")
+        assert ffi.walk(nodes + 1, "next", 2) == [nodes + 1, nodes + 2]
+        assert ffi.walk(nodes + 1, "next", 0) == []
+        assert ffi.walk(ffi.cast("struct node *", 0), "next", 10) == []
+        values = ffi.walk(nodes + 0, "next", 100, field="value")
+        assert memoryview(values).tolist() == [0, 10, 20, 30, 40]
+        ws = ffi.walk(nodes + 2, "next", 100, "w")
+        assert memoryview(ws).tolist() == [1.0, 1.5, 2.0]
+        # a cycle stops at 'limit'
+        nodes[4].next = nodes + 3
+        assert ffi.walk(nodes + 2, "next", 6) == [
+            nodes + 2, nodes + 3, nodes + 4, nodes + 3, nodes + 4, nodes + 3]
+        #
+        #        0
+        #      1   4
+        #     2 3
+        t = ffi.new("struct tree[5]")
+        for i in range(5):
+            t[i].key = i
+        t[0].left = t + 1
+        t[0].right = t + 4
+        t[1].left = t + 2
+        t[1].right = t + 3
+        keys = ffi.walk(t + 0, ["left", "right"], 100, "key")
+        assert memoryview(keys).tolist() == [0, 1, 2, 3, 4]
+        assert ffi.walk(t + 0, ["right", "left"], 3) == [t + 0, t + 4, t + 1]
+        keys = ffi.walk(t + 0, ["left"], 100, "key")
+        assert memoryview(keys).tolist() == [0, 1, 2]
+        #
+        e = pytest.raises(TypeError, ffi.walk, nodes + 0, "value", 10)
+        assert str(e.value) == ("link field 'value' is of type 'int', "
+                                "not 'struct node *'")
+        pytest.raises(AttributeError, ffi.walk, t + 0, "left", 10, "nokey")
+        pytest.raises(AttributeError, ffi.walk, nodes + 0, "prev", 10)
+        pytest.raises(TypeError, ffi.walk, nodes, "next", 10)
+        pytest.raises(ValueError, ffi.walk, nodes + 0, "next", -1)
+
+    def test_strings(self):
+        ffi = FFI()
+        ffi.cdef("struct ent { int n; char *name; char tag[4]; };")
+        keepalive = [ffi.new("char[]", x) for x in
+                     [b"foo", b"", u"caf\xe9".encode('utf-8')]]
+        argv = ffi.new("char *[]", keepalive + [ffi.NULL])
+        assert ffi.strings(argv) == [b"foo", b"", b"caf\xc3\xa9", None]
+        p = ffi.cast("char **", argv)
+        assert ffi.strings(p) == [b"foo", b"", b"caf\xc3\xa9"]  # until NULL
+        assert ffi.strings(p, 2) == [b"foo", b""]
+        assert ffi.strings(argv, 4, encoding='utf-8', null=u"?") == [
+            u"foo", u"", u"caf\xe9", u"?"]
+        assert ffi.strings(argv, 3, encoding='ascii', errors='replace') == [
+            u"foo", u"", u"caf\ufffd\ufffd"]
+        pytest.raises(UnicodeDecodeError, ffi.strings, argv, 3,
+                      encoding='ascii')
+        # arrays of struct, with a 'char *' or a 'char[N]' field
+        ents = ffi.new("struct ent[3]", [[1, keepalive[0], b"ab"],
+                                         [2, ffi.NULL, b"abcd"],
+                                         [3, keepalive[2], b""]])
+        assert ffi.strings(ents, field="name") == [b"foo", None,
+                                                   b"caf\xc3\xa9"]
+        assert ffi.strings(ents, field="tag") == [b"ab", b"abcd", b""]
+        assert ffi.strings(ffi.cast("struct ent *", ents), 2,
+                           field="tag") == [b"ab", b"abcd"]
+        pytest.raises(TypeError, ffi.strings, ffi.cast("struct ent *", ents),
+                      field="tag")
+        pytest.raises(TypeError, ffi.strings, ents, field="n")
+        # arrays of 'char[N]'
+        rows = ffi.new("char[3][3]", [b"ab", b"abc", b""])
+        assert ffi.strings(rows) == [b"ab", b"abc", b""]
+        # wchar_t
+        w = ffi.new("wchar_t[]", u"hi")
+        assert ffi.strings(ffi.new("wchar_t *[]", [w, w])) == [u"hi", u"hi"]
+        pytest.raises(TypeError, ffi.strings, ffi.new("int *[1]"))
+        pytest.raises(TypeError, ffi.strings, ffi.new("int *"))
+        assert ffi.strings(ffi.cast("char **", 0), 0) == []
+        pytest.raises(RuntimeError, ffi.strings, ffi.cast("char **", 0), 1)
+
+    def test_memmove_large(self):
+        ffi = FFI()
+        n = 40 * 1024 * 1024 + 123
+        src = (b"abcdefgh" * (n // 8 + 1))[:n]
+        for threads in [1, 3, 8]:
+            p = ffi.new("char[]", n)
+            ffi.memmove(p, bytearray(src), n, threads=threads)
+            assert ffi.buffer(p)[:] == src
+            # between two Python buffers, the copy is done without the GIL
+            b = bytearray(n)
+            ffi.memmove(b, src, n, threads=threads)
+            assert b == src
+        # overlapping copies are still done in the right order
+        p = ffi.new("char[]", src)
+        ffi.memmove(p + 5, p, n - 5, threads=4)
+        assert ffi.buffer(p, n)[:] == src[:5] + src[:n - 5]
+        pytest.raises(ValueError, ffi.memmove, p, src, 10, threads=0)
+
+
+class TestMemory:
+    # allocating and freeing C memory
+
+    def test_new_pool(self):
+        ffi = FFI()
+        ffi.cdef("struct pt { int x, y; };")
+        pool = ffi.new_pool("struct pt *", objects_per_slab=4)
+        assert pool.type is ffi.typeof("struct pt *")
+        assert repr(pool) == "<pool of 'struct pt *' with 0 live objects>"
+        p = pool({'x': 5})
+        assert ffi.typeof(p) is ffi.typeof("struct pt *")
+        assert isinstance(p, ffi.CData)
+        assert (p.x, p.y) == (5, 0)
+        assert repr(p) == "<cdata 'struct pt *' owning 8 bytes>"
+        assert repr(p[0]) == "<cdata 'struct pt' owning 8 bytes>"
+        pytest.raises(IndexError, lambda: p[1])
+        lst = [pool((i, -i)) for i in range(9)]
+        stats = pool.stats()
+        assert stats['slabs'] == 3
+        assert stats['objects_per_slab'] == 4
+        assert stats['live'] == stats['high_water'] == 10
+        assert stats['reused'] == 0
+        # the 'struct pt' keeps the memory alive, not the 'struct pt *'
+        s = lst[3][0]
+        del lst[3]
+        assert pool.stats()['live'] == 10
+        assert s.y == -3
+        del s
+        assert pool.stats()['live'] == 9
+        # released memory is reused, and cleared again
+        lst[0].y = 42
+        del lst
+        assert pool.stats()['live'] == 1
+        lst = [pool() for i in range(11)]
+        assert [q.y for q in lst] == [0] * 11
+        stats = pool.stats()
+        assert stats['slabs'] == 3
+        assert stats['live'] == stats['high_water'] == 12
+        assert stats['reused'] == 9
+        # a failing initializer gives the memory back
+        pytest.raises(ValueError, pool, [1, 2, 3])
+        assert pool.stats()['live'] == 12
+        #
+        pool = ffi.new_pool("int[3]")
+        a = pool([1, 2, 3])
+        assert list(a) == [1, 2, 3]
+        assert repr(a) == "<cdata 'int[3]' owning 12 bytes>"
+        with a:
+            pass
+        pool = ffi.new_pool("char *")
+        assert pool(b"A")[0] == b"A"
+        pytest.raises(TypeError, ffi.new_pool, "int[]")
+        pytest.raises(TypeError, ffi.new_pool, "int")
+        pytest.raises(ValueError, ffi.new_pool, "int *", -1)
+
+    def test_new_arena(self):
+        import weakref
+        ffi = FFI()
+        ffi.cdef("struct pt { int x, y; }; struct v { int n; int a[]; };"
+                 "struct pkt { struct pt hdr; int len; };")
+        with ffi.new_arena(chunk_size=256) as arena:
+            assert repr(arena) == "<arena with 0 live objects>"
+            p = arena.new("struct pt *", [1, 2])
+            assert ffi.typeof(p) is ffi.typeof("struct pt *")
+            assert isinstance(p, ffi.CData)
+            assert (p.x, p[0].y) == (1, 2)
+            assert repr(p) == "<cdata 'struct pt *' owning 8 bytes in an arena>"
+            a = arena.new(ffi.typeof("int[]"), 100)
+            assert len(a) == 100 and a[99] == 0
+            s = arena.new("char[]", b"hello")
+            assert ffi.string(s) == b"hello"
+            v = arena.new("struct v *", [3, [4, 5, 6]])
+            assert v.a[2] == 6
+            assert ffi.typeof(v.a) is ffi.typeof("int[]")
+            assert len(v.a) == 3
+            assert repr(v) == (
+                "<cdata 'struct v *' owning 16 bytes in an arena>")
+            lst = [arena.new("double *", i) for i in range(50)]
+            assert [q[0] for q in lst] == list(range(50))
+            stats = arena.stats()
+            assert stats['live'] == 54
+            assert stats['chunks'] > 1
+            assert stats['closed'] is False
+            del lst, v
+            assert arena.stats()['live'] == 3
+            r = weakref.ref(s)
+            d = {p: "p", a: "a"}
+            p_alias = ffi.cast("struct pt *", p)
+            k = arena.new("struct pkt *")
+        # the objects still alive were invalidated
+        assert repr(arena) == "<closed arena>"
+        assert arena.stats()['closed'] is True
+        assert arena.stats()['live'] == 0
+        assert repr(p) == "<cdata 'struct pt *' from a closed arena>"
+        assert not isinstance(p, ffi.CData)
+        e = pytest.raises(ValueError, getattr, p, 'x')
+        assert str(e.value) == "cdata object used after its arena was closed"
+        pytest.raises(ValueError, lambda: a[0])
+        pytest.raises(ValueError, len, a)
+        pytest.raises(TypeError, ffi.string, s)
+        pytest.raises(ValueError, arena.new, "int *")
+        # the invalidated objects keep their hash and can be compared
+        assert d[p] == "p" and d[a] == "a"
+        assert p == p_alias and hash(p) == hash(p_alias)
+        assert p != a
+        assert repr(k) == "<cdata 'struct pkt *' from a closed arena>"
+        assert r() is s
+        del s
+        assert r() is None
+        arena.close()     # no effect
+        #
+        arena = ffi.new_arena()
+        q = arena.new("int[0]")
+        assert len(q) == 0
+        pytest.raises(TypeError, arena.new, "int")
+        pytest.raises(TypeError, arena.new, "int[]")
+        pytest.raises(ValueError, ffi.new_arena, -1)
+
+    @pytest.mark.thread_unsafe
+    def test_gc_defer(self):
+        # the queue of deferred destructors is global, and is only
+        # emptied automatically by the main thread
+        ffi = FFI()
+        ffi.gc_flush()     # empty the queue
+        seen = []
+        p = ffi.gc(ffi.new("int *", 42), lambda x: seen.append(x[0]),
+                   defer=True)
+        del p
+        assert seen == []
+        assert ffi.gc_flush() >= 1
+        assert seen == [42]
+        # ffi.release() and 'with' call the destructor immediately
+        p = ffi.gc(ffi.new("int *", 43), lambda x: seen.append(x[0]),
+                   defer=True)
+        with p:
+            pass
+        assert seen == [42, 43]
+        ffi.gc_flush()
+        assert seen == [42, 43]
+        # a destructor that is a C function pointer; here a callback
+        cb = ffi.callback("void(int *)", lambda x: seen.append(x[0]))
+        p = ffi.gc(ffi.new("int *", 44), cb)
+        del p
+        assert seen == [42, 43, 44]
+        p = ffi.gc(ffi.new("int *", 45), cb, defer=True)
+        del p
+        assert seen == [42, 43, 44]
+        assert ffi.gc_flush() >= 1
+        assert seen == [42, 43, 44, 45]
+        # 'void *' arguments accept any pointer
+        cb = ffi.callback("void(void *)",
+                          lambda x: seen.append(ffi.cast("int *", x)[0]))
+        p = ffi.gc(ffi.new("int *", 46), cb)
+        del p
+        assert seen[-1] == 46
+        # many destructors waiting
+        del seen[:]
+        for i in range(1000):
+            ffi.gc(ffi.new("int *", i), lambda x: seen.append(x[0]),
+                   defer=True)
+        ffi.gc_flush()
+        assert sorted(seen) == list(range(1000))
+
+    @pytest.mark.thread_unsafe
+    def test_gc_defer_batch(self):
+        # a full batch of deferred destructors is flushed automatically
+        # the next time the main thread runs Python's pending calls,
+        # which is at the latest when it handles a signal
+        import signal, threading
+        if threading.current_thread() is not threading.main_thread():
+            pytest.skip("pending calls are only run by the main thread")
+        if not hasattr(signal, 'raise_signal'):
+            pytest.skip("needs signal.raise_signal()")
+        ffi = FFI()
+        ffi.gc_flush()     # empty the queue
+        seen = []
+        for i in range(256):
+            ffi.gc(ffi.new("int *", i), lambda x: seen.append(x[0]),
+                   defer=True)
+        prev = signal.signal(signal.SIGINT, lambda *args: None)
+        try:
+            signal.raise_signal(signal.SIGINT)
+        finally:
+            signal.signal(signal.SIGINT, prev)
+        assert sorted(seen) == list(range(256))
+        assert ffi.gc_flush() == 0
+
+    def test_gc_defer_at_exit(self):
+        # the destructors still waiting when the interpreter exits are
+        # called too
+        import os, subprocess
+        import cffi
+        code = """if 1:
+            import os, sys
+            sys.path.insert(0, %r)
+            from cffi import FFI
+            ffi = FFI()
+            def destructor(x, write=os.write):
+                write(1, b"destructor %%d\\n" %% x[0])
+            p = ffi.gc(ffi.new("int *", 42), destructor, defer=True)
+            del p
+            # dies during the finalization of the interpreter
+            q = ffi.gc(ffi.new("int *", 43), destructor, defer=True)
+        """ % (os.path.dirname(os.path.dirname(cffi.__file__)),)
+        out = subprocess.check_output([sys.executable, '-c', code])
+        assert out.splitlines() == [b"destructor 42", b"destructor 43"]
+
+    @pytest.mark.thread_unsafe
+    def test_memory_pressure(self):
+        # the setting and the count are process-wide
+        import tracemalloc
+        ffi = FFI()
+        ffi.cdef("struct vs { int n; int a[]; };")
+        def owned():
+            return ffi.memory_stats()['owned']
+        assert ffi.memory_stats()['threshold'] == 0
+        p = ffi.new("int[100]")
+        assert owned() == 0      # not counted while disabled
+        ffi.set_memory_pressure(sys.maxsize)
+        try:
+            assert owned() == 0
+            del p                # allocated before: does not go below 0
+            assert owned() == 0
+            p = ffi.new("int[100]")
+            assert owned() == 400
+            q = ffi.new("struct vs *", [5, [1, 2, 3]])
+            assert owned() == 400 + ffi.sizeof(q[0])
+            del p, q
+            assert owned() == 0
+            p = ffi.gc(ffi.cast("void *", 42), lambda x: None, size=10000)
+            assert owned() == 10000
+            ffi.gc(p, None)     # removes the destructor and the size
+            assert owned() == 0
+            p = ffi.gc(ffi.cast("void *", 42), lambda x: None, size=10000)
+            ffi.release(p)
+            assert owned() == 0
+            #
+            seen = []
+            ffi.set_memory_pressure(1000, seen.append)
+            assert ffi.memory_stats()['threshold'] == 1000
+            lst = [ffi.new("char[300]") for i in range(10)]
+            assert seen == [1200, 2400]
+            del lst
+            p = ffi.gc(ffi.cast("void *", 42), lambda x: None, size=1001)
+            assert seen[2:] == [1001]
+            del p
+        finally:
+            ffi.set_memory_pressure(0)
+        assert ffi.memory_stats()['threshold'] == 0
+        assert owned() == 0
+        pytest.raises(ValueError, ffi.set_memory_pressure, -1)
+        pytest.raises(TypeError, ffi.set_memory_pressure, 10, 42)
+        #
+        tracemalloc.start()
+        try:
+            p = ffi.new("char[12345]")     # not reported: disabled
+            ffi.set_memory_pressure(sys.maxsize)
+            try:
+                q = ffi.new("char[5432]")
+                snapshot = tracemalloc.take_snapshot()
+            finally:
+                ffi.set_memory_pressure(0)
+        finally:
+            tracemalloc.stop()
+        snapshot = snapshot.filter_traces([tracemalloc.DomainFilter(
+            True, _cffi_backend.TRACEMALLOC_DOMAIN)])
+        assert [trace.size for trace in snapshot.traces] == [5432]
+
+    def test_new_align(self):
+        ffi = FFI()
+        ffi.cdef("struct s { char c; double d; };"
+                 "void *malloc(size_t); void free(void *);")
+        def address(p):
+            return int(ffi.cast("uintptr_t", p))
+        for align in [1, 32, 64, 4096]:
+            for n in [1, 5, 100]:
+                p = ffi.new("double[]", n, align=align)
+                assert address(p) % align == 0
+                assert list(p) == [0.0] * n
+            p = ffi.new("struct s *", [b'A', 4.5], align=align)
+            assert address(p) % align == 0
+            assert p.c == b'A' and p.d == 4.5
+        pytest.raises(ValueError, ffi.new, "int *", align=3)
+        pytest.raises(ValueError, ffi.new, "int *", align=-8)
+        #
+        allocator = ffi.new_allocator(align=64)
+        p = allocator("int[]", [1, 2, 3])
+        assert address(p) % 64 == 0
+        assert list(p) == [1, 2, 3]
+        p = allocator("int[]", 3, align=256)      # can be increased
+        assert address(p) % 256 == 0
+        lib = ffi.dlopen(None)
+        allocator = ffi.new_allocator(lib.malloc, lib.free, align=128)
+        p = allocator("int[]", [4, 5, 6])
+        assert address(p) % 128 == 0
+        assert list(p) == [4, 5, 6]
+        pytest.raises(ValueError, ffi.new_allocator, align=24)
+        pytest.raises(TypeError, ffi.new_allocator, lib.malloc, lib.free,
+                      huge_pages=True)
+
+    @pytest.mark.thread_unsafe
+    def test_new_allocator_huge_pages(self):
+        ffi = FFI()
+        allocator = ffi.new_allocator(huge_pages=True)
+        ffi.set_memory_pressure(sys.maxsize)    # to count the memory
+        try:
+            start = ffi.memory_stats()['owned']
+            n = 3 * 1024 * 1024
+            p = allocator("char[]", n)
+            assert repr(p) == "<cdata 'char[]' owning %d bytes>" % n
+            assert len(p) == n
+            if sys.platform != 'win32':
+                assert int(ffi.cast("uintptr_t", p)) % (2 * 1024 * 1024) == 0
+            assert p[0] == p[n - 1] == b'\x00'
+            p[n - 1] = b'x'
+            assert p[n - 1] == b'x'
+            assert ffi.memory_stats()['owned'] == start + n
+            del p
+            assert ffi.memory_stats()['owned'] == start
+            # small objects are allocated normally
+            p = allocator("int[]", [1, 2, 3])
+            assert list(p) == [1, 2, 3]
+            if sys.platform == 'win32':
+                return
+            # ffi.release() and 'with' unmap the memory immediately
+            p = allocator("char[]", n)
+            with p:
+                p[n - 1] = b'x'
+            assert ffi.memory_stats()['owned'] == start
+            assert ffi.cast("uintptr_t", p) == 0
+            ffi.release(p)      # no effect
+            # using it afterwards raises instead of crashing
+            assert len(p) == 0
+            with pytest.raises(RuntimeError):
+                p[0]
+            with pytest.raises(RuntimeError):
+                p[0] = b'y'
+            pytest.raises(RuntimeError, ffi.buffer, p)
+            pytest.raises(RuntimeError, ffi.memmove, p, b"abc", 3)
+            pytest.raises(RuntimeError, ffi.memmove, bytearray(3), p, 3)
+            del p
+            assert ffi.memory_stats()['owned'] == start
+            ffi.cdef("struct big { char data[%d]; };" % n)
+            p = allocator("struct big *")
+            assert ffi.memory_stats()['owned'] == start + n
+            ffi.release(p)
+            assert ffi.memory_stats()['owned'] == start
+            assert p == ffi.NULL
+            with pytest.raises(RuntimeError):
+                p[0]
+            pytest.raises(RuntimeError, ffi.buffer, p)
+            del p
+            assert ffi.memory_stats()['owned'] == start
+        finally:
+            ffi.set_memory_pressure(0)
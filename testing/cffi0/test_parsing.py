@@ -619,3 +619,55 @@ def test_missing_newline_bug():
     ffi = FFI(backend=FakeBackend())
     ffi.cdef("#pragma foobar")
     ffi.cdef("#pragma foobar")    # used to crash the second time
+
+def _make_big_cdef(prefix, n):
+    return "\n".join(["""
+        typedef struct %(p)s_s%(i)d { int a; struct %(p)s_s%(i)d *next; } %(p)s_t%(i)d;
+        int %(p)s_f%(i)d(%(p)s_t%(i)d *, long[%(i)d]);
+        #define %(P)s_C%(i)d %(i)d
+    """ % {'p': prefix, 'P': prefix.upper(), 'i': i} for i in range(n)])
+
+def test_parse_in_many_threads():
+    import threading
+    # each thread uses its own parser, without any global lock; check
+    # that the results are the same as when parsing sequentially
+    nthreads, ncdefs = 8, 5
+    sources = [[_make_big_cdef("th%d_%d" % (j, k), 50) for k in range(ncdefs)]
+               for j in range(nthreads)]
+    def parse_all(j):
+        ffi = FFI(backend=FakeBackend())
+        for csource in sources[j]:
+            ffi.cdef(csource)
+        return ffi
+    expected = [sorted(parse_all(j)._parser._declarations)
+                for j in range(nthreads)]
+    results = [None] * nthreads
+    def run(j):
+        try:
+            results[j] = sorted(parse_all(j)._parser._declarations)
+        except Exception as e:
+            results[j] = e
+    threads = [threading.Thread(target=run, args=(j,))
+               for j in range(nthreads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == expected
+    assert len(expected[0]) == ncdefs * 50 * 4
+
+def test_only_used_typedefs_are_repeated():
+    ffi = FFI(backend=FakeBackend())
+    for i in range(100):
+        ffi.cdef("typedef int t%d;" % i)
+    ast, _, _ = ffi._parser._parse("t5 f(t42, uint8_t *);")
+    names = []
+    for decl in ast.ext:
+        if decl.name == '__dotdotdot__':
+            break
+        names.append(decl.name)
+    assert names == ['t42', 't5', 'uint8_t', '__dotdotdotint__',
+                     '__dotdotdotfloat__']
+    ffi.cdef("t5 f(t42, uint8_t *);")
+    assert str(ffi.typeof("t5(*)(t42, uint8_t *)")) == (
+        "<func (<int>, <pointer to <uint8_t>>), <int>, False>")
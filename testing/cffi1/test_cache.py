@@ -0,0 +1,241 @@
+import os, time
+import pytest
+import cffi
+from cffi import cache, ffiplatform
+from testing.udir import udir
+
+pytestmark = [
+    pytest.mark.thread_unsafe,
+]
+
+
+def make_ffi(source="static int foo(int x) { return x + 42; }"):
+    ffi = cffi.FFI()
+    ffi.cdef("int foo(int);")
+    ffi.set_source("_test_cache_mod", source)
+    return ffi
+
+def test_compile_uses_cache(monkeypatch):
+    tmpdir = str(udir.join('test_compile_uses_cache'))
+    cache_dir = os.path.join(tmpdir, 'cache')
+    builds = []
+    original_build = ffiplatform._build
+    def counting_build(*args):
+        builds.append(args)
+        return original_build(*args)
+    monkeypatch.setattr(ffiplatform, '_build', counting_build)
+    #
+    so1 = make_ffi().compile(tmpdir=os.path.join(tmpdir, 'a'),
+                             cache_dir=cache_dir)
+    assert len(builds) == 1
+    [entry] = cache.list_entries(cache_dir)
+    assert entry['module'] == '_test_cache_mod'
+    assert entry['filename'] == os.path.basename(so1)
+    #
+    so2 = make_ffi().compile(tmpdir=os.path.join(tmpdir, 'b'),
+                             cache_dir=cache_dir)
+    assert len(builds) == 1                 # not compiled again
+    assert os.path.basename(so2) == os.path.basename(so1)
+    with open(so1, 'rb') as f1, open(so2, 'rb') as f2:
+        assert f1.read() == f2.read()
+    #
+    make_ffi("static int foo(int x) { return x + 43; }").compile(
+        tmpdir=os.path.join(tmpdir, 'c'), cache_dir=cache_dir)
+    assert len(builds) == 2                 # different source
+    assert len(cache.list_entries(cache_dir)) == 2
+
+def test_compile_cache_dir_from_environ(monkeypatch):
+    tmpdir = str(udir.join('test_compile_cache_dir_from_environ'))
+    cache_dir = os.path.join(tmpdir, 'cache')
+    monkeypatch.setenv('CFFI_CACHE_DIR', cache_dir)
+    make_ffi().compile(tmpdir=tmpdir)
+    entries = cache.list_entries(cache_dir)
+    assert [info['module'] for info in entries
+            if info['module'] != '<cdef>'] == ['_test_cache_mod']
+
+def test_compute_key_depends_on_flags():
+    ext1 = ffiplatform.get_extension(__file__, 'mod')
+    ext2 = ffiplatform.get_extension(__file__, 'mod',
+                                     define_macros=[('FOO', None)])
+    key1 = cache.compute_key(ext1, False, 'mod.so')
+    assert len(key1) == 64
+    assert key1 == cache.compute_key(ext1, False, 'mod.so')
+    assert key1 != cache.compute_key(ext2, False, 'mod.so')
+    assert key1 != cache.compute_key(ext1, True, 'mod.so')
+    assert key1 != cache.compute_key(ext1, False, 'mod2.so')
+
+def test_store_lookup_prune(monkeypatch):
+    tmpdir = udir.ensure('test_store_lookup_prune', dir=1)
+    cache_dir = str(tmpdir.join('cache'))
+    for i in range(3):
+        tmpdir.join('m%d.so' % i).write_binary(b'x' * 100 * (i + 1))
+        cache.store(cache_dir, '%02d' % i * 32,
+                    str(tmpdir.join('m%d.so' % i)), 'm%d' % i)
+    assert cache.lookup(cache_dir, '00' * 32, str(tmpdir.join('out.so')))
+    assert tmpdir.join('out.so').read_binary() == b'x' * 100
+    assert not cache.lookup(cache_dir, 'ff' * 32, str(tmpdir.join('no.so')))
+    assert not tmpdir.join('no.so').check()
+    # least recently used first: m1, m2, m0
+    for i, age in [(1, 300), (2, 200), (0, 100)]:
+        key = '%02d' % i * 32
+        t = time.time() - age
+        os.utime(os.path.join(cache_dir, cache.MODULES_SUBDIR, key[:2],
+                              key + '.json'), (t, t))
+    removed = cache.prune(cache_dir, 450)
+    assert [info['module'] for info in removed] == ['m1']
+    assert sorted([info['module'] for info in cache.list_entries(cache_dir)]
+                  ) == ['m0', 'm2']
+    #
+    monkeypatch.setenv('CFFI_CACHE_MAX_SIZE', 'lots')
+    with pytest.warns(UserWarning, match="invalid CFFI_CACHE_MAX_SIZE"):
+        assert cache.get_max_size() == cache.DEFAULT_MAX_SIZE
+    monkeypatch.setenv('CFFI_CACHE_MAX_SIZE', '0.25K')
+    assert cache.get_max_size() == 256
+    tmpdir.join('m3.so').write_binary(b'y' * 200)
+    cache.store(cache_dir, '03' * 32, str(tmpdir.join('m3.so')), 'm3')
+    assert [info['module'] for info in cache.list_entries(cache_dir)
+            ] == ['m3']
+
+def test_main(capsys):
+    tmpdir = udir.ensure('test_main', dir=1)
+    cache_dir = str(tmpdir.join('cache'))
+    tmpdir.join('m.so').write_binary(b'x' * 100)
+    cache.store(cache_dir, 'ab' * 32, str(tmpdir.join('m.so')), 'm')
+    assert cache.main(['--dir', cache_dir, 'info']) == 0
+    out = capsys.readouterr().out
+    assert 'modules:         1\n' in out
+    assert 'total size:      100 B\n' in out
+    assert cache.main(['--dir', cache_dir, 'list']) == 0
+    out = capsys.readouterr().out
+    assert out.startswith('ab' * 8 + '       100 B  ')
+    assert out.endswith('  m.so\n')
+    assert cache.main(['--dir', cache_dir, 'clear']) == 0
+    assert capsys.readouterr().out == 'removed 1 module(s)\n'
+    assert cache.list_entries(cache_dir) == []
+
+CDEF = """
+    typedef struct { int a; struct { long b; } c; } foo_t;
+    struct bar { foo_t *x; int y[5]; };
+    enum e { A, B=5 };
+    #define FOO 42
+    int abs(int);
+"""
+
+def test_cdef_cache(monkeypatch):
+    from cffi import cparser
+    cache_dir = str(udir.join('test_cdef_cache'))
+    monkeypatch.setenv('CFFI_CACHE_DIR', cache_dir)
+    cdef_dir = os.path.join(cache_dir, cache.CDEF_SUBDIR)
+    ffi1 = cffi.FFI()
+    ffi1.cdef(CDEF)
+    [entry] = cache.list_entries(cache_dir)
+    assert entry['module'] == '<cdef>'
+    assert entry['subdir'] == cache.CDEF_SUBDIR
+    if hasattr(os, 'getuid'):
+        assert os.stat(cdef_dir).st_mode & 0o777 == 0o700
+    #
+    real_get_parser = cparser._get_parser
+    def no_parser():
+        raise AssertionError("pycparser should not be called")
+    monkeypatch.setattr(cparser, '_get_parser', no_parser)
+    ffi2 = cffi.FFI()
+    ffi2.cdef(CDEF)
+    # different options: another key
+    pytest.raises(AssertionError, cffi.FFI().cdef, CDEF, packed=True)
+    monkeypatch.setattr(cparser, '_get_parser', real_get_parser)
+    #
+    assert (sorted(ffi2._parser._declarations) ==
+            sorted(ffi1._parser._declarations))
+    assert ffi2.sizeof("foo_t") == ffi1.sizeof("foo_t")
+    assert ffi2.offsetof("struct bar", "y") == ffi1.offsetof("struct bar", "y")
+    assert ffi2.typeof("struct bar").fields[0][1].type.item.cname == "foo_t"
+    lib = ffi2.dlopen(None)
+    assert lib.FOO == 42
+    assert lib.B == 5
+    assert lib.abs(-5) == 5
+    # only the first cdef() of an FFI instance uses the cache
+    ffi1.cdef("int labs(int);")
+    assert len(cache.list_entries(cache_dir)) == 1
+
+def test_cdef_cache_corrupted(monkeypatch):
+    cache_dir = str(udir.join('test_cdef_cache_corrupted'))
+    monkeypatch.setenv('CFFI_CACHE_DIR', cache_dir)
+    cdef_dir = os.path.join(cache_dir, cache.CDEF_SUBDIR)
+    cffi.FFI().cdef(CDEF)
+    [entry] = cache.list_entries(cache_dir)
+    key = entry['key']
+    path = os.path.join(cdef_dir, key[:2], key + '.module')
+    with open(path, 'rb') as f:
+        data = f.read()
+    # a valid pickle that doesn't match the digest is not loaded
+    import pickle
+    digest = data.split(b'\n', 1)[0]
+    with open(path, 'wb') as f:
+        f.write(digest + b'\n' + pickle.dumps(None))
+    ffi = cffi.FFI()
+    ffi.cdef(CDEF)          # parsed again, and stored again
+    assert ffi.sizeof("struct bar") > 0
+    with open(path, 'rb') as f:
+        assert f.read() == data
+
+@pytest.mark.skipif("not hasattr(os, 'getuid')")
+def test_cdef_cache_not_private(monkeypatch):
+    from cffi import cparser
+    cache_dir = str(udir.join('test_cdef_cache_not_private'))
+    monkeypatch.setenv('CFFI_CACHE_DIR', cache_dir)
+    cdef_dir = os.path.join(cache_dir, cache.CDEF_SUBDIR)
+    cffi.FFI().cdef(CDEF)
+    assert len(cache.list_entries(cache_dir)) == 1
+    os.chmod(cdef_dir, 0o770)
+    assert cache.get_private_dir(cache_dir, cache.CDEF_SUBDIR) is None
+    parsed = []
+    real_get_parser = cparser._get_parser
+    def counting_parser():
+        parsed.append(1)
+        return real_get_parser()
+    monkeypatch.setattr(cparser, '_get_parser', counting_parser)
+    cffi.FFI().cdef(CDEF)
+    assert parsed                  # the cache was not used
+    os.chmod(cdef_dir, 0o700)
+
+@pytest.mark.skipif("not hasattr(os, 'getuid')")
+def test_compile_cache_not_private(monkeypatch):
+    tmpdir = str(udir.join('test_compile_cache_not_private'))
+    cache_dir = os.path.join(tmpdir, 'cache')
+    builds = []
+    original_build = ffiplatform._build
+    def counting_build(*args):
+        builds.append(args)
+        return original_build(*args)
+    monkeypatch.setattr(ffiplatform, '_build', counting_build)
+    make_ffi().compile(tmpdir=os.path.join(tmpdir, 'a'), cache_dir=cache_dir)
+    assert len(builds) == 1
+    [entry] = cache.list_entries(cache_dir)
+    assert entry['subdir'] == cache.MODULES_SUBDIR
+    # another user could write there: the compiled modules are not used
+    modules_dir = os.path.join(cache_dir, cache.MODULES_SUBDIR)
+    os.chmod(modules_dir, 0o777)
+    try:
+        with pytest.warns(UserWarning, match="not private"):
+            make_ffi().compile(tmpdir=os.path.join(tmpdir, 'b'),
+                               cache_dir=cache_dir)
+        assert len(builds) == 2
+        assert not cache.lookup(cache_dir, entry['key'],
+                                os.path.join(tmpdir, 'x.so'))
+    finally:
+        os.chmod(modules_dir, 0o700)
+
+def test_prune_all_subdirs(monkeypatch):
+    # the size limit applies to the modules and the cdef entries together
+    tmpdir = udir.ensure('test_prune_all_subdirs', dir=1)
+    cache_dir = str(tmpdir.join('cache'))
+    tmpdir.join('m.so').write_binary(b'x' * 100)
+    cache.store(cache_dir, 'aa' * 32, str(tmpdir.join('m.so')), 'm')
+    t = time.time() - 100
+    os.utime(os.path.join(cache_dir, cache.MODULES_SUBDIR, 'aa',
+                          'aa' * 32 + '.json'), (t, t))
+    monkeypatch.setenv('CFFI_CACHE_MAX_SIZE', '150')
+    cache.store_data(cache_dir, 'bb' * 32, b'y' * 100, '<cdef>', '1 lines')
+    assert [(info['subdir'], info['module'])
+            for info in cache.list_entries(cache_dir)] == [
+        (cache.CDEF_SUBDIR, '<cdef>')]
@@ -241,6 +241,14 @@ def test_ffi_buffer():
     assert ffi.buffer(cdata=a, size=2)[:] == b'\x05\x06'
     assert type(ffi.buffer(a)) is ffi.buffer
 
+def test_ffi_buffer_typed():
+    ffi = _cffi1_backend.FFI()
+    a = ffi.new("short[2][3]", [[1, 2, 3], [4, 5, 6]])
+    m = memoryview(ffi.buffer(a, typed=True))
+    assert m.format == 'h'
+    assert m.shape == (2, 3)
+    assert m.tolist() == [[1, 2, 3], [4, 5, 6]]
+
 def test_ffi_from_buffer():
     import array
     ffi = _cffi1_backend.FFI()
@@ -325,6 +333,18 @@ def test_memmove_readonly_readwrite():
     ffi.memmove(dest=ba, src=p, n=3)
     assert ba == bytearray(b"ABcxx")
 
+def test_ffi_call_many():
+    import array
+    ffi = _cffi1_backend.FFI()
+    f = ffi.callback("int(*)(int, int)", lambda x, y: x * y)
+    res = ffi.call_many(f, array.array('i', [1, 2, 3]),
+                           ffi.new("int[]", [4, 5, 6]))
+    assert ffi.typeof(res) is ffi.typeof("int[]")
+    assert list(res) == [4, 10, 18]
+    out = array.array('i', [0, 0, 0])
+    assert ffi.call_many(f, res, res, out=out) is out
+    assert out.tolist() == [16, 100, 324]
+
 def test_ffi_types():
     CData = _cffi1_backend.FFI.CData
     CType = _cffi1_backend.FFI.CType
@@ -907,6 +907,76 @@ def test_unpack_args():
     assert st1(e7.value) in ["foo2 expected 2 arguments, got 3",
                              "foo2() takes exactly 2 arguments (3 given)"]
 
+def test_unpack_args_fastcall():
+    ffi = FFI()
+    ffi.cdef("int foo2(int, int); int foo3(int *, int, double);")
+    lib = verify(ffi, "test_unpack_args_fastcall", """
+    int foo2(int x, int y) { return x - y; }
+    int foo3(int *p, int n, double d) {
+        int i, total = (int)d;
+        for (i = 0; i < n; i++)
+            total += p[i];
+        return total;
+    }
+    """, define_macros=[('_CFFI_NO_LIMITED_API', None)])
+    assert lib.foo2(50, 8) == 42
+    assert lib.foo3([1, 2, 3], 3, 100.5) == 106
+    assert lib.foo3(ffi.new("int[]", [4, 5]), 2, 0.0) == 9
+    e1 = pytest.raises(TypeError, lib.foo2)
+    e2 = pytest.raises(TypeError, lib.foo2, 42)
+    e3 = pytest.raises(TypeError, lib.foo3, [1], 1, 2.0, 3)
+    e4 = pytest.raises(TypeError, lib.foo2, 42, "x")
+    assert str(e1.value) == "foo2 expected 2 arguments, got 0"
+    assert str(e2.value) == "foo2 expected 2 arguments, got 1"
+    assert str(e3.value) == "foo3 expected 3 arguments, got 4"
+    assert "an integer is required" in str(e4.value) or (
+        "cannot be interpreted as an integer" in str(e4.value))
+    pytest.raises(TypeError, lib.foo2, 1, y=2)
+    fptr = ffi.addressof(lib, "foo2")
+    assert ffi.typeof(fptr) == ffi.typeof("int(*)(int, int)")
+    assert fptr(10, 3) == 7
+
+@pytest.mark.parametrize("limited_api", [None, "0x030A0000"])
+def test_unpack_args_fastcall_limited_api(limited_api):
+    # with the default Py_LIMITED_API, METH_FASTCALL is not available;
+    # it is if the module asks for the 3.10 limited API explicitly
+    if limited_api is not None and sys.version_info < (3, 10):
+        pytest.skip("the 3.10 limited API needs CPython >= 3.10")
+    kwds = {}
+    if limited_api is not None:
+        kwds['define_macros'] = [('Py_LIMITED_API', limited_api)]
+    ffi = FFI()
+    ffi.cdef("int foo2(int, int); int uses_fastcall(void);"
+             "int uses_limited_api(void);")
+    lib = verify(ffi, "test_unpack_args_fastcall_limited_api_%s" % (
+        limited_api is not None,), """
+    int foo2(int x, int y) { return x - y; }
+    int uses_fastcall(void) {
+    #ifdef _CFFI_USE_FASTCALL
+        return 1;
+    #else
+        return 0;
+    #endif
+    }
+    int uses_limited_api(void) {
+    #ifdef Py_LIMITED_API
+        return 1;
+    #else
+        return 0;
+    #endif
+    }
+    """, **kwds)
+    assert lib.foo2(50, 8) == 42
+    e1 = pytest.raises(TypeError, lib.foo2, 42)
+    assert str(e1.value) in ["foo2 expected 2 arguments, got 1",
+                             "foo2() takes exactly 2 arguments (1 given)"]
+    if '__pypy__' in sys.builtin_module_names:
+        assert lib.uses_fastcall() == 0
+    elif limited_api is not None or not lib.uses_limited_api():
+        assert lib.uses_fastcall() == 1
+    else:
+        assert lib.uses_fastcall() == 0
+
 def test_address_of_function():
     ffi = FFI()
     ffi.cdef("long myfunc(long x);")
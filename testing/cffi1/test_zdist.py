@@ -422,3 +422,55 @@ class TestDist(object):
                                    'src1': {'pack3': {'__init__.py': None,
                                                       '_build.py': None,
                                                       'mymod.SO': None}}})
+
+    @chdir_to_tmp
+    def test_setuptools_parallel(self, monkeypatch):
+        self._prepare_setuptools()
+        os.mkdir("src4")
+        os.mkdir(os.path.join("src4", "pack4"))
+        with open(os.path.join("src4", "pack4", "__init__.py"), "w") as f:
+            pass
+        for i in range(3):
+            with open(os.path.join("src4", "pack4", "_build%d.py" % i),
+                      "w") as f:
+                f.write("""if 1:
+                    import cffi
+                    ffi = cffi.FFI()
+                    ffi.cdef("int foo(void);")
+                    ffi.set_source("pack4.mymod%d",
+                                   "static int foo(void) { return %d; }")
+                """ % (i, i))
+        with open(os.path.join("src4", "pack4", "_buildpy.py"), "w") as f:
+            f.write("""if 1:
+                import cffi
+                ffi = cffi.FFI()
+                ffi.set_source("pack4.mymodpy", None)
+            """)
+        # call the 'cffi_modules' hook directly, in this process
+        from setuptools import Distribution
+        from cffi.setuptools_ext import cffi_modules
+        monkeypatch.setenv("CFFI_BUILD_JOBS", "3")
+        dist = Distribution({'name': 'example1',
+                             'packages': ['pack4'],
+                             'package_dir': {'': 'src4'}})
+        cffi_modules(dist, 'cffi_modules', ["src4/pack4/_build0.py:ffi",
+                                            "src4/pack4/_build1.py:ffi",
+                                            "src4/pack4/_build2.py:ffi",
+                                            "src4/pack4/_buildpy.py:ffi"])
+        assert [ext.name for ext in dist.ext_modules] == [
+            'pack4.mymod0', 'pack4.mymod1', 'pack4.mymod2']
+        assert dist.py_modules == ['pack4.mymodpy']
+        assert dist.get_option_dict('build_ext')['parallel'] == (
+            'CFFI_BUILD_JOBS', 3)
+        dist.get_command_obj('build_ext').inplace = 1
+        dist.run_command('build_ext')
+        self.check_produced_files({'build': '?',
+                                   'src4': {'pack4': {'__init__.py': None,
+                                                      '_build0.py': None,
+                                                      '_build1.py': None,
+                                                      '_build2.py': None,
+                                                      '_buildpy.py': None,
+                                                      'mymod0.SO': None,
+                                                      'mymod1.SO': None,
+                                                      'mymod2.SO': None,
+                                                      'mymodpy.py': None}}})